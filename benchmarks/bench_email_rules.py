@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark per-email parse cost of the bank email rule engine.
+
+Builds a synthetic corpus of payment alerts mixed with ordinary mail
+(newsletters, receipts, long threads), parses every email with the bundled
+rule pack and reports the average cost per email, split into emails the
+keyword prefilter rejects and emails that reach the field patterns.
+
+Usage:
+    python benchmarks/bench_email_rules.py [--emails 5000] [--payment-ratio 0.2] [--rules PATH]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from payment_sources.email_rules import DEFAULT_RULES_PATH, RuleSet  # noqa: E402
+
+WORDS = (
+    "update account newsletter offer meeting invoice shipping order delivery weekly "
+    "summary team project schedule review report security login device welcome"
+).split()
+
+
+def payment_email(rng):
+    """Return (subject, from, body) of a payment alert matching one of the bundled rules"""
+    amount = f"{rng.randint(1, 99999):,}.{rng.randint(0, 99):02d}"
+    if rng.random() < 0.6:
+        body = (
+            f"Dear Customer,\n\nRs.{amount} has been credited to account **{rng.randint(1000, 9999)} by VPA "
+            f"user{rng.randint(1, 999)}@okaxis on {rng.randint(10, 28)}-0{rng.randint(1, 9)}-24. "
+            f"Your UPI transaction reference number is {rng.randint(10 ** 11, 10 ** 12 - 1)}.\n"
+        )
+        return "You have received a UPI payment", "HDFC Bank <alerts@hdfcbank.net>", body
+    body = (
+        f"Thank you for using your HDFC Bank Credit Card ending {rng.randint(1000, 9999)} for Rs {amount} "
+        f"at STORE {rng.randint(1, 99)} on 2024-05-{rng.randint(10, 28)}:10:11:12. Authorization code:- ABC123\n"
+    )
+    return "Transaction alert for your HDFC Bank Credit Card", "alerts@hdfcbank.net", body
+
+
+def other_email(rng):
+    """Return (subject, from, body) of ordinary mail of a few kilobytes"""
+    body = "\n".join(" ".join(rng.choice(WORDS) for _ in range(14)) for _ in range(rng.randint(20, 60)))
+    return " ".join(rng.choice(WORDS) for _ in range(5)), f"news@{rng.choice(WORDS)}.example", body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--emails', type=int, default=5000)
+    parser.add_argument('--payment-ratio', type=float, default=0.2)
+    parser.add_argument('--rules', default=DEFAULT_RULES_PATH)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = [
+        payment_email(rng) if rng.random() < args.payment_ratio else other_email(rng)
+        for _ in range(args.emails)
+    ]
+
+    start = time.perf_counter()
+    rules = RuleSet.load(args.rules)
+    load_ms = (time.perf_counter() - start) * 1000
+
+    matched = 0
+    timings = {"matched": [], "rejected": []}
+    for subject, from_, body in corpus:
+        t0 = time.perf_counter()
+        record = rules.parse(subject, from_, body)
+        elapsed = time.perf_counter() - t0
+        matched += record is not None
+        timings["matched" if record is not None else "rejected"].append(elapsed)
+
+    total = sum(timings["matched"]) + sum(timings["rejected"])
+    print(json.dumps({
+        "emails": len(corpus),
+        "matched": matched,
+        "rule_pack_load_ms": round(load_ms, 2),
+        "us_per_email": round(total / len(corpus) * 1e6, 2),
+        "us_per_matched_email": round(sum(timings["matched"]) / max(len(timings["matched"]), 1) * 1e6, 2),
+        "us_per_rejected_email": round(sum(timings["rejected"]) / max(len(timings["rejected"]), 1) * 1e6, 2),
+        "emails_per_s": round(len(corpus) / total),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Benchmark ImapAlerts against a local IMAP server holding a synthetic mailbox.
+
+Starts `stubs/imap_server.py` in its own process with N generated messages
+(bank alerts mixed with newsletters, threads, large attachments and odd
+charsets, see `stubs/synthetic_mail.py`) and measures two things:
+
+- catch-up: the first sync of the whole mailbox (every message unseen)
+- steady state: polls that each find a few newly appended messages
+
+For both it reports messages per second, bytes fetched and peak Python memory
+(tracemalloc, measured in a separate pass so it does not slow the timed one),
+and checks the number of alerts against the payment alerts in the mailbox.
+
+Usage:
+    python benchmarks/bench_imap_sync.py [--messages 10000] [--polls 30] [--new-per-poll 20]
+"""
+
+import argparse
+import imaplib
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from stubs.synthetic_mail import PAYMENT_KINDS, generate_mailbox  # noqa: E402
+
+
+class CountingNotifier:
+    """Stands in for the dispatcher"""
+
+    def __init__(self):
+        self.sent = 0
+
+    def send_message(self, message, **kwargs):
+        self.sent += 1
+        return True
+
+
+def start_server(args):
+    """Start the IMAP stub and return (process, description of the mailbox)"""
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'stubs', 'imap_server.py'), '--port', '0',
+         '--messages', str(args.messages), '--seed', str(args.seed), '--attachment-kb', str(args.attachment_kb)],
+        stdout=subprocess.PIPE
+    )
+    line = process.stdout.readline()
+    if not line:
+        raise RuntimeError("IMAP stub did not start")
+    return process, json.loads(line)
+
+
+def peak_mb(func):
+    """Run func under tracemalloc and return the peak in MiB"""
+    tracemalloc.start()
+    try:
+        func()
+        return round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 2)
+    finally:
+        tracemalloc.stop()
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=10000, help="messages in the mailbox (1k-100k)")
+    parser.add_argument('--polls', type=int, default=30)
+    parser.add_argument('--new-per-poll', type=int, default=20, help="messages appended before each poll")
+    parser.add_argument('--attachment-kb', type=int, default=128)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    process, mailbox = start_server(args)
+    tmpdir = tempfile.mkdtemp()
+    os.environ.update({
+        'IMAP_HOST': mailbox['host'],
+        'IMAP_PORT': str(mailbox['port']),
+        'IMAP_USER': 'user',
+        'IMAP_PASSWORD': 'password',
+    })
+    # Read at import time, so only import once the server address is known
+    from payment_sources.imap_alerts import ImapAlerts
+    from storage.state import StateStore
+
+    def new_alerter(name):
+        return ImapAlerts(CountingNotifier(), state=StateStore(os.path.join(tmpdir, f'{name}.db')))
+
+    try:
+        expected = sum(count for kind, count in mailbox['kinds'].items() if kind in PAYMENT_KINDS)
+
+        alerter = new_alerter('timed')
+        start = time.perf_counter()
+        alerter.check_for_new_emails()
+        elapsed = time.perf_counter() - start
+        catch_up = {
+            "messages": mailbox['messages'],
+            "alerts": alerter.notifier.sent,
+            "expected_alerts": expected,
+            "elapsed_s": round(elapsed, 3),
+            "messages_per_s": round(mailbox['messages'] / elapsed),
+            "bytes_fetched": alerter.bytes_fetched,
+            "fetched_share_of_mailbox": round(alerter.bytes_fetched / mailbox['bytes'], 4),
+            "peak_mb": peak_mb(new_alerter('traced').check_for_new_emails),
+        }
+
+        appender = imaplib.IMAP4(mailbox['host'], mailbox['port'])
+        # imaplib sends a literal and its closing CRLF separately; without this each APPEND waits on Nagle
+        appender.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        appender.login('user', 'password')
+        next_index = [mailbox['messages']]
+        expected_new = [0]
+
+        def append_batch():
+            for kind, raw in generate_mailbox(args.new_per_poll, seed=args.seed, attachment_kb=args.attachment_kb,
+                                              start=next_index[0]):
+                appender.append('INBOX', None, None, raw)
+                expected_new[0] += kind in PAYMENT_KINDS
+            next_index[0] += args.new_per_poll
+
+        timings = []
+        sent_before, bytes_before = alerter.notifier.sent, alerter.bytes_fetched
+        for _ in range(args.polls):
+            append_batch()
+            start = time.perf_counter()
+            alerter.check_for_new_emails()
+            timings.append(time.perf_counter() - start)
+        polled_alerts = alerter.notifier.sent - sent_before
+        polled_bytes = alerter.bytes_fetched - bytes_before
+        polled_expected = expected_new[0]
+
+        def traced_polls():
+            for _ in range(min(args.polls, 5)):
+                append_batch()
+                alerter.check_for_new_emails()
+
+        memory = peak_mb(traced_polls)
+        appender.logout()
+        timings.sort()
+        polling = {
+            "polls": args.polls,
+            "new_per_poll": args.new_per_poll,
+            "alerts": polled_alerts,
+            "expected_alerts": polled_expected,
+            "messages_per_s": round(args.polls * args.new_per_poll / sum(timings)),
+            "p50_ms_per_poll": round(percentile(timings, 0.5) * 1000, 2),
+            "p95_ms_per_poll": round(percentile(timings, 0.95) * 1000, 2),
+            "bytes_per_poll": round(polled_bytes / args.polls),
+            "peak_mb": memory,
+        }
+    finally:
+        process.terminate()
+        process.wait(10)
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    print(json.dumps({
+        "mailbox": {"messages": mailbox['messages'], "mb": round(mailbox['bytes'] / 1024 / 1024, 1),
+                    "kinds": mailbox['kinds']},
+        "catch_up": catch_up,
+        "steady_state": polling,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
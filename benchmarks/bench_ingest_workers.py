@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Benchmark webhook ingest throughput with 1 vs N gunicorn workers.
+
+Starts `gunicorn wsgi:app` (BOT_ROLE=ingest) with each worker count on a
+temporary state database and posts signed `sponsorship.created` deliveries
+from concurrent client threads. Every delivery is verified, deduped, formatted
+and committed to the outbox, which is exactly what an ingest worker does in
+production. Reports requests per second, latency percentiles and the number of
+alerts stored for the notifier.
+
+Usage:
+    python benchmarks/bench_ingest_workers.py [--workers 1 4] [--requests 4000] [--clients 32]
+"""
+
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SECRET = 'benchmark-secret'
+
+PAYLOAD = json.dumps({
+    "action": "created",
+    "sponsorship": {
+        "sponsor": {"login": "test-user", "name": "Test User", "html_url": "https://github.com/test-user"},
+        "tier": {"name": "Gold", "monthly_price_in_dollars": 25, "is_one_time": False},
+        "created_at": "2025-01-01T12:00:00Z",
+    },
+}).encode('utf-8')
+SIGNATURE = 'sha256=' + hmac.new(SECRET.encode('utf-8'), PAYLOAD, hashlib.sha256).hexdigest()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_gunicorn(workers, threads, port, db_path, log_path):
+    """Start gunicorn serving wsgi:app and wait until /health answers"""
+    env = dict(os.environ)
+    env.update({
+        'BOT_ROLE': 'ingest',
+        'GITHUB_WEBHOOK_SECRET': SECRET,
+        'TELEGRAM_TOKEN': '123456:benchmark-token',
+        'TELEGRAM_CHAT_ID': '1',
+        'STATE_DB_PATH': db_path,
+    })
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-k', 'gthread', '--threads', str(threads),
+         '-b', f'127.0.0.1:{port}', '--log-level', 'warning', 'wsgi:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=open(log_path, 'w')
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f'http://127.0.0.1:{port}/health', timeout=1).ok:
+                return process
+        except requests.RequestException:
+            pass
+        if process.poll() is not None:
+            break
+        time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f"gunicorn did not start, see {log_path}")
+
+
+def run(workers, threads, total, clients):
+    """Post the deliveries against gunicorn with the given worker count and return a result dictionary"""
+    tmpdir = tempfile.mkdtemp()
+    port = free_port()
+    db_path = os.path.join(tmpdir, 'state.db')
+    process = start_gunicorn(workers, threads, port, db_path, os.path.join(tmpdir, 'gunicorn.log'))
+    url = f'http://127.0.0.1:{port}/webhook/github'
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def client(count):
+        session = requests.Session()
+        own = []
+        for _ in range(count):
+            headers = {
+                'Content-Type': 'application/json',
+                'X-GitHub-Event': 'sponsorship',
+                'X-GitHub-Delivery': str(uuid.uuid4()),
+                'X-Hub-Signature-256': SIGNATURE,
+            }
+            start = time.perf_counter()
+            response = session.post(url, data=PAYLOAD, headers=headers)
+            own.append(time.perf_counter() - start)
+            if response.status_code != 202:
+                with lock:
+                    errors.append(response.status_code)
+        with lock:
+            latencies.extend(own)
+
+    try:
+        per_client = total // clients
+        pool = [threading.Thread(target=client, args=(per_client,)) for _ in range(clients)]
+        start = time.perf_counter()
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        process.terminate()
+        process.wait(10)
+
+    conn = sqlite3.connect(db_path)
+    stored = conn.execute('SELECT COUNT(*) FROM outbox').fetchone()[0]
+    conn.close()
+    shutil.rmtree(tmpdir)
+
+    latencies.sort()
+    sent = per_client * clients
+    return {
+        "workers": workers,
+        "threads_per_worker": threads,
+        "requests": sent,
+        "errors": len(errors),
+        "stored_alerts": stored,
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(sent / elapsed),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--threads', type=int, default=4, help="gthread threads per worker")
+    parser.add_argument('--requests', type=int, default=4000)
+    parser.add_argument('--clients', type=int, default=32)
+    args = parser.parse_args()
+
+    results = [run(workers, args.threads, args.requests, args.clients) for workers in args.workers]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Benchmark the cost of recording metrics on the hot path.
+
+Measures a counter increment, a labelled counter increment and a histogram
+observation, and the instrumentation a single webhook delivery performs
+(two histograms for signature and parse time, the request counter and the
+request-time histogram), in nanoseconds per call. Rendering `/metrics` is
+timed as well.
+
+Usage:
+    python benchmarks/bench_metrics.py [--iterations 200000]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from observability.metrics import Registry  # noqa: E402
+
+
+def per_call_ns(func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return round((time.perf_counter() - start) / iterations * 1e9)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=200000)
+    args = parser.parse_args()
+
+    registry = Registry()
+    plain = registry.counter('bench_total', 'Plain counter')
+    labelled = registry.counter('bench_requests_total', 'Labelled counter', ('event', 'outcome'))
+    latency = registry.histogram('bench_seconds', 'Histogram', ('event',))
+    signature = registry.histogram('bench_signature_seconds', 'Histogram')
+    parse = registry.histogram('bench_parse_seconds', 'Histogram')
+
+    def webhook():
+        started = time.perf_counter()
+        signature.observe(time.perf_counter() - started)
+        parse_started = time.perf_counter()
+        parse.observe(time.perf_counter() - parse_started)
+        labelled.labels('sponsorship', 'accepted').inc()
+        latency.labels('sponsorship').observe(time.perf_counter() - started)
+
+    results = {
+        "counter_inc_ns": per_call_ns(plain.inc, args.iterations),
+        "labelled_counter_inc_ns": per_call_ns(lambda: labelled.labels('sponsorship', 'accepted').inc(), args.iterations),
+        "histogram_observe_ns": per_call_ns(lambda: latency.labels('sponsorship').observe(0.0042), args.iterations),
+        "webhook_instrumentation_ns": per_call_ns(webhook, args.iterations),
+        "render_us": round(per_call_ns(registry.render, 1000) / 1000, 1),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Compare memory and time of body extraction for emails with large attachments.
+
+For each message the full-tree approach (email.message_from_bytes and a walk
+over every part) is compared with the streaming extractor. Peak memory is
+measured with tracemalloc on top of the raw message bytes, which are the same
+for both approaches.
+
+Usage:
+    python benchmarks/bench_mime_extract.py [--messages 20] [--attachment-mb 20]
+"""
+
+import argparse
+import email
+import json
+import os
+import sys
+import time
+import tracemalloc
+from email.message import EmailMessage
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from payment_sources.mime_extract import extract_email  # noqa: E402
+
+
+def build_message(attachment_mb):
+    """Return a payment alert with a PDF statement attached"""
+    msg = EmailMessage()
+    msg['Subject'] = 'Account update for your HDFC Bank A/c'
+    msg['From'] = 'alerts@hdfcbank.net'
+    msg.set_content("Rs.1,250.00 has been credited to account **4321 by VPA asha.k@okaxis on 12-05-24.")
+    msg.add_attachment(os.urandom(attachment_mb * 1024 * 1024), maintype='application', subtype='pdf',
+                       filename='statement.pdf')
+    return msg.as_bytes()
+
+
+def full_tree(raw):
+    """Body extraction as done with message_from_bytes"""
+    msg = email.message_from_bytes(raw)
+    for part in msg.walk():
+        if part.get_content_type() == "text/plain" and "attachment" not in str(part.get("Content-Disposition")):
+            return part.get_payload(decode=True).decode()
+    return ""
+
+
+def measure(func, raws):
+    """Return (peak MiB over the raw input, ms per message)"""
+    tracemalloc.start()
+    peak = 0
+    start = time.perf_counter()
+    for raw in raws:
+        tracemalloc.reset_peak()
+        func(raw)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+    elapsed = time.perf_counter() - start
+    tracemalloc.stop()
+    return round(peak / 1024 / 1024, 2), round(elapsed / len(raws) * 1000, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=20)
+    parser.add_argument('--attachment-mb', type=int, default=20)
+    args = parser.parse_args()
+
+    raw = build_message(args.attachment_mb)
+    raws = [raw] * args.messages
+    results = {"message_mb": round(len(raw) / 1024 / 1024, 2), "messages": args.messages}
+    for name, func in (("message_from_bytes", full_tree), ("streaming", lambda r: extract_email(r).body)):
+        peak_mb, ms = measure(func, raws)
+        results[name] = {"peak_mb": peak_mb, "ms_per_message": ms}
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark the cost of durably storing alerts in the outbox.
+
+Appends alerts from one or more threads and reports the average wall-clock
+cost per alert, the number of commits (group commit folds concurrent writers
+into shared transactions) and the throughput for each SQLite synchronous mode.
+
+Usage:
+    python benchmarks/bench_outbox.py [--alerts 20000] [--threads 1 8]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from notifications.notification import Notification  # noqa: E402
+from storage.outbox import Outbox  # noqa: E402
+
+MESSAGE = (
+    "🔔 *New GitHub Sponsor Payment Received*\n\n"
+    "*Sponsor:* Test User (@test-user)\n*Tier:* Gold\n*Amount:* $25\n"
+    "*Type:* monthly sponsorship\n*Timestamp:* 2025-01-01 12:00:00\n\n"
+    "*GitHub Profile:* https://github.com/test-user"
+)
+
+
+def run(alerts, threads, synchronous):
+    """Append alerts from the given number of threads and return a result dictionary"""
+    tmpdir = tempfile.mkdtemp()
+    try:
+        outbox = Outbox(os.path.join(tmpdir, 'bench.db'), synchronous=synchronous)
+        outbox.append(Notification("warm-up"))
+        per_thread = alerts // threads
+
+        def writer():
+            for _ in range(per_thread):
+                outbox.append(Notification(MESSAGE, source="github_sponsors", amount=25, currency="USD"))
+
+        workers = [threading.Thread(target=writer) for _ in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+        total = per_thread * threads
+        result = {
+            "synchronous": synchronous,
+            "threads": threads,
+            "alerts": total,
+            "commits": outbox.commits - 1,
+            "elapsed_s": round(elapsed, 3),
+            "us_per_alert": round(elapsed / total * 1e6, 1),
+            "alerts_per_s": round(total / elapsed),
+        }
+        outbox.close()
+        return result
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--alerts', type=int, default=20000)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--modes', nargs='+', default=['NORMAL', 'FULL'])
+    args = parser.parse_args()
+
+    results = [run(args.alerts, threads, mode) for mode in args.modes for threads in args.threads]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark the rate-limited Telegram sender against the local Bot API stub.
+
+Pushes a burst of messages spread over several chats through the notification
+dispatcher and the real `TelegramBot`, while the stub enforces Telegram's flood
+limits and answers excess requests with 429 / retry_after. Reports sustained
+throughput, the number of 429 responses and the number of dropped messages.
+
+Usage:
+    python benchmarks/bench_telegram_sender.py [--messages 300] [--chats 40] [--workers 8]
+    python benchmarks/bench_telegram_sender.py --unpaced   # disable client-side pacing
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('TELEGRAM_TOKEN', '123456:benchmark-token')
+os.environ.setdefault('TELEGRAM_CHAT_ID', '1')
+
+from github_sponsors_bot import TelegramBot  # noqa: E402
+from notifications.dispatch import NotificationDispatcher  # noqa: E402
+from notifications.rate_limit import TelegramRateLimiter  # noqa: E402
+from stubs.telegram_api import TelegramStubServer  # noqa: E402
+
+
+def run(messages, chats, workers, chat_limit, global_limit, unpaced):
+    """Send the burst and return a result dictionary"""
+    stub = TelegramStubServer(chat_limit=chat_limit, global_limit=global_limit).start()
+    if unpaced:
+        limiter = TelegramRateLimiter(global_rate=1e6, chat_rate=1e6, chat_burst=1e6)
+    else:
+        # Same margin below the stub's limits as the production defaults
+        limiter = TelegramRateLimiter(global_rate=global_limit * 25 / 30, chat_rate=chat_limit * 0.9)
+    bot = TelegramBot(
+        os.environ['TELEGRAM_TOKEN'],
+        os.environ['TELEGRAM_CHAT_ID'],
+        base_url=stub.base_url,
+        rate_limiter=limiter,
+        con_pool_size=workers + 2
+    )
+
+    # Each item carries its own chat so the burst spreads over several chats
+    dispatcher = NotificationDispatcher(lambda item: bot.send_message(item[1], chat_id=item[0]), workers=workers)
+    dispatcher.start()
+    start = time.monotonic()
+    for i in range(messages):
+        dispatcher.send_message((str(1000 + i % chats), f"benchmark message {i}"))
+    dispatcher.join()
+    elapsed = time.monotonic() - start
+    dispatcher.stop()
+    stub.stop()
+
+    stats = dispatcher.stats()
+    return {
+        "messages": messages,
+        "chats": chats,
+        "workers": workers,
+        "paced": not unpaced,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_msg_s": round(stats["delivered"] / elapsed, 2),
+        "api_limit_msg_s": min(global_limit, chats * chat_limit),
+        "delivered": stats["delivered"],
+        "dropped": stats["failed"] + stats["rejected"],
+        "http_429": stub.rejections,
+        "stub_deliveries": len(stub.deliveries),
+        "wait_max_ms": stats["wait_max_ms"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=300)
+    parser.add_argument('--chats', type=int, default=40)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--chat-limit', type=int, default=1, help='stub messages/s per chat')
+    parser.add_argument('--global-limit', type=int, default=30, help='stub messages/s overall')
+    parser.add_argument('--unpaced', action='store_true', help='send without client-side token buckets')
+    args = parser.parse_args()
+
+    result = run(args.messages, args.chats, args.workers, args.chat_limit, args.global_limit, args.unpaced)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
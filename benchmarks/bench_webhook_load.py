@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Load test for the GitHub webhook endpoint.
+
+Spawns the bot locally (Flask, the asyncio runtime, or gunicorn ingest workers
+next to a notifier), wired to the Telegram Bot API stub, and drives
+`/webhook/github` with signed sponsorship events built by `test_webhook.py`.
+The events cover every sponsorship action and a spread of payload sizes.
+Requests are sent from concurrent client threads, either as fast as possible
+or at a fixed rate. With a fixed rate, latency is measured from the scheduled
+send time, so a stalled server is not hidden by clients that wait for it.
+Throughput, p50/p95/p99 latency and status counts are printed as JSON. Pass
+`--baseline` with an earlier result to see the change per metric.
+
+Usage:
+    python benchmarks/bench_webhook_load.py [--requests 5000] [--concurrency 32] [--rate 0]
+    python benchmarks/bench_webhook_load.py --runtime asyncio
+    python benchmarks/bench_webhook_load.py --workers 4          # gunicorn ingest workers + notifier
+    python benchmarks/bench_webhook_load.py --output run.json --baseline previous.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from stubs.telegram_api import TelegramStubServer  # noqa: E402
+from test_webhook import SPONSORSHIP_ACTIONS, build_sponsorship_payload, generate_signature  # noqa: E402
+
+SECRET = 'benchmark-secret'
+DEFAULT_MIX = 'created=70,cancelled=10,edited=5,tier_changed=5,pending_cancellation=5,pending_tier_change=5'
+
+
+def parse_mix(text):
+    """Parse 'action=weight,...' into a dict, rejecting unknown actions"""
+    mix = {}
+    for part in text.split(','):
+        action, _, weight = part.partition('=')
+        if action not in SPONSORSHIP_ACTIONS:
+            raise argparse.ArgumentTypeError(f"unknown sponsorship action {action!r}")
+        mix[action] = float(weight or 1)
+    return mix
+
+
+def build_corpus(size, mix, max_description, seed):
+    """Pre-sign a pool of payloads so signing is not part of the measured time"""
+    rng = random.Random(seed)
+    actions, weights = zip(*mix.items())
+    corpus = []
+    for i in range(size):
+        action = rng.choices(actions, weights)[0]
+        payload = build_sponsorship_payload(
+            action=action,
+            login=f"sponsor-{i}",
+            name=f"Sponsor {i}",
+            amount=rng.choice((1, 5, 10, 25, 100, 500)),
+            one_time=rng.random() < 0.3,
+            description=' '.join('perk' for _ in range(rng.randint(0, max_description // 5))),
+            created_at=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(1735689600 + i * 61))
+        )
+        body = json.dumps(payload).encode('utf-8')
+        corpus.append((action, body, generate_signature(body, SECRET)))
+    return corpus
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_healthy(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with status {process.returncode}")
+        try:
+            if requests.get(f'http://127.0.0.1:{port}/health', timeout=1).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError("server did not become healthy")
+
+
+def start_servers(args, tmpdir, telegram_url):
+    """Start the bot (and gunicorn) and return (webhook port, processes)"""
+    env = dict(os.environ)
+    env.update({
+        'GITHUB_WEBHOOK_SECRET': SECRET,
+        'TELEGRAM_TOKEN': '123456:benchmark-token',
+        'TELEGRAM_CHAT_ID': '1',
+        'TELEGRAM_API_BASE_URL': telegram_url,
+        # Commands by webhook, so the bot does not long-poll the stub
+        'TELEGRAM_WEBHOOK_URL': 'http://127.0.0.1/webhook/telegram',
+        'TELEGRAM_WEBHOOK_SECRET': 'benchmark-telegram-secret',
+        'STATE_DB_PATH': os.path.join(tmpdir, 'state.db'),
+        'WEBHOOK_HOST': '127.0.0.1',
+        'BOT_RUNTIME': args.runtime,
+        'BOT_ROLE': 'notifier' if args.workers else 'all',
+        'BINANCE_API_KEY': '',
+        'IMAP_HOST': '',
+    })
+    for name in ('IMAP_USER', 'IMAP_PASSWORD', 'BINANCE_API_SECRET'):
+        env.pop(name, None)
+    log = open(os.path.join(tmpdir, 'server.log'), 'w')
+    processes = []
+
+    bot_port = free_port()
+    processes.append(subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'github_sponsors_bot.py')],
+        cwd=tmpdir, env=dict(env, WEBHOOK_PORT=str(bot_port)), stdout=log, stderr=log
+    ))
+    wait_healthy(bot_port, processes[0])
+    if not args.workers:
+        return bot_port, processes
+
+    ingest_port = free_port()
+    processes.append(subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-w', str(args.workers), '-k', 'gthread', '--threads', '4',
+         '-b', f'127.0.0.1:{ingest_port}', '--log-level', 'warning', 'wsgi:app'],
+        cwd=ROOT, env=dict(env, BOT_ROLE='ingest'), stdout=log, stderr=log
+    ))
+    wait_healthy(ingest_port, processes[1])
+    return ingest_port, processes
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def drive(url, corpus, total, concurrency, rate):
+    """Send total requests from concurrent clients; returns (latencies, statuses, elapsed)"""
+    next_index = iter(range(total))
+    index_lock = threading.Lock()
+    latencies = []
+    statuses = Counter()
+    results_lock = threading.Lock()
+    start = time.perf_counter() + 0.05
+
+    def client():
+        session = requests.Session()
+        own_latencies = []
+        own_statuses = Counter()
+        while True:
+            with index_lock:
+                i = next(next_index, None)
+            if i is None:
+                break
+            action, body, signature = corpus[i % len(corpus)]
+            headers = {
+                'Content-Type': 'application/json',
+                'X-GitHub-Event': 'sponsorship',
+                'X-GitHub-Delivery': str(uuid.uuid4()),
+                'X-Hub-Signature-256': signature,
+            }
+            scheduled = start + i / rate if rate else None
+            if scheduled is not None:
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            sent = time.perf_counter()
+            try:
+                status = session.post(url, data=body, headers=headers, timeout=30).status_code
+            except requests.RequestException:
+                status = 'error'
+            finished = time.perf_counter()
+            own_latencies.append(finished - (scheduled if scheduled is not None else sent))
+            own_statuses[str(status)] += 1
+        with results_lock:
+            latencies.extend(own_latencies)
+            statuses.update(own_statuses)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, statuses, time.perf_counter() - start
+
+
+def compare(result, baseline):
+    """Relative change of the headline numbers against an earlier result"""
+    delta = {}
+    for key in ('requests_per_s', 'p50_ms', 'p95_ms', 'p99_ms'):
+        if baseline.get(key):
+            delta[key] = f"{(result[key] - baseline[key]) / baseline[key] * 100:+.1f}%"
+    return delta
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--rate', type=float, default=0, help="requests per second in total, 0 for unpaced")
+    parser.add_argument('--warmup', type=int, default=200, help="requests sent before measuring")
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX), help="action=weight,...")
+    parser.add_argument('--max-description', type=int, default=4000, help="largest tier description in bytes")
+    parser.add_argument('--corpus', type=int, default=1000, help="distinct payloads to cycle through")
+    parser.add_argument('--runtime', choices=('threads', 'asyncio'), default='threads')
+    parser.add_argument('--workers', type=int, default=0, help="gunicorn ingest workers, 0 for a single process")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="also write the JSON result to this file")
+    parser.add_argument('--baseline', help="earlier JSON result to compare with")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.corpus, args.mix, args.max_description, args.seed)
+    sizes = sorted(len(body) for _, body, _ in corpus)
+    tmpdir = tempfile.mkdtemp()
+    telegram = TelegramStubServer(global_limit=30).start()
+    processes = []
+    try:
+        port, processes = start_servers(args, tmpdir, telegram.base_url)
+        url = f'http://127.0.0.1:{port}/webhook/github'
+        if args.warmup:
+            drive(url, corpus, args.warmup, min(args.concurrency, args.warmup), 0)
+        latencies, statuses, elapsed = drive(url, corpus, args.requests, args.concurrency, args.rate)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        telegram.stop()
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    latencies.sort()
+    result = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "runtime": args.runtime,
+        "workers": args.workers,
+        "concurrency": args.concurrency,
+        "target_rate": args.rate,
+        "requests": len(latencies),
+        "statuses": dict(statuses),
+        "errors": sum(count for status, count in statuses.items() if not status.startswith('2')),
+        "payload_bytes": {"min": sizes[0], "p50": percentile(sizes, 0.5), "max": sizes[-1]},
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        "telegram_deliveries": len(telegram.deliveries),
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            result["baseline_delta"] = compare(result, json.load(f))
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -11,17 +11,103 @@ It provides real-time payment notifications with complete transaction details.
 Usage:
     python github_sponsors_bot.py
 
+    Or, to scale webhook ingest across cores:
+    BOT_ROLE=notifier python github_sponsors_bot.py
+    gunicorn -w 4 -b 0.0.0.0:5000 wsgi:app
+
 Environment variables required:
     GITHUB_WEBHOOK_SECRET - Secret for verifying GitHub webhook signatures
     TELEGRAM_TOKEN - Telegram Bot API token
     TELEGRAM_CHAT_ID - Telegram chat ID to send notifications to
     WEBHOOK_HOST - Host to bind the webhook server to (default: 0.0.0.0)
     WEBHOOK_PORT - Port to bind the webhook server to (default: 5000)
+    BOT_RUNTIME - threads (Flask server and worker threads) or asyncio (aiohttp on one event loop) (default: threads)
+    BOT_ROLE - all (one process does everything), ingest (webhook workers that only store alerts, see wsgi.py)
+        or notifier (Telegram, delivery and payment sources for the ingest workers) (default: all)
+    INGEST_POLL_INTERVAL - Seconds between checks of the notifier for alerts stored by ingest workers (default: 0.2)
+
+    # Notification delivery (Optional)
+    DISPATCH_QUEUE_SIZE - Maximum number of notifications waiting to be sent (default: 1000)
+    DISPATCH_WORKERS - Number of notification sender threads (default: 2)
+    COALESCE_WINDOW - Seconds during which bursts of alerts are folded into one digest (default: 0, disabled)
+    COALESCE_MAX_BATCH - Maximum number of alerts in one digest (default: 20)
+    NOTIFY_DESTINATIONS - Extra destinations as name=kind:target separated by ';', kind is telegram, slack, discord
+        or webhook; TELEGRAM_CHAT_ID is the destination 'default' (default: unset)
+    NOTIFY_ROUTES - Sources mapped to destinations, e.g. github_sponsors=public;*=ops; '*' applies to every alert
+        source (not startup or command messages) and sources without a route of their own also go to 'default'
+        (default: unset, everything to 'default')
+    NOTIFY_QUEUE_SIZE - Alerts waiting per destination (default: DISPATCH_QUEUE_SIZE)
+    NOTIFY_WEBHOOK_TIMEOUT - Seconds before a webhook destination request times out (default: 10)
+    STATE_DB_PATH - SQLite database for the outbox and other local state (default: data/bot_state.db)
+    OUTBOX_ENABLED - Store alerts durably until Telegram accepted them (default: true)
+    OUTBOX_SYNCHRONOUS - SQLite synchronous mode for the outbox, NORMAL or FULL (default: NORMAL)
+    OUTBOX_RETRY_INTERVAL - Seconds between re-queueing undelivered alerts (default: 30)
+    OUTBOX_MAX_ATTEMPTS - Failed sends after which an alert is no longer retried (default: 10)
+    DEDUPE_MAX_ENTRIES - Webhook delivery ids remembered in memory (default: 10000)
+    DEDUPE_TTL - Seconds a webhook delivery id is remembered (default: 259200, three days)
+    DEDUPE_PERSISTENT - Also remember delivery ids in STATE_DB_PATH across restarts (default: true)
+    TELEGRAM_API_BASE_URL - Bot API base URL, e.g. a local stub (default: https://api.telegram.org/bot)
+    TELEGRAM_GLOBAL_RATE - Messages per second across all chats (default: 25)
+    TELEGRAM_CHAT_RATE - Messages per second to a single chat (default: 0.9)
+    TELEGRAM_CHAT_BURST - Messages that may be sent to a chat back to back (default: 1)
+    TELEGRAM_MAX_RETRIES - Retries for a message after network errors (default: 5)
+    TELEGRAM_WEBHOOK_URL - Public URL of /webhook/telegram; when set, bot commands arrive by webhook
+        instead of a getUpdates long-poll (default: unset, long-polling)
+    TELEGRAM_WEBHOOK_SECRET - Secret token Telegram sends with every update; required with TELEGRAM_WEBHOOK_URL
+    METRICS_ENABLED - Serve Prometheus text-format metrics on /metrics (default: true)
+
+    # Logging (Optional)
+    LOG_LEVEL - Logging level (default: INFO)
+    LOG_FILE - Rotating log file, empty to log to stderr only; BOT_ROLE notifier and ingest insert
+        the role into the name, e.g. logs/github_sponsors_bot.notifier.log (default: logs/github_sponsors_bot.log)
+    LOG_FORMAT - text, or json for one JSON object per record with its extra fields (default: text)
+    LOG_MAX_BYTES - Size at which the log file is rotated (default: 10485760)
+    LOG_ROTATE_WHEN - Rotate by time instead of size, e.g. midnight (default: unset)
+    LOG_BACKUP_COUNT - Rotated log files kept (default: 5)
+    LOG_QUEUE_SIZE - Records waiting for the background log writer before new ones are dropped (default: 10000)
+    LOG_RATE_LIMIT - Identical warnings or errors per logger written per window, 0 for no limit (default: 10)
+    LOG_RATE_WINDOW - Seconds of the repeat limit window (default: 60)
+
+    # Profiling (Optional, see observability/profiling.py)
+    PROFILE_DIR - Directory for cProfile and tracemalloc output; profiling is disabled when unset
+    PROFILE_TOKEN - Bearer token for POST /admin/profile; the endpoint is disabled when unset
+    PROFILE_REQUESTS - Calls of each target profiled per trigger (default: 20)
+    PROFILE_SAMPLE_RATE - Fraction of the calls after a trigger that are profiled (default: 1.0)
+    PROFILE_SIGNAL - Signal that arms a capture of every target, empty for none (default: SIGUSR2)
+    PROFILE_POLLS - Profile every poll cycle of every payment source (default: false)
+    PROFILE_TRACEMALLOC_INTERVAL - Seconds between tracemalloc snapshots, 0 disables them (default: 0)
+    PROFILE_TRACEMALLOC_FRAMES - Stack frames kept per traced allocation (default: 5)
+    PROFILE_MAX_FILES - Files kept in PROFILE_DIR before the oldest are removed (default: 500)
+
+    # Payment source scheduling (Optional)
+    POLL_JITTER - Fraction of the interval by which each poll is randomly shifted (default: 0.1)
+    POLL_RETRY_BASE - Seconds before retrying a failed poll, doubled per consecutive failure (default: 15)
+    POLL_MAX_BACKOFF - Maximum seconds between retries of a failing poll (default: 1800)
+    POLL_ACTIVE_PERIOD - Seconds a source polls at its active interval after a payment (default: 900)
+    POLL_WORKERS - Payment source checks that may run at the same time (default: 2)
 
     # Binance Alerts (Optional)
     BINANCE_API_KEY - Binance API Key
     BINANCE_API_SECRET - Binance API Secret
     BINANCE_POLL_INTERVAL - Interval in seconds to poll Binance (default: 300)
+    BINANCE_ACTIVE_POLL_INTERVAL - Interval for POLL_ACTIVE_PERIOD seconds after a payment (default: 60)
+    BINANCE_POLL_OVERLAP - Seconds each poll re-reads before the stored cursor (default: 600)
+    BINANCE_INITIAL_LOOKBACK - Seconds of history read by the very first poll (default: 3600)
+    BINANCE_API_URL - Optional Binance REST base URL override, e.g. a local stub
+    BINANCE_WEIGHT_LIMIT - Per-minute request weight limit of /api shared by this IP (default: 6000)
+    BINANCE_SAPI_WEIGHT_LIMIT - Per-minute request weight limit of /sapi shared by this IP (default: 12000)
+    BINANCE_WEIGHT_RESERVE - Fraction of the limit low-priority calls (P2P history) leave unused (default: 0.2)
+    BINANCE_WEIGHT_MAX_WAIT - Longest a call is delayed for weight before it is skipped (default: 60)
+    BINANCE_HTTP_POOL_SIZE - Keep-alive connections pooled for Binance REST calls (default: 4)
+    BINANCE_USER_STREAM - Receive balance changes over the user data WebSocket instead of polling;
+        falls back to polling if the API key may not open a stream (default: false)
+    BINANCE_WS_URL - WebSocket base URL of the user data stream (default: wss://stream.binance.com:9443)
+    BINANCE_LISTEN_KEY_KEEPALIVE - Seconds between listenKey keepalives (default: 1800)
+    BINANCE_STREAM_RECONCILE - Seconds between REST reconciliations while streaming (default: 1800)
+    BINANCE_STREAM_RECHECK - Seconds before checking again when an event found nothing new (default: 10)
+    BINANCE_RECONNECT_MAX_BACKOFF - Maximum seconds between stream reconnect attempts (default: 300)
+    SEEN_IDS_PARTITION - Seconds of transaction time grouped into one seen-id partition (default: 3600)
+    SEEN_IDS_BLOOM_CAPACITY - Initial capacity of a Bloom filter front over the seen ids, 0 keeps an in-memory index (default: 0)
 
     # IMAP Email Alerts (Optional)
     IMAP_HOST - IMAP server host
@@ -30,8 +116,17 @@ Environment variables required:
     IMAP_PASSWORD - IMAP account password
     IMAP_MAILBOX - Mailbox to check (default: INBOX)
     IMAP_POLL_INTERVAL - Interval in seconds to poll IMAP server (default: 600)
+    IMAP_ACTIVE_POLL_INTERVAL - Interval for POLL_ACTIVE_PERIOD seconds after a payment (default: 120)
+    IMAP_FETCH_BATCH - Messages requested per UID FETCH command (default: 200)
+    IMAP_PARTIAL_FETCH_BYTES - Bytes fetched for a candidate email without a usable BODYSTRUCTURE (default: 65536)
+    EMAIL_MAX_BODY_BYTES - Maximum bytes of an email body downloaded and parsed (default: 262144)
+    IMAP_IDLE - Keep a persistent connection and wait for new mail with IMAP IDLE;
+        falls back to polling if the server lacks IDLE (default: true)
+    IMAP_IDLE_TIMEOUT - Seconds before IDLE is re-issued, below the 30-minute server limit (default: 1500)
+    IMAP_RECONNECT_MAX_BACKOFF - Maximum seconds between IMAP reconnect attempts (default: 300)
     UPI_EMAIL_SENDER_FILTER - Optional: Email address or domain to filter UPI emails
     HDFC_EMAIL_SENDER_FILTER - Optional: Email address or domain to filter HDFC emails
+    EMAIL_RULES_PATH - YAML rule pack describing bank email formats (default: payment_sources/email_rules.yaml)
 """
 
 import os
@@ -45,24 +140,62 @@ import threading
 from datetime import datetime
 
 import telegram
+from telegram.error import BadRequest, ChatMigrated, NetworkError, RetryAfter
 from telegram.ext import Updater, CommandHandler
-from flask import Flask, request, jsonify
+from telegram.utils.request import Request
+from flask import Flask, Response, request, jsonify
 from dotenv import load_dotenv
 
+from notifications.dispatch import NotificationDispatcher
+from notifications.handoff import OutboxHandoff
+from notifications.routing import (
+    DEFAULT_DESTINATION, NotificationRouter, TelegramDestination, parse_destinations, parse_routes
+)
+from notifications.rate_limit import (
+    TELEGRAM_MESSAGES, TELEGRAM_RETRIES, TELEGRAM_SEND_SECONDS, TelegramRateLimiter, backoff_delay
+)
+from observability import log_pipeline, metrics, profiling
+from observability.profiling import profiled
+from storage.dedupe import DeliveryDedupe
+from storage.outbox import Outbox
+from storage.seen_ids import SeenIdStore
+from storage.state import StateStore
+from storage.sqlite import DEFAULT_DB_PATH
 from payment_sources.binance_alerts import BinanceAlerts
+from payment_sources.binance_stream import BinanceUserStream
 from payment_sources.imap_alerts import ImapAlerts
+from payment_sources.imap_idle import ImapIdleWatcher
+from payment_sources.scheduler import PollJob, PollScheduler
+from runtime.asyncio_runtime import AsyncPollScheduler, AsyncRuntime, AsyncTelegramSender
 
 # Load environment variables
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('github_sponsors_bot.log')
-    ]
+# Process role; read before logging is configured because each role writes its own log file
+BOT_ROLE = os.getenv('BOT_ROLE', 'all').lower()
+
+# Configure logging; records are written to stderr and the log file by a background thread
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_FILE = os.getenv('LOG_FILE', 'logs/github_sponsors_bot.log')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', 5))
+LOG_ROTATE_WHEN = os.getenv('LOG_ROTATE_WHEN')
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+LOG_RATE_LIMIT = int(os.getenv('LOG_RATE_LIMIT', 10))
+LOG_RATE_WINDOW = float(os.getenv('LOG_RATE_WINDOW', 60))
+log_pipeline.configure(
+    level=LOG_LEVEL,
+    path=log_pipeline.role_path(LOG_FILE, BOT_ROLE),
+    fmt=LOG_FORMAT,
+    max_bytes=LOG_MAX_BYTES,
+    backup_count=LOG_BACKUP_COUNT,
+    rotate_when=LOG_ROTATE_WHEN,
+    queue_size=LOG_QUEUE_SIZE,
+    rate_limit=LOG_RATE_LIMIT,
+    rate_window=LOG_RATE_WINDOW,
+    # Ingest workers share one file, which must be rotated externally (e.g. logrotate)
+    shared=BOT_ROLE == 'ingest'
 )
 logger = logging.getLogger("GitHubSponsorsBot")
 
@@ -72,12 +205,60 @@ TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
 TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
 WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
 WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', 5000))
+BOT_RUNTIME = os.getenv('BOT_RUNTIME', 'threads').lower()
+INGEST_POLL_INTERVAL = float(os.getenv('INGEST_POLL_INTERVAL', 0.2))
 BINANCE_POLL_INTERVAL = int(os.getenv('BINANCE_POLL_INTERVAL', 300))
 IMAP_POLL_INTERVAL = int(os.getenv('IMAP_POLL_INTERVAL', 600))
+BINANCE_ACTIVE_POLL_INTERVAL = int(os.getenv('BINANCE_ACTIVE_POLL_INTERVAL', 60))
+IMAP_ACTIVE_POLL_INTERVAL = int(os.getenv('IMAP_ACTIVE_POLL_INTERVAL', 120))
+IMAP_IDLE = os.getenv('IMAP_IDLE', 'true').lower() in ('1', 'true', 'yes')
+BINANCE_USER_STREAM = os.getenv('BINANCE_USER_STREAM', 'false').lower() in ('1', 'true', 'yes')
+DISPATCH_QUEUE_SIZE = int(os.getenv('DISPATCH_QUEUE_SIZE', 1000))
+DISPATCH_WORKERS = int(os.getenv('DISPATCH_WORKERS', 2))
+COALESCE_WINDOW = float(os.getenv('COALESCE_WINDOW', 0))
+COALESCE_MAX_BATCH = int(os.getenv('COALESCE_MAX_BATCH', 20))
+STATE_DB_PATH = os.getenv('STATE_DB_PATH', DEFAULT_DB_PATH)
+OUTBOX_ENABLED = os.getenv('OUTBOX_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+OUTBOX_SYNCHRONOUS = os.getenv('OUTBOX_SYNCHRONOUS', 'NORMAL').upper()
+OUTBOX_RETRY_INTERVAL = float(os.getenv('OUTBOX_RETRY_INTERVAL', 30))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 10))
+DEDUPE_MAX_ENTRIES = int(os.getenv('DEDUPE_MAX_ENTRIES', 10000))
+DEDUPE_TTL = float(os.getenv('DEDUPE_TTL', 3 * 24 * 3600))
+DEDUPE_PERSISTENT = os.getenv('DEDUPE_PERSISTENT', 'true').lower() in ('1', 'true', 'yes')
+SEEN_IDS_PARTITION = int(os.getenv('SEEN_IDS_PARTITION', 3600))
+SEEN_IDS_BLOOM_CAPACITY = int(os.getenv('SEEN_IDS_BLOOM_CAPACITY', 0))
+TELEGRAM_API_BASE_URL = os.getenv('TELEGRAM_API_BASE_URL')
+TELEGRAM_GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', 25))
+TELEGRAM_CHAT_RATE = float(os.getenv('TELEGRAM_CHAT_RATE', 0.9))
+TELEGRAM_CHAT_BURST = int(os.getenv('TELEGRAM_CHAT_BURST', 1))
+TELEGRAM_MAX_RETRIES = int(os.getenv('TELEGRAM_MAX_RETRIES', 5))
+TELEGRAM_WEBHOOK_URL = os.getenv('TELEGRAM_WEBHOOK_URL')
+TELEGRAM_WEBHOOK_SECRET = os.getenv('TELEGRAM_WEBHOOK_SECRET')
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+NOTIFY_DESTINATIONS = os.getenv('NOTIFY_DESTINATIONS')
+NOTIFY_ROUTES = os.getenv('NOTIFY_ROUTES')
+NOTIFY_QUEUE_SIZE = int(os.getenv('NOTIFY_QUEUE_SIZE', DISPATCH_QUEUE_SIZE))
+NOTIFY_WEBHOOK_TIMEOUT = float(os.getenv('NOTIFY_WEBHOOK_TIMEOUT', 10))
 
 # Initialize Flask app
 app = Flask(__name__)
 
+# Webhook and queue metrics served on /metrics
+WEBHOOK_REQUESTS = metrics.counter(
+    'sponsors_bot_webhook_requests_total', 'GitHub webhook deliveries by event type and outcome', ('event', 'outcome'))
+WEBHOOK_SECONDS = metrics.histogram(
+    'sponsors_bot_webhook_seconds', 'Time to handle a GitHub webhook delivery', ('event',))
+WEBHOOK_SIGNATURE_SECONDS = metrics.histogram(
+    'sponsors_bot_webhook_signature_seconds', 'Time to verify a GitHub webhook signature')
+WEBHOOK_PARSE_SECONDS = metrics.histogram(
+    'sponsors_bot_webhook_parse_seconds', 'Time to parse a GitHub webhook body')
+DISPATCH_DEPTH = metrics.gauge('sponsors_bot_dispatch_queue_depth', 'Notifications waiting in the dispatch queue')
+DISPATCH_INFLIGHT = metrics.gauge('sponsors_bot_dispatch_inflight', 'Outbox notifications queued or being sent')
+OUTBOX_PENDING = metrics.gauge('sponsors_bot_outbox_pending', 'Undelivered notifications in the outbox')
+OUTBOX_DEAD = metrics.gauge('sponsors_bot_outbox_dead', 'Notifications that reached the maximum delivery attempts')
+DESTINATION_DEPTH = metrics.gauge(
+    'sponsors_bot_destination_queue_depth', 'Alerts waiting in each destination queue', ('destination',))
+
 # Global Alerter Instances
 binance_alerter = None
 imap_alerter = None
@@ -85,12 +266,20 @@ imap_alerter = None
 class TelegramBot:
     """Class to handle Telegram bot functionality"""
     
-    def __init__(self, token, chat_id):
+    def __init__(self, token, chat_id, base_url=None, rate_limiter=None, max_retries=5, con_pool_size=8):
         """Initialize with Telegram Bot Token and Chat ID"""
         self.token = token
         self.chat_id = chat_id
+        self.base_url = base_url
         self.logger = logging.getLogger("GitHubSponsorsBot.Telegram")
-        self.bot = telegram.Bot(token=token)
+        # Several dispatcher workers share this bot, so give it a connection pool
+        self.bot = telegram.Bot(
+            token=token,
+            base_url=base_url,
+            request=Request(con_pool_size=con_pool_size)
+        )
+        self.rate_limiter = rate_limiter or TelegramRateLimiter()
+        self.max_retries = max_retries
         
         # Initialize updater for handling commands
         self.updater = None
@@ -99,13 +288,14 @@ class TelegramBot:
     def initialize_bot(self):
         """Initialize the bot with command handlers"""
         try:
-            self.updater = Updater(self.token, use_context=True)
+            self.updater = Updater(self.token, base_url=self.base_url, use_context=True)
             dispatcher = self.updater.dispatcher
             
             # Register command handlers
             dispatcher.add_handler(CommandHandler("start", self._start_command))
             dispatcher.add_handler(CommandHandler("help", self._help_command))
             dispatcher.add_handler(CommandHandler("status", self._status_command))
+            dispatcher.add_handler(CommandHandler("poll", self._poll_command))
             
             # Log errors
             dispatcher.add_error_handler(self._error_handler)
@@ -133,23 +323,85 @@ class TelegramBot:
     
     def stop_polling(self):
         """Stop the bot polling"""
-        if self.updater:
+        if self.updater and self.updater.running:
             self.updater.stop()
             self.logger.info("Telegram bot stopped polling")
-    
-    def send_message(self, message):
-        """Send a message to the configured chat ID"""
+
+    def set_webhook(self, url, secret_token):
+        """
+        Ask Telegram to deliver updates to url instead of answering getUpdates.
+        Every update then carries secret_token in the X-Telegram-Bot-Api-Secret-Token header.
+        """
+        if not self.initialized:
+            if not self.initialize_bot():
+                return False
+
         try:
-            self.bot.send_message(
-                chat_id=self.chat_id,
-                text=message,
-                parse_mode=telegram.ParseMode.MARKDOWN
-            )
-            self.logger.info(f"Message sent to chat {self.chat_id}")
+            self.updater.bot.set_webhook(url=url, secret_token=secret_token, allowed_updates=["message"])
+            self.logger.info(f"Telegram webhook set to {url}")
             return True
         except Exception as e:
-            self.logger.error(f"Failed to send message: {e}")
+            self.logger.error(f"Failed to set Telegram webhook: {e}")
             return False
+
+    def process_update(self, data):
+        """Run the command handlers for one update received by webhook"""
+        if not self.initialized:
+            if not self.initialize_bot():
+                return False
+        update = telegram.Update.de_json(data, self.updater.bot)
+        self.updater.dispatcher.process_update(update)
+        return True
+    
+    @profiled('send')
+    def send_message(self, message, chat_id=None):
+        """
+        Send a message to the configured chat ID (or the given one).
+        Paces requests to stay within Telegram's limits, waits out flood-control
+        responses and retries network errors with jittered exponential backoff.
+        """
+        chat_id = chat_id or self.chat_id
+        attempt = 0
+        while True:
+            self.rate_limiter.wait(chat_id)
+            started = time.perf_counter()
+            try:
+                self.bot.send_message(
+                    chat_id=chat_id,
+                    text=message,
+                    parse_mode=telegram.ParseMode.MARKDOWN
+                )
+                duration = time.perf_counter() - started
+                TELEGRAM_SEND_SECONDS.observe(duration)
+                TELEGRAM_MESSAGES.labels('sent').inc()
+                self.logger.info(f"Message sent to chat {chat_id}", extra={
+                    "chat_id": chat_id, "attempt": attempt + 1, "duration_ms": round(duration * 1000, 3)
+                })
+                return True
+            except RetryAfter as e:
+                # Flood control is not a failure; wait as long as Telegram asks and try again
+                TELEGRAM_RETRIES.labels('flood_control').inc()
+                self.logger.warning(f"Telegram flood control for chat {chat_id}, retrying in {e.retry_after}s")
+                self.rate_limiter.penalize(chat_id, e.retry_after)
+            except (BadRequest, ChatMigrated) as e:
+                # The request itself is wrong; sending it again will not help
+                TELEGRAM_MESSAGES.labels('failed').inc()
+                self.logger.error(f"Failed to send message to chat {chat_id}: {e}")
+                return False
+            except NetworkError as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    TELEGRAM_MESSAGES.labels('failed').inc()
+                    self.logger.error(f"Failed to send message to chat {chat_id} after {attempt} attempts: {e}")
+                    return False
+                TELEGRAM_RETRIES.labels('network').inc()
+                delay = backoff_delay(attempt)
+                self.logger.warning(f"Network error sending to chat {chat_id} ({e}), retry {attempt} in {delay:.1f}s")
+                time.sleep(delay)
+            except Exception as e:
+                TELEGRAM_MESSAGES.labels('failed').inc()
+                self.logger.error(f"Failed to send message: {e}")
+                return False
     
     # Command handlers
     def _start_command(self, update, context):
@@ -168,7 +420,8 @@ class TelegramBot:
             "Available commands:\n"
             "/start - Start the bot\n"
             "/help - Show this help message\n"
-            "/status - Show current bot status"
+            "/status - Show current bot status\n"
+            "/poll [source] - Check payment sources now"
         )
         update.message.reply_text(help_text, parse_mode=telegram.ParseMode.MARKDOWN)
     
@@ -182,13 +435,97 @@ class TelegramBot:
         )
         update.message.reply_text(status_text, parse_mode=telegram.ParseMode.MARKDOWN)
     
+    def _poll_command(self, update, context):
+        """Handle /poll command: run one (or every) polled payment source now"""
+        if str(update.effective_chat.id) != str(self.chat_id):
+            self.logger.warning(f"Ignoring /poll from unauthorized chat {update.effective_chat.id}")
+            return
+        name = context.args[0].lower() if context.args else None
+        if BOT_ROLE == 'ingest':
+            # The payment sources run in the notifier process, which answers once it has seen the request
+            sync_state.set('poll_request', {"source": name, "requested_at": time.time()})
+            return
+        update.message.reply_text(trigger_poll(name))
+    
     def _error_handler(self, update, context):
         """Handle errors in the dispatcher"""
         self.logger.error(f"Update {update} caused error {context.error}")
 
 
 # Initialize Telegram bot
-telegram_bot = TelegramBot(TELEGRAM_TOKEN, TELEGRAM_CHAT_ID)
+telegram_bot = TelegramBot(
+    TELEGRAM_TOKEN,
+    TELEGRAM_CHAT_ID,
+    base_url=TELEGRAM_API_BASE_URL,
+    rate_limiter=TelegramRateLimiter(TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_RATE, TELEGRAM_CHAT_BURST),
+    max_retries=TELEGRAM_MAX_RETRIES,
+    con_pool_size=DISPATCH_WORKERS + 2
+)
+
+# Alerts are stored here until Telegram accepted them (the database is opened on first use)
+outbox = Outbox(STATE_DB_PATH, OUTBOX_SYNCHRONOUS, OUTBOX_MAX_ATTEMPTS) if OUTBOX_ENABLED else None
+
+# Recently seen X-GitHub-Delivery ids, so redeliveries are acknowledged without notifying again
+delivery_dedupe = DeliveryDedupe(
+    max_entries=DEDUPE_MAX_ENTRIES,
+    ttl=DEDUPE_TTL,
+    path=STATE_DB_PATH if DEDUPE_PERSISTENT else None
+)
+
+# Sync cursors of the payment sources (e.g. the last processed IMAP UID)
+sync_state = StateStore(STATE_DB_PATH)
+
+# Binance transaction ids already alerted, kept only as long as the poll overlap can return them
+seen_ids = SeenIdStore(STATE_DB_PATH, SEEN_IDS_PARTITION, SEEN_IDS_BLOOM_CAPACITY)
+
+
+
+def create_notification_router():
+    """
+    Builds the router for NOTIFY_DESTINATIONS and NOTIFY_ROUTES, or returns None when neither is set.
+    TELEGRAM_CHAT_ID is always available as the 'default' destination.
+    """
+    if not NOTIFY_DESTINATIONS and not NOTIFY_ROUTES:
+        return None
+    options = {
+        "maxsize": NOTIFY_QUEUE_SIZE,
+        "coalesce_window": COALESCE_WINDOW,
+        "coalesce_max_batch": COALESCE_MAX_BATCH,
+    }
+    destinations = parse_destinations(NOTIFY_DESTINATIONS, telegram_bot.send_message,
+                                      webhook_timeout=NOTIFY_WEBHOOK_TIMEOUT, **options)
+    if TELEGRAM_CHAT_ID and DEFAULT_DESTINATION not in [d.name for d in destinations]:
+        destinations.insert(0, TelegramDestination(DEFAULT_DESTINATION, TELEGRAM_CHAT_ID, telegram_bot.send_message,
+                                                   **options))
+    return NotificationRouter(destinations, parse_routes(NOTIFY_ROUTES))
+
+
+# All alerts go through the dispatcher so producers never wait on Telegram.
+# Ingest workers only store alerts in the outbox; the notifier process picks them up and sends them.
+notification_router = None
+routing_error = None
+if BOT_ROLE == 'ingest' and outbox is not None:
+    dispatcher = OutboxHandoff(outbox)
+else:
+    # With NOTIFY_DESTINATIONS/NOTIFY_ROUTES alerts are fanned out to several chats and webhooks
+    try:
+        notification_router = create_notification_router()
+    except ValueError as e:
+        routing_error = str(e)
+    dispatcher = NotificationDispatcher(
+        telegram_bot.send_message,
+        maxsize=DISPATCH_QUEUE_SIZE,
+        workers=DISPATCH_WORKERS,
+        coalesce_window=COALESCE_WINDOW,
+        coalesce_max_batch=COALESCE_MAX_BATCH,
+        outbox=outbox,
+        retry_interval=OUTBOX_RETRY_INTERVAL,
+        pickup_interval=INGEST_POLL_INTERVAL if BOT_ROLE == 'notifier' else 0,
+        router=notification_router
+    )
+
+# Runs the polled payment sources; push watchers hand their source over when unavailable
+poll_scheduler = PollScheduler()
 
 
 def verify_github_signature(request_data, signature_header):
@@ -260,26 +597,82 @@ def format_sponsor_message(data):
         return "Error processing GitHub Sponsors webhook data"
 
 
+def summarize_sponsorship(data):
+    """Return the (amount, one-line summary) of a sponsorship used in digest messages"""
+    sponsorship = data.get('sponsorship') or {}
+    sponsor = sponsorship.get('sponsor') or {}
+    tier = sponsorship.get('tier') or {}
+    sponsor_login = sponsor.get('login', 'Unknown')
+    sponsor_name = sponsor.get('name') or sponsor_login
+    amount = tier.get('monthly_price_in_dollars')
+    summary = f"{sponsor_name} (@{sponsor_login}) - {tier.get('name', 'Unknown')}"
+    if amount is not None:
+        summary += f" - ${amount}"
+    return amount, summary
+
+
 @app.route('/webhook/github', methods=['POST'])
 def github_webhook():
     """Handle GitHub webhook events"""
+    body, status = process_github_webhook(request.get_data(), request.headers)
+    return jsonify(body), status
+
+
+@profiled('webhook')
+def process_github_webhook(request_data, headers):
+    """
+    Verify, dedupe and queue one GitHub webhook delivery.
+    Shared by the Flask route and the asyncio runtime; returns (response body, HTTP status).
+    """
+    started = time.perf_counter()
     # Get the signature from the request headers
-    signature_header = request.headers.get('X-Hub-Signature-256')
-    event_type = request.headers.get('X-GitHub-Event')
-    
-    # Get the raw request data for signature verification
-    request_data = request.get_data()
+    signature_header = headers.get('X-Hub-Signature-256')
+    event_type = headers.get('X-GitHub-Event')
+    delivery_id = headers.get('X-GitHub-Delivery')
     
     # Verify the signature
-    if not verify_github_signature(request_data, signature_header):
+    verified = verify_github_signature(request_data, signature_header)
+    WEBHOOK_SIGNATURE_SECONDS.observe(time.perf_counter() - started)
+    if not verified:
         logger.error("Invalid signature in GitHub webhook request")
-        return jsonify({"status": "error", "message": "Invalid signature"}), 401
+        # Unverified requests could carry any event name, so they are not labelled with it
+        return webhook_result("unverified", "invalid_signature", started,
+                              {"status": "error", "message": "Invalid signature"}, 401)
+    event = event_type or "unknown"
+    
+    # Acknowledge redeliveries of an event we already handled without parsing it again
+    if delivery_dedupe.check_and_record(delivery_id):
+        logger.info(f"Ignoring duplicate GitHub delivery {delivery_id}", extra={"delivery_id": delivery_id, "event": event})
+        return webhook_result(event, "duplicate", started, {"status": "duplicate"}, 200)
+    
+    # The id is only kept once the delivery was handled; any error or exception releases it
+    # so that GitHub's redelivery of this event is processed instead of ignored
+    handled = False
+    try:
+        body, status = handle_github_event(request_data, event_type, delivery_id, started)
+        handled = status < 300
+        return body, status
+    finally:
+        if not handled:
+            delivery_dedupe.forget(delivery_id)
+
+
+def handle_github_event(request_data, event_type, delivery_id, started):
+    """Parse a verified, not yet seen delivery and queue its alert; returns (response body, HTTP status)"""
+    event = event_type or "unknown"
     
     # Parse the JSON data
-    data = request.json
+    parse_started = time.perf_counter()
+    try:
+        data = json.loads(request_data)
+    except ValueError:
+        logger.error("GitHub webhook body is not valid JSON")
+        return webhook_result(event, "invalid_json", started, {"status": "error", "message": "Invalid JSON"}, 400)
+    finally:
+        WEBHOOK_PARSE_SECONDS.observe(time.perf_counter() - parse_started)
     
     # Log the event
-    logger.info(f"Received GitHub webhook event: {event_type}")
+    logger.info(f"Received GitHub webhook event: {event_type}", extra={"delivery_id": delivery_id, "event": event})
     
     # Process the event based on type
     if event_type == 'sponsorship':
@@ -289,21 +682,212 @@ def github_webhook():
         if action == 'created':
             # Format the message
             message = format_sponsor_message(data)
+            amount, summary = summarize_sponsorship(data)
             
-            # Send the notification
-            telegram_bot.send_message(message)
+            # Queue the notification; delivery happens on the dispatcher workers
+            queued = dispatcher.send_message(
+                message,
+                source="github_sponsors",
+                amount=amount,
+                currency="USD",
+                summary=summary
+            )
+            if not queued:
+                return webhook_result(event, "queue_full", started,
+                                      {"status": "error", "message": "Notification queue full"}, 503)
             
             # Log the notification
-            logger.info(f"Sent notification for new sponsorship")
+            logger.info("Queued notification for new sponsorship", extra={
+                "delivery_id": delivery_id,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 3)
+            })
+            return webhook_result(event, "accepted", started, {"status": "accepted"}, 202)
     
     # Return a success response
-    return jsonify({"status": "success"}), 200
+    return webhook_result(event, "ignored", started, {"status": "success"}, 200)
+
+
+def webhook_result(event, outcome, started, body, status):
+    """Count a handled webhook delivery and its handling time, then pass the response through"""
+    WEBHOOK_REQUESTS.labels(event, outcome).inc()
+    WEBHOOK_SECONDS.labels(event).observe(time.perf_counter() - started)
+    return body, status
+
+
+@app.route('/webhook/telegram', methods=['POST'])
+def telegram_webhook():
+    """Handle Telegram bot updates when commands are received by webhook"""
+    body, status = process_telegram_update(request.get_data(), request.headers)
+    return jsonify(body), status
+
+
+def process_telegram_update(request_data, headers):
+    """
+    Verify one Telegram update by its secret token and run the command handlers.
+    Shared by the Flask route and the asyncio runtime; returns (response body, HTTP status).
+    """
+    if not TELEGRAM_WEBHOOK_SECRET:
+        return {"status": "error", "message": "Telegram webhook not enabled"}, 404
+
+    token = headers.get('X-Telegram-Bot-Api-Secret-Token') or ''
+    if not hmac.compare_digest(token.encode('utf-8'), TELEGRAM_WEBHOOK_SECRET.encode('utf-8')):
+        logger.error("Invalid secret token in Telegram webhook request")
+        return {"status": "error", "message": "Invalid secret token"}, 401
+
+    try:
+        data = json.loads(request_data)
+    except ValueError:
+        logger.error("Telegram webhook body is not valid JSON")
+        return {"status": "error", "message": "Invalid JSON"}, 400
+
+    # Handler errors go to the command dispatcher's error handler; Telegram only needs a 200
+    telegram_bot.process_update(data)
+    return {"status": "success"}, 200
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus text-format metrics"""
+    if not METRICS_ENABLED:
+        return jsonify({"status": "error", "message": "Metrics disabled"}), 404
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+@app.route('/admin/profile', methods=['POST'])
+def profile_endpoint():
+    """Arm cProfile captures or write a memory snapshot (see observability/profiling.py)"""
+    body, status = process_profile_request(request.get_data(), request.headers)
+    return jsonify(body), status
+
+
+def process_profile_request(request_data, headers):
+    """
+    Authenticate a profiling request by its bearer token and arm the requested captures.
+    The JSON body may name "targets" (default: all), a "count" of calls (0 disarms)
+    and "memory": true for a tracemalloc snapshot now. Returns (response body, HTTP status).
+    """
+    if profiling.profiler is None or not profiling.PROFILE_TOKEN:
+        return {"status": "error", "message": "Profiling not enabled"}, 404
+
+    token = headers.get('Authorization') or ''
+    if not hmac.compare_digest(token.encode('utf-8'), f"Bearer {profiling.PROFILE_TOKEN}".encode('utf-8')):
+        logger.error("Invalid token in profiling request")
+        return {"status": "error", "message": "Invalid token"}, 401
+
+    try:
+        options = json.loads(request_data) if request_data else {}
+        targets = options.get('targets')
+        count = int(options.get('count', profiling.PROFILE_REQUESTS))
+    except (ValueError, TypeError, AttributeError):
+        return {"status": "error", "message": "Invalid JSON"}, 400
+    unknown = sorted(set(targets or ()) - profiling.profiler.targets)
+    if unknown:
+        return {"status": "error", "message": f"Unknown targets: {', '.join(unknown)}",
+                "targets": sorted(profiling.profiler.targets)}, 400
+
+    body = {"status": "success", "armed": profiling.profiler.arm(count, targets)}
+    if options.get('memory'):
+        body["memory_snapshot"] = profiling.profiler.snapshot_memory()
+    return body, 200
+
+
+@metrics.on_collect
+def collect_queue_metrics():
+    """Sets the queue and outbox gauges when /metrics is scraped"""
+    stats = dispatcher.stats()
+    DISPATCH_DEPTH.set(stats.get("depth", 0))
+    DISPATCH_INFLIGHT.set(stats.get("inflight", 0))
+    if outbox is not None:
+        outbox_stats = outbox.stats()
+        OUTBOX_PENDING.set(outbox_stats["pending"])
+        OUTBOX_DEAD.set(outbox_stats["dead"])
+    for name, destination_stats in stats.get("destinations", {}).items():
+        DESTINATION_DEPTH.labels(name).set(destination_stats["depth"])
 
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Simple health check endpoint"""
-    return jsonify({"status": "healthy"}), 200
+    return jsonify(health_status()), 200
+
+
+def health_status():
+    """Queue, storage and polling statistics reported by /health"""
+    health = {"status": "healthy", "dispatch_queue": dispatcher.stats()}
+    if outbox is not None:
+        health["outbox"] = outbox.stats()
+    health["webhook_dedupe"] = delivery_dedupe.stats()
+    if binance_alerter and binance_alerter.enabled:
+        health["binance_weight"] = binance_alerter.weights.metrics()
+    health["poll_jobs"] = poll_scheduler.stats()
+    return health
+
+
+def create_async_runtime():
+    """
+    Builds the asyncio runtime: aiohttp serves the webhook, Telegram messages are sent
+    from the event loop and polled sources are scheduled on it.
+    """
+    global poll_scheduler
+    poll_scheduler = AsyncPollScheduler()
+    sender = AsyncTelegramSender(
+        TELEGRAM_TOKEN,
+        TELEGRAM_CHAT_ID,
+        base_url=TELEGRAM_API_BASE_URL,
+        rate_limiter=telegram_bot.rate_limiter,
+        max_retries=TELEGRAM_MAX_RETRIES,
+        pool_size=DISPATCH_WORKERS + 2
+    )
+    runtime = AsyncRuntime(
+        WEBHOOK_HOST,
+        WEBHOOK_PORT,
+        process_github_webhook,
+        health_status,
+        poll_scheduler,
+        sender,
+        on_startup=dispatcher.start,
+        on_shutdown=dispatcher.stop,
+        telegram_handler=process_telegram_update,
+        metrics_handler=metrics.render if METRICS_ENABLED else None,
+        profile_handler=process_profile_request
+    )
+    dispatcher.send_func = runtime.send_message
+    if notification_router is not None:
+        notification_router.use_telegram_sender(runtime.send_message)
+    return runtime
+
+
+def ingest_config_errors():
+    """Return the configuration problems that keep this process from running as an ingest worker"""
+    errors = []
+    if not GITHUB_WEBHOOK_SECRET:
+        errors.append("GITHUB_WEBHOOK_SECRET environment variable is required")
+    if outbox is None:
+        errors.append("OUTBOX_ENABLED must be true; ingest workers hand alerts to the notifier through the outbox")
+    return errors
+
+
+def run_ingest_worker():
+    """Serve webhooks without Telegram or payment sources (BOT_ROLE=ingest); use wsgi.py for several workers"""
+    errors = ingest_config_errors()
+    if errors:
+        for error in errors:
+            logger.error(error)
+            print(f"Error: {error}")
+        sys.exit(1)
+    if TELEGRAM_WEBHOOK_SECRET:
+        telegram_bot.initialize_bot()
+    profiling.start()
+    try:
+        run_webhook_server()
+    except KeyboardInterrupt:
+        logger.info("Keyboard interrupt received, shutting down")
+    finally:
+        profiling.stop()
+        outbox.close()
+        delivery_dedupe.close()
+        sync_state.close()
+        logger.info("Ingest worker stopped")
 
 
 def run_webhook_server():
@@ -312,39 +896,84 @@ def run_webhook_server():
     app.run(host=WEBHOOK_HOST, port=WEBHOOK_PORT)
 
 
-# --- Polling functions for payment sources ---
-def poll_binance_payments():
-    """Periodically polls Binance for new payments."""
-    global binance_alerter
-    if not binance_alerter or not binance_alerter.enabled:
-        logger.info("Binance alerter not initialized or disabled. Binance polling thread will not run.")
-        return
-    logger.info("Starting Binance payment polling thread.")
-    while True:
-        try:
-            binance_alerter.check_for_new_payments()
-        except Exception as e:
-            logger.error(f"Error in Binance polling loop: {e}")
-        time.sleep(BINANCE_POLL_INTERVAL)
-
-def poll_imap_emails():
-    """Periodically polls IMAP server for new payment emails."""
-    global imap_alerter
-    if not imap_alerter or not imap_alerter.enabled:
-        logger.info("IMAP alerter not initialized or disabled. IMAP polling thread will not run.")
-        return
-    logger.info("Starting IMAP email polling thread.")
+def trigger_poll(name=None):
+    """Run one (or every) polled payment source now and return the reply for /poll"""
+    triggered = poll_scheduler.trigger(name)
+    if triggered:
+        return f"Polling {', '.join(triggered)} now."
+    if poll_scheduler.job_names():
+        return f"Unknown source. Polled sources: {', '.join(poll_scheduler.job_names())}"
+    return "No payment source is polled; push watchers deliver alerts as they arrive."
+
+
+def watch_poll_requests(interval=1.0):
+    """Runs the /poll requests that ingest workers received over the Telegram webhook (BOT_ROLE=notifier)"""
+    last = (sync_state.get('poll_request') or {}).get('requested_at')
     while True:
-        try:
-            imap_alerter.check_for_new_emails()
-        except Exception as e:
-            logger.error(f"Error in IMAP polling loop: {e}")
-        time.sleep(IMAP_POLL_INTERVAL)
+        time.sleep(interval)
+        poll_request = sync_state.get('poll_request') or {}
+        if poll_request.get('requested_at') == last:
+            continue
+        last = poll_request.get('requested_at')
+        dispatcher.send_message(trigger_poll(poll_request.get('source')), source="command")
+
+
+# --- Payment source jobs ---
+def binance_poll_job():
+    """Scheduler job for REST polling of Binance"""
+    return PollJob("binance", binance_alerter.check_for_new_payments, BINANCE_POLL_INTERVAL,
+                   active_interval=BINANCE_ACTIVE_POLL_INTERVAL)
+
+def imap_poll_job():
+    """Scheduler job for periodic IMAP checks"""
+    return PollJob("imap", imap_alerter.check_for_new_emails, IMAP_POLL_INTERVAL,
+                   active_interval=IMAP_ACTIVE_POLL_INTERVAL)
+
+def watch_binance_stream():
+    """
+    Follows the Binance user data stream.
+    Hands Binance over to the poll scheduler if the stream is refused.
+    """
+    logger.info("Starting Binance user data stream.")
+    if not BinanceUserStream(binance_alerter).run():
+        poll_scheduler.add(binance_poll_job())
+
+def watch_imap_idle():
+    """
+    Watches the IMAP mailbox with IDLE.
+    Hands the mailbox over to the poll scheduler if the server lacks IDLE.
+    """
+    logger.info("Starting IMAP IDLE watcher.")
+    if not ImapIdleWatcher(imap_alerter).run():
+        poll_scheduler.add(imap_poll_job())
+
+def start_payment_sources():
+    """Starts push watchers where enabled and schedules everything else for polling"""
+    if binance_alerter and binance_alerter.enabled:
+        if BINANCE_USER_STREAM:
+            threading.Thread(target=watch_binance_stream, name="binance-stream", daemon=True).start()
+        else:
+            poll_scheduler.add(binance_poll_job())
+    else:
+        logger.info("Binance alerter not initialized or disabled. Binance will not be checked.")
+
+    if imap_alerter and imap_alerter.enabled:
+        if IMAP_IDLE:
+            threading.Thread(target=watch_imap_idle, name="imap-idle", daemon=True).start()
+        else:
+            poll_scheduler.add(imap_poll_job())
+    else:
+        logger.info("IMAP alerter not initialized or disabled. Email will not be checked.")
+    poll_scheduler.start()
 
 def main():
     """Main function to run the bot"""
     global binance_alerter, imap_alerter
 
+    if BOT_ROLE == 'ingest':
+        run_ingest_worker()
+        return
+
     # Validate required configuration
     if not GITHUB_WEBHOOK_SECRET:
         logger.error("GITHUB_WEBHOOK_SECRET not configured")
@@ -360,26 +989,55 @@ def main():
         logger.error("TELEGRAM_CHAT_ID not configured")
         print("Error: TELEGRAM_CHAT_ID environment variable is required")
         sys.exit(1)
+
+    if TELEGRAM_WEBHOOK_URL and not TELEGRAM_WEBHOOK_SECRET:
+        logger.error("TELEGRAM_WEBHOOK_SECRET not configured")
+        print("Error: TELEGRAM_WEBHOOK_SECRET environment variable is required with TELEGRAM_WEBHOOK_URL")
+        sys.exit(1)
+
+    if routing_error:
+        logger.error(f"Invalid notification routing: {routing_error}")
+        print(f"Error: invalid NOTIFY_DESTINATIONS or NOTIFY_ROUTES: {routing_error}")
+        sys.exit(1)
+
+    if BOT_ROLE == 'notifier' and outbox is None:
+        logger.error("BOT_ROLE=notifier requires the outbox")
+        print("Error: OUTBOX_ENABLED must be true; ingest workers hand alerts to the notifier through the outbox")
+        sys.exit(1)
     
     # Initialize and start the Telegram bot
     if not telegram_bot.initialize_bot():
         logger.error("Failed to initialize Telegram bot")
         sys.exit(1)
     
-    telegram_bot.start_polling()
+    # Commands arrive on /webhook/telegram when a webhook is configured, otherwise by long-polling
+    if TELEGRAM_WEBHOOK_URL:
+        telegram_bot.set_webhook(TELEGRAM_WEBHOOK_URL, TELEGRAM_WEBHOOK_SECRET)
+        if BOT_ROLE == 'notifier':
+            threading.Thread(target=watch_poll_requests, name="poll-requests", daemon=True).start()
+    else:
+        telegram_bot.start_polling()
+
+    # The asyncio runtime serves the webhook and sends messages on its event loop
+    runtime = create_async_runtime() if BOT_RUNTIME == 'asyncio' else None
+
+    # Start the notification sender workers; undelivered alerts from a previous run are replayed
+    if outbox is not None:
+        purged = outbox.purge_delivered()
+        if purged:
+            logger.info(f"Purged {purged} delivered notifications from the outbox")
+    if runtime is None:
+        dispatcher.start()
 
     # Initialize payment alerters
-    binance_alerter = BinanceAlerts(telegram_bot)
-    imap_alerter = ImapAlerts(telegram_bot)
+    binance_alerter = BinanceAlerts(dispatcher, state=sync_state, seen=seen_ids)
+    imap_alerter = ImapAlerts(dispatcher, state=sync_state)
 
-    # Start polling threads
-    if binance_alerter.enabled:
-        binance_thread = threading.Thread(target=poll_binance_payments, daemon=True)
-        binance_thread.start()
-    
-    if imap_alerter.enabled:
-        imap_thread = threading.Thread(target=poll_imap_emails, daemon=True)
-        imap_thread.start()
+    # Start push watchers and the poll scheduler
+    start_payment_sources()
+
+    # Profiling signal handler and memory snapshots, when PROFILE_DIR is set
+    profiling.start()
     
     # Send startup message
     startup_message = (
@@ -387,21 +1045,40 @@ def main():
         "Listening for GitHub Sponsors webhooks.\n"
     )
     if binance_alerter and binance_alerter.enabled:
-        startup_message += "Polling Binance for payments.\n"
+        if BINANCE_USER_STREAM:
+            startup_message += "Streaming Binance balance updates.\n"
+        else:
+            startup_message += "Polling Binance for payments.\n"
     if imap_alerter and imap_alerter.enabled:
-        startup_message += "Polling IMAP for email notifications.\n"
+        if IMAP_IDLE:
+            startup_message += "Watching IMAP for email notifications.\n"
+        else:
+            startup_message += "Polling IMAP for email notifications.\n"
+    if BOT_ROLE == 'notifier':
+        startup_message += "Delivering alerts from webhook ingest workers.\n"
     
-    telegram_bot.send_message(startup_message)
+    dispatcher.send_message(startup_message, source="startup")
     
     try:
         # Run the webhook server (this will block until the server is stopped)
-        run_webhook_server()
+        if runtime is not None:
+            runtime.run()
+        else:
+            run_webhook_server()
     except KeyboardInterrupt:
         logger.info("Keyboard interrupt received, shutting down")
     except Exception as e:
         logger.error(f"Error running webhook server: {e}")
     finally:
-        # Stop the Telegram bot
+        # Stop polling, flush queued notifications and stop the Telegram bot
+        poll_scheduler.stop()
+        profiling.stop()
+        dispatcher.stop()
+        if outbox is not None:
+            outbox.close()
+        delivery_dedupe.close()
+        sync_state.close()
+        seen_ids.close()
         telegram_bot.stop_polling()
         logger.info("Bot stopped")
 
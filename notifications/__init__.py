@@ -0,0 +1 @@
+# This file makes the notifications directory a Python package.
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Burst coalescing for notifications.
+
+The first alert after a quiet period is sent straight away. Alerts that arrive
+within the coalescing window after a send are held back and folded into a
+single digest message with per-source totals, which keeps sponsor drives and
+batches of bank credits from turning into dozens of Telegram messages.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal, InvalidOperation
+
+from notifications.notification import Notification
+
+logger = logging.getLogger("GitHubSponsorsBot.Coalesce")
+
+SOURCE_LABELS = {
+    "github_sponsors": "GitHub Sponsors",
+    "binance": "Binance",
+    "email": "Email",
+}
+
+# Telegram rejects messages longer than this
+MAX_MESSAGE_LENGTH = 4096
+
+
+def _parse_amount(amount):
+    """Turn an amount such as '1,250.00' or 10 into a Decimal, or None"""
+    if amount is None:
+        return None
+    try:
+        return Decimal(str(amount).replace(',', '').strip())
+    except InvalidOperation:
+        return None
+
+
+def _item_line(notification):
+    """One-line description of a notification for the digest item list"""
+    if notification.summary:
+        return notification.summary
+    first_line = notification.message.strip().split('\n', 1)[0]
+    return first_line.replace('*', '')
+
+
+def format_digest(notifications):
+    """Render a digest message for a batch of notifications"""
+    totals = OrderedDict()
+    for notification in notifications:
+        label = SOURCE_LABELS.get(notification.source, notification.source or "Other")
+        entry = totals.setdefault(label, {"count": 0, "amounts": OrderedDict()})
+        entry["count"] += 1
+        amount = _parse_amount(notification.amount)
+        if amount is not None:
+            currency = notification.currency or ""
+            entry["amounts"][currency] = entry["amounts"].get(currency, Decimal(0)) + amount
+
+    lines = [f"📦 *{len(notifications)} New Payment Alerts*", "", "*Totals:*"]
+    for label, entry in totals.items():
+        amounts = ", ".join(f"{amount:,} {currency}".strip() for currency, amount in entry["amounts"].items())
+        lines.append(f"• {label}: {entry['count']}" + (f" ({amounts})" if amounts else ""))
+    lines += ["", "*Items:*"]
+    header = "\n".join(lines)
+
+    items = []
+    length = len(header)
+    for i, notification in enumerate(notifications, 1):
+        line = f"{i}. {_item_line(notification)}"
+        if length + len(line) + 40 > MAX_MESSAGE_LENGTH:
+            items.append(f"…and {len(notifications) - i + 1} more")
+            break
+        items.append(line)
+        length += len(line) + 1
+    return header + "\n" + "\n".join(items)
+
+
+class Coalescer:
+    """Folds notifications that arrive close together into digest messages"""
+
+    def __init__(self, send_func, window=5.0, max_batch=20):
+        """Initialize with the function that sends one Notification"""
+        self.send_func = send_func
+        self.window = window
+        self.max_batch = max_batch
+        self.digests = 0
+        self._buffer = []
+        self._last_send = float('-inf')
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def submit(self, notification):
+        """Send a notification now, or hold it for the next digest"""
+        batch = None
+        with self._lock:
+            now = time.monotonic()
+            if not self._buffer and now - self._last_send >= self.window:
+                self._last_send = now
+                send_now = True
+            else:
+                send_now = False
+                self._buffer.append(notification)
+                if len(self._buffer) >= self.max_batch:
+                    batch = self._take_batch()
+                elif self._timer is None:
+                    self._timer = threading.Timer(max(0.0, self._last_send + self.window - now), self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+        if send_now:
+            return self.send_func(notification)
+        if batch:
+            return self._send_batch(batch)
+        return True
+
+    def flush(self):
+        """Send whatever is buffered right away"""
+        with self._lock:
+            batch = self._take_batch()
+        if batch:
+            self._send_batch(batch)
+
+    def pending(self):
+        """Number of notifications waiting for the next digest"""
+        with self._lock:
+            return len(self._buffer)
+
+    def _take_batch(self):
+        """Detach the buffer; caller must hold the lock"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._buffer = self._buffer, []
+        if batch:
+            self._last_send = time.monotonic()
+        return batch
+
+    def _send_batch(self, batch):
+        """Send a single held notification as-is, or several as one digest"""
+        if len(batch) == 1:
+            return self.send_func(batch[0])
+        digest = Notification(format_digest(batch), source="digest")
+        digest.parts = batch
+        self.digests += 1
+        logger.info(f"Coalesced {len(batch)} notifications into one digest")
+        return self.send_func(digest)
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+Asynchronous notification dispatch.
+
+Alerts produced by the webhook handler and the payment source pollers are put
+on a bounded in-process queue and delivered by a small pool of sender threads,
+so producers never wait for a Telegram round trip.
+
+With an outbox attached, every alert is stored durably before it is queued and
+marked delivered only after a successful send. A background sweep re-queues
+stored alerts that are not in flight: on startup, after failed sends, and when
+the in-memory queue overflowed. With a pickup interval, alerts that other
+processes (webhook ingest workers) stored in the same outbox are picked up
+and queued within that interval.
+
+With a router, dequeued alerts are handed to notifications/routing.py, which
+delivers them to several destinations, each with its own queue and digests.
+"""
+
+import logging
+import queue
+import threading
+import time
+
+from notifications.coalesce import Coalescer
+from notifications.notification import Notification
+from observability import metrics
+
+logger = logging.getLogger("GitHubSponsorsBot.Dispatch")
+
+# Sentinel put on the queue to stop a worker thread
+_STOP = object()
+
+QUEUE_WAIT_SECONDS = metrics.histogram(
+    'sponsors_bot_dispatch_wait_seconds', 'Time notifications spend in the dispatch queue')
+
+
+class NotificationDispatcher:
+    """Bounded notification queue drained by a pool of sender workers"""
+
+    def __init__(self, send_func, maxsize=1000, workers=2, coalesce_window=0, coalesce_max_batch=20,
+                 outbox=None, retry_interval=30.0, pickup_interval=0, router=None):
+        """
+        Initialize with the function that delivers a single message.
+        A positive coalesce_window folds bursts of alerts into digest messages.
+        An optional Outbox makes delivery at-least-once; undelivered alerts are
+        re-queued every retry_interval seconds. A positive pickup_interval also
+        queues alerts stored by other processes every pickup_interval seconds.
+        An optional NotificationRouter replaces send_func and the coalescer; it
+        coalesces per destination instead, and records per-destination deliveries
+        in the outbox.
+        """
+        self.send_func = send_func
+        self.maxsize = maxsize
+        self.num_workers = workers
+        self.queue = queue.Queue(maxsize=maxsize)
+        self._threads = []
+        self._lock = threading.Lock()
+        self.outbox = outbox
+        self.retry_interval = retry_interval
+        self.pickup_interval = pickup_interval
+        # Highest outbox row id already picked up from other processes
+        self._pickup_after = 0
+        # Appends in progress; a pickup waits for them so it never mistakes our own rows for foreign ones
+        self._gate = threading.Condition()
+        self._appending = 0
+        self._picking = False
+        # Outbox rows currently queued, held for a digest or being sent
+        self._inflight = set()
+        self._stop_event = threading.Event()
+        self._sweeper = None
+        self.router = router
+        if router is not None and router.outbox is None:
+            router.outbox = outbox
+        self.coalescer = None
+        if coalesce_window > 0 and router is None:
+            self.coalescer = Coalescer(self._send, coalesce_window, coalesce_max_batch)
+
+        # Counters exposed through stats()
+        self.enqueued = 0
+        self.picked_up = 0
+        self.rejected = 0
+        self.delivered = 0
+        self.failed = 0
+        self.deferred = 0
+        self._dequeued = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._wait_last = 0.0
+
+    def send_message(self, message, source=None, amount=None, currency=None, summary=None):
+        """
+        Queue a message for delivery without waiting on Telegram.
+        Returns False only if the alert could neither be stored nor queued.
+        """
+        notification = Notification(message, source, amount, currency, summary)
+        if self.outbox is not None:
+            with self._gate:
+                while self._picking:
+                    self._gate.wait()
+                self._appending += 1
+            try:
+                notification.outbox_id = self.outbox.append(notification)
+            except Exception as e:
+                logger.error(f"Could not store notification from {source or 'unknown'} in the outbox: {e}")
+            if notification.outbox_id is not None:
+                with self._lock:
+                    self._inflight.add(notification.outbox_id)
+            with self._gate:
+                self._appending -= 1
+                self._gate.notify_all()
+        try:
+            self.queue.put_nowait(notification)
+        except queue.Full:
+            with self._lock:
+                self._inflight.discard(notification.outbox_id)
+                self.rejected += 1
+            if notification.outbox_id is not None:
+                # Stored durably; the outbox sweep will queue it once there is room
+                logger.warning(f"Dispatch queue full ({self.maxsize}), notification from {source or 'unknown'} deferred")
+                return True
+            logger.error(f"Dispatch queue full ({self.maxsize}), dropping notification from {source or 'unknown'}")
+            return False
+        with self._lock:
+            self.enqueued += 1
+        return True
+
+    def start(self):
+        """Start the sender worker threads"""
+        if self._threads:
+            return
+        for i in range(self.num_workers):
+            thread = threading.Thread(target=self._worker, name=f"dispatch-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        if self.router is not None:
+            self.router.start()
+        if self.outbox is not None:
+            if self.pickup_interval > 0:
+                # Older rows are replayed by the sweep; pick up only what is stored from now on
+                self._pickup_after = self.outbox.last_id()
+            self._stop_event.clear()
+            self._sweeper = threading.Thread(target=self._sweep_outbox, name="dispatch-outbox", daemon=True)
+            self._sweeper.start()
+        logger.info(f"Notification dispatcher started with {self.num_workers} workers (queue size {self.maxsize})")
+
+    def stop(self, timeout=10.0):
+        """Stop the workers after the messages already queued have been sent"""
+        if not self._threads:
+            return
+        deadline = time.monotonic() + timeout
+        self._stop_event.set()
+        if self._sweeper is not None:
+            self._sweeper.join(max(0.0, deadline - time.monotonic()))
+            self._sweeper = None
+        for _ in self._threads:
+            try:
+                self.queue.put(_STOP, timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Full:
+                logger.warning("Dispatch queue still full at shutdown, abandoning pending notifications")
+                break
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._threads = []
+        if self.coalescer:
+            self.coalescer.flush()
+        if self.router is not None:
+            self.router.stop(max(0.0, deadline - time.monotonic()))
+        logger.info("Notification dispatcher stopped")
+
+    def join(self):
+        """Block until every queued notification has been processed"""
+        self.queue.join()
+
+    def _worker(self):
+        """Deliver notifications from the queue until told to stop"""
+        while True:
+            item = self.queue.get()
+            try:
+                if item is _STOP:
+                    return
+                self._deliver(item)
+            finally:
+                self.queue.task_done()
+
+    def _deliver(self, item):
+        """Hand a dequeued notification to the coalescer or send it directly"""
+        waited = time.monotonic() - item.enqueued_at
+        QUEUE_WAIT_SECONDS.observe(waited)
+        with self._lock:
+            self._dequeued += 1
+            self._wait_total += waited
+            self._wait_last = waited
+            if waited > self._wait_max:
+                self._wait_max = waited
+        if self.router is not None:
+            self.router.route(item, self._finish)
+        elif self.coalescer:
+            self.coalescer.submit(item)
+        else:
+            self._send(item)
+
+    def _send(self, item):
+        """Send a notification (or digest) and record its outcome"""
+        try:
+            ok = self.send_func(item.message)
+        except Exception as e:
+            logger.error(f"Unexpected error delivering notification from {item.source or 'unknown'}: {e}")
+            ok = False
+        return self._finish(item, ok)
+
+    def _finish(self, item, ok):
+        """
+        Count a delivered or failed notification (or digest) and update the outbox.
+        ok is None when the router deferred it: it is retried without counting an attempt.
+        """
+        count = len(item.parts) or 1
+        with self._lock:
+            if ok:
+                self.delivered += count
+            elif ok is None:
+                self.deferred += count
+            else:
+                self.failed += count
+        if self.outbox is not None:
+            row_ids = [n.outbox_id for n in (item.parts or (item,)) if n.outbox_id is not None]
+            try:
+                if ok:
+                    self.outbox.mark_delivered(row_ids)
+                elif ok is False:
+                    self.outbox.mark_failed(row_ids)
+            except Exception as e:
+                logger.error(f"Could not update outbox after delivery: {e}")
+            with self._lock:
+                self._inflight.difference_update(row_ids)
+        return ok
+
+    def _sweep_outbox(self):
+        """
+        Re-queue stored notifications that are not in flight, starting with a replay at startup,
+        and pick up notifications stored by other processes
+        """
+        next_replay = 0.0
+        while not self._stop_event.is_set():
+            now = time.monotonic()
+            if now >= next_replay:
+                try:
+                    self.replay_pending()
+                except Exception as e:
+                    logger.error(f"Error replaying outbox: {e}")
+                next_replay = now + self.retry_interval
+            if self.pickup_interval <= 0:
+                self._stop_event.wait(self.retry_interval)
+                continue
+            try:
+                self.pickup_new()
+            except Exception as e:
+                logger.error(f"Error picking up stored notifications: {e}")
+            self._stop_event.wait(min(self.pickup_interval, max(0.0, next_replay - time.monotonic())))
+
+    def pickup_new(self):
+        """
+        Queue notifications that other processes stored since the last pickup.
+        Returns the number of notifications queued.
+        """
+        room = self.maxsize - self.queue.qsize()
+        if room <= 0:
+            return 0
+        with self._gate:
+            while self._appending:
+                self._gate.wait()
+            self._picking = True
+        picked = 0
+        try:
+            # Every row this process stored is in flight by now, or was already attempted
+            with self._lock:
+                inflight = set(self._inflight)
+            for notification in self.outbox.fresh(self._pickup_after, limit=room):
+                if notification.outbox_id not in inflight:
+                    with self._lock:
+                        self._inflight.add(notification.outbox_id)
+                    try:
+                        self.queue.put_nowait(notification)
+                    except queue.Full:
+                        with self._lock:
+                            self._inflight.discard(notification.outbox_id)
+                        break
+                    picked += 1
+                self._pickup_after = notification.outbox_id
+        finally:
+            with self._gate:
+                self._picking = False
+                self._gate.notify_all()
+        if picked:
+            with self._lock:
+                self.picked_up += picked
+            logger.debug(f"Picked up {picked} notifications stored by other processes")
+        return picked
+
+    def replay_pending(self, min_age=5.0):
+        """
+        Queue undelivered outbox rows that are not already in flight.
+        Rows younger than min_age are left alone; they are normally still on their way to the queue.
+        """
+        room = self.maxsize - self.queue.qsize()
+        if room <= 0:
+            return 0
+        with self._lock:
+            inflight = set(self._inflight)
+        replayed = 0
+        for notification in self.outbox.pending(limit=room, exclude=inflight, min_age=min_age):
+            with self._lock:
+                self._inflight.add(notification.outbox_id)
+            try:
+                self.queue.put_nowait(notification)
+            except queue.Full:
+                with self._lock:
+                    self._inflight.discard(notification.outbox_id)
+                break
+            replayed += 1
+        if replayed:
+            logger.info(f"Re-queued {replayed} undelivered notifications from the outbox")
+        return replayed
+
+    def stats(self):
+        """Return queue depth, counters and wait-time statistics"""
+        with self._lock:
+            return {
+                "depth": self.queue.qsize(),
+                "capacity": self.maxsize,
+                "workers": len(self._threads),
+                "enqueued": self.enqueued,
+                "picked_up": self.picked_up,
+                "rejected": self.rejected,
+                "delivered": self.delivered,
+                "failed": self.failed,
+                "deferred": self.deferred,
+                "wait_avg_ms": round(self._wait_total / self._dequeued * 1000, 3) if self._dequeued else 0.0,
+                "wait_max_ms": round(self._wait_max * 1000, 3),
+                "wait_last_ms": round(self._wait_last * 1000, 3),
+                "coalesce_pending": self.coalescer.pending() if self.coalescer else 0,
+                "digests": self.coalescer.digests if self.coalescer else 0,
+                "inflight": len(self._inflight),
+                "destinations": self.router.stats() if self.router is not None else {},
+            }
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Output formats for notification destinations.
+
+Alerts are written in Telegram's Markdown by the payment sources. Other
+destinations need them converted: Slack and Discord incoming webhooks take
+their own markup inside a JSON body, and the generic webhook gets the alert
+fields as JSON. `render()` produces the payload for one format and caches it
+on the notification, so an alert routed to several destinations is rendered
+once per format, not once per destination.
+"""
+
+import json
+import re
+
+# Discord rejects webhook messages whose content is longer than this
+DISCORD_MAX_LENGTH = 2000
+
+_LINK = re.compile(r'\[([^\]\n]+)\]\((\S+?)\)')
+_BOLD = re.compile(r'\*([^*\n]+)\*')
+
+
+def _slack_text(message):
+    """Telegram Markdown to Slack mrkdwn: escape &, < and > and rewrite links"""
+    text = message.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+    return _LINK.sub(r'<\2|\1>', text)
+
+
+def _discord_text(message):
+    """Telegram Markdown to Discord Markdown: single-asterisk bold becomes double"""
+    text = _BOLD.sub(r'**\1**', message)
+    if len(text) > DISCORD_MAX_LENGTH:
+        text = text[:DISCORD_MAX_LENGTH - 1] + '…'
+    return text
+
+
+def plain_text(message):
+    """Telegram Markdown without emphasis markers; links become 'text (url)'"""
+    return _LINK.sub(r'\1 (\2)', message).replace('*', '').replace('`', '')
+
+
+def _encode(body):
+    return json.dumps(body, ensure_ascii=False).encode('utf-8')
+
+
+def _render_markdown(notification):
+    return notification.message
+
+
+def _render_slack(notification):
+    return _encode({"text": _slack_text(notification.message)})
+
+
+def _render_discord(notification):
+    return _encode({"content": _discord_text(notification.message)})
+
+
+def _render_json(notification):
+    return _encode({
+        "source": notification.source,
+        "text": plain_text(notification.message),
+        "markdown": notification.message,
+        "amount": None if notification.amount is None else str(notification.amount),
+        "currency": notification.currency,
+        "summary": notification.summary,
+        "items": len(notification.parts) or 1,
+    })
+
+
+# Telegram destinations take the message text; webhook formats are JSON request bodies
+RENDERERS = {
+    "markdown": _render_markdown,
+    "slack": _render_slack,
+    "discord": _render_discord,
+    "json": _render_json,
+}
+
+
+def render(notification, fmt):
+    """Return the payload of a notification in the given format, rendering it only the first time"""
+    payload = notification.rendered.get(fmt)
+    if payload is None:
+        payload = RENDERERS[fmt](notification)
+        notification.rendered[fmt] = payload
+    return payload
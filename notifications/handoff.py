@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Alert handoff for webhook ingest workers (BOT_ROLE=ingest).
+
+Ingest workers run under gunicorn in several processes and must not talk to
+Telegram themselves. They use this stand-in for the dispatcher: an alert is
+only written to the shared SQLite outbox, and the single notifier process
+picks it up from there and delivers it.
+"""
+
+import logging
+import threading
+
+from notifications.notification import Notification
+
+logger = logging.getLogger("GitHubSponsorsBot.Handoff")
+
+
+class OutboxHandoff:
+    """Stores alerts in the outbox for the notifier process instead of sending them"""
+
+    def __init__(self, outbox):
+        self.outbox = outbox
+        self._lock = threading.Lock()
+        self.handed_off = 0
+        self.failed = 0
+
+    def send_message(self, message, source=None, amount=None, currency=None, summary=None):
+        """Durably store a message; returns False if it could not be stored"""
+        try:
+            self.outbox.append(Notification(message, source, amount, currency, summary))
+        except Exception as e:
+            logger.error(f"Could not hand off notification from {source or 'unknown'}: {e}")
+            with self._lock:
+                self.failed += 1
+            return False
+        with self._lock:
+            self.handed_off += 1
+        return True
+
+    def start(self):
+        """Nothing to start; delivery happens in the notifier process"""
+
+    def stop(self, timeout=10.0):
+        """Nothing to flush; every accepted alert is already committed"""
+
+    def stats(self):
+        """Return handoff counters"""
+        with self._lock:
+            return {"handed_off": self.handed_off, "failed": self.failed}
@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+The unit of work passed between the notification pipeline stages.
+"""
+
+import time
+
+
+class Notification:
+    """A rendered alert waiting in the dispatch queue"""
+
+    __slots__ = ('message', 'source', 'amount', 'currency', 'summary', 'parts', 'outbox_id', 'enqueued_at',
+                 'rendered')
+
+    def __init__(self, message, source=None, amount=None, currency=None, summary=None):
+        self.message = message
+        self.source = source
+        # Optional details used when alerts are folded into a digest
+        self.amount = amount
+        self.currency = currency
+        self.summary = summary
+        # Notifications folded into this one, for digests
+        self.parts = ()
+        # Row id in the durable outbox, once stored
+        self.outbox_id = None
+        self.enqueued_at = time.monotonic()
+        # Payloads per output format, rendered once when the alert is routed
+        self.rendered = {}
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Rate limiting for outgoing Telegram messages.
+
+Telegram allows roughly one message per second to a single chat and about
+thirty messages per second across all chats. Messages are paced with a global
+token bucket plus one bucket per chat, and a chat is paused when Telegram
+answers with a flood-control (429) error. The default rates sit slightly below
+the published limits: a 429 costs at least a full second, so absorbing network
+jitter is cheaper than bumping into the limit.
+"""
+
+import asyncio
+import random
+import threading
+import time
+
+from observability import metrics
+
+# Delivery metrics, shared by the threaded and the asyncio Telegram sender
+TELEGRAM_SEND_SECONDS = metrics.histogram(
+    'sponsors_bot_telegram_send_seconds', 'Duration of successful Telegram sendMessage calls')
+TELEGRAM_MESSAGES = metrics.counter(
+    'sponsors_bot_telegram_messages_total', 'Telegram messages by outcome (sent, failed)', ('outcome',))
+TELEGRAM_RETRIES = metrics.counter(
+    'sponsors_bot_telegram_retries_total', 'Telegram send retries by reason (flood_control, network)', ('reason',))
+
+
+class TokenBucket:
+    """Thread-safe token bucket that hands out send slots"""
+
+    def __init__(self, rate, capacity=None):
+        """Initialize with a refill rate (tokens per second) and burst capacity"""
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        """
+        Take a token and return how many seconds the caller must wait before using it.
+        Tokens may go negative, which queues concurrent callers fairly behind each other.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1.0
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(delay, self.paused_until - now)
+
+    def pause(self, seconds):
+        """Refuse to hand out usable tokens for the given number of seconds"""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class TelegramRateLimiter:
+    """Global and per-chat pacing for the Telegram Bot API"""
+
+    def __init__(self, global_rate=25, chat_rate=0.9, chat_burst=1, global_burst=1):
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self._chat_buckets = {}
+        self._lock = threading.Lock()
+
+    def _chat_bucket(self, chat_id):
+        with self._lock:
+            bucket = self._chat_buckets.get(chat_id)
+            if bucket is None:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+                self._chat_buckets[chat_id] = bucket
+            return bucket
+
+    def wait(self, chat_id):
+        """Block until a message may be sent to the given chat"""
+        delay = self._chat_bucket(chat_id).reserve()
+        if delay > 0:
+            time.sleep(delay)
+        # Only take a global slot once the chat is ready, so a busy chat
+        # does not hold global capacity other chats could use.
+        delay = self.global_bucket.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def wait_async(self, chat_id):
+        """Like wait(), but sleeps on the event loop instead of blocking the thread"""
+        delay = self._chat_bucket(chat_id).reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        delay = self.global_bucket.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def penalize(self, chat_id, retry_after):
+        """Pause a chat after Telegram asked us to retry later"""
+        self._chat_bucket(chat_id).pause(retry_after)
+
+
+def backoff_delay(attempt, base=0.5, cap=30.0):
+    """Exponential backoff with full jitter for the given (1-based) retry attempt"""
+    return random.uniform(0, min(cap, base * (2 ** (attempt - 1))))
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+Routing of alerts to several destinations.
+
+A routing table maps alert sources (github_sponsors, binance, email, ...) to
+named destinations: Telegram chats or channels, and Slack, Discord or generic
+JSON webhooks. The dispatcher hands every alert to the router. The router
+renders it once per output format the matching destinations use, then puts
+it on each destination's own bounded queue. Every destination has its own
+sender thread (and digest coalescer), so a slow or failing webhook only backs
+up its own queue while the other destinations keep delivering.
+
+An alert counts as delivered once every destination accepted it. The
+destinations that did accept an outbox row are recorded in the outbox, so a
+retry of a partly failed alert only goes to the destinations that missed it.
+A destination whose queue is full defers the alert instead of failing it, so
+one slow destination does not use up the alert's delivery attempts.
+
+Configuration strings (NOTIFY_DESTINATIONS, NOTIFY_ROUTES):
+
+    public=telegram:@sponsors_channel; ops=telegram:-1001234567890; slack=slack:https://hooks.slack.com/...
+    github_sponsors=public,ops; email=ops; *=slack
+
+A `*` route applies to every source, in addition to its own. Sources without
+a route of their own also go to the `default` destination, whether or not a
+`*` route exists. Bot messages (startup, command replies) are not alerts: they
+only follow a route of their own, and otherwise go to `default` alone.
+"""
+
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from notifications.coalesce import Coalescer
+from notifications.formats import render
+from notifications.rate_limit import backoff_delay
+from observability import metrics
+
+logger = logging.getLogger("GitHubSponsorsBot.Routing")
+
+# Name of the destination that receives sources without a route (TELEGRAM_CHAT_ID)
+DEFAULT_DESTINATION = 'default'
+# Webhook kinds and the format of their request body
+WEBHOOK_FORMATS = {"slack": "slack", "discord": "discord", "webhook": "json"}
+# Sources of the bot's own messages, which '*' routes do not apply to
+SYSTEM_SOURCES = frozenset({'startup', 'command'})
+
+# Sentinel put on a destination queue to stop its sender
+_STOP = object()
+
+DESTINATION_DELIVERIES = metrics.counter(
+    'sponsors_bot_destination_deliveries_total', 'Alerts handled per destination by outcome (sent, failed, dropped)',
+    ('destination', 'outcome'))
+DESTINATION_SEND_SECONDS = metrics.histogram(
+    'sponsors_bot_destination_send_seconds', 'Time to deliver one message to a destination', ('destination',))
+
+
+class Destination:
+    """A place alerts are delivered to, with its own queue, sender thread and digests"""
+
+    format = "markdown"
+
+    def __init__(self, name, maxsize=1000, coalesce_window=0, coalesce_max_batch=20):
+        self.name = name
+        self.maxsize = maxsize
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.router = None
+        self.coalescer = None
+        if coalesce_window > 0:
+            self.coalescer = Coalescer(self._send, coalesce_window, coalesce_max_batch)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def deliver(self, payload):
+        """Deliver one rendered payload; returns True once the destination accepted it"""
+        raise NotImplementedError
+
+    def submit(self, notification):
+        """Queue a routed notification; returns False if this destination's queue is full"""
+        try:
+            self.queue.put_nowait(notification)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            DESTINATION_DELIVERIES.labels(self.name, 'dropped').inc()
+            logger.warning(f"Queue of destination {self.name} full ({self.maxsize}), alert will be retried")
+            return False
+        return True
+
+    def start(self):
+        """Start the sender thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._worker, name=f"notify-{self.name}", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=10.0):
+        """Stop the sender once the queued alerts are delivered"""
+        if self._thread is None:
+            return
+        try:
+            self.queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.warning(f"Queue of destination {self.name} still full at shutdown")
+        self._thread.join(timeout)
+        self._thread = None
+        if self.coalescer:
+            self.coalescer.flush()
+
+    def _worker(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is _STOP:
+                    return
+                if self.coalescer:
+                    self.coalescer.submit(item)
+                else:
+                    self._send(item)
+            finally:
+                self.queue.task_done()
+
+    def _send(self, item):
+        """Deliver a notification (or digest) and report the outcome of every alert in it"""
+        started = time.perf_counter()
+        try:
+            ok = self.deliver(render(item, self.format))
+        except Exception as e:
+            logger.error(f"Unexpected error delivering to {self.name}: {e}")
+            ok = False
+        DESTINATION_SEND_SECONDS.labels(self.name).observe(time.perf_counter() - started)
+        DESTINATION_DELIVERIES.labels(self.name, 'sent' if ok else 'failed').inc(len(item.parts) or 1)
+        with self._lock:
+            if ok:
+                self.sent += len(item.parts) or 1
+            else:
+                self.failed += len(item.parts) or 1
+        for part in item.parts or (item,):
+            self.router.completed(part, self.name, ok)
+        return ok
+
+    def stats(self):
+        """Return queue depth and delivery counters"""
+        with self._lock:
+            return {
+                "format": self.format,
+                "depth": self.queue.qsize(),
+                "capacity": self.maxsize,
+                "sent": self.sent,
+                "failed": self.failed,
+                "dropped": self.dropped,
+                "coalesce_pending": self.coalescer.pending() if self.coalescer else 0,
+            }
+
+
+class TelegramDestination(Destination):
+    """A Telegram chat or channel, sent to through the bot's rate-limited sender"""
+
+    def __init__(self, name, chat_id, send_func, **kwargs):
+        """send_func(message, chat_id) is TelegramBot.send_message or the asyncio runtime's equivalent"""
+        super().__init__(name, **kwargs)
+        self.chat_id = chat_id
+        self.send_func = send_func
+
+    def deliver(self, payload):
+        return self.send_func(payload, self.chat_id)
+
+
+class WebhookDestination(Destination):
+    """An incoming webhook (Slack, Discord or generic JSON) that takes the alert as a POST body"""
+
+    def __init__(self, name, url, fmt="json", timeout=10.0, max_retries=3, **kwargs):
+        super().__init__(name, **kwargs)
+        self.format = fmt
+        self.url = url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        self.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+
+    def deliver(self, payload):
+        """
+        POST the payload. Rate-limit responses are waited out as the destination asks;
+        network errors and server errors are retried with backoff.
+        """
+        attempt = 0
+        while True:
+            try:
+                response = self.session.post(self.url, data=payload, timeout=self.timeout,
+                                             headers={'Content-Type': 'application/json'})
+            except requests.RequestException as e:
+                error = str(e)
+                response = None
+            else:
+                if response.status_code < 300:
+                    return True
+                error = f"HTTP {response.status_code}"
+                if response.status_code < 500 and response.status_code != 429:
+                    logger.error(f"Webhook destination {self.name} rejected an alert: {error}")
+                    return False
+            attempt += 1
+            if attempt > self.max_retries:
+                logger.error(f"Failed to deliver to {self.name} after {attempt} attempts: {error}")
+                return False
+            delay = backoff_delay(attempt)
+            if response is not None and response.status_code == 429:
+                try:
+                    delay = max(delay, float(response.headers.get('Retry-After', 0)))
+                except ValueError:
+                    pass
+            logger.warning(f"Error delivering to {self.name} ({error}), retry {attempt} in {delay:.1f}s")
+            time.sleep(delay)
+
+
+class NotificationRouter:
+    """Fans alerts out to the destinations their source is routed to"""
+
+    def __init__(self, destinations, routes, outbox=None):
+        """
+        Initialize with the destinations and a dict of source -> destination names;
+        the '*' entry applies to every source. With an outbox, the destinations that
+        accepted a stored alert are recorded there (the dispatcher attaches its own).
+        """
+        self.destinations = OrderedDict((destination.name, destination) for destination in destinations)
+        if len(self.destinations) != len(destinations):
+            raise ValueError("Destination names must be unique")
+        for destination in self.destinations.values():
+            destination.router = self
+        unknown = {name for names in routes.values() for name in names} - set(self.destinations)
+        if unknown:
+            raise ValueError(f"Routes name unknown destinations: {', '.join(sorted(unknown))}")
+        self.routes = routes
+        self.outbox = outbox
+        self._resolved = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def destinations_for(self, source):
+        """Destinations an alert from the given source goes to"""
+        resolved = self._resolved.get(source)
+        if resolved is None:
+            names = list(self.routes.get(source, ()))
+            # A '*' route does not count as the source's own route
+            if source not in self.routes and DEFAULT_DESTINATION in self.destinations:
+                names.append(DEFAULT_DESTINATION)
+            for name in self.routes.get('*', ()) if source not in SYSTEM_SOURCES else ():
+                if name not in names:
+                    names.append(name)
+            resolved = [self.destinations[name] for name in names]
+            self._resolved[source] = resolved
+        return resolved
+
+    def route(self, notification, on_done):
+        """
+        Render the notification once per format and queue it for each of its destinations.
+        on_done(notification, ok) is called once every destination has handled it; ok is
+        True when all accepted it, False when one failed, and None when it was only
+        deferred because a destination's queue was full.
+        """
+        accepted = ()
+        if self.outbox is not None and notification.outbox_id is not None:
+            try:
+                accepted = self.outbox.delivered_destinations(notification.outbox_id)
+            except Exception as e:
+                logger.error(f"Could not read the destinations of outbox row {notification.outbox_id}: {e}")
+        targets = [d for d in self.destinations_for(notification.source) if d.name not in accepted]
+        if not targets:
+            on_done(notification, True)
+            return
+        for destination in targets:
+            render(notification, destination.format)
+        with self._lock:
+            self._pending[id(notification)] = [len(targets), True, on_done]
+        for destination in targets:
+            if not destination.submit(notification):
+                self.completed(notification, destination.name, None)
+
+    def completed(self, notification, name, ok):
+        """Record that one destination handled a notification; ok is None when it deferred it"""
+        with self._lock:
+            entry = self._pending.get(id(notification))
+            if entry is None:
+                return
+            entry[0] -= 1
+            # A failure outweighs a deferral, which outweighs success
+            if ok is False or entry[1] is False:
+                entry[1] = False
+            elif ok is None:
+                entry[1] = None
+            last = entry[0] == 0
+            if last:
+                del self._pending[id(notification)]
+        row_id = notification.outbox_id
+        if ok and row_id is not None and self.outbox is not None and not (last and entry[1]):
+            try:
+                self.outbox.mark_destination_delivered(row_id, name)
+            except Exception as e:
+                logger.error(f"Could not record delivery of outbox row {row_id} to {name}: {e}")
+        if last:
+            entry[2](notification, entry[1])
+
+    def use_telegram_sender(self, send_func):
+        """Send to the Telegram destinations with another function (the asyncio runtime's sender)"""
+        for destination in self.destinations.values():
+            if isinstance(destination, TelegramDestination):
+                destination.send_func = send_func
+
+    def start(self):
+        """Start every destination's sender"""
+        for destination in self.destinations.values():
+            destination.start()
+
+    def stop(self, timeout=10.0):
+        """Stop the senders after the queued alerts are delivered"""
+        for destination in self.destinations.values():
+            destination.stop(timeout)
+
+    def stats(self):
+        """Per-destination queue and delivery statistics"""
+        return {name: destination.stats() for name, destination in self.destinations.items()}
+
+
+def parse_destinations(spec, telegram_send, webhook_timeout=10.0, **kwargs):
+    """
+    Build destinations from 'name=kind:target' entries separated by ';'.
+    kind is telegram (target: chat id or @channel), slack, discord or webhook (target: URL).
+    Remaining keyword arguments are passed to every destination.
+    """
+    destinations = []
+    for entry in (spec or '').split(';'):
+        entry = entry.strip()
+        if not entry:
+            continue
+        name, _, target = entry.partition('=')
+        kind, _, address = target.partition(':')
+        name, kind, address = name.strip(), kind.strip().lower(), address.strip()
+        if not name or not address:
+            raise ValueError(f"Invalid destination {entry!r}, expected name=kind:target")
+        if kind == 'telegram':
+            destinations.append(TelegramDestination(name, address, telegram_send, **kwargs))
+        elif kind in WEBHOOK_FORMATS:
+            destinations.append(WebhookDestination(name, address, WEBHOOK_FORMATS[kind], webhook_timeout, **kwargs))
+        else:
+            raise ValueError(f"Unknown destination kind {kind!r} in {entry!r}")
+    return destinations
+
+
+def parse_routes(spec):
+    """Parse 'source=dest1,dest2' entries separated by ';' into a dict; an empty list drops the source"""
+    routes = {}
+    for entry in (spec or '').split(';'):
+        entry = entry.strip()
+        if not entry:
+            continue
+        source, separator, names = entry.partition('=')
+        if not separator or not source.strip():
+            raise ValueError(f"Invalid route {entry!r}, expected source=destination[,destination]")
+        routes[source.strip()] = [name.strip() for name in names.split(',') if name.strip()]
+    return routes
+
@@ -0,0 +1 @@
+# This file makes the observability directory a Python package.
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Non-blocking logging with rotation, JSON records and rate-limited repeats.
+
+`configure()` replaces the root handlers with a single QueueHandler. Logging
+calls only format the message and put the record on a bounded in-memory
+queue; a QueueListener thread writes it to stderr and to a rotating log file,
+so request and poll latency no longer depend on disk (or pipe) speed. When
+the queue is full, records are dropped and counted rather than blocking the
+caller.
+
+Records can be written as one JSON object per line. Fields passed with
+`extra=` (delivery ids, sources, durations) become keys of the object.
+Repeats of the same warning or error from the same logger are limited per
+time window, and the first record after a suppressed run reports how many
+were left out.
+
+Only one process may rotate a log file. When the bot runs as several
+processes (gunicorn ingest workers next to the notifier), every role gets a
+file of its own; the ingest workers share theirs through a WatchedFileHandler
+that reopens the file after an external tool such as logrotate moved it.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from observability import metrics
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+LOG_RECORDS_DROPPED = metrics.counter(
+    'sponsors_bot_log_records_dropped_total', 'Log records not written, by reason (queue_full, rate_limited)',
+    ('reason',))
+
+# Attributes every LogRecord has; anything else on a record was passed with extra=
+_STANDARD_ATTRIBUTES = frozenset(logging.LogRecord('', 0, '', 0, '', None, None).__dict__) | {'message', 'asctime'}
+
+_listener = None
+_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one JSON object, including the fields passed with extra="""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class RepeatFilter(logging.Filter):
+    """
+    Lets at most `limit` identical warnings or errors from one logger through per
+    `window` seconds. The first record of the next window notes how many were dropped.
+    """
+
+    def __init__(self, limit=10, window=60.0, level=logging.WARNING, max_keys=1000):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self.level = level
+        self.max_keys = max_keys
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if self.limit <= 0 or record.levelno < self.level:
+            return True
+        message = record.getMessage()
+        key = (record.name, record.levelno, message)
+        now = time.monotonic()
+        with self._lock:
+            started, count, suppressed = self._counts.get(key, (now, 0, 0))
+            if now - started >= self.window:
+                started, count = now, 0
+            if count >= self.limit:
+                self._counts[key] = (started, count, suppressed + 1)
+                LOG_RECORDS_DROPPED.labels('rate_limited').inc()
+                return False
+            self._counts[key] = (started, count + 1, 0)
+            if len(self._counts) > self.max_keys:
+                self._expire(now)
+        if suppressed:
+            record.msg = f"{message} ({suppressed} similar messages suppressed)"
+            record.args = None
+        return True
+
+    def _expire(self, now):
+        for key, (started, _, suppressed) in list(self._counts.items()):
+            if now - started >= self.window and not suppressed:
+                del self._counts[key]
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops and counts records when the queue is full instead of blocking or raising"""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.labels('queue_full').inc()
+
+
+def role_path(path, role):
+    """Log file of one process role: logs/bot.log becomes logs/bot.notifier.log; 'all' keeps the path"""
+    if not path or not role or role == 'all':
+        return path
+    base, extension = os.path.splitext(path)
+    return f"{base}.{role}{extension}"
+
+
+def file_handler(path, max_bytes=10 * 1024 * 1024, backup_count=5, when=None, shared=False):
+    """
+    Rotating file handler: by time when `when` is given (e.g. 'midnight'), otherwise by size.
+    A file shared by several processes is never rotated in-process; it is reopened once
+    an external tool has rotated it.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if shared:
+        return logging.handlers.WatchedFileHandler(path, encoding='utf-8', delay=True)
+    if when:
+        return logging.handlers.TimedRotatingFileHandler(path, when=when, backupCount=backup_count,
+                                                         encoding='utf-8', delay=True)
+    return logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count,
+                                                encoding='utf-8', delay=True)
+
+
+def configure(level='INFO', path=None, fmt='text', max_bytes=10 * 1024 * 1024, backup_count=5,
+              rotate_when=None, queue_size=10000, rate_limit=10, rate_window=60.0, shared=False):
+    """
+    Send all logging through a background writer to stderr and, when path is set,
+    a rotating file (shared=True when other processes write the same file).
+    fmt is 'text' or 'json'. Returns the QueueListener.
+    Calling it again replaces the previous configuration.
+    """
+    global _listener
+    formatter = JsonFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT)
+    handlers = [logging.StreamHandler()]
+    if path:
+        try:
+            handlers.append(file_handler(path, max_bytes, backup_count, rotate_when, shared))
+        except OSError as e:
+            sys.stderr.write(f"Cannot write log file {path}: {e}\n")
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    records = queue.Queue(maxsize=queue_size)
+    queue_handler = DroppingQueueHandler(records)
+    queue_handler.addFilter(RepeatFilter(rate_limit, rate_window))
+
+    with _lock:
+        stop()
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+            handler.close()
+        root.addHandler(queue_handler)
+        root.setLevel(level.upper() if isinstance(level, str) else level)
+        _listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+        _listener.start()
+    return _listener
+
+
+def stop():
+    """Write the queued records and stop the background writer"""
+    global _listener
+    listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+atexit.register(stop)
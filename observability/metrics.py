@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+In-process metrics in the Prometheus text exposition format.
+
+Counters, gauges and histograms live in plain Python objects. Recording a
+value is a dictionary lookup, a bisect over the bucket bounds and a couple of
+additions under a lock, well under a microsecond, so hot paths can be
+instrumented freely. `render()` produces the text served by `/metrics`, which
+any Prometheus-compatible scraper reads without an agent or client library.
+
+Metrics are per process: with several gunicorn workers each worker reports
+its own values.
+"""
+
+import bisect
+import logging
+import math
+import threading
+
+logger = logging.getLogger("GitHubSponsorsBot.Metrics")
+
+# Content type of the text exposition format
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Upper bounds in seconds; wide enough for sub-millisecond parsing and multi-second polls
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _label_string(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _CounterValue:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class _GaugeValue:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+
+class _HistogramValue:
+    __slots__ = ('bounds', 'counts', 'sum', 'count', '_lock')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+
+class _Metric:
+    """A named metric with optional labels; each label combination has its own value"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """Return the value for one combination of label values, creating it on first use"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self, child):
+        """Yield (suffix, extra label, value) for one child"""
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = sorted(self._children.items())
+        for values, child in children:
+            for suffix, extra, value in self._samples(child):
+                lines.append(f"{self.name}{suffix}{_label_string(self.labelnames, values, extra)} "
+                             f"{_format_value(value)}")
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterValue()
+
+    def inc(self, amount=1):
+        """Increment the unlabelled counter"""
+        self.labels().inc(amount)
+
+    def _samples(self, child):
+        yield '', None, child.value
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, e.g. a queue depth"""
+
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeValue()
+
+    def set(self, value):
+        """Set the unlabelled gauge"""
+        self.labels().set(value)
+
+    def _samples(self, child):
+        yield '', None, child.value
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets, plus their sum and count"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        """Record one value in the unlabelled histogram"""
+        self.labels().observe(value)
+
+    def _samples(self, child):
+        with child._lock:
+            counts = list(child.counts)
+            total, count = child.sum, child.count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+            cumulative += bucket_count
+            yield '_bucket', f'le="{_format_value(bound)}"', cumulative
+        yield '_sum', None, total
+        yield '_count', None, count
+
+
+class Registry:
+    """Collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, documentation, labelnames, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} is already registered with a different type or labels")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        """Return the counter with this name, registering it on first use"""
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        """Return the gauge with this name, registering it on first use"""
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """Return the histogram with this name, registering it on first use"""
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def on_collect(self, func):
+        """Call func before every render, e.g. to set gauges from current queue sizes"""
+        self._collectors.append(func)
+        return func
+
+    def render(self):
+        """Return every metric in the Prometheus text format"""
+        for collect in list(self._collectors):
+            try:
+                collect()
+            except Exception as e:
+                logger.error(f"Error collecting metrics: {e}")
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+# Process-wide registry used by the bot's modules
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+on_collect = REGISTRY.on_collect
+render = REGISTRY.render
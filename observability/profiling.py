@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+On-demand profiling of the webhook, Telegram and payment source hot paths.
+
+Functions are marked with `@profiled(target)`. Profiling is off unless
+PROFILE_DIR is set; then the decorator returns the function unchanged, so a
+disabled bot runs exactly the code it ran before. When enabled, a marked
+function costs one extra call and a dictionary check until a capture is
+armed, by PROFILE_SIGNAL or an authenticated POST to /admin/profile. The
+next N calls of the armed targets (optionally sampled) then run under
+cProfile and each is written to PROFILE_DIR as a `.pstats` file, loadable
+with `python -m pstats` or snakeviz, next to a `.json` summary of the
+slowest functions. PROFILE_POLLS profiles every poll cycle of every payment
+source, and PROFILE_TRACEMALLOC_INTERVAL writes periodic tracemalloc
+snapshots (top allocations and growth since the previous snapshot) as JSON.
+
+Profiles are per process: with several gunicorn workers the admin endpoint
+arms only the worker that served the request.
+"""
+
+import cProfile
+import functools
+import itertools
+import json
+import logging
+import os
+import pstats
+import random
+import signal
+import threading
+import time
+import tracemalloc
+
+logger = logging.getLogger("GitHubSponsorsBot.Profiling")
+
+# Directory for profiles and memory snapshots; profiling is disabled when unset
+PROFILE_DIR = os.getenv('PROFILE_DIR')
+# Bearer token required by POST /admin/profile; the endpoint is disabled when unset
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN')
+# Calls of each target captured per trigger
+PROFILE_REQUESTS = int(os.getenv('PROFILE_REQUESTS', 20))
+# Fraction of the calls after a trigger that are captured
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 1.0))
+# Signal that arms a capture of every target (empty to install no handler)
+PROFILE_SIGNAL = os.getenv('PROFILE_SIGNAL', 'SIGUSR2')
+# Profile every poll cycle of every payment source
+PROFILE_POLLS = os.getenv('PROFILE_POLLS', 'false').lower() in ('1', 'true', 'yes')
+# Seconds between tracemalloc snapshots (0 disables them)
+PROFILE_TRACEMALLOC_INTERVAL = float(os.getenv('PROFILE_TRACEMALLOC_INTERVAL', 0))
+# Stack frames kept per traced allocation
+PROFILE_TRACEMALLOC_FRAMES = int(os.getenv('PROFILE_TRACEMALLOC_FRAMES', 5))
+# Files kept in PROFILE_DIR; the oldest are removed beyond this
+PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES', 500))
+
+# Targets of the payment sources, profiled on every cycle with PROFILE_POLLS
+POLL_TARGETS = ('binance', 'imap')
+# Functions and allocation sites listed in the JSON summaries
+SUMMARY_LIMIT = 30
+
+
+class Profiler:
+    """Captures cProfile profiles of armed targets and tracemalloc snapshots into a directory"""
+
+    def __init__(self, directory, sample_rate=1.0, always=(), max_files=500):
+        """
+        Initialize with the output directory. Targets in always are profiled on
+        every call; others only after arm().
+        """
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.always = frozenset(always)
+        self.max_files = max_files
+        self.targets = set()
+        self.written = 0
+        self._armed = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._seq = itertools.count(1)
+        self._previous_snapshot = None
+        self._memory_thread = None
+        self._memory_stop = threading.Event()
+
+    def wrap(self, target, func):
+        """Return func, profiled whenever the target is armed (or always profiled)"""
+        self.targets.add(target)
+        always = target in self.always
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if (always or self._armed) and self._claim(target, always):
+                return self._profile(target, func, args, kwargs)
+            return func(*args, **kwargs)
+        return wrapper
+
+    def arm(self, count, targets=None):
+        """Profile the next count calls of the given targets (default: every target); returns the armed counts"""
+        targets = self.targets if targets is None else targets
+        with self._lock:
+            for target in targets:
+                if count > 0:
+                    self._armed[target] = count
+                else:
+                    self._armed.pop(target, None)
+            logger.info(f"Profiling armed: {self._armed or 'nothing'}")
+            return dict(self._armed)
+
+    def armed(self):
+        """Remaining captures per target"""
+        with self._lock:
+            return dict(self._armed)
+
+    def _claim(self, target, always):
+        # A call inside a profiled call is part of the outer profile
+        if getattr(self._local, 'active', False):
+            return False
+        if always:
+            return True
+        with self._lock:
+            remaining = self._armed.get(target)
+            if not remaining:
+                return False
+            if self.sample_rate < 1 and random.random() >= self.sample_rate:
+                return False
+            if remaining == 1:
+                del self._armed[target]
+            else:
+                self._armed[target] = remaining - 1
+            return True
+
+    def _profile(self, target, func, args, kwargs):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ allows one profiler at a time; a concurrent capture is already running
+            return func(*args, **kwargs)
+        self._local.active = True
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+            self._local.active = False
+            self._write_profile(target, profile, time.perf_counter() - started)
+
+    def _path(self, prefix, extension):
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        return os.path.join(self.directory, f"{prefix}-{stamp}-{os.getpid()}-{next(self._seq):05d}.{extension}")
+
+    def _write_profile(self, target, profile, duration):
+        path = self._path(target, 'pstats')
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            profile.dump_stats(path)
+            stats = pstats.Stats(profile).stats
+            top = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:SUMMARY_LIMIT]
+            summary = {
+                "target": target,
+                "duration_ms": round(duration * 1000, 3),
+                "functions": [
+                    {
+                        "function": f"{filename}:{line}({name})",
+                        "calls": calls,
+                        "own_ms": round(own * 1000, 3),
+                        "cumulative_ms": round(cumulative * 1000, 3),
+                    }
+                    for (filename, line, name), (_, calls, own, cumulative, _) in top
+                ],
+            }
+            self._write_json(path[:-len('.pstats')] + '.json', summary)
+        except OSError as e:
+            logger.error(f"Failed to write profile {path}: {e}")
+            return
+        logger.info(f"Profiled {target} ({duration * 1000:.1f} ms): {path}")
+        self._prune()
+
+    def _write_json(self, path, data):
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+        self.written += 1
+
+    def snapshot_memory(self):
+        """Write the top allocations and their growth since the last snapshot; returns the path or None"""
+        if not tracemalloc.is_tracing():
+            return None
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        current, peak = tracemalloc.get_traced_memory()
+        data = {
+            "time": time.time(),
+            "current_kb": round(current / 1024, 1),
+            "peak_kb": round(peak / 1024, 1),
+            "top": [
+                {"where": str(stat.traceback[0]), "size_kb": round(stat.size / 1024, 1), "count": stat.count}
+                for stat in snapshot.statistics('lineno')[:SUMMARY_LIMIT]
+            ],
+        }
+        if self._previous_snapshot is not None:
+            data["growth"] = [
+                {"where": str(stat.traceback[0]), "size_diff_kb": round(stat.size_diff / 1024, 1),
+                 "count_diff": stat.count_diff}
+                for stat in snapshot.compare_to(self._previous_snapshot, 'lineno')[:SUMMARY_LIMIT]
+            ]
+        self._previous_snapshot = snapshot
+        path = self._path('memory', 'json')
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            self._write_json(path, data)
+        except OSError as e:
+            logger.error(f"Failed to write memory snapshot {path}: {e}")
+            return None
+        self._prune()
+        return path
+
+    def start_memory_snapshots(self, interval, frames=5):
+        """Trace allocations and write a snapshot every interval seconds"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self._memory_stop.clear()
+        self._memory_thread = threading.Thread(
+            target=self._memory_loop, args=(interval,), name="memory-snapshots", daemon=True)
+        self._memory_thread.start()
+        logger.info(f"Writing tracemalloc snapshots every {interval}s to {self.directory}")
+
+    def stop(self):
+        """Stop the memory snapshots"""
+        self._memory_stop.set()
+        if self._memory_thread is not None:
+            self._memory_thread.join(5)
+            self._memory_thread = None
+
+    def _memory_loop(self, interval):
+        while not self._memory_stop.wait(interval):
+            self.snapshot_memory()
+
+    def _prune(self):
+        if self.max_files <= 0:
+            return
+        try:
+            paths = [os.path.join(self.directory, name) for name in os.listdir(self.directory)]
+            paths.sort(key=os.path.getmtime)
+            for path in paths[:-self.max_files]:
+                os.remove(path)
+        except OSError as e:
+            logger.warning(f"Failed to prune {self.directory}: {e}")
+
+
+# The process-wide profiler; None when PROFILE_DIR is unset
+profiler = Profiler(
+    PROFILE_DIR,
+    sample_rate=PROFILE_SAMPLE_RATE,
+    always=POLL_TARGETS if PROFILE_POLLS else (),
+    max_files=PROFILE_MAX_FILES
+) if PROFILE_DIR else None
+
+
+def profiled(target):
+    """Decorator marking a function as the profiling target of that name; a no-op while profiling is disabled"""
+    def decorate(func):
+        if profiler is None:
+            return func
+        return profiler.wrap(target, func)
+    return decorate
+
+
+def _arm_from_signal(signum, frame):
+    # The interrupted main thread may hold the profiler lock, so arm from another thread
+    threading.Thread(target=profiler.arm, args=(PROFILE_REQUESTS,), name="profile-arm").start()
+
+
+def start():
+    """Install the profiling signal handler and start memory snapshots, as configured"""
+    if profiler is None:
+        return
+    if PROFILE_SIGNAL:
+        signum = getattr(signal, PROFILE_SIGNAL, None)
+        if signum is None:
+            logger.warning(f"PROFILE_SIGNAL {PROFILE_SIGNAL} is not available on this platform")
+        else:
+            signal.signal(signum, _arm_from_signal)
+            logger.info(f"Send {PROFILE_SIGNAL} to profile the next {PROFILE_REQUESTS} calls of {sorted(profiler.targets)}")
+    if PROFILE_TRACEMALLOC_INTERVAL > 0:
+        profiler.start_memory_snapshots(PROFILE_TRACEMALLOC_INTERVAL, PROFILE_TRACEMALLOC_FRAMES)
+
+
+def stop():
+    """Stop the memory snapshots"""
+    if profiler is not None:
+        profiler.stop()
@@ -9,120 +9,379 @@ This module will connect to the Binance API to fetch:
 
 import os
 import logging
-# from binance.client import Client # To be added when implementing
+import time
+from datetime import datetime
+
+from binance.client import Client
+
+from observability.profiling import profiled
+from payment_sources.binance_weight import HIGH_PRIORITY, LOW_PRIORITY, WeightBudget, WeightBudgetExceeded
+from storage.seen_ids import SeenIdStore
 
 logger = logging.getLogger("GitHubSponsorsBot.BinanceAlerts")
 
 # Environment variables for Binance API (ensure these are set)
 BINANCE_API_KEY = os.getenv('BINANCE_API_KEY')
 BINANCE_API_SECRET = os.getenv('BINANCE_API_SECRET')
+# Optional base URL override, e.g. a local stub (http://127.0.0.1:8082)
+BINANCE_API_URL = os.getenv('BINANCE_API_URL')
+# Each poll re-reads this many seconds before the stored cursor to catch late-indexed records
+BINANCE_POLL_OVERLAP = int(os.getenv('BINANCE_POLL_OVERLAP', 600))
+# How far back the very first poll looks
+BINANCE_INITIAL_LOOKBACK = int(os.getenv('BINANCE_INITIAL_LOOKBACK', 3600))
+# Per-minute request weight limits of /api and /sapi, shared by every process behind this IP
+BINANCE_WEIGHT_LIMIT = int(os.getenv('BINANCE_WEIGHT_LIMIT', 6000))
+BINANCE_SAPI_WEIGHT_LIMIT = int(os.getenv('BINANCE_SAPI_WEIGHT_LIMIT', 12000))
+# Fraction of each limit that low-priority calls (P2P history) leave for everything else
+BINANCE_WEIGHT_RESERVE = float(os.getenv('BINANCE_WEIGHT_RESERVE', 0.2))
+# Longest a call is delayed for weight before the stream is skipped until the next check
+BINANCE_WEIGHT_MAX_WAIT = float(os.getenv('BINANCE_WEIGHT_MAX_WAIT', 60))
+# Keep-alive connections pooled on the REST session
+BINANCE_HTTP_POOL_SIZE = int(os.getenv('BINANCE_HTTP_POOL_SIZE', 4))
+
+DAY_MS = 24 * 3600 * 1000
+# Largest time window and page size each history endpoint accepts
+DEPOSIT_MAX_WINDOW_MS = 90 * DAY_MS
+DEPOSIT_PAGE_SIZE = 1000
+P2P_MAX_WINDOW_MS = 30 * DAY_MS
+P2P_PAGE_SIZE = 100
+
+# Deposit status codes: 1 success, 6 credited but cannot withdraw; 0 and 8 are still in progress
+DEPOSIT_CREDITED = (1, 6)
+DEPOSIT_IN_PROGRESS = (0, 8)
+P2P_COMPLETED = 'COMPLETED'
+P2P_IN_PROGRESS = ('PENDING', 'TRADING', 'BUYER_PAYED', 'DISTRIBUTING', 'IN_APPEAL')
+
+# Deposits and orders still in progress after this long are no longer re-checked
+PENDING_MAX_AGE_MS = 30 * DAY_MS
+
+# Streams polled independently, each with its own persisted cursor
+STREAMS = ('deposits', 'p2p_buy', 'p2p_sell')
+
+
+def now_ms():
+    """Current time in milliseconds"""
+    return int(time.time() * 1000)
+
+
+def format_time(timestamp_ms):
+    """Format a Binance millisecond timestamp"""
+    if not timestamp_ms:
+        return 'N/A'
+    return datetime.fromtimestamp(int(timestamp_ms) / 1000).strftime('%Y-%m-%d %H:%M:%S')
+
 
 class BinanceAlerts:
-    def __init__(self, telegram_bot):
-        self.telegram_bot = telegram_bot
-        # self.client = Client(BINANCE_API_KEY, BINANCE_API_SECRET) # Uncomment when ready
+    def __init__(self, notifier, state=None, client=None, seen=None, weights=None):
+        self.notifier = notifier
+        self.state = state
+        self.client = client
+        # Ids alerted within the overlap window; in-memory unless a persistent store is passed
+        self.seen = seen if seen is not None else SeenIdStore()
+        self.weights = weights if weights is not None else WeightBudget(
+            BINANCE_WEIGHT_LIMIT, BINANCE_SAPI_WEIGHT_LIMIT, BINANCE_WEIGHT_RESERVE, BINANCE_WEIGHT_MAX_WAIT
+        )
+        self._cursors = {}
+        self._pending = {}
         if not BINANCE_API_KEY or not BINANCE_API_SECRET:
             logger.error("Binance API Key or Secret not configured. Binance alerts will be disabled.")
             self.enabled = False
         else:
             self.enabled = True
-            # Initialize API client here
-            pass
+            if self.client is None:
+                self.client = self._create_client()
+            # All REST calls share one pooled session whose responses feed the weight budget
+            self.weights.attach(self.client.session, BINANCE_HTTP_POOL_SIZE)
 
+    def _create_client(self):
+        """Creates the REST client, pointing it at BINANCE_API_URL when set"""
+        client = Client(BINANCE_API_KEY, BINANCE_API_SECRET, requests_params={'timeout': 10}, ping=False)
+        if BINANCE_API_URL:
+            base = BINANCE_API_URL.rstrip('/')
+            client.API_URL = base + '/api'
+            client.MARGIN_API_URL = base + '/sapi'
+        return client
+
+    @profiled('binance')
     def check_for_new_payments(self):
         """
         Checks for new deposits and P2P payments and sends alerts.
+        Each stream only asks for the window since its stored cursor.
+        Returns the number of alerts sent, or False if every stream failed.
         """
         if not self.enabled:
-            return
+            return 0
 
         logger.info("Checking for new Binance payments...")
-        # TODO: Implement logic to fetch new crypto deposits
-        # Example:
-        # deposits = self.client.get_deposit_history()
-        # for deposit in deposits:
-        #     if self.is_new_deposit(deposit): # Implement is_new_deposit to avoid duplicates
-        #         message = self.format_deposit_message(deposit)
-        #         self.telegram_bot.send_message(message)
-        #         self.mark_deposit_as_processed(deposit) # Mark to avoid re-alerting
-
-        # TODO: Implement logic to fetch completed P2P payments
-        # Example:
-        # p2p_orders = self.client.get_c2c_trade_history(tradeType='BUY') # or relevant endpoint
-        # for order in p2p_orders:
-        #     if order['orderStatus'] == 'COMPLETED' and self.is_new_p2p_payment(order):
-        #         message = self.format_p2p_message(order)
-        #         self.telegram_bot.send_message(message)
-        #         self.mark_p2p_as_processed(order)
+        sent = 0
+        failed = 0
+        for stream in STREAMS:
+            try:
+                sent += self.poll_stream(stream)
+            except WeightBudgetExceeded as e:
+                logger.warning(f"Skipping Binance {stream} until the next check: {e}")
+            except Exception as e:
+                failed += 1
+                logger.error(f"Error polling Binance {stream}: {e}")
+        self.prune_seen()
         logger.info("Finished checking Binance payments.")
+        if failed == len(STREAMS):
+            return False
+        return sent
+
+    def _cursor_key(self, stream):
+        return f"binance:{stream}"
+
+    def get_cursor(self, stream):
+        """Return the stored start time (ms) of a stream, or None before the first poll"""
+        if stream not in self._cursors and self.state is not None:
+            value = self.state.get(self._cursor_key(stream))
+            if value is not None:
+                self._cursors[stream] = value["start_time"]
+                self._pending[stream] = dict(value.get("pending", {}))
+        return self._cursors.get(stream)
+
+    def get_pending(self, stream):
+        """Return {item key: timestamp (ms)} of the stream's deposits or orders still in progress"""
+        self.get_cursor(stream)
+        return self._pending.setdefault(stream, {})
+
+    def set_cursor(self, stream, start_time):
+        """Persist the start time (ms) for the next poll of a stream, with its in-progress items"""
+        self._cursors[stream] = start_time
+        if self.state is not None:
+            self.state.set(self._cursor_key(stream), {"start_time": start_time, "pending": self.get_pending(stream)})
+
+    def prune_seen(self):
+        """Forget alerted ids older than the earliest window any stream will query again"""
+        cursors = [self.get_cursor(stream) for stream in STREAMS]
+        if None in cursors:
+            return
+        oldest = min(cursors) - BINANCE_POLL_OVERLAP * 1000
+        dropped = self.seen.prune(oldest / 1000)
+        if dropped:
+            logger.debug(f"Dropped {dropped} expired seen-id partitions")
+
+    def poll_stream(self, stream):
+        """
+        Fetches one stream from its cursor (minus the overlap) up to now and sends alerts.
+        Long gaps are split into windows the endpoint accepts, and the cursor advances to
+        the end of each window. Deposits and orders still in progress are kept in a small
+        pending set and re-read by their own timestamp until they complete, so one open
+        order does not hold every later poll's window open. The cursor only stops at an
+        alert that could not be queued, so the next check retries it.
+        """
+        end = now_ms()
+        cursor = self.get_cursor(stream)
+        if cursor is None:
+            start = end - BINANCE_INITIAL_LOOKBACK * 1000
+        else:
+            start = max(0, cursor - BINANCE_POLL_OVERLAP * 1000)
+        max_window = DEPOSIT_MAX_WINDOW_MS if stream == 'deposits' else P2P_MAX_WINDOW_MS
+        pending = self.get_pending(stream)
+
+        sent = 0
+        window_start = start
+        while window_start < end:
+            window_end = min(end, window_start + max_window - 1)
+            count, failed_at = self._process(stream, self._fetch(stream, window_start, window_end), pending)
+            sent += count
+            if failed_at is not None:
+                self.set_cursor(stream, failed_at)
+                logger.warning(f"Could not queue a Binance {stream} alert, retrying it on the next check")
+                return sent
+            self.set_cursor(stream, window_end + 1)
+            window_start = window_end + 1
+        return sent + self._recheck_pending(stream, start)
+
+    def _recheck_pending(self, stream, window_start):
+        """
+        Re-reads in-progress items older than the window just polled, one request per distinct
+        timestamp, and alerts those that completed. Items open for too long are given up on.
+        """
+        pending = self.get_pending(stream)
+        oldest = now_ms() - PENDING_MAX_AGE_MS
+        for key, timestamp in list(pending.items()):
+            if timestamp < oldest:
+                logger.warning(f"Binance {key} still in progress after {PENDING_MAX_AGE_MS // DAY_MS} days, no longer followed")
+                del pending[key]
+        sent = 0
+        for timestamp in sorted({t for t in pending.values() if t < window_start}):
+            count, failed_at = self._process(stream, self._fetch(stream, timestamp, timestamp), pending)
+            sent += count
+            if failed_at is not None:
+                logger.warning(f"Could not queue a Binance {stream} alert, retrying it on the next check")
+                break
+        self.set_cursor(stream, self.get_cursor(stream))
+        return sent
+
+    def _fetch(self, stream, start, end):
+        """Returns the deposits or P2P orders of a stream between start and end (ms)"""
+        if stream == 'deposits':
+            return self.fetch_deposits(start, end)
+        return self.fetch_p2p('BUY' if stream == 'p2p_buy' else 'SELL', start, end)
+
+    def _process(self, stream, records, pending):
+        if stream == 'deposits':
+            return self._process_deposits(records, pending)
+        return self._process_p2p(records, pending)
+
+    def fetch_deposits(self, start, end):
+        """Returns all deposits inserted between start and end (ms), paging by offset"""
+        deposits = []
+        offset = 0
+        while True:
+            self.weights.acquire('sapi', HIGH_PRIORITY)
+            page = self.client.get_deposit_history(
+                startTime=start, endTime=end, offset=offset, limit=DEPOSIT_PAGE_SIZE
+            )
+            deposits.extend(page)
+            if len(page) < DEPOSIT_PAGE_SIZE:
+                return deposits
+            offset += len(page)
+
+    def fetch_p2p(self, trade_type, start, end):
+        """Returns all P2P orders of one side created between start and end (ms), paging by page number"""
+        orders = []
+        page = 1
+        while True:
+            # P2P history is the first to yield when the shared weight budget runs low
+            self.weights.acquire('sapi', LOW_PRIORITY)
+            response = self.client.get_c2c_trade_history(
+                tradeType=trade_type, startTimestamp=start, endTimestamp=end, page=page, rows=P2P_PAGE_SIZE
+            )
+            data = response.get('data') or []
+            orders.extend(data)
+            if len(data) < P2P_PAGE_SIZE:
+                return orders
+            page += 1
+
+    def _process_deposits(self, deposits, pending):
+        """
+        Alerts credited deposits and keeps the pending set of in-progress ones up to date.
+        Returns (alerts sent, insertTime of a deposit whose alert could not be queued, or None);
+        processing stops at that deposit.
+        """
+        sent = 0
+        for deposit in sorted(deposits, key=lambda d: d.get('insertTime', 0)):
+            key = self._deposit_key(deposit)
+            if deposit.get('status') in DEPOSIT_IN_PROGRESS:
+                pending[key] = deposit.get('insertTime', 0)
+                continue
+            if deposit.get('status') in DEPOSIT_CREDITED and self.is_new_deposit(deposit):
+                queued = self.notifier.send_message(
+                    self.format_deposit_message(deposit),
+                    source="binance",
+                    amount=deposit.get('amount'),
+                    currency=deposit.get('coin'),
+                    summary=f"Deposit {deposit.get('amount')} {deposit.get('coin')}"
+                )
+                if not queued:
+                    return sent, deposit.get('insertTime', 0)
+                self.mark_deposit_as_processed(deposit)
+                sent += 1
+            pending.pop(key, None)
+        return sent, None
+
+    def _process_p2p(self, orders, pending):
+        """
+        Alerts completed P2P orders and keeps the pending set of in-progress ones up to date.
+        Returns (alerts sent, createTime of an order whose alert could not be queued, or None);
+        processing stops at that order.
+        """
+        sent = 0
+        for order in sorted(orders, key=lambda o: o.get('createTime', 0)):
+            key = self._p2p_key(order)
+            if order.get('orderStatus') in P2P_IN_PROGRESS:
+                pending[key] = order.get('createTime', 0)
+                continue
+            if order.get('orderStatus') == P2P_COMPLETED and self.is_new_p2p_payment(order):
+                queued = self.notifier.send_message(
+                    self.format_p2p_message(order),
+                    source="binance",
+                    amount=order.get('totalPrice'),
+                    currency=order.get('fiat'),
+                    summary=f"P2P {order.get('tradeType', '')} {order.get('amount')} {order.get('asset')}"
+                )
+                if not queued:
+                    return sent, order.get('createTime', 0)
+                self.mark_p2p_as_processed(order)
+                sent += 1
+            pending.pop(key, None)
+        return sent, None
 
     def format_deposit_message(self, deposit_data):
         """
         Formats a cryptocurrency deposit alert message.
         """
-        # Example structure, adjust based on actual API response
-        # amount = deposit_data.get('amount')
-        # currency = deposit_data.get('coin')
-        # tx_id = deposit_data.get('txId')
-        # timestamp = deposit_data.get('insertTime') # Convert to readable format
-        # formatted_time = datetime.fromtimestamp(timestamp/1000).strftime('%Y-%m-%d %H:%M:%S') if timestamp else 'N/A'
-        #
-        # message = (
-        #     f"💰 *New Binance Deposit Received*\n\n"
-        #     f"*Amount:* {amount} {currency}\n"
-        #     f"*Transaction ID:* `{tx_id}`\n"
-        #     f"*Timestamp:* {formatted_time}\n"
-        # )
-        # return message
-        return "Placeholder Binance deposit message" # Replace with actual formatting
+        amount = deposit_data.get('amount')
+        currency = deposit_data.get('coin')
+        network = deposit_data.get('network', 'N/A')
+        tx_id = deposit_data.get('txId')
+        formatted_time = format_time(deposit_data.get('insertTime'))
+
+        message = (
+            f"💰 *New Binance Deposit Received*\n\n"
+            f"*Amount:* {amount} {currency}\n"
+            f"*Network:* {network}\n"
+            f"*Transaction ID:* `{tx_id}`\n"
+            f"*Timestamp:* {formatted_time}\n"
+        )
+        return message
 
     def format_p2p_message(self, p2p_data):
         """
         Formats a P2P payment receipt alert message.
         """
-        # Example structure, adjust based on actual API response
-        # order_number = p2p_data.get('orderNumber')
-        # amount = p2p_data.get('totalPrice')
-        # currency = p2p_data.get('fiatUnit')
-        # crypto_amount = p2p_data.get('amount')
-        # crypto_currency = p2p_data.get('asset')
-        # timestamp = p2p_data.get('createTime') # Convert to readable format
-        # formatted_time = datetime.fromtimestamp(timestamp/1000).strftime('%Y-%m-%d %H:%M:%S') if timestamp else 'N/A'
-        #
-        # message = (
-        #     f"🤝 *Binance P2P Payment Completed*\n\n"
-        #     f"*Order Number:* `{order_number}`\n"
-        #     f"*Fiat Amount:* {amount} {currency}\n"
-        #     f"*Crypto Amount:* {crypto_amount} {crypto_currency}\n"
-        #     f"*Timestamp:* {formatted_time}\n"
-        # )
-        # return message
-        return "Placeholder Binance P2P message" # Replace with actual formatting
-
-    # Helper methods to track processed transactions (to avoid duplicate alerts)
-    # These could use a simple in-memory set for recent IDs, or a small DB/file for persistence
+        order_number = p2p_data.get('orderNumber')
+        trade_type = p2p_data.get('tradeType', 'N/A')
+        amount = p2p_data.get('totalPrice')
+        currency = p2p_data.get('fiat')
+        crypto_amount = p2p_data.get('amount')
+        crypto_currency = p2p_data.get('asset')
+        formatted_time = format_time(p2p_data.get('createTime'))
+
+        message = (
+            f"🤝 *Binance P2P Payment Completed*\n\n"
+            f"*Order Number:* `{order_number}`\n"
+            f"*Side:* {trade_type}\n"
+            f"*Fiat Amount:* {amount} {currency}\n"
+            f"*Crypto Amount:* {crypto_amount} {crypto_currency}\n"
+            f"*Timestamp:* {formatted_time}\n"
+        )
+        return message
+
+    # Alerted ids are keyed by stream type so a deposit and an order can never collide
+    def _deposit_key(self, deposit_data):
+        return f"deposit:{deposit_data.get('txId') or deposit_data.get('id')}"
+
+    def _p2p_key(self, p2p_data):
+        return f"p2p:{p2p_data.get('orderNumber')}"
+
     def is_new_deposit(self, deposit_data):
-        # TODO: Implement logic to check if this deposit has been alerted already
-        return True
+        """Returns True if this deposit has not been alerted yet"""
+        return not self.seen.contains(self._deposit_key(deposit_data))
 
     def mark_deposit_as_processed(self, deposit_data):
-        # TODO: Implement logic to mark this deposit as processed
-        pass
+        """Records the deposit under the partition of its insert time"""
+        self.seen.add(self._deposit_key(deposit_data), deposit_data.get('insertTime', now_ms()) / 1000)
 
     def is_new_p2p_payment(self, p2p_data):
-        # TODO: Implement logic to check if this P2P payment has been alerted already
-        return True
+        """Returns True if this P2P order has not been alerted yet"""
+        return not self.seen.contains(self._p2p_key(p2p_data))
 
     def mark_p2p_as_processed(self, p2p_data):
-        # TODO: Implement logic to mark this P2P payment as processed
-        pass
+        """Records the order under the partition of its create time"""
+        self.seen.add(self._p2p_key(p2p_data), p2p_data.get('createTime', now_ms()) / 1000)
+
 
 if __name__ == '__main__':
     # This section is for testing the module independently
     # You'll need to mock telegram_bot or provide a dummy one
     class MockTelegramBot:
-        def send_message(self, message):
+        def send_message(self, message, **kwargs):
             print(f"MockTelegramBot sending: {message}")
+            return True
 
     # Ensure environment variables are set for testing
     # load_dotenv() # If you have a .env file for testing
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Push-style Binance alerts over the user data stream.
+
+A listenKey is requested over REST and the account's WebSocket stream is
+kept open; `balanceUpdate` and `outboundAccountPosition` events arrive within
+a second of a balance change. The events carry no transaction ids, so each
+one triggers an incremental check in BinanceAlerts, which fetches the new
+records since its cursors and formats and dedupes them as in polling mode.
+The listenKey is kept alive every 30 minutes. After every (re)connect, and
+periodically while connected, the same check reconciles anything the stream
+did not announce, so a dropped connection never leaves a gap.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+from binance.exceptions import BinanceAPIException
+from websockets.sync.client import connect
+
+from notifications.rate_limit import backoff_delay
+from payment_sources.scheduler import record_check
+
+logger = logging.getLogger("GitHubSponsorsBot.BinanceStream")
+
+# WebSocket base URL; the stream for a listenKey is at <url>/ws/<listenKey>
+BINANCE_WS_URL = os.getenv('BINANCE_WS_URL', 'wss://stream.binance.com:9443')
+# Binance expires a listenKey after 60 minutes without a keepalive
+BINANCE_LISTEN_KEY_KEEPALIVE = int(os.getenv('BINANCE_LISTEN_KEY_KEEPALIVE', 30 * 60))
+# Seconds between REST reconciliations while the stream is connected
+BINANCE_STREAM_RECONCILE = int(os.getenv('BINANCE_STREAM_RECONCILE', 1800))
+# Seconds before checking again when an event was not yet visible in the history endpoints
+BINANCE_STREAM_RECHECK = float(os.getenv('BINANCE_STREAM_RECHECK', 10))
+# Upper bound for the delay between reconnect attempts
+BINANCE_RECONNECT_MAX_BACKOFF = float(os.getenv('BINANCE_RECONNECT_MAX_BACKOFF', 300))
+
+BALANCE_EVENTS = ('balanceUpdate', 'outboundAccountPosition')
+
+
+class BinanceUserStream:
+    """Keeps the user data stream open and checks for new payments whenever the balance changes"""
+
+    def __init__(self, alerter, ws_url=BINANCE_WS_URL, keepalive_interval=BINANCE_LISTEN_KEY_KEEPALIVE,
+                 reconcile_interval=BINANCE_STREAM_RECONCILE, recheck_delay=BINANCE_STREAM_RECHECK,
+                 max_backoff=BINANCE_RECONNECT_MAX_BACKOFF):
+        """
+        Initialize with a BinanceAlerts instance, which provides the REST client
+        and the incremental payment check.
+        """
+        self.alerter = alerter
+        self.ws_url = ws_url.rstrip('/')
+        self.keepalive_interval = keepalive_interval
+        self.reconcile_interval = reconcile_interval
+        self.recheck_delay = recheck_delay
+        self.max_backoff = max_backoff
+        self._stop = threading.Event()
+        self.reconnects = 0
+        self.events = 0
+
+    def stop(self):
+        """Ask the stream to disconnect and return from run()"""
+        self._stop.set()
+
+    def run(self):
+        """
+        Follow the user data stream until stop() is called.
+        Returns False straight away if Binance refuses to create a listenKey
+        (e.g. the API key lacks permission), so the caller can fall back to polling.
+        """
+        attempt = 0
+        while not self._stop.is_set():
+            try:
+                listen_key = self.alerter.client.stream_get_listen_key()
+            except BinanceAPIException as e:
+                if e.status_code not in (418, 429):
+                    logger.warning(f"Binance user data stream unavailable ({e}), falling back to polling.")
+                    return False
+                delay = self.alerter.weights.delay('api')
+                logger.warning(f"Binance rate limit while creating a listenKey, retrying in {delay:.0f}s")
+                self._stop.wait(delay)
+                continue
+            except Exception as e:
+                attempt += 1
+                delay = backoff_delay(attempt, base=1.0, cap=self.max_backoff)
+                logger.warning(f"Could not create Binance listenKey ({e}), retrying in {delay:.1f}s")
+                self._stop.wait(delay)
+                continue
+
+            try:
+                with connect(f"{self.ws_url}/ws/{listen_key}", open_timeout=10, close_timeout=2) as ws:
+                    attempt = 0
+                    logger.info("Connected to the Binance user data stream.")
+                    self._watch(ws, listen_key)
+            except Exception as e:
+                attempt += 1
+                self.reconnects += 1
+                delay = backoff_delay(attempt, base=1.0, cap=self.max_backoff)
+                logger.warning(f"Binance user data stream lost ({e}), reconnecting in {delay:.1f}s")
+                self._stop.wait(delay)
+        return True
+
+    def _watch(self, ws, listen_key):
+        """Reconcile, then handle events, keepalives and periodic reconciliation until the stream ends"""
+        # The stream is already subscribed, so nothing that happens during this check is missed
+        self.reconcile()
+        now = time.monotonic()
+        next_keepalive = now + self.keepalive_interval
+        next_reconcile = now + self.reconcile_interval
+        recheck_at = None
+        while not self._stop.is_set():
+            try:
+                # Wake up at least once a second so stop() and timers are noticed promptly
+                message = ws.recv(timeout=1.0)
+            except TimeoutError:
+                message = None
+            now = time.monotonic()
+
+            if message is not None:
+                kind = self.handle_event(message)
+                if kind == 'expired':
+                    logger.info("Binance listenKey expired, requesting a new one.")
+                    return
+                if kind == 'balance':
+                    # A deposit can reach the balance before the history endpoint lists it
+                    recheck_at = now + self.recheck_delay if self.reconcile() == 0 else None
+                    next_reconcile = now + self.reconcile_interval
+
+            if recheck_at is not None and now >= recheck_at:
+                recheck_at = None
+                self.reconcile()
+            # Keepalives wait out a Retry-After like every other call
+            if now >= next_keepalive and self.alerter.weights.delay('api') <= 0:
+                self.alerter.client.stream_keepalive(listen_key)
+                next_keepalive = now + self.keepalive_interval
+            if now >= next_reconcile:
+                self.reconcile()
+                next_reconcile = now + self.reconcile_interval
+
+    def handle_event(self, message):
+        """Classify one stream message as 'balance', 'expired' or None"""
+        try:
+            event = json.loads(message)
+        except ValueError:
+            logger.warning(f"Ignoring malformed Binance stream message: {message[:200]!r}")
+            return None
+        event_type = event.get('e')
+        if event_type in BALANCE_EVENTS:
+            self.events += 1
+            if event_type == 'balanceUpdate':
+                logger.info(f"Binance balance update: {event.get('d')} {event.get('a')}")
+            return 'balance'
+        if event_type == 'listenKeyExpired':
+            return 'expired'
+        return None
+
+    def reconcile(self):
+        """Run the incremental REST check; returns the number of alerts sent"""
+        started = time.monotonic()
+        try:
+            result = self.alerter.check_for_new_payments()
+        except Exception as e:
+            logger.error(f"Error reconciling Binance payments: {e}")
+            result = False
+        record_check("binance", time.monotonic() - started, result)
+        return result or 0
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Request-weight budget for the Binance REST API.
+
+Binance limits request weight per IP per minute and answers with 429 when a
+client goes over, then with 418 (an IP ban of minutes to days) if it keeps
+sending. Every response reports the weight the IP has used in the current
+minute (`X-MBX-USED-WEIGHT-1M` for /api, `X-SAPI-USED-IP-WEIGHT-1M` for
+/sapi), which includes other processes behind the same egress IP. The budget
+records these headers from every response; before a call, low-priority
+requests wait for the next minute once usage passes the reserve, nothing is
+sent above the limit, and nothing is sent while a Retry-After is pending.
+"""
+
+import logging
+import math
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger("GitHubSponsorsBot.BinanceWeight")
+
+# Header prefix per weight bucket; only the one-minute interval is tracked
+WEIGHT_HEADERS = {
+    'api': 'x-mbx-used-weight-1m',
+    'sapi': 'x-sapi-used-ip-weight-1m',
+}
+
+HIGH_PRIORITY = 'high'
+LOW_PRIORITY = 'low'
+
+
+class WeightBudgetExceeded(Exception):
+    """Raised when a call would have to wait longer than allowed for request weight"""
+
+    def __init__(self, bucket, wait):
+        super().__init__(f"{bucket} request weight exhausted, next call possible in {wait:.0f}s")
+        self.bucket = bucket
+        self.wait = wait
+
+
+def bucket_for(url):
+    """Return the weight bucket of a request URL"""
+    return 'sapi' if '/sapi/' in url else 'api'
+
+
+def retry_after(response, default=60):
+    """Seconds from the Retry-After header of a 418/429 response"""
+    try:
+        return max(1, int(response.headers.get('Retry-After', default)))
+    except ValueError:
+        return default
+
+
+class WeightBudget:
+    """Tracks used request weight per bucket from response headers and paces calls against it"""
+
+    def __init__(self, api_limit=6000, sapi_limit=12000, reserve=0.2, max_wait=60, window=60):
+        """
+        Initialize with per-minute weight limits, the fraction of each limit kept
+        for high-priority calls and the longest a call may be delayed.
+        """
+        self.limits = {'api': api_limit, 'sapi': sapi_limit}
+        self.reserve = reserve
+        self.max_wait = max_wait
+        self.window = window
+        self._used = {'api': 0, 'sapi': 0}
+        self._window_start = {'api': 0, 'sapi': 0}
+        self.blocked_until = 0.0
+        self.requests = 0
+        self.delays = 0
+        self.delayed_seconds = 0.0
+        self.rate_limited = 0
+        self.banned = 0
+        self._lock = threading.Lock()
+
+    def _current_window(self, now):
+        return math.floor(now / self.window) * self.window
+
+    def used(self, bucket):
+        """Weight used in the current minute, as last reported by Binance"""
+        with self._lock:
+            if self._window_start[bucket] != self._current_window(time.time()):
+                return 0
+            return self._used[bucket]
+
+    def record(self, response, *args, **kwargs):
+        """Response hook: store the reported weight and honour Retry-After on 418/429"""
+        now = time.time()
+        bucket = bucket_for(response.url)
+        value = response.headers.get(WEIGHT_HEADERS[bucket])
+        with self._lock:
+            self.requests += 1
+            if value is not None:
+                try:
+                    self._used[bucket] = int(value)
+                    self._window_start[bucket] = self._current_window(now)
+                except ValueError:
+                    pass
+            if response.status_code in (418, 429):
+                wait = retry_after(response)
+                self.blocked_until = max(self.blocked_until, now + wait)
+                if response.status_code == 418:
+                    self.banned += 1
+                    logger.error(f"Binance banned this IP for {wait}s (HTTP 418)")
+                else:
+                    self.rate_limited += 1
+                    logger.warning(f"Binance rate limit hit, pausing requests for {wait}s (HTTP 429)")
+
+    def delay(self, bucket, priority=HIGH_PRIORITY, cost=1):
+        """Seconds to wait before a call of the given priority may be sent"""
+        now = time.time()
+        with self._lock:
+            if now < self.blocked_until:
+                return self.blocked_until - now
+            window = self._current_window(now)
+            used = self._used[bucket] if self._window_start[bucket] == window else 0
+            limit = self.limits[bucket]
+            if priority == LOW_PRIORITY:
+                limit = limit * (1 - self.reserve)
+            if used + cost > limit:
+                return window + self.window - now
+            return 0.0
+
+    def acquire(self, bucket, priority=HIGH_PRIORITY, cost=1):
+        """
+        Wait until a call may be sent.
+        Raises WeightBudgetExceeded instead of waiting longer than max_wait.
+        """
+        wait = self.delay(bucket, priority, cost)
+        if wait <= 0:
+            return
+        if wait > self.max_wait:
+            raise WeightBudgetExceeded(bucket, wait)
+        logger.info(f"Delaying {priority}-priority Binance call {wait:.1f}s to stay within the {bucket} weight budget")
+        with self._lock:
+            self.delays += 1
+            self.delayed_seconds += wait
+        time.sleep(wait)
+
+    def attach(self, session, pool_size=4):
+        """Pool keep-alive connections on the client's session and record every response"""
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.hooks['response'].append(self.record)
+        return session
+
+    def metrics(self):
+        """Return weight usage and throttling counters"""
+        blocked = max(0.0, self.blocked_until - time.time())
+        metrics = {
+            "requests": self.requests,
+            "delays": self.delays,
+            "delayed_seconds": round(self.delayed_seconds, 1),
+            "rate_limited": self.rate_limited,
+            "banned": self.banned,
+            "blocked_seconds": round(blocked, 1),
+        }
+        for bucket, limit in self.limits.items():
+            metrics[f"{bucket}_used_weight"] = self.used(bucket)
+            metrics[f"{bucket}_weight_limit"] = limit
+        return metrics
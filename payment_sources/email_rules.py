@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Declarative parsing of payment notification emails.
+
+Bank email formats are described in a YAML rule pack (email_rules.yaml by
+default). All patterns are compiled once when the pack is loaded, and the
+keywords of every rule are folded into a single case-insensitive alternation
+so an email that cannot be a payment alert is rejected in one pass over its
+text. Matching emails are turned into PaymentRecord objects.
+"""
+
+import logging
+import os
+import re
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+import yaml
+
+logger = logging.getLogger("GitHubSponsorsBot.EmailRules")
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'email_rules.yaml')
+
+FIELDS = ('amount', 'counterparty', 'reference', 'timestamp')
+
+
+class PaymentRecord:
+    """A payment extracted from an email"""
+
+    __slots__ = ('rule', 'type', 'amount', 'currency', 'counterparty', 'reference', 'timestamp', 'description')
+
+    def __init__(self, rule, type, amount, currency, counterparty=None, reference=None, timestamp=None,
+                 description=None):
+        self.rule = rule
+        self.type = type
+        self.amount = amount
+        self.currency = currency
+        self.counterparty = counterparty
+        self.reference = reference
+        self.timestamp = timestamp
+        self.description = description
+
+    def to_dict(self):
+        """Return the dictionary format used by ImapAlerts.format_email_payment_message"""
+        timestamp = self.timestamp or datetime.now()
+        return {
+            "type": self.type,
+            "amount": str(self.amount),
+            "currency": self.currency,
+            "description": self.description or self.counterparty or "N/A",
+            "transaction_id": self.reference or "N/A",
+            "timestamp": timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+
+    def __repr__(self):
+        return f"PaymentRecord({self.rule}, {self.amount} {self.currency}, {self.counterparty!r}, {self.reference!r})"
+
+
+class Rule:
+    """One compiled email format"""
+
+    def __init__(self, spec):
+        """Compile a rule from its YAML mapping; raises ValueError for invalid rules"""
+        self.name = spec.get('name') or 'unnamed'
+        self.type = spec.get('type', 'Payment')
+        self.currency = spec.get('currency', '')
+        self.description = spec.get('description')
+        self.senders = [s.lower() for s in spec.get('senders') or []]
+        sender_env = spec.get('sender_env')
+        if sender_env and os.getenv(sender_env):
+            self.senders.append(os.getenv(sender_env).lower())
+        # A rule tied to a sender variable stays off until the variable is set
+        self.active = bool(self.senders) or not sender_env
+        self.keywords = [k.lower() for k in spec.get('keywords') or []]
+        self.subject = _compile(spec.get('subject'), self.name)
+        self.fields = {}
+        for field, pattern in (spec.get('fields') or {}).items():
+            if field not in FIELDS:
+                raise ValueError(f"rule {self.name}: unknown field {field}")
+            self.fields[field] = _compile(pattern, self.name)
+        self.require = list(spec.get('require') or ['amount'])
+        self.timestamp_formats = list(spec.get('timestamp_formats') or [])
+
+    def matches_sender(self, from_lower):
+        """Return True if the lowercased From header belongs to this rule's senders"""
+        return not self.senders or any(sender in from_lower for sender in self.senders)
+
+    def matches_headers(self, subject, from_lower):
+        """Cheap check on the sender and subject"""
+        if not self.matches_sender(from_lower):
+            return False
+        return self.subject is None or self.subject.search(subject or '') is not None
+
+    def extract(self, subject, body, found_keywords):
+        """Return a PaymentRecord if the email body matches this rule, else None"""
+        if self.keywords and not any(k in found_keywords for k in self.keywords):
+            return None
+        values = {}
+        for field, pattern in self.fields.items():
+            match = pattern.search(body) or pattern.search(subject)
+            if match:
+                values[field] = match.group(1).strip()
+        if any(field not in values for field in self.require):
+            return None
+
+        amount = _parse_amount(values.get('amount'))
+        if amount is None and 'amount' in self.require:
+            return None
+        timestamp = self._parse_timestamp(values.get('timestamp'))
+        description = None
+        if self.description:
+            description = self.description.format(
+                counterparty=values.get('counterparty') or 'N/A',
+                reference=values.get('reference') or 'N/A'
+            )
+        return PaymentRecord(
+            self.name, self.type, amount, self.currency,
+            counterparty=values.get('counterparty'),
+            reference=values.get('reference'),
+            timestamp=timestamp,
+            description=description
+        )
+
+    def _parse_timestamp(self, value):
+        """Parse a captured timestamp with the rule's formats"""
+        if not value:
+            return None
+        for fmt in self.timestamp_formats:
+            try:
+                return datetime.strptime(value, fmt)
+            except ValueError:
+                continue
+        return None
+
+
+class RuleSet:
+    """A loaded rule pack with a shared keyword prefilter"""
+
+    def __init__(self, rules):
+        """Initialize with compiled rules; inactive rules are dropped"""
+        self.rules = [rule for rule in rules if rule.active]
+        keywords = sorted({k for rule in self.rules for k in rule.keywords}, key=len, reverse=True)
+        self.keyword_filter = re.compile('|'.join(map(re.escape, keywords)), re.IGNORECASE) if keywords else None
+        # A match on a long keyword also counts for the keywords it contains ("upi ref" -> "upi")
+        self._implied = {k: {other for other in keywords if other in k} for k in keywords}
+        self._always = any(not rule.keywords for rule in self.rules)
+
+    @classmethod
+    def load(cls, path=DEFAULT_RULES_PATH):
+        """Load and compile a YAML rule pack"""
+        with open(path, encoding='utf-8') as f:
+            spec = yaml.safe_load(f) or {}
+        rules = [Rule(item) for item in spec.get('rules') or []]
+        ruleset = cls(rules)
+        skipped = [rule.name for rule in rules if not rule.active]
+        logger.info(
+            f"Loaded {len(ruleset.rules)} email parsing rules from {path}"
+            + (f" ({', '.join(skipped)} inactive: sender not configured)" if skipped else "")
+        )
+        return ruleset
+
+    def senders(self):
+        """
+        Return the sender addresses that can produce a match, or an empty list
+        if some rule accepts any sender.
+        """
+        senders = []
+        for rule in self.rules:
+            if not rule.senders:
+                return []
+            senders.extend(s for s in rule.senders if s not in senders)
+        return senders
+
+    def matches_headers(self, subject, from_address):
+        """Return True if any rule could match an email with these headers"""
+        from_lower = (from_address or '').lower()
+        return any(rule.matches_headers(subject, from_lower) for rule in self.rules)
+
+    def parse(self, subject, from_address, body):
+        """Return the PaymentRecord of the first matching rule, or None"""
+        subject = subject or ''
+        from_lower = (from_address or '').lower()
+        candidates = [rule for rule in self.rules if rule.matches_headers(subject, from_lower)]
+        if not candidates:
+            return None
+
+        body = body or ''
+        found = set()
+        if self.keyword_filter is not None:
+            for match in set(self.keyword_filter.findall(subject + '\n' + body)):
+                found |= self._implied[match.lower()]
+        if not found and not self._always:
+            return None
+
+        for rule in candidates:
+            record = rule.extract(subject, body, found)
+            if record is not None:
+                return record
+        return None
+
+
+def _compile(pattern, rule_name):
+    """Compile a case-insensitive pattern, reporting which rule it belongs to"""
+    if not pattern:
+        return None
+    try:
+        return re.compile(pattern, re.IGNORECASE)
+    except re.error as e:
+        raise ValueError(f"rule {rule_name}: invalid pattern {pattern!r}: {e}")
+
+
+def _parse_amount(value):
+    """Convert a captured amount such as '1,234.50' to a Decimal"""
+    if not value:
+        return None
+    try:
+        return Decimal(value.replace(',', ''))
+    except InvalidOperation:
+        return None
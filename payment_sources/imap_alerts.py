@@ -11,9 +11,14 @@ This module will connect to an IMAP server to:
 import os
 import logging
 import imaplib
-import email
-from email.header import decode_header
-from datetime import datetime
+from email.parser import BytesHeaderParser
+
+from observability.profiling import profiled
+from payment_sources.email_rules import DEFAULT_RULES_PATH, RuleSet
+from payment_sources.imap_fetch import (
+    decode_part, fetch_item, find_text_part, parse_fetch_response, sender_criteria, uid_set
+)
+from payment_sources.mime_extract import EMAIL_MAX_BODY_BYTES, decode_mime_header, extract_email
 
 logger = logging.getLogger("GitHubSponsorsBot.ImapAlerts")
 
@@ -23,19 +28,44 @@ IMAP_PORT = os.getenv('IMAP_PORT', 993) # Default to 993 for IMAP SSL
 IMAP_USER = os.getenv('IMAP_USER')
 IMAP_PASSWORD = os.getenv('IMAP_PASSWORD')
 IMAP_MAILBOX = os.getenv('IMAP_MAILBOX', 'INBOX')
-# Optional: Define specific sender emails or subjects to filter for UPI/HDFC
-UPI_EMAIL_SENDER_FILTER = os.getenv('UPI_EMAIL_SENDER_FILTER')
-HDFC_EMAIL_SENDER_FILTER = os.getenv('HDFC_EMAIL_SENDER_FILTER')
+# Rule pack describing the bank email formats; UPI_EMAIL_SENDER_FILTER and
+# HDFC_EMAIL_SENDER_FILTER are read by the rules that reference them
+EMAIL_RULES_PATH = os.getenv('EMAIL_RULES_PATH', DEFAULT_RULES_PATH)
+# Number of messages requested per UID FETCH command
+IMAP_FETCH_BATCH = int(os.getenv('IMAP_FETCH_BATCH', 200))
+# Bytes downloaded for a candidate whose text/plain part cannot be located from BODYSTRUCTURE
+IMAP_PARTIAL_FETCH_BYTES = int(os.getenv('IMAP_PARTIAL_FETCH_BYTES', 65536))
+
+# Headers fetched for every new message; bodies are only fetched for candidates
+HEADER_FIELDS = 'BODY.PEEK[HEADER.FIELDS (FROM SUBJECT DATE)]'
+# A message whose handler keeps failing is skipped after this many attempts
+MAX_MESSAGE_ATTEMPTS = 3
+
 
 class ImapAlerts:
-    def __init__(self, telegram_bot):
-        self.telegram_bot = telegram_bot
+    def __init__(self, notifier, state=None, rules=None):
+        self.notifier = notifier
+        self.state = state
+        self.rules = rules
+        self.uidvalidity = None
+        self._cursor = None
+        # UID -> failed attempts of messages below the cursor that are still to be retried
+        self._retry = {}
+        self.bytes_fetched = 0
+        self.alerts_sent = 0
         self.enabled = False
         if not all([IMAP_HOST, IMAP_USER, IMAP_PASSWORD]):
             logger.error("IMAP configuration (HOST, USER, PASSWORD) incomplete. IMAP alerts will be disabled.")
         else:
             self.enabled = True
             logger.info(f"IMAP Alerts initialized for user {IMAP_USER} on host {IMAP_HOST}")
+        if self.rules is None:
+            try:
+                self.rules = RuleSet.load(EMAIL_RULES_PATH)
+            except Exception as e:
+                logger.error(f"Failed to load email parsing rules from {EMAIL_RULES_PATH}: {e}. IMAP alerts will be disabled.")
+                self.rules = RuleSet([])
+                self.enabled = False
 
     def _connect(self):
         """Connects to the IMAP server."""
@@ -46,138 +76,245 @@ class ImapAlerts:
                 mail = imaplib.IMAP4(IMAP_HOST, int(IMAP_PORT))
             mail.login(IMAP_USER, IMAP_PASSWORD)
             mail.select(IMAP_MAILBOX)
+            # UIDs are only meaningful together with the mailbox's UIDVALIDITY
+            _, data = mail.response('UIDVALIDITY')
+            self.uidvalidity = int(data[0]) if data and data[0] else None
             logger.info(f"Successfully connected to IMAP server and selected mailbox '{IMAP_MAILBOX}'.")
             return mail
         except Exception as e:
             logger.error(f"Failed to connect to IMAP server: {e}")
             return None
 
+    @profiled('imap')
     def check_for_new_emails(self):
         """
         Checks for new emails, parses them, and sends alerts.
+        Returns the number of alerts sent, or False if the mailbox could not be checked.
         """
         if not self.enabled:
-            return
+            return 0
 
         logger.info("Checking for new emails via IMAP...")
         mail = self._connect()
         if not mail:
-            return
+            return False
 
+        sent_before = self.alerts_sent
         try:
-            # Search for unseen emails. Add more criteria if needed (e.g., SENDER, SUBJECT)
-            status, messages = mail.search(None, 'UNSEEN')
-            if status != 'OK':
-                logger.error("Failed to search for emails.")
-                return
-
-            email_ids = messages[0].split()
-            logger.info(f"Found {len(email_ids)} unseen emails.")
-
-            for email_id in email_ids:
-                status, msg_data = mail.fetch(email_id, '(RFC822)')
-                if status == 'OK':
-                    for response_part in msg_data:
-                        if isinstance(response_part, tuple):
-                            msg = email.message_from_bytes(response_part[1])
-                            
-                            # Decode email subject
-                            subject, encoding = decode_header(msg["Subject"])[0]
-                            if isinstance(subject, bytes):
-                                subject = subject.decode(encoding if encoding else "utf-8")
-                            
-                            # Decode sender
-                            from_ = msg.get("From")
-                            logger.info(f"Processing email from: {from_}, subject: {subject}")
-
-                            # Get email body
-                            body = ""
-                            if msg.is_multipart():
-                                for part in msg.walk():
-                                    content_type = part.get_content_type()
-                                    content_disposition = str(part.get("Content-Disposition"))
-                                    try:
-                                        if content_type == "text/plain" and "attachment" not in content_disposition:
-                                            body = part.get_payload(decode=True).decode()
-                                            break
-                                    except Exception as e:
-                                        logger.warning(f"Could not decode part of email: {e}")
-                            else:
-                                try:
-                                    body = msg.get_payload(decode=True).decode()
-                                except Exception as e:
-                                    logger.warning(f"Could not decode email body: {e}")
-                            
-                            # TODO: Implement parsing logic for UPI and HDFC notifications
-                            # This will be complex and require specific rules based on email formats.
-                            payment_details = self.parse_payment_email(subject, from_, body)
-
-                            if payment_details:
-                                alert_message = self.format_email_payment_message(payment_details)
-                                self.telegram_bot.send_message(alert_message)
-                                logger.info(f"Sent alert for payment: {payment_details.get('type')}")
-                                # Optionally, mark email as read or move it
-                                # mail.store(email_id, '+FLAGS', '\\Seen')
-                            else:
-                                logger.info(f"Email from {from_} with subject '{subject}' did not match payment patterns.")
-                else:
-                    logger.error(f"Failed to fetch email ID {email_id}")
+            self.process_mailbox(mail)
         except Exception as e:
             logger.error(f"Error during email processing: {e}")
+            return False
         finally:
             if mail:
                 mail.close()
                 mail.logout()
                 logger.info("IMAP connection closed.")
         logger.info("Finished checking IMAP emails.")
+        return self.alerts_sent - sent_before
+
+    def _state_key(self):
+        """Key under which the sync cursor for this mailbox is stored"""
+        return f"imap:{IMAP_USER}@{IMAP_HOST}/{IMAP_MAILBOX}"
+
+    def _load_cursor(self):
+        """Return the persisted {'uidvalidity', 'last_uid', 'retry'} cursor, or None"""
+        if self._cursor is None and self.state is not None:
+            self._cursor = self.state.get(self._state_key())
+        return self._cursor
+
+    def _save_cursor(self, last_uid):
+        """Remember the highest processed UID for the current UIDVALIDITY and the UIDs to retry"""
+        self._cursor = {"uidvalidity": self.uidvalidity, "last_uid": last_uid}
+        if self._retry:
+            self._cursor["retry"] = {str(uid): attempts for uid, attempts in self._retry.items()}
+        if self.state is not None:
+            self.state.set(self._state_key(), self._cursor)
+
+    def process_mailbox(self, mail):
+        """
+        Processes messages that arrived since the last run in the selected mailbox of an
+        open connection. Used by both the polling path and the long-lived IDLE connection.
+
+        Messages are tracked by UID above a persisted high-water mark rather than by the
+        \\Seen flag. Without a cursor (first run, or the server reset UIDVALIDITY) the
+        unseen messages are processed and the cursor starts at the newest UID.
+        The search is narrowed to the configured senders on the server.
+
+        The cursor moves past messages whose handler failed; their UIDs are kept in
+        the cursor and fetched again on the next runs, up to MAX_MESSAGE_ATTEMPTS.
+        """
+        cursor = self._load_cursor()
+        incremental = bool(cursor) and cursor.get("uidvalidity") == self.uidvalidity
+        senders = sender_criteria(self.rules.senders())
+        if incremental:
+            last_uid = cursor["last_uid"]
+            self._retry = {int(uid): attempts for uid, attempts in cursor.get("retry", {}).items()}
+            if self._retry:
+                retry = sorted(self._retry)
+                logger.info(f"Retrying {len(retry)} emails that failed before.")
+                for start in range(0, len(retry), IMAP_FETCH_BATCH):
+                    if not self._process_batch(mail, retry[start:start + IMAP_FETCH_BATCH]):
+                        return
+                    self._save_cursor(last_uid)
+            status, messages = mail.uid('SEARCH', None, 'UID', f'{last_uid + 1}:*', *senders)
+        else:
+            if cursor:
+                logger.warning(
+                    f"UIDVALIDITY of '{IMAP_MAILBOX}' changed from {cursor.get('uidvalidity')} "
+                    f"to {self.uidvalidity}, resynchronising from unseen messages."
+                )
+            self._retry = {}
+            last_uid = self._newest_uid(mail)
+            status, messages = mail.uid('SEARCH', None, 'UNSEEN', *senders)
+        if status != 'OK':
+            logger.error("Failed to search for emails.")
+            return
+
+        uids = sorted(map(int, messages[0].split()))
+        if incremental:
+            # "n:*" always matches the newest message, even when its UID is below n
+            uids = [uid for uid in uids if uid > last_uid]
+        logger.info(f"Found {len(uids)} new emails.")
+
+        for start in range(0, len(uids), IMAP_FETCH_BATCH):
+            batch = uids[start:start + IMAP_FETCH_BATCH]
+            if not self._process_batch(mail, batch):
+                return
+            last_uid = max(last_uid, batch[-1])
+            self._save_cursor(last_uid)
+
+        if not incremental and not uids:
+            self._save_cursor(last_uid)
+
+    def _newest_uid(self, mail):
+        """Return the highest UID in the selected mailbox, or 0 if it is empty"""
+        status, messages = mail.uid('SEARCH', None, 'UID', '*')
+        if status != 'OK' or not messages or not messages[0]:
+            return 0
+        return max(map(int, messages[0].split()))
+
+    def _fetch(self, mail, uids, items):
+        """Run one UID FETCH and return the parsed per-message dictionaries, or None on failure"""
+        status, data = mail.uid('FETCH', uid_set(uids), items)
+        if status != 'OK':
+            logger.error(f"Failed to fetch {items} for UIDs {uid_set(uids)}")
+            return None
+        for part in data:
+            if isinstance(part, tuple):
+                self.bytes_fetched += len(part[1])
+        return parse_fetch_response(data)
+
+    def _process_batch(self, mail, uids):
+        """
+        Fetches headers and structure for a batch of messages, then downloads only the
+        text/plain part of those whose headers look like payment notifications.
+        Returns False if the server refused a fetch.
+        """
+        headers = self._fetch(mail, uids, f'(UID BODYSTRUCTURE {HEADER_FIELDS})')
+        if headers is None:
+            return False
+
+        # A message awaiting a retry that has since been deleted is not retried
+        for uid in set(uids) - {int(message.get('UID', 0)) for message in headers}:
+            self._retry.pop(uid, None)
+
+        by_section = {}
+        partial = []
+        for message in headers:
+            uid = int(message.get('UID', 0))
+            fields = BytesHeaderParser().parsebytes(fetch_item(message, 'BODY[HEADER') or b'')
+            subject = decode_mime_header(fields.get('Subject'))
+            from_ = decode_mime_header(fields.get('From'))
+            if not self.matches_headers(subject, from_):
+                logger.debug(f"Skipping email from {from_} with subject '{subject}' without downloading it.")
+                continue
+            part = find_text_part(message.get('BODYSTRUCTURE'))
+            if part is None:
+                partial.append((uid, subject, from_))
+            else:
+                section, encoding, charset = part
+                by_section.setdefault(section, []).append((uid, subject, from_, encoding, charset))
+
+        for section, candidates in by_section.items():
+            bodies = self._fetch(mail, [c[0] for c in candidates], f'(UID BODY.PEEK[{section}]<0.{EMAIL_MAX_BODY_BYTES}>)')
+            if bodies is None:
+                return False
+            bodies = {int(m.get('UID', 0)): fetch_item(m, f'BODY[{section}]') for m in bodies}
+            for uid, subject, from_, encoding, charset in candidates:
+                body = decode_part(bodies.get(uid) or b'', encoding, charset)
+                self._handle_safely(uid, self.handle_email, subject, from_, body)
+
+        if partial:
+            # No usable BODYSTRUCTURE: fall back to the start of the raw message
+            raws = self._fetch(mail, [c[0] for c in partial], f'(UID BODY.PEEK[]<0.{IMAP_PARTIAL_FETCH_BYTES}>)')
+            if raws is None:
+                return False
+            for message in raws:
+                self._handle_safely(int(message.get('UID', 0)), self.handle_message, fetch_item(message, 'BODY[]') or b'')
+        return True
+
+    def _handle_safely(self, uid, handler, *args):
+        """
+        Runs a message handler, logging instead of aborting the batch on errors.
+        A failed message is added to the retry set; one that keeps failing is given up on.
+        """
+        try:
+            handler(*args)
+        except Exception as e:
+            attempts = self._retry.get(uid, 0) + 1
+            if attempts >= MAX_MESSAGE_ATTEMPTS:
+                self._retry.pop(uid, None)
+                logger.error(f"Failed to process email UID {uid} after {attempts} attempts, skipping it: {e}")
+            else:
+                self._retry[uid] = attempts
+                logger.error(f"Failed to process email UID {uid} (attempt {attempts}), it will be retried: {e}")
+            return
+        self._retry.pop(uid, None)
+
+    def matches_headers(self, subject, from_address):
+        """
+        Cheap check on the headers of an email; only matching emails have their body
+        downloaded and passed to parse_payment_email.
+        """
+        return self.rules.matches_headers(subject, from_address)
+
+    def handle_message(self, raw):
+        """Parses one raw RFC 822 message and sends an alert if it is a payment notification"""
+        extracted = extract_email(raw)
+        self.handle_email(extracted.subject, extracted.from_, extracted.body)
+
+    def handle_email(self, subject, from_, body):
+        """Sends an alert if the email is a payment notification"""
+        logger.info(f"Processing email from: {from_}, subject: {subject}")
+        payment_details = self.parse_payment_email(subject, from_, body)
+
+        if payment_details:
+            alert_message = self.format_email_payment_message(payment_details)
+            queued = self.notifier.send_message(
+                alert_message,
+                source="email",
+                amount=payment_details.get("amount"),
+                currency=payment_details.get("currency"),
+                summary=f"{payment_details.get('type', 'Payment')}: {payment_details.get('description', 'N/A')}"
+            )
+            if not queued:
+                raise RuntimeError("the alert could not be queued")
+            self.alerts_sent += 1
+            logger.info(f"Sent alert for payment: {payment_details.get('type')}")
+        else:
+            logger.info(f"Email from {from_} with subject '{subject}' did not match payment patterns.")
 
     def parse_payment_email(self, subject, from_address, body):
         """
-        Parses email content to extract payment details.
-        This needs to be highly customized based on the exact format of UPI/HDFC emails.
+        Parses email content to extract payment details using the loaded rule pack.
         Returns a dictionary with extracted details or None.
         """
-        # Placeholder - very basic example
-        # You'll need robust regex or string searching here.
-        
-        # Example for HDFC Credit Card Transaction (highly hypothetical)
-        if HDFC_EMAIL_SENDER_FILTER and HDFC_EMAIL_SENDER_FILTER.lower() in from_address.lower():
-            if "transaction alert" in subject.lower() and "hdfc bank credit card" in body.lower():
-                # Regex to find amount, merchant, etc.
-                # amount_match = re.search(r"Rs\.([\d,]+\.\d{2})", body)
-                # merchant_match = re.search(r"at ([\w\s]+) on", body)
-                # if amount_match and merchant_match:
-                #     return {
-                #         "type": "HDFC Credit Card",
-                #         "amount": amount_match.group(1),
-                #         "currency": "INR",
-                #         "description": merchant_match.group(1).strip(),
-                #         "transaction_id": "N/A (extract if available)",
-                #         "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S') # Extract from email if possible
-                #     }
-                logger.info("Potential HDFC email found, parsing logic to be implemented.")
-                pass # Added pass to fix indentation
-
-
-        # Example for UPI Transaction (highly hypothetical)
-        if UPI_EMAIL_SENDER_FILTER and UPI_EMAIL_SENDER_FILTER.lower() in from_address.lower():
-            if "payment received" in subject.lower() and "upi" in body.lower():
-                # Regex to find amount, sender, UPI ID etc.
-                # amount_match = re.search(r"amount of INR ([\d,]+\.\d{2})", body)
-                # sender_match = re.search(r"from ([\w\s@\.]+)", body) # Could be name or VPA
-                # if amount_match and sender_match:
-                #     return {
-                #         "type": "UPI",
-                #         "amount": amount_match.group(1),
-                #         "currency": "INR",
-                #         "description": f"Payment from {sender_match.group(1).strip()}",
-                #         "transaction_id": "N/A (extract if available)",
-                #         "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S') # Extract from email if possible
-                #     }
-                logger.info("Potential UPI email found, parsing logic to be implemented.")
-                pass # Added pass to fix indentation
-        
-        return None # No relevant payment found or parsing failed
+        record = self.rules.parse(subject, from_address, body)
+        if record is None:
+            return None
+        logger.info(f"Email matched parsing rule {record.rule}")
+        return record.to_dict()
 
     def format_email_payment_message(self, details):
         """
@@ -202,8 +339,9 @@ class ImapAlerts:
 if __name__ == '__main__':
     # This section is for testing the module independently
     class MockTelegramBot:
-        def send_message(self, message):
+        def send_message(self, message, **kwargs):
             print(f"MockTelegramBot sending: {message}")
+            return True
 
     # Ensure environment variables are set for testing
     # from dotenv import load_dotenv
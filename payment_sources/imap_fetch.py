@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Helpers for economical IMAP fetching.
+
+imaplib leaves FETCH responses as raw bytes, so this module parses them
+(including literals and BODYSTRUCTURE) into dictionaries. That lets the
+alerter download only the headers of every message and then only the
+text/plain part of the few that look like payment notifications.
+"""
+
+import base64
+import binascii
+import quopri
+
+_OPEN = object()
+_CLOSE = object()
+
+
+class _Literal(bytes):
+    """Marks literal data so it is not decoded like an atom"""
+
+
+def uid_set(uids):
+    """Compress sorted UIDs into an IMAP sequence set, e.g. [1, 2, 3, 7] -> '1:3,7'"""
+    ranges = []
+    start = prev = uids[0]
+    for uid in uids[1:]:
+        if uid != prev + 1:
+            ranges.append(f"{start}:{prev}" if start != prev else str(start))
+            start = uid
+        prev = uid
+    ranges.append(f"{start}:{prev}" if start != prev else str(start))
+    return ','.join(ranges)
+
+
+def quote(value):
+    """Quote a string for use as an IMAP SEARCH argument"""
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def sender_criteria(senders):
+    """Build SEARCH criteria matching mail from any of the given senders, e.g. OR FROM a FROM b"""
+    senders = [sender for sender in senders if sender]
+    if not senders:
+        return []
+    criteria = ['FROM', quote(senders[-1])]
+    for sender in reversed(senders[:-1]):
+        criteria = ['OR', 'FROM', quote(sender)] + criteria
+    return criteria
+
+
+def _tokenize(text, tokens):
+    """Split response text into parentheses, atoms, quoted strings and NIL"""
+    i, n = 0, len(text)
+    while i < n:
+        c = text[i:i + 1]
+        if c == b' ':
+            i += 1
+        elif c == b'(':
+            tokens.append(_OPEN)
+            i += 1
+        elif c == b')':
+            tokens.append(_CLOSE)
+            i += 1
+        elif c == b'"':
+            i += 1
+            value = bytearray()
+            while i < n and text[i:i + 1] != b'"':
+                if text[i:i + 1] == b'\\':
+                    i += 1
+                value += text[i:i + 1]
+                i += 1
+            tokens.append(bytes(value))
+            i += 1
+        else:
+            start = i
+            depth = 0
+            # Section specs such as BODY[HEADER.FIELDS (FROM SUBJECT)] contain spaces and parentheses
+            while i < n and (depth or text[i:i + 1] not in (b' ', b'(', b')')):
+                if text[i:i + 1] == b'[':
+                    depth += 1
+                elif text[i:i + 1] == b']':
+                    depth -= 1
+                i += 1
+            atom = text[start:i]
+            tokens.append(None if atom.upper() == b'NIL' else atom)
+
+
+def _parse_list(tokens, pos):
+    """Parse tokens from just after an opening parenthesis; return (list, next position)"""
+    items = []
+    while pos < len(tokens):
+        token = tokens[pos]
+        if token is _CLOSE:
+            return items, pos + 1
+        if token is _OPEN:
+            value, pos = _parse_list(tokens, pos + 1)
+            items.append(value)
+        else:
+            items.append(token)
+            pos += 1
+    return items, pos
+
+
+def parse_fetch_response(data):
+    """
+    Parse the data returned by mail.uid('FETCH', ...) into one dictionary per
+    message, keyed by upper-case item name (e.g. 'UID', 'BODYSTRUCTURE',
+    'BODY[1]'). Literals are returned as bytes, atoms and strings as str,
+    lists as lists and NIL as None.
+    """
+    tokens = []
+    for item in data:
+        if isinstance(item, tuple):
+            text, literal = item
+            marker = text.rfind(b'{')
+            _tokenize(text[:marker] if marker >= 0 and text.endswith(b'}') else text, tokens)
+            tokens.append(_Literal(literal))
+        elif item:
+            _tokenize(item, tokens)
+
+    messages = []
+    pos = 0
+    while pos < len(tokens):
+        if tokens[pos] is not _OPEN:
+            pos += 1
+            continue
+        items, pos = _parse_list(tokens, pos + 1)
+        message = {}
+        for key, value in zip(items[0::2], items[1::2]):
+            message[key.decode('ascii', 'replace').upper()] = _to_str(value)
+        messages.append(message)
+    return messages
+
+
+def _to_str(value):
+    """Decode atoms and strings in a parsed structure, leaving literals as bytes"""
+    if isinstance(value, list):
+        return [_to_str(v) for v in value]
+    if isinstance(value, _Literal):
+        return bytes(value)
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'replace')
+    return value
+
+
+def fetch_item(message, prefix):
+    """Return the first item whose name starts with prefix (servers vary in spacing and case)"""
+    for key, value in message.items():
+        if key.startswith(prefix):
+            return value
+    return None
+
+
+def find_text_part(structure, section=''):
+    """
+    Return (section, transfer encoding, charset) of the first inline
+    text/plain part in a parsed BODYSTRUCTURE, or None.
+    """
+    if not structure:
+        return None
+    if isinstance(structure[0], list):
+        # Multipart: child parts come first, followed by the subtype
+        for index, child in enumerate(structure, 1):
+            if not isinstance(child, list):
+                break
+            found = find_text_part(child, f"{section}{index}.")
+            if found:
+                return found
+        return None
+
+    media_type = (structure[0] or '').lower()
+    subtype = (structure[1] or '').lower() if len(structure) > 1 else ''
+    if media_type != 'text' or subtype != 'plain' or len(structure) < 7:
+        return None
+    disposition = structure[9] if len(structure) > 9 else None
+    if isinstance(disposition, list) and disposition and str(disposition[0]).lower() == 'attachment':
+        return None
+    params = structure[2] if isinstance(structure[2], list) else []
+    charset = None
+    for key, value in zip(params[0::2], params[1::2]):
+        if str(key).lower() == 'charset':
+            charset = value
+    return section.rstrip('.') or '1', (structure[5] or '7bit').lower(), charset
+
+
+def decode_part(data, encoding, charset):
+    """Undo the transfer encoding of a fetched part and decode it to text"""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    if encoding == 'base64':
+        # A partial fetch may end mid-quantum; decode the complete part
+        data = b''.join(data.split())
+        try:
+            data = base64.b64decode(data[:len(data) - len(data) % 4])
+        except (binascii.Error, ValueError):
+            pass
+    elif encoding == 'quoted-printable':
+        data = quopri.decodestring(data)
+    try:
+        return data.decode(charset or 'utf-8', 'replace')
+    except LookupError:
+        return data.decode('utf-8', 'replace')
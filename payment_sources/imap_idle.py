@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Push-style mailbox watching with IMAP IDLE (RFC 2177).
+
+Instead of logging in every poll interval, one connection is kept open per
+mailbox and parked in IDLE; the server announces new mail with an untagged
+EXISTS response and the mailbox is processed within seconds. Servers may drop
+an idle client after 30 minutes, so IDLE is re-issued well before that.
+Broken connections are re-established with exponential backoff. Servers that
+do not advertise IDLE are left to the regular polling loop.
+"""
+
+import logging
+import os
+import select
+import ssl
+import threading
+import time
+
+from notifications.rate_limit import backoff_delay
+from payment_sources.scheduler import record_check
+
+logger = logging.getLogger("GitHubSponsorsBot.ImapIdle")
+
+# Re-issue IDLE after this many seconds (RFC 2177 servers may log out after 30 minutes)
+IMAP_IDLE_TIMEOUT = int(os.getenv('IMAP_IDLE_TIMEOUT', 25 * 60))
+# Upper bound for the delay between reconnect attempts
+IMAP_RECONNECT_MAX_BACKOFF = float(os.getenv('IMAP_RECONNECT_MAX_BACKOFF', 300))
+
+
+class IdleNotSupported(Exception):
+    """Raised when the server does not advertise the IDLE capability"""
+
+
+class ImapIdleWatcher:
+    """Keeps one IMAP connection in IDLE and processes the mailbox whenever it changes"""
+
+    def __init__(self, alerter, idle_timeout=IMAP_IDLE_TIMEOUT, max_backoff=IMAP_RECONNECT_MAX_BACKOFF):
+        """
+        Initialize with an ImapAlerts instance, which provides connections and
+        mailbox processing.
+        """
+        self.alerter = alerter
+        self.idle_timeout = idle_timeout
+        self.max_backoff = max_backoff
+        self._stop = threading.Event()
+        self._attempt = 0
+        self.reconnects = 0
+
+    def stop(self):
+        """Ask the watcher to leave IDLE and return from run()"""
+        self._stop.set()
+
+    def run(self):
+        """
+        Watch the mailbox until stop() is called.
+        Returns False straight away if the server does not support IDLE,
+        so the caller can fall back to polling.
+        """
+        self._attempt = 0
+        while not self._stop.is_set():
+            mail = self.alerter._connect()
+            if mail is None:
+                self._attempt += 1
+                delay = backoff_delay(self._attempt, base=1.0, cap=self.max_backoff)
+                logger.warning(f"IMAP connection failed, retrying in {delay:.1f}s")
+                self._stop.wait(delay)
+                continue
+
+            try:
+                if not supports_idle(mail):
+                    logger.warning("IMAP server does not support IDLE, falling back to polling.")
+                    return False
+                self._watch(mail)
+            except Exception as e:
+                self._attempt += 1
+                self.reconnects += 1
+                delay = backoff_delay(self._attempt, base=1.0, cap=self.max_backoff)
+                logger.warning(f"IMAP IDLE connection lost ({e}), reconnecting in {delay:.1f}s")
+                self._stop.wait(delay)
+            finally:
+                _logout(mail)
+        return True
+
+    def _watch(self, mail):
+        """
+        Process the mailbox, then alternate between IDLE and processing on changes.
+        The reconnect backoff is reset only once a full IDLE cycle has succeeded, so a
+        connection that logs in but breaks straight away keeps backing off.
+        """
+        # Catch up on anything that arrived while we were disconnected
+        self.process(mail)
+        while not self._stop.is_set():
+            if self.idle(mail):
+                self.process(mail)
+            self._attempt = 0
+
+    def process(self, mail):
+        """Process the mailbox and record the check in the metrics"""
+        started = time.monotonic()
+        sent_before = self.alerter.alerts_sent
+        self.alerter.process_mailbox(mail)
+        record_check("imap", time.monotonic() - started, self.alerter.alerts_sent - sent_before)
+
+    def idle(self, mail):
+        """
+        Run one IDLE command on a selected mailbox.
+        Returns True if the server reported new messages, False if the IDLE
+        timed out (or stop() was called) without changes.
+        """
+        tag = mail._new_tag()
+        mail.send(tag + b' IDLE\r\n')
+        line = mail.readline()
+        while line.startswith(b'* '):
+            # Untagged data queued before the continuation request
+            line = mail.readline()
+        if not line.startswith(b'+'):
+            raise mail.error(f"IDLE rejected: {line.strip().decode(errors='replace')}")
+
+        new_mail = False
+        deadline = time.monotonic() + self.idle_timeout
+        while not new_mail and not self._stop.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            # Wake up at least once a second so stop() is noticed promptly
+            if not _wait_readable(mail, min(remaining, 1.0)):
+                continue
+            new_mail = _is_new_mail(_read_line(mail))
+
+        mail.send(b'DONE\r\n')
+        while True:
+            line = _read_line(mail)
+            if line.startswith(tag):
+                break
+            new_mail = _is_new_mail(line) or new_mail
+        if not line[len(tag):].strip().startswith(b'OK'):
+            raise mail.error(f"IDLE failed: {line.strip().decode(errors='replace')}")
+        return new_mail
+
+
+def supports_idle(mail):
+    """Return True if the server advertises the IDLE capability"""
+    return 'IDLE' in getattr(mail, 'capabilities', ())
+
+
+def _is_new_mail(line):
+    """Return True for an untagged EXISTS response, raise on BYE"""
+    parts = line.split()
+    if len(parts) >= 2 and parts[0] == b'*' and parts[1].upper() == b'BYE':
+        raise ConnectionError(f"server closed the connection: {line.strip().decode(errors='replace')}")
+    return len(parts) >= 3 and parts[0] == b'*' and parts[2].upper() == b'EXISTS'
+
+
+def _read_line(mail):
+    """Read one response line, treating EOF as a dropped connection"""
+    line = mail.readline()
+    if not line:
+        raise ConnectionError("IMAP connection closed by server")
+    return line
+
+
+def _buffered(mail):
+    """
+    Return True if response bytes are already waiting in the connection's
+    read buffer or the socket, without blocking.
+    """
+    sock = mail.sock
+    timeout = sock.gettimeout()
+    sock.settimeout(0.0)
+    try:
+        return bool(mail.file.peek(1))
+    except (BlockingIOError, ssl.SSLWantReadError):
+        return False
+    finally:
+        sock.settimeout(timeout)
+
+
+def _wait_readable(mail, timeout):
+    """Wait up to timeout seconds for the server to send something"""
+    if _buffered(mail):
+        return True
+    readable, _, _ = select.select([mail.sock], [], [], timeout)
+    return bool(readable)
+
+
+def _logout(mail):
+    """Log out, ignoring errors on an already broken connection"""
+    try:
+        mail.logout()
+    except Exception:
+        pass
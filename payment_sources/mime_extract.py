@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Streaming, size-bounded extraction of the readable body of an email.
+
+email.message_from_bytes builds the whole message tree and keeps every part,
+so a statement PDF attached to a mail we will reject costs as much memory as
+the PDF itself. The extractor here feeds the raw message to a BytesFeedParser
+in chunks and watches parts as the parser completes them: attachments and
+other non-text parts are dropped without being decoded, parsing stops as soon
+as an inline text/plain part is complete, and no more than a fixed number of
+bytes is ever fed. text/html is used, stripped to text, only when the message
+has no plain-text part.
+"""
+
+import io
+import logging
+import os
+from email.header import decode_header, make_header
+from email.message import Message
+from email.parser import BytesFeedParser
+from html.parser import HTMLParser
+
+logger = logging.getLogger("GitHubSponsorsBot.MimeExtract")
+
+# Maximum number of message bytes parsed, and of body characters returned
+EMAIL_MAX_BODY_BYTES = int(os.getenv('EMAIL_MAX_BODY_BYTES', 256 * 1024))
+CHUNK_SIZE = 16 * 1024
+
+
+class ExtractedEmail:
+    """Headers and readable body of a parsed email"""
+
+    __slots__ = ('subject', 'from_', 'date', 'body', 'content_type', 'bytes_parsed', 'truncated')
+
+    def __init__(self, subject, from_, date, body, content_type, bytes_parsed, truncated):
+        self.subject = subject
+        self.from_ = from_
+        self.date = date
+        self.body = body
+        self.content_type = content_type
+        self.bytes_parsed = bytes_parsed
+        self.truncated = truncated
+
+
+class _TextCollector(HTMLParser):
+    """Collects the visible text of an HTML document"""
+
+    BLOCK_TAGS = {'br', 'p', 'div', 'tr', 'li', 'table', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+    SKIP_TAGS = {'script', 'style', 'head', 'title'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.chunks = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip += 1
+        elif tag in self.BLOCK_TAGS:
+            self.chunks.append('\n')
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag in self.BLOCK_TAGS:
+            self.chunks.append('\n')
+
+    def handle_data(self, data):
+        if not self._skip:
+            self.chunks.append(data)
+
+
+def html_to_text(html):
+    """Strip tags, scripts and styles from HTML and collapse the whitespace"""
+    collector = _TextCollector()
+    collector.feed(html)
+    collector.close()
+    lines = (' '.join(line.split()) for line in ''.join(collector.chunks).splitlines())
+    return '\n'.join(line for line in lines if line)
+
+
+def decode_text_payload(part):
+    """Undo the transfer encoding of a text part and decode it with its declared charset"""
+    data = part.get_payload(decode=True) or b''
+    charset = part.get_content_charset() or 'utf-8'
+    try:
+        return data.decode(charset, 'replace')
+    except LookupError:
+        return data.decode('utf-8', 'replace')
+
+
+def decode_mime_header(value):
+    """Decode an RFC 2047 encoded header into a string"""
+    if not value:
+        return ""
+    try:
+        return str(make_header(decode_header(value)))
+    except Exception:
+        return str(value)
+
+
+class _Extraction:
+    """Parse state shared by the parts created for one message"""
+
+    def __init__(self):
+        self.text = None
+        self.html = None
+
+    def part_class(self):
+        """Return a Message subclass that reports finished parts to this extraction"""
+        extraction = self
+
+        class Part(Message):
+            def set_payload(self, payload, charset=None):
+                # Called by the feed parser once a leaf part is complete
+                if isinstance(payload, str) and not self.is_multipart():
+                    payload = extraction.keep(self, payload)
+                super().set_payload(payload, charset)
+
+        return Part
+
+    def keep(self, part, payload):
+        """Decide whether a finished part is kept; returns the payload to store"""
+        if part.get_content_disposition() == 'attachment' or part.get_content_maintype() != 'text':
+            return ''
+        subtype = part.get_content_subtype()
+        if subtype == 'plain' and self.text is None:
+            Message.set_payload(part, payload)
+            self.text = decode_text_payload(part)
+            return payload
+        if subtype == 'html' and self.html is None:
+            Message.set_payload(part, payload)
+            self.html = decode_text_payload(part)
+            return payload
+        return ''
+
+
+def extract_email(source, max_bytes=EMAIL_MAX_BODY_BYTES, chunk_size=CHUNK_SIZE):
+    """
+    Parse an email from bytes or a binary file object and return an ExtractedEmail.
+    At most max_bytes of the message are read; the body is also capped at max_bytes characters.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    extraction = _Extraction()
+    parser = BytesFeedParser(_factory=extraction.part_class())
+    fed = 0
+    truncated = False
+    while extraction.text is None:
+        chunk = source.read(min(chunk_size, max_bytes - fed))
+        if not chunk:
+            truncated = fed >= max_bytes and bool(source.read(1))
+            break
+        parser.feed(chunk)
+        fed += len(chunk)
+    root = parser.close()
+
+    if extraction.text is not None:
+        body, content_type = extraction.text, 'text/plain'
+    elif extraction.html is not None:
+        body, content_type = html_to_text(extraction.html), 'text/html'
+    else:
+        body, content_type = '', None
+    if len(body) > max_bytes:
+        body = body[:max_bytes]
+        truncated = True
+    if truncated:
+        logger.info(f"Email body truncated after {max_bytes} bytes")
+
+    return ExtractedEmail(
+        decode_mime_header(root.get('Subject')),
+        decode_mime_header(root.get('From')),
+        root.get('Date'),
+        body,
+        content_type,
+        fed,
+        truncated
+    )
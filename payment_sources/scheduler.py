@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+One scheduler for every polled payment source.
+
+Each source is a job with its own interval. Runs are anchored to their
+schedule rather than to the end of the previous run, so slow checks do not
+make the interval drift, and each run is shifted by a random jitter so
+sources (and bots) do not poll in lockstep. A slot that a slow run left less
+than half an interval away is skipped, so runs never follow back to back. A failing job is retried
+quickly and then with exponential backoff. After a run finds new payments
+the job polls at its active interval for a while, since payments tend to
+come in bursts. Jobs can be triggered on demand (the /poll command), and
+per-job run time and scheduling lag are recorded.
+
+A job function returns the number of alerts it sent; False or an exception
+counts as a failure.
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from observability import metrics
+
+logger = logging.getLogger("GitHubSponsorsBot.Scheduler")
+
+# Each run is shifted by up to this fraction of the interval
+POLL_JITTER = float(os.getenv('POLL_JITTER', 0.1))
+# First retry delay after a failure, doubled for every further consecutive failure
+POLL_RETRY_BASE = float(os.getenv('POLL_RETRY_BASE', 15))
+# Upper bound for the retry delay
+POLL_MAX_BACKOFF = float(os.getenv('POLL_MAX_BACKOFF', 1800))
+# Seconds a job keeps its active interval after a run that found payments
+POLL_ACTIVE_PERIOD = float(os.getenv('POLL_ACTIVE_PERIOD', 900))
+# Jobs that may run at the same time
+POLL_WORKERS = int(os.getenv('POLL_WORKERS', 2))
+
+# A slot closer than this fraction of the interval to the end of a run is skipped,
+# so a slow run is never followed straight away by the next one
+MIN_GAP_FRACTION = 0.5
+
+CHECK_SECONDS = metrics.histogram(
+    'sponsors_bot_source_check_seconds', 'Duration of payment source checks', ('source',))
+CHECK_RUNS = metrics.counter(
+    'sponsors_bot_source_checks_total', 'Payment source checks by outcome (ok, failed)', ('source', 'outcome'))
+CHECK_ITEMS = metrics.counter(
+    'sponsors_bot_source_items_found_total', 'Alerts sent by payment source checks', ('source',))
+
+
+def record_check(source, duration, result):
+    """Record one payment source check (polled or pushed) in the metrics"""
+    CHECK_SECONDS.labels(source).observe(duration)
+    CHECK_RUNS.labels(source, 'failed' if result is False else 'ok').inc()
+    if result:
+        CHECK_ITEMS.labels(source).inc(int(result))
+
+
+class PollJob:
+    """A periodically run payment-source check and its statistics"""
+
+    def __init__(self, name, func, interval, active_interval=None, active_period=POLL_ACTIVE_PERIOD,
+                 jitter=POLL_JITTER, retry_base=POLL_RETRY_BASE, max_backoff=POLL_MAX_BACKOFF):
+        """
+        Initialize with a name, the check function and its interval in seconds.
+        active_interval (default: interval) is used for active_period seconds after
+        a run that sent alerts.
+        """
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.active_interval = active_interval or interval
+        self.active_period = active_period
+        self.jitter = jitter
+        self.retry_base = retry_base
+        self.max_backoff = max_backoff
+        self.next_run = 0.0
+        self.running = False
+        self.triggered = False
+        self.failures = 0
+        self.active_until = 0.0
+        self._anchor = 0.0
+        self.runs = 0
+        self.errors = 0
+        self.alerts = 0
+        self.last_result = None
+        self.last_run = None
+        self.last_duration = 0.0
+        self.total_duration = 0.0
+        self.max_duration = 0.0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    def current_interval(self, now):
+        """Interval in effect at the given (monotonic) time"""
+        return self.active_interval if now < self.active_until else self.interval
+
+    def _jittered(self, delay):
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def schedule(self, now):
+        """Plan the first run immediately"""
+        self._anchor = now
+        self.next_run = now
+
+    def record(self, scheduled, started, finished, result):
+        """Update statistics for one run and plan the next one"""
+        failed = result is False
+        duration = finished - started
+        lag = max(0.0, started - scheduled)
+        self.runs += 1
+        self.last_result = result
+        self.last_run = time.time()
+        self.last_duration = duration
+        self.total_duration += duration
+        self.max_duration = max(self.max_duration, duration)
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+        record_check(self.name, duration, result)
+
+        if failed:
+            self.errors += 1
+            self.failures += 1
+            delay = min(self.max_backoff, self.retry_base * 2 ** (self.failures - 1))
+            self._anchor = finished + delay
+            self.next_run = finished + self._jittered(delay)
+            return
+
+        self.failures = 0
+        if result:
+            self.alerts += int(result)
+            self.active_until = finished + self.active_period
+        interval = self.current_interval(finished)
+        # Keep to the schedule; skip slots that a long run has already missed
+        self._anchor += interval
+        if self._anchor <= finished:
+            self._anchor += interval * (int((finished - self._anchor) // interval) + 1)
+        # After a backoff or a switch to a shorter interval, start counting from now
+        self._anchor = min(self._anchor, finished + interval)
+        if self._anchor - finished < interval * MIN_GAP_FRACTION:
+            self._anchor += interval
+        # Jitter the wait from the end of this run, so it can never reach back before it
+        self.next_run = finished + self._jittered(self._anchor - finished)
+
+    def stats(self):
+        """Return run counts, durations and lag in seconds"""
+        return {
+            "runs": self.runs,
+            "errors": self.errors,
+            "consecutive_failures": self.failures,
+            "alerts": self.alerts,
+            "last_result": self.last_result,
+            "last_run": self.last_run,
+            "last_duration": round(self.last_duration, 3),
+            "avg_duration": round(self.total_duration / self.runs, 3) if self.runs else 0.0,
+            "max_duration": round(self.max_duration, 3),
+            "last_lag": round(self.last_lag, 3),
+            "max_lag": round(self.max_lag, 3),
+            "interval": self.current_interval(time.monotonic()),
+            "next_run_in": round(max(0.0, self.next_run - time.monotonic()), 1),
+        }
+
+
+class PollScheduler:
+    """Runs PollJobs on a small worker pool; one run per job at a time"""
+
+    def __init__(self, workers=POLL_WORKERS):
+        self._jobs = {}
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="poll")
+        self._thread = None
+        self._stopped = False
+
+    def add(self, job):
+        """Register a job; its first run starts straight away"""
+        with self._cond:
+            job.schedule(time.monotonic())
+            self._jobs[job.name] = job
+            self._cond.notify_all()
+        logger.info(f"Scheduled {job.name} every {job.interval}s")
+        return job
+
+    def job_names(self):
+        """Names of the registered jobs"""
+        with self._cond:
+            return sorted(self._jobs)
+
+    def trigger(self, name=None):
+        """
+        Run a job (or every job when name is None) as soon as possible.
+        A job that is running now runs again once it finishes.
+        Returns the names of the triggered jobs.
+        """
+        with self._cond:
+            jobs = list(self._jobs.values()) if name is None else [self._jobs[name]] if name in self._jobs else []
+            now = time.monotonic()
+            for job in jobs:
+                if job.running:
+                    job.triggered = True
+                else:
+                    job.next_run = now
+            self._cond.notify_all()
+        return [job.name for job in jobs]
+
+    def start(self):
+        """Start the scheduling thread"""
+        self._thread = threading.Thread(target=self._loop, name="poll-scheduler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        """Stop scheduling new runs; running checks are left to finish"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._executor.shutdown(wait=False)
+
+    def _loop(self):
+        with self._cond:
+            while not self._stopped:
+                now = time.monotonic()
+                waiting = []
+                for job in self._jobs.values():
+                    if job.running:
+                        continue
+                    if job.next_run <= now:
+                        job.running = True
+                        self._executor.submit(self._run, job, job.next_run)
+                    else:
+                        waiting.append(job.next_run)
+                timeout = min(waiting) - now if waiting else None
+                self._cond.wait(timeout)
+
+    def _run(self, job, scheduled):
+        started = time.monotonic()
+        try:
+            result = job.func()
+        except Exception as e:
+            logger.error(f"Error in {job.name} poll: {e}")
+            result = False
+        finished = time.monotonic()
+        with self._cond:
+            job.record(scheduled, started, finished, result)
+            job.running = False
+            if job.triggered:
+                job.triggered = False
+                job.next_run = finished
+            if result is False:
+                logger.warning(f"{job.name} poll failed {job.failures} time(s) in a row, "
+                               f"retrying in {job.next_run - finished:.0f}s",
+                               extra={"source": job.name, "duration_ms": round((finished - started) * 1000, 3)})
+            self._cond.notify_all()
+
+    def stats(self):
+        """Return per-job statistics"""
+        with self._cond:
+            return {name: job.stats() for name, job in self._jobs.items()}
@@ -0,0 +1 @@
+# This file makes the runtime directory a Python package.
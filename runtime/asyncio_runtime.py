@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Single event loop runtime (BOT_RUNTIME=asyncio).
+
+The GitHub webhook and /health are served by aiohttp, and Telegram messages
+are sent with an aiohttp client session, all on one event loop: a thousand
+concurrent webhook connections are a thousand small coroutines, not a
+thousand threads. The handlers themselves wait on SQLite (dedupe, outbox),
+so they run on the loop's bounded default executor and never stall
+Telegram sends or polls. Payment sources sit behind the same PollJob interface as
+in the threaded runtime; a job whose function is a coroutine function runs
+on the loop, while the existing blocking BinanceAlerts/ImapAlerts checks
+run on one small shared executor, so the number of threads is bounded by
+POLL_WORKERS, not by the number of sources.
+
+The notification dispatcher, outbox and coalescing are unchanged; their
+sender threads hand each message to the loop and wait for the result.
+"""
+
+import asyncio
+import inspect
+import logging
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+from aiohttp import web
+
+from notifications.rate_limit import (
+    TELEGRAM_MESSAGES, TELEGRAM_RETRIES, TELEGRAM_SEND_SECONDS, TelegramRateLimiter, backoff_delay
+)
+from payment_sources.scheduler import POLL_WORKERS
+
+logger = logging.getLogger("GitHubSponsorsBot.AsyncRuntime")
+
+TELEGRAM_API_URL = 'https://api.telegram.org/bot'
+
+
+class AsyncTelegramSender:
+    """Sends Telegram messages from the event loop with the same pacing and retries as TelegramBot"""
+
+    def __init__(self, token, chat_id, base_url=None, rate_limiter=None, max_retries=5, pool_size=8):
+        self.token = token
+        self.chat_id = chat_id
+        self.base_url = base_url or TELEGRAM_API_URL
+        self.rate_limiter = rate_limiter or TelegramRateLimiter()
+        self.max_retries = max_retries
+        self.pool_size = pool_size
+        self.session = None
+
+    async def start(self):
+        """Open the pooled client session; must run on the loop that sends"""
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.pool_size),
+            timeout=aiohttp.ClientTimeout(total=30)
+        )
+
+    async def close(self):
+        """Close the client session"""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def send_message(self, message, chat_id=None):
+        """
+        Send a Markdown message to the configured chat (or the given one).
+        Waits out flood control and retries network errors; returns True on success.
+        """
+        chat_id = chat_id or self.chat_id
+        url = f"{self.base_url}{self.token}/sendMessage"
+        attempt = 0
+        while True:
+            await self.rate_limiter.wait_async(chat_id)
+            started = time.perf_counter()
+            try:
+                async with self.session.post(
+                    url, json={"chat_id": chat_id, "text": message, "parse_mode": "Markdown"}
+                ) as response:
+                    body = await response.json(content_type=None)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    TELEGRAM_MESSAGES.labels('failed').inc()
+                    logger.error(f"Failed to send message to chat {chat_id} after {attempt} attempts: {e}")
+                    return False
+                TELEGRAM_RETRIES.labels('network').inc()
+                delay = backoff_delay(attempt)
+                logger.warning(f"Network error sending to chat {chat_id} ({e}), retry {attempt} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            if body.get("ok"):
+                TELEGRAM_SEND_SECONDS.observe(time.perf_counter() - started)
+                TELEGRAM_MESSAGES.labels('sent').inc()
+                logger.info(f"Message sent to chat {chat_id}")
+                return True
+            retry_after = (body.get("parameters") or {}).get("retry_after")
+            if body.get("error_code") == 429 and retry_after:
+                TELEGRAM_RETRIES.labels('flood_control').inc()
+                logger.warning(f"Telegram flood control for chat {chat_id}, retrying in {retry_after}s")
+                self.rate_limiter.penalize(chat_id, retry_after)
+                continue
+            TELEGRAM_MESSAGES.labels('failed').inc()
+            logger.error(f"Failed to send message to chat {chat_id}: {body.get('description')}")
+            return False
+
+
+class AsyncPollScheduler:
+    """
+    PollScheduler counterpart that runs each PollJob as a task on the event loop.
+    Jobs may be added and triggered from any thread.
+    """
+
+    def __init__(self, workers=POLL_WORKERS):
+        self._jobs = {}
+        self._wakeups = {}
+        self._tasks = []
+        self._loop = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="poll")
+
+    def add(self, job):
+        """Register a job; its first run starts straight away (or once the loop runs)"""
+        with self._lock:
+            job.schedule(time.monotonic())
+            self._jobs[job.name] = job
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._spawn, job)
+        logger.info(f"Scheduled {job.name} every {job.interval}s")
+        return job
+
+    def job_names(self):
+        """Names of the registered jobs"""
+        with self._lock:
+            return sorted(self._jobs)
+
+    def trigger(self, name=None):
+        """Run a job (or every job when name is None) as soon as possible; returns the triggered names"""
+        with self._lock:
+            jobs = list(self._jobs.values()) if name is None else [self._jobs[name]] if name in self._jobs else []
+            now = time.monotonic()
+            for job in jobs:
+                if job.running:
+                    job.triggered = True
+                else:
+                    job.next_run = now
+        if self._loop is not None:
+            for job in jobs:
+                self._loop.call_soon_threadsafe(self._wake, job.name)
+        return [job.name for job in jobs]
+
+    def start(self):
+        """Jobs start with the runtime's event loop; kept for interface parity with PollScheduler"""
+        return self
+
+    async def run_on_loop(self):
+        """Start a task for every registered job on the running loop"""
+        self._loop = asyncio.get_running_loop()
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            self._spawn(job)
+
+    def stop(self, timeout=5.0):
+        """Cancel the job tasks; running blocking checks are left to finish"""
+        if self._loop is not None and not self._loop.is_closed():
+            try:
+                self._loop.call_soon_threadsafe(self._cancel)
+            except RuntimeError:
+                pass
+        self._executor.shutdown(wait=False)
+
+    def _cancel(self):
+        for task in self._tasks:
+            task.cancel()
+
+    def _spawn(self, job):
+        self._wakeups[job.name] = asyncio.Event()
+        self._tasks.append(self._loop.create_task(self._run_job(job)))
+
+    def _wake(self, name):
+        wakeup = self._wakeups.get(name)
+        if wakeup is not None:
+            wakeup.set()
+
+    async def _run_job(self, job):
+        wakeup = self._wakeups[job.name]
+        while True:
+            delay = job.next_run - time.monotonic()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                wakeup.clear()
+                continue
+
+            with self._lock:
+                scheduled = job.next_run
+                job.running = True
+            started = time.monotonic()
+            try:
+                if inspect.iscoroutinefunction(job.func):
+                    result = await job.func()
+                else:
+                    result = await self._loop.run_in_executor(self._executor, job.func)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in {job.name} poll: {e}")
+                result = False
+            finished = time.monotonic()
+            with self._lock:
+                job.record(scheduled, started, finished, result)
+                job.running = False
+                if job.triggered:
+                    job.triggered = False
+                    job.next_run = finished
+            if result is False:
+                logger.warning(f"{job.name} poll failed {job.failures} time(s) in a row, "
+                               f"retrying in {job.next_run - finished:.0f}s")
+
+    def stats(self):
+        """Return per-job statistics"""
+        with self._lock:
+            return {name: job.stats() for name, job in self._jobs.items()}
+
+
+class AsyncRuntime:
+    """Serves the webhook and runs Telegram I/O and polled sources on one event loop"""
+
+    def __init__(self, host, port, webhook_handler, health_handler, scheduler, telegram_sender,
+                 on_startup=None, on_shutdown=None, telegram_handler=None, metrics_handler=None,
+                 profile_handler=None):
+        """
+        webhook_handler(body, headers) returns (response body, status) and health_handler()
+        returns a dict; both are the same functions the Flask app uses and, since they
+        query SQLite, run in the loop's default executor. The optional
+        telegram_handler(body, headers) serves Telegram updates; it replies to commands
+        with blocking calls, so it runs in a worker thread. The optional metrics_handler()
+        returns the text served on /metrics and the optional profile_handler(body, headers)
+        serves /admin/profile.
+        on_startup runs once the loop can send (e.g. to start the dispatcher) and
+        on_shutdown before the Telegram session closes (e.g. to flush it), both in
+        a worker thread.
+        """
+        self.host = host
+        self.port = port
+        self.webhook_handler = webhook_handler
+        self.health_handler = health_handler
+        self.scheduler = scheduler
+        self.telegram = telegram_sender
+        self.on_startup = on_startup
+        self.on_shutdown = on_shutdown
+        self.telegram_handler = telegram_handler
+        self.metrics_handler = metrics_handler
+        self.profile_handler = profile_handler
+        self.loop = None
+        self.ready = threading.Event()
+        self._stopped = None
+
+    def make_app(self):
+        """aiohttp application with the same routes as the Flask app"""
+        app = web.Application()
+        app.router.add_post('/webhook/github', self._webhook)
+        app.router.add_get('/health', self._health)
+        if self.telegram_handler is not None:
+            app.router.add_post('/webhook/telegram', self._telegram)
+        if self.metrics_handler is not None:
+            app.router.add_get('/metrics', self._metrics)
+        if self.profile_handler is not None:
+            app.router.add_post('/admin/profile', self._profile)
+        return app
+
+    async def _webhook(self, request):
+        body = await request.read()
+        # Dedupe lookups and outbox commits block on SQLite, so handle the delivery off the loop
+        payload, status = await self.loop.run_in_executor(None, self.webhook_handler, body, request.headers)
+        return web.json_response(payload, status=status)
+
+    async def _telegram(self, request):
+        body = await request.read()
+        payload, status = await self.loop.run_in_executor(None, self.telegram_handler, body, request.headers)
+        return web.json_response(payload, status=status)
+
+    async def _metrics(self, request):
+        # Collectors query the outbox, so render off the loop
+        text = await self.loop.run_in_executor(None, self.metrics_handler)
+        return web.Response(text=text, content_type='text/plain', charset='utf-8')
+
+    async def _profile(self, request):
+        body = await request.read()
+        # A memory snapshot can take a while, so handle it off the loop
+        payload, status = await self.loop.run_in_executor(None, self.profile_handler, body, request.headers)
+        return web.json_response(payload, status=status)
+
+    async def _health(self, request):
+        # Outbox statistics query SQLite
+        return web.json_response(await self.loop.run_in_executor(None, self.health_handler))
+
+    def send_message(self, message, chat_id=None):
+        """
+        Blocking bridge for the dispatcher's sender threads: runs the send on the loop
+        and waits for its result.
+        """
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            logger.error("Event loop is not running, cannot send message")
+            return False
+        future = asyncio.run_coroutine_threadsafe(self.telegram.send_message(message, chat_id), loop)
+        try:
+            return future.result()
+        except Exception as e:
+            logger.error(f"Failed to send message: {e}")
+            return False
+
+    async def serve(self):
+        """Run until stop() is called"""
+        self.loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        await self.telegram.start()
+        runner = web.AppRunner(self.make_app(), access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, self.host, self.port)
+        await site.start()
+        # Report the bound port when an ephemeral one (0) was requested
+        self.port = runner.addresses[0][1]
+        logger.info(f"Serving GitHub Sponsors webhooks on {self.host}:{self.port} (asyncio runtime)")
+        if self.on_startup is not None:
+            await self.loop.run_in_executor(None, self.on_startup)
+        await self.scheduler.run_on_loop()
+        self.ready.set()
+        try:
+            await self._stopped.wait()
+        finally:
+            self.scheduler.stop()
+            await runner.cleanup()
+            if self.on_shutdown is not None:
+                await self.loop.run_in_executor(None, self.on_shutdown)
+            await self.telegram.close()
+
+    def stop(self):
+        """Ask serve() to return; safe to call from any thread"""
+        if self.loop is not None and self._stopped is not None:
+            self.loop.call_soon_threadsafe(self._stopped.set)
+
+    def run(self):
+        """Run the event loop in the calling thread until SIGINT/SIGTERM"""
+        async def main():
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                try:
+                    loop.add_signal_handler(sig, self.stop)
+                except (NotImplementedError, RuntimeError):
+                    pass
+            await self.serve()
+        asyncio.run(main())
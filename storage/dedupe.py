@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Duplicate detection for GitHub webhook deliveries.
+
+GitHub retries a delivery when our response is slow and lets users redeliver
+by hand; every copy carries the same X-GitHub-Delivery GUID. The index keeps
+recently seen GUIDs in a bounded in-memory LRU with a TTL, optionally backed
+by a SQLite table so duplicates are still recognised after a restart and
+across processes: the id is claimed with a single conditional insert, so two
+workers receiving the same delivery cannot both treat it as new.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from storage.sqlite import connect
+
+logger = logging.getLogger("GitHubSponsorsBot.Dedupe")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS webhook_deliveries (
+    delivery_id TEXT PRIMARY KEY,
+    seen_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS webhook_deliveries_seen_at ON webhook_deliveries (seen_at);
+"""
+
+# Expired rows are pruned from the table once every this many new deliveries
+PRUNE_EVERY = 1000
+
+
+class DeliveryDedupe:
+    """Bounded LRU + TTL index of webhook delivery ids"""
+
+    def __init__(self, max_entries=10000, ttl=3 * 24 * 3600, path=None):
+        """
+        Initialize with the maximum number of ids kept in memory and how long
+        an id is remembered. With a database path, ids are also persisted.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._inserts = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _conn(self):
+        """Return the open connection; caller must hold _lock"""
+        if self._db is None:
+            self._db = connect(self.path)
+            self._db.executescript(SCHEMA)
+        return self._db
+
+    def check_and_record(self, delivery_id):
+        """
+        Return True if the delivery was already seen within the TTL.
+        Otherwise remember it and return False.
+        """
+        if not delivery_id:
+            return False
+        now = time.time()
+        with self._lock:
+            seen_at = self._entries.get(delivery_id)
+            if seen_at is not None and now - seen_at < self.ttl:
+                self._entries.move_to_end(delivery_id)
+                self.hits += 1
+                return True
+
+            if self.path and not self._claim(delivery_id, now):
+                # Another process (or an earlier run) recorded it within the TTL
+                row = self._query(delivery_id)
+                self._remember(delivery_id, row if row is not None else now)
+                self.hits += 1
+                return True
+
+            self._remember(delivery_id, now)
+            self.misses += 1
+            return False
+
+    def forget(self, delivery_id):
+        """Drop a delivery id, e.g. when it could not be processed and should be retried"""
+        if not delivery_id:
+            return
+        with self._lock:
+            self._entries.pop(delivery_id, None)
+            if self.path:
+                try:
+                    self._conn().execute('DELETE FROM webhook_deliveries WHERE delivery_id = ?', (delivery_id,))
+                except Exception as e:
+                    logger.error(f"Could not remove delivery {delivery_id} from the dedupe table: {e}")
+
+    def _remember(self, delivery_id, seen_at):
+        """Add an id to the LRU, evicting the least recently used beyond the limit"""
+        self._entries[delivery_id] = seen_at
+        self._entries.move_to_end(delivery_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _query(self, delivery_id):
+        """Return when a delivery was persisted, or None"""
+        try:
+            row = self._conn().execute(
+                'SELECT seen_at FROM webhook_deliveries WHERE delivery_id = ?', (delivery_id,)
+            ).fetchone()
+            return row[0] if row else None
+        except Exception as e:
+            logger.error(f"Could not read the dedupe table: {e}")
+            return None
+
+    def _claim(self, delivery_id, seen_at):
+        """
+        Atomically store a delivery id unless an unexpired row exists, so that of several
+        processes receiving the same delivery only one claims it. Returns False for a duplicate.
+        """
+        try:
+            conn = self._conn()
+            cursor = conn.execute(
+                'INSERT INTO webhook_deliveries (delivery_id, seen_at) VALUES (?, ?) '
+                'ON CONFLICT (delivery_id) DO UPDATE SET seen_at = excluded.seen_at '
+                'WHERE webhook_deliveries.seen_at < ?',
+                (delivery_id, seen_at, seen_at - self.ttl)
+            )
+            if cursor.rowcount == 0:
+                return False
+            self._inserts += 1
+            if self._inserts % PRUNE_EVERY == 0:
+                conn.execute('DELETE FROM webhook_deliveries WHERE seen_at < ?', (seen_at - self.ttl,))
+        except Exception as e:
+            logger.error(f"Could not persist delivery {delivery_id}: {e}")
+        return True
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self):
+        """Return hit/miss counters and the number of ids held in memory"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "capacity": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Durable outbox for alert delivery.
+
+Every alert is written to a SQLite table before it is queued for sending and
+is only marked delivered once Telegram accepted it, so alerts survive crashes
+and failed sends (at-least-once delivery). With several destinations, the
+ones that accepted a row are recorded, so a retry only goes to the others. Concurrent writers share commits:
+whoever finds no commit in progress writes every row queued so far in one
+transaction, while the others wait for it to finish (group commit).
+"""
+
+import logging
+import threading
+import time
+
+from notifications.notification import Notification
+from storage.sqlite import connect
+
+logger = logging.getLogger("GitHubSponsorsBot.Outbox")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    source TEXT,
+    message TEXT NOT NULL,
+    amount TEXT,
+    currency TEXT,
+    summary TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    delivered_at REAL
+);
+CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (id) WHERE delivered_at IS NULL;
+CREATE TABLE IF NOT EXISTS outbox_destinations (
+    row_id INTEGER NOT NULL,
+    destination TEXT NOT NULL,
+    PRIMARY KEY (row_id, destination)
+);
+"""
+
+
+class _Ticket:
+    """A row waiting for the next group commit"""
+
+    __slots__ = ('notification', 'row_id', 'done', 'error')
+
+    def __init__(self, notification):
+        self.notification = notification
+        self.row_id = None
+        self.done = False
+        self.error = None
+
+
+class Outbox:
+    """SQLite-backed store of alerts that still have to be delivered"""
+
+    def __init__(self, path, synchronous='NORMAL', max_attempts=10):
+        """Initialize with the database path; the file is opened on first use"""
+        self.path = path
+        self.synchronous = synchronous
+        self.max_attempts = max_attempts
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._queued = []
+        self._committing = False
+        self.appended = 0
+        self.commits = 0
+
+    def _conn(self):
+        """Return the open connection; caller must hold _db_lock"""
+        if self._db is None:
+            self._db = connect(self.path, self.synchronous)
+            self._db.executescript(SCHEMA)
+            logger.info(f"Outbox opened at {self.path}")
+        return self._db
+
+    def close(self):
+        """Close the database connection"""
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def append(self, notification):
+        """
+        Durably store a notification and return its row id.
+        Blocks until the row is committed, sharing the commit with concurrent callers.
+        """
+        ticket = _Ticket(notification)
+        with self._cond:
+            self._queued.append(ticket)
+            while not ticket.done:
+                if self._committing:
+                    self._cond.wait()
+                    continue
+                # Become the commit leader for everything queued so far
+                self._committing = True
+                batch, self._queued = self._queued, []
+                self._cond.release()
+                try:
+                    self._write(batch)
+                finally:
+                    self._cond.acquire()
+                    self._committing = False
+                    self._cond.notify_all()
+        if ticket.error is not None:
+            raise ticket.error
+        return ticket.row_id
+
+    def _write(self, batch):
+        """Insert a batch of tickets in a single transaction"""
+        now = time.time()
+        try:
+            with self._db_lock:
+                conn = self._conn()
+                conn.execute('BEGIN')
+                try:
+                    for ticket in batch:
+                        n = ticket.notification
+                        cursor = conn.execute(
+                            'INSERT INTO outbox (created_at, source, message, amount, currency, summary) '
+                            'VALUES (?, ?, ?, ?, ?, ?)',
+                            (now, n.source, n.message,
+                             None if n.amount is None else str(n.amount), n.currency, n.summary)
+                        )
+                        ticket.row_id = cursor.lastrowid
+                    conn.execute('COMMIT')
+                except Exception:
+                    conn.execute('ROLLBACK')
+                    raise
+            self.appended += len(batch)
+            self.commits += 1
+        except Exception as e:
+            logger.error(f"Failed to write {len(batch)} notifications to the outbox: {e}")
+            for ticket in batch:
+                ticket.error = e
+        for ticket in batch:
+            ticket.done = True
+
+    def mark_delivered(self, row_ids):
+        """Mark rows as delivered"""
+        if not row_ids:
+            return
+        now = time.time()
+        with self._db_lock:
+            conn = self._conn()
+            conn.execute('BEGIN')
+            try:
+                conn.executemany(
+                    'UPDATE outbox SET delivered_at = ? WHERE id = ?',
+                    [(now, row_id) for row_id in row_ids]
+                )
+                conn.executemany('DELETE FROM outbox_destinations WHERE row_id = ?', [(i,) for i in row_ids])
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+    def mark_failed(self, row_ids):
+        """Record a failed delivery attempt; rows are retried until max_attempts"""
+        if not row_ids:
+            return
+        with self._db_lock:
+            conn = self._conn()
+            conn.execute('BEGIN')
+            try:
+                conn.executemany('UPDATE outbox SET attempts = attempts + 1 WHERE id = ?', [(i,) for i in row_ids])
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            dead = conn.execute(
+                f'SELECT COUNT(*) FROM outbox WHERE id IN ({",".join("?" * len(row_ids))}) AND attempts >= ?',
+                list(row_ids) + [self.max_attempts]
+            ).fetchone()[0]
+        if dead:
+            logger.error(f"{dead} notifications reached {self.max_attempts} failed attempts and will not be retried")
+
+    def mark_destination_delivered(self, row_id, destination):
+        """Record that one destination accepted a row that is not yet delivered everywhere"""
+        with self._db_lock:
+            self._conn().execute(
+                'INSERT OR IGNORE INTO outbox_destinations (row_id, destination) VALUES (?, ?)',
+                (row_id, destination)
+            )
+
+    def delivered_destinations(self, row_id):
+        """Return the names of the destinations that already accepted a row"""
+        with self._db_lock:
+            rows = self._conn().execute(
+                'SELECT destination FROM outbox_destinations WHERE row_id = ?', (row_id,)
+            ).fetchall()
+        return {name for (name,) in rows}
+
+    def pending(self, limit=100, exclude=(), min_age=0.0):
+        """
+        Return up to limit undelivered notifications, oldest first.
+        Rows whose ids are in exclude or that are younger than min_age seconds are skipped.
+        """
+        with self._db_lock:
+            rows = self._conn().execute(
+                'SELECT id, source, message, amount, currency, summary FROM outbox '
+                'WHERE delivered_at IS NULL AND attempts < ? AND created_at <= ? ORDER BY id LIMIT ?',
+                (self.max_attempts, time.time() - min_age, limit + len(exclude))
+            ).fetchall()
+        notifications = []
+        for row_id, source, message, amount, currency, summary in rows:
+            if row_id in exclude:
+                continue
+            notification = Notification(message, source, amount, currency, summary)
+            notification.outbox_id = row_id
+            notifications.append(notification)
+            if len(notifications) >= limit:
+                break
+        return notifications
+
+    def last_id(self):
+        """Return the highest row id stored so far (0 for an empty outbox)"""
+        with self._db_lock:
+            return self._conn().execute('SELECT COALESCE(MAX(id), 0) FROM outbox').fetchone()[0]
+
+    def fresh(self, after_id, limit=100):
+        """Return up to limit never-attempted notifications with a row id above after_id, oldest first"""
+        with self._db_lock:
+            rows = self._conn().execute(
+                'SELECT id, source, message, amount, currency, summary FROM outbox '
+                'WHERE id > ? AND delivered_at IS NULL AND attempts = 0 ORDER BY id LIMIT ?',
+                (after_id, limit)
+            ).fetchall()
+        notifications = []
+        for row_id, source, message, amount, currency, summary in rows:
+            notification = Notification(message, source, amount, currency, summary)
+            notification.outbox_id = row_id
+            notifications.append(notification)
+        return notifications
+
+    def purge_delivered(self, older_than=7 * 24 * 3600):
+        """Delete delivered rows older than the given number of seconds"""
+        with self._db_lock:
+            cursor = self._conn().execute(
+                'DELETE FROM outbox WHERE delivered_at IS NOT NULL AND delivered_at < ?',
+                (time.time() - older_than,)
+            )
+            # Destination records of rows that were delivered (or purged) in the meantime
+            self._conn().execute(
+                'DELETE FROM outbox_destinations WHERE row_id NOT IN (SELECT id FROM outbox WHERE delivered_at IS NULL)'
+            )
+        return cursor.rowcount
+
+    def stats(self):
+        """Return pending and dead-letter counts plus write statistics"""
+        with self._db_lock:
+            pending, dead = self._conn().execute(
+                'SELECT COALESCE(SUM(attempts < ?), 0), COALESCE(SUM(attempts >= ?), 0) '
+                'FROM outbox WHERE delivered_at IS NULL',
+                (self.max_attempts, self.max_attempts)
+            ).fetchone()
+        return {
+            "pending": pending,
+            "dead": dead,
+            "appended": self.appended,
+            "commits": self.commits,
+        }
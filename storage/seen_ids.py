@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Bounded, persistent index of already alerted transaction ids.
+
+Polling with an overlap window returns the same transactions several times,
+so every alerted id is remembered until its time window can no longer be
+queried again. Ids are grouped into partitions by the transaction's own
+timestamp; once a partition lies entirely before the oldest window any poller
+still reads, the whole partition is dropped at once. Memory is therefore
+bounded by the activity within the overlap, not by account history.
+
+Lookups go through a single index of the live ids, so they cost one probe
+however many partitions are retained: a dict of id -> partition, or, with a
+Bloom filter front, one bit array over every live id whose positives are
+confirmed against the on-disk table. The Bloom filter is rebuilt from the
+table when partitions are pruned or it outgrows its capacity. On startup
+only the retained partitions are read back from SQLite.
+"""
+
+import hashlib
+import logging
+import math
+import threading
+
+from storage.sqlite import connect
+
+logger = logging.getLogger("GitHubSponsorsBot.SeenIds")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS seen_ids (
+    item_id TEXT PRIMARY KEY,
+    partition INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS seen_ids_partition ON seen_ids (partition);
+"""
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter sized for an expected number of items and false-positive rate"""
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        """Set the item's bits; return True if any was unset, i.e. the item was not present"""
+        added = False
+        for pos in self._positions(item):
+            mask = 1 << (pos & 7)
+            if not self.bits[pos >> 3] & mask:
+                self.bits[pos >> 3] |= mask
+                added = True
+        return added
+
+    def __contains__(self, item):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class SeenIdStore:
+    """Time-partitioned set of ids with an optional Bloom filter front and SQLite backing"""
+
+    def __init__(self, path=None, partition_seconds=3600, bloom_capacity=0, bloom_error=0.001):
+        """
+        Initialize with an optional database path and the partition width in seconds.
+        A bloom_capacity (initial number of ids) enables the Bloom filter front;
+        it requires a database to confirm positives and is ignored without one.
+        """
+        self.path = path
+        self.partition_seconds = partition_seconds
+        self.bloom_capacity = bloom_capacity if path else 0
+        self.bloom_error = bloom_error
+        # Partition -> its ids (dict index) or number of ids (Bloom filter front)
+        self._partitions = {}
+        self._index = {}
+        self._bloom = None
+        self._bloom_count = 0
+        self._lock = threading.Lock()
+        self._db = None
+        self._loaded = False
+        self.hits = 0
+        self.misses = 0
+        self.db_lookups = 0
+
+    def _conn(self):
+        """Return the open connection; caller must hold _lock"""
+        if self._db is None:
+            self._db = connect(self.path)
+            self._db.executescript(SCHEMA)
+        return self._db
+
+    def _partition_of(self, event_time):
+        return int(event_time // self.partition_seconds)
+
+    def _remember(self, item_id, partition):
+        """Add an id to the in-memory index; caller must hold _lock"""
+        if self.bloom_capacity:
+            if self._bloom is None:
+                self._bloom = BloomFilter(self.bloom_capacity, self.bloom_error)
+            # Ids already in the filter are not counted again, so re-adds do not force a rebuild
+            added = self._bloom.add(item_id)
+            self._partitions[partition] = self._partitions.get(partition, 0) + added
+            self._bloom_count += added
+            return
+        previous = self._index.get(item_id)
+        if previous == partition:
+            return
+        if previous is not None:
+            self._partitions[previous].discard(item_id)
+        self._index[item_id] = partition
+        self._partitions.setdefault(partition, set()).add(item_id)
+
+    def _rebuild_bloom(self):
+        """Rebuild the Bloom filter from the table, sized for the live ids; caller must hold _lock"""
+        try:
+            rows = self._conn().execute('SELECT item_id FROM seen_ids').fetchall()
+        except Exception as e:
+            # Keep the old filter: it still has no false negatives
+            logger.error(f"Could not rebuild seen id filter: {e}")
+            return
+        capacity = max(self.bloom_capacity, 2 * len(rows))
+        self._bloom = BloomFilter(capacity, self.bloom_error)
+        for (item_id,) in rows:
+            self._bloom.add(item_id)
+        self._bloom_count = len(rows)
+
+    def _load(self):
+        """Read the retained partitions back from disk; caller must hold _lock"""
+        if self._loaded or not self.path:
+            self._loaded = True
+            return
+        self._loaded = True
+        try:
+            rows = self._conn().execute('SELECT item_id, partition FROM seen_ids').fetchall()
+        except Exception as e:
+            logger.error(f"Could not load seen ids: {e}")
+            return
+        for item_id, partition in rows:
+            self._remember(item_id, partition)
+        logger.info(f"Loaded {len(rows)} seen ids in {len(self._partitions)} partitions")
+
+    def contains(self, item_id):
+        """Return True if the id was recorded and its partition has not been pruned"""
+        with self._lock:
+            self._load()
+            if self.bloom_capacity:
+                candidate = self._bloom is not None and item_id in self._bloom
+            else:
+                candidate = item_id in self._index
+            if candidate and self.bloom_capacity:
+                # Bloom filters can report false positives; the table is authoritative
+                self.db_lookups += 1
+                try:
+                    candidate = self._conn().execute(
+                        'SELECT 1 FROM seen_ids WHERE item_id = ?', (item_id,)
+                    ).fetchone() is not None
+                except Exception as e:
+                    logger.error(f"Could not look up seen id {item_id}: {e}")
+            if candidate:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return candidate
+
+    def add(self, item_id, event_time):
+        """Record an id under the partition of its event time (seconds since the epoch)"""
+        partition = self._partition_of(event_time)
+        with self._lock:
+            self._load()
+            self._remember(item_id, partition)
+            if self.path:
+                try:
+                    self._conn().execute(
+                        'INSERT OR REPLACE INTO seen_ids (item_id, partition) VALUES (?, ?)', (item_id, partition)
+                    )
+                except Exception as e:
+                    logger.error(f"Could not persist seen id {item_id}: {e}")
+            if self._bloom is not None and self._bloom_count > self._bloom.capacity:
+                self._rebuild_bloom()
+
+    def prune(self, before):
+        """Drop every partition that ends before the given time (seconds since the epoch)"""
+        cutoff = self._partition_of(before)
+        with self._lock:
+            self._load()
+            expired = [p for p in self._partitions if p < cutoff]
+            for partition in expired:
+                ids = self._partitions.pop(partition)
+                if not self.bloom_capacity:
+                    for item_id in ids:
+                        del self._index[item_id]
+            if self.path and expired:
+                try:
+                    self._conn().execute('DELETE FROM seen_ids WHERE partition < ?', (cutoff,))
+                except Exception as e:
+                    logger.error(f"Could not prune seen ids: {e}")
+                if self.bloom_capacity:
+                    self._rebuild_bloom()
+        return len(expired)
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self):
+        """Return partition counts, memory use of Bloom filters and lookup counters"""
+        with self._lock:
+            entries = len(self._index)
+            bloom_bytes = len(self._bloom.bits) if self._bloom is not None else 0
+            return {
+                "partitions": len(self._partitions),
+                "entries": entries,
+                "bloom_bytes": bloom_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "db_lookups": self.db_lookups,
+            }
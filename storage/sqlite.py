@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Shared SQLite helpers for the bot's local state.
+
+All persistent state (outbox, dedupe index, sync cursors) lives in SQLite
+databases opened in WAL mode, so readers never block the writer and a commit
+only appends to the write-ahead log.
+"""
+
+import os
+import sqlite3
+
+# Default location of the state database, relative to the working directory
+DEFAULT_DB_PATH = os.path.join('data', 'bot_state.db')
+
+
+def connect(path, synchronous='NORMAL'):
+    """
+    Open a SQLite database in WAL mode, creating its directory if needed.
+
+    With synchronous=NORMAL a commit survives a crash of the process but may
+    be lost if the machine itself loses power before the next checkpoint;
+    use FULL when that matters more than write latency.
+    """
+    if path != ':memory:':
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10.0)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute(f'PRAGMA synchronous={synchronous}')
+    conn.execute('PRAGMA busy_timeout=10000')
+    return conn
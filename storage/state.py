@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Small key/value store for sync cursors.
+
+Payment sources remember how far they have read (IMAP UIDVALIDITY and the
+highest processed UID, API timestamps, ...) so a restart resumes exactly
+where the previous run stopped. Values are stored as JSON.
+"""
+
+import json
+import logging
+import threading
+import time
+
+from storage.sqlite import connect
+
+logger = logging.getLogger("GitHubSponsorsBot.State")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+class StateStore:
+    """SQLite-backed JSON values keyed by name"""
+
+    def __init__(self, path):
+        """Initialize with the database path; the file is opened on first use"""
+        self.path = path
+        self._db = None
+        self._lock = threading.Lock()
+
+    def _conn(self):
+        """Return the open connection; caller must hold _lock"""
+        if self._db is None:
+            self._db = connect(self.path)
+            self._db.executescript(SCHEMA)
+        return self._db
+
+    def get(self, key, default=None):
+        """Return the stored value for key, or default"""
+        try:
+            with self._lock:
+                row = self._conn().execute('SELECT value FROM sync_state WHERE key = ?', (key,)).fetchone()
+        except Exception as e:
+            logger.error(f"Could not read sync state {key}: {e}")
+            return default
+        return json.loads(row[0]) if row else default
+
+    def set(self, key, value):
+        """Store a JSON-serialisable value under key"""
+        try:
+            with self._lock:
+                self._conn().execute(
+                    'INSERT OR REPLACE INTO sync_state (key, value, updated_at) VALUES (?, ?, ?)',
+                    (key, json.dumps(value), time.time())
+                )
+            return True
+        except Exception as e:
+            logger.error(f"Could not store sync state {key}: {e}")
+            return False
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1 @@
+# This file makes the stubs directory a Python package.
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Binance REST endpoints used by BinanceAlerts.
+
+Serves deposit history (`/sapi/v1/capital/deposit/hisrec`) and C2C/P2P
+order history (`/sapi/v1/c2c/orderMatch/listUserOrderHistory`) from in-memory
+lists with Binance's time-window filtering and paging, and records every
+request so tests can assert how many calls a poll cost. Signatures are not
+checked. `/api/v3/userDataStream` hands out listenKeys for the user data
+stream, which `BinanceStreamStub` serves over a local WebSocket.
+
+Request weight is counted per minute like Binance does and reported in the
+`X-MBX-USED-WEIGHT-1M` / `X-SAPI-USED-IP-WEIGHT-1M` headers. Requests above
+`weight_limits` get a 429 with Retry-After, and requests sent during that
+pause get a 418 ban.
+
+Point the bot at it with:
+    BINANCE_API_URL=http://127.0.0.1:<port>
+    BINANCE_WS_URL=ws://127.0.0.1:<stream port>
+"""
+
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from websockets.sync.server import serve
+
+logger = logging.getLogger("GitHubSponsorsBot.BinanceStub")
+
+DEPOSIT_PATH = '/sapi/v1/capital/deposit/hisrec'
+C2C_PATH = '/sapi/v1/c2c/orderMatch/listUserOrderHistory'
+LISTEN_KEY_PATH = '/api/v3/userDataStream'
+
+# Request weight of each endpoint (Binance documents 1 for both histories and 2 for listenKeys)
+ENDPOINT_WEIGHTS = {DEPOSIT_PATH: 1, C2C_PATH: 1, LISTEN_KEY_PATH: 2}
+WEIGHT_HEADERS = {'api': 'X-MBX-USED-WEIGHT-1M', 'sapi': 'X-SAPI-USED-IP-WEIGHT-1M'}
+
+
+class BinanceStubServer:
+    """Threaded HTTP server emulating the Binance wallet and C2C history endpoints"""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        """Initialize with empty deposit and order histories"""
+        self.deposits = []
+        self.c2c_orders = []
+        self.requests = []
+        self.listen_keys = []
+        # Set to False to answer listenKey requests like a key without stream permission
+        self.user_stream_allowed = True
+        # Per-minute weight limits; used_weight may be raised to simulate other bots on the same IP
+        self.weight_limits = {'api': 6000, 'sapi': 12000}
+        self.used_weight = {'api': 0, 'sapi': 0}
+        self.ban_seconds = 120
+        self._weight_minute = int(time.time() // 60)
+        self._retry_until = 0.0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        """Value for BINANCE_API_URL"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve requests on a background thread"""
+        self._thread = threading.Thread(target=self._server.serve_forever, name="binance-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Shut the server down"""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def add_deposit(self, tx_id, amount, coin='USDT', status=1, insert_time=None, network='TRX'):
+        """Add a deposit record; insert_time defaults to now (milliseconds)"""
+        deposit = {
+            "id": tx_id,
+            "amount": str(amount),
+            "coin": coin,
+            "network": network,
+            "status": status,
+            "address": "TXstubAddress",
+            "txId": tx_id,
+            "insertTime": insert_time or int(time.time() * 1000),
+            "transferType": 0,
+            "confirmTimes": "1/1",
+        }
+        with self._lock:
+            self.deposits.append(deposit)
+        return deposit
+
+    def add_c2c_order(self, order_number, trade_type='SELL', total_price='1000', fiat='INR', amount='12',
+                      asset='USDT', status='COMPLETED', create_time=None):
+        """Add a P2P order; create_time defaults to now (milliseconds)"""
+        order = {
+            "orderNumber": order_number,
+            "advNo": "1",
+            "tradeType": trade_type,
+            "asset": asset,
+            "fiat": fiat,
+            "fiatSymbol": "₹",
+            "amount": str(amount),
+            "totalPrice": str(total_price),
+            "unitPrice": "83.3",
+            "orderStatus": status,
+            "createTime": create_time or int(time.time() * 1000),
+            "commission": "0",
+            "counterPartNickName": "stub-user",
+            "advertisementRole": "MAKER",
+        }
+        with self._lock:
+            self.c2c_orders.append(order)
+        return order
+
+    def requests_to(self, path):
+        """Return the recorded query parameters of requests to one path"""
+        with self._lock:
+            return [params for p, params in self.requests if p == path]
+
+    def _deposit_history(self, params):
+        start = int(params.get('startTime', 0))
+        end = int(params.get('endTime', 2 ** 63))
+        offset = int(params.get('offset', 0))
+        limit = min(int(params.get('limit', 1000)), 1000)
+        with self._lock:
+            rows = [d for d in self.deposits if start <= d['insertTime'] <= end]
+        rows.sort(key=lambda d: d['insertTime'], reverse=True)
+        return 200, rows[offset:offset + limit]
+
+    def _c2c_history(self, params):
+        trade_type = params.get('tradeType')
+        if trade_type not in ('BUY', 'SELL'):
+            return 400, {"code": -1102, "msg": "Mandatory parameter 'tradeType' was not sent."}
+        start = int(params.get('startTimestamp', 0))
+        end = int(params.get('endTimestamp', 2 ** 63))
+        page = max(int(params.get('page', 1)), 1)
+        rows_per_page = min(int(params.get('rows', 100)), 100)
+        with self._lock:
+            rows = [o for o in self.c2c_orders
+                    if o['tradeType'] == trade_type and start <= o['createTime'] <= end]
+        rows.sort(key=lambda o: o['createTime'], reverse=True)
+        data = rows[(page - 1) * rows_per_page:page * rows_per_page]
+        return 200, {"code": "000000", "message": "success", "data": data, "total": len(rows), "success": True}
+
+    def _listen_key(self, method, params):
+        if not self.user_stream_allowed:
+            return 401, {"code": -2015, "msg": "Invalid API-key, IP, or permissions for action."}
+        if method == 'POST':
+            with self._lock:
+                key = f"stub-listen-key-{len(self.listen_keys) + 1}"
+                self.listen_keys.append(key)
+            return 200, {"listenKey": key}
+        return 200, {}
+
+    def _charge(self, path):
+        """
+        Add the request's weight to the current minute.
+        Returns (status, body, headers) for a rejected request, or (None, None, headers).
+        """
+        bucket = 'sapi' if path.startswith('/sapi/') else 'api'
+        now = time.time()
+        with self._lock:
+            minute = int(now // 60)
+            if minute != self._weight_minute:
+                self._weight_minute = minute
+                self.used_weight = {'api': 0, 'sapi': 0}
+            if now < self._retry_until:
+                # Ignoring a Retry-After turns the rate limit into an IP ban
+                self._retry_until = now + self.ban_seconds
+                return 418, {"code": -1003, "msg": "IP banned."}, {'Retry-After': str(self.ban_seconds)}
+            self.used_weight[bucket] += ENDPOINT_WEIGHTS.get(path, 1)
+            headers = {WEIGHT_HEADERS[bucket]: str(self.used_weight[bucket])}
+            if self.used_weight[bucket] > self.weight_limits[bucket]:
+                wait = max(1, int(60 - now % 60))
+                self._retry_until = now + wait
+                headers['Retry-After'] = str(wait)
+                return 429, {"code": -1003, "msg": "Too many requests."}, headers
+        return None, None, headers
+
+    def _route(self, method, path, params):
+        """Return (status, body, extra headers) for a request"""
+        status, body, headers = self._charge(path)
+        if status is not None:
+            return status, body, headers
+        if method == 'GET' and path == DEPOSIT_PATH:
+            status, body = self._deposit_history(params)
+        elif method == 'GET' and path == C2C_PATH:
+            status, body = self._c2c_history(params)
+        elif path == LISTEN_KEY_PATH:
+            status, body = self._listen_key(method, params)
+        else:
+            status, body = 404, {"code": -1, "msg": f"Unknown endpoint {method} {path}"}
+        return status, body, headers
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _handle(self, method):
+                url = urlsplit(self.path)
+                query = url.query
+                length = int(self.headers.get('Content-Length', 0))
+                if length:
+                    query = '&'.join(filter(None, [query, self.rfile.read(length).decode('utf-8')]))
+                params = {k: v[-1] for k, v in parse_qs(query).items()}
+                with stub._lock:
+                    stub.requests.append((url.path, params))
+                status, body, headers = stub._route(method, url.path, params)
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                self._handle('GET')
+
+            def do_POST(self):
+                self._handle('POST')
+
+            def do_PUT(self):
+                self._handle('PUT')
+
+            def do_DELETE(self):
+                self._handle('DELETE')
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        return Handler
+
+
+class BinanceStreamStub:
+    """
+    WebSocket stand-in for the user data stream at /ws/<listenKey>.
+    Tests push scripted events with emit() and simulate outages with drop().
+    """
+
+    def __init__(self, host='127.0.0.1', port=0):
+        """Initialize without connections"""
+        self.paths = []
+        self._connections = []
+        self._lock = threading.Lock()
+        self._connected = threading.Condition(self._lock)
+        self._server = serve(self._handle, host, port)
+        self._thread = None
+
+    @property
+    def url(self):
+        """Value for BINANCE_WS_URL"""
+        host, port = self._server.socket.getsockname()[:2]
+        return f"ws://{host}:{port}"
+
+    def start(self):
+        """Serve connections on a background thread"""
+        self._thread = threading.Thread(target=self._server.serve_forever, name="binance-ws-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Close all connections and shut the server down"""
+        self.drop()
+        self._server.shutdown()
+
+    def _handle(self, connection):
+        with self._connected:
+            self.paths.append(connection.request.path)
+            self._connections.append(connection)
+            self._connected.notify_all()
+        try:
+            # Clients only send pings; keep the connection open until either side closes it
+            for _ in connection:
+                pass
+        finally:
+            with self._lock:
+                if connection in self._connections:
+                    self._connections.remove(connection)
+
+    def wait_for_connections(self, count, timeout=5.0):
+        """Block until count connections have been accepted in total; returns True on success"""
+        with self._connected:
+            return self._connected.wait_for(lambda: len(self.paths) >= count, timeout)
+
+    def emit(self, event):
+        """Send one event (a dict) to every connected client"""
+        with self._lock:
+            connections = list(self._connections)
+        for connection in connections:
+            connection.send(json.dumps(event))
+
+    def drop(self):
+        """Close every open connection abruptly"""
+        with self._lock:
+            connections = list(self._connections)
+        for connection in connections:
+            connection.close(code=1011, reason="stub drop")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    server = BinanceStubServer(port=8082).start()
+    server.add_deposit("stub-deposit-1", "25.5")
+    server.add_c2c_order("stub-order-1")
+    stream = BinanceStreamStub(port=8083).start()
+    print(f"Binance stub listening, use BINANCE_API_URL={server.base_url} BINANCE_WS_URL={stream.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stream.stop()
+        server.stop()
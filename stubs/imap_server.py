@@ -0,0 +1,648 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for an IMAP server (a subset of IMAP4rev1 plus IDLE).
+
+Serves one mailbox from memory to imaplib clients such as ImapAlerts and
+ImapIdleWatcher. Supported commands are CAPABILITY, LOGIN, SELECT/EXAMINE,
+SEARCH and FETCH (plain and UID), STORE, APPEND, IDLE, NOOP, CLOSE and LOGOUT.
+Messages have UIDs, flags and a UIDVALIDITY. FETCH answers BODYSTRUCTURE,
+header field subsets and partial section fetches such as BODY.PEEK[1]<0.65536>.
+Clients in IDLE are told about new messages with an untagged EXISTS as soon as
+they are appended.
+
+Run it with a synthetic mailbox (see stubs/synthetic_mail.py):
+    python stubs/imap_server.py --messages 10000 --port 1143
+and point the bot at it with:
+    IMAP_HOST=127.0.0.1 IMAP_PORT=1143 IMAP_USER=user IMAP_PASSWORD=password
+"""
+
+import argparse
+import email
+import json
+import logging
+import os
+import re
+import socketserver
+import sys
+import threading
+import time
+from collections import Counter
+from email.utils import parsedate_to_datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stubs.synthetic_mail import generate_mailbox  # noqa: E402
+
+logger = logging.getLogger("GitHubSponsorsBot.ImapStub")
+
+CAPABILITIES = 'IMAP4rev1 IDLE UIDPLUS LITERAL+'
+SYSTEM_FLAGS = ('\\Answered', '\\Flagged', '\\Deleted', '\\Seen', '\\Draft')
+
+_FROM_HEADER = re.compile(rb'^From:[ \t]*(.*(?:\r?\n[ \t].*)*)', re.IGNORECASE | re.MULTILINE)
+_HEADER_LINE = re.compile(rb'^([^:\s]+):.*(?:\r?\n[ \t].*)*\r?\n', re.MULTILINE)
+_LITERAL = re.compile(rb'\{(\d+)\+?\}$')
+_FETCH_ITEM = re.compile(r'^(BODY(?:\.PEEK)?)\[([^\]]*)\](?:<(\d+)(?:\.(\d+))?>)?$', re.IGNORECASE)
+
+
+class BadCommand(Exception):
+    """The client sent something this server does not understand"""
+
+
+def _quote(value):
+    if value is None:
+        return 'NIL'
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def _params(pairs):
+    if not pairs:
+        return 'NIL'
+    return '(' + ' '.join(f'{_quote(k)} {_quote(v)}' for k, v in pairs) + ')'
+
+
+def _leaf_bytes(part):
+    """Transfer-encoded body of a non-multipart part, as it appears in the message"""
+    payload = part.get_payload()
+    if isinstance(payload, bytes):
+        return payload
+    return (payload or '').encode('ascii', 'surrogateescape')
+
+
+def _bodystructure(part):
+    """BODYSTRUCTURE of a parsed message or part (RFC 3501 section 7.4.2), with extension data"""
+    if part.is_multipart():
+        children = ''.join(_bodystructure(child) for child in part.get_payload())
+        params = [(k, v) for k, v in (part.get_params() or [])[1:]]
+        return f'({children} {_quote(part.get_content_subtype())} {_params(params)} NIL NIL)'
+    body = _leaf_bytes(part)
+    params = [(k, v) for k, v in (part.get_params() or [])[1:]]
+    encoding = (part.get('Content-Transfer-Encoding') or '7bit').strip()
+    fields = [_quote(part.get_content_maintype()), _quote(part.get_content_subtype()), _params(params),
+              _quote(part.get('Content-ID')), _quote(part.get('Content-Description')), _quote(encoding),
+              str(len(body))]
+    if part.get_content_maintype() == 'text':
+        fields.append(str(body.count(b'\n')))
+    disposition = part.get_content_disposition()
+    if disposition:
+        filename = part.get_param('filename', header='content-disposition')
+        disposition = f'({_quote(disposition)} {_params([("filename", filename)] if filename else [])})'
+    fields.extend(('NIL', disposition or 'NIL', 'NIL'))
+    return '(' + ' '.join(fields) + ')'
+
+
+class StubMessage:
+    """One message in the mailbox; the MIME structure is worked out on first use"""
+
+    def __init__(self, uid, raw, flags=()):
+        self.uid = uid
+        self.raw = raw
+        self.flags = set(flags)
+        self.internal_time = time.time()
+        end = raw.find(b'\r\n\r\n')
+        self.header_end = end + 4 if end >= 0 else len(raw)
+        match = _FROM_HEADER.search(raw, 0, self.header_end)
+        self.from_ = match.group(1).decode('utf-8', 'replace').lower() if match else ''
+        self._structure = None
+
+    @property
+    def header(self):
+        return self.raw[:self.header_end]
+
+    def header_value(self, name):
+        match = re.search(rb'^' + re.escape(name.encode()) + rb':[ \t]*(.*(?:\r?\n[ \t].*)*)',
+                          self.header, re.IGNORECASE | re.MULTILINE)
+        return match.group(1).decode('utf-8', 'replace') if match else ''
+
+    def structure(self):
+        if self._structure is None:
+            self._structure = _bodystructure(email.message_from_bytes(self.raw))
+        return self._structure
+
+    def header_fields(self, names, exclude=False):
+        """The header lines named in names (or all others), followed by the blank line"""
+        wanted = {name.lower() for name in names}
+        lines = [m.group(0) for m in _HEADER_LINE.finditer(self.header)
+                 if (m.group(1).decode('ascii', 'replace').lower() in wanted) != exclude]
+        return b''.join(lines) + b'\r\n'
+
+    def section(self, spec):
+        """Bytes of a BODY[...] section such as '', 'HEADER', 'TEXT', '1', '1.2' or 'HEADER.FIELDS (FROM)'"""
+        upper = spec.upper()
+        if not spec:
+            return self.raw
+        if upper == 'HEADER':
+            return self.header
+        if upper == 'TEXT':
+            return self.raw[self.header_end:]
+        if upper.startswith('HEADER.FIELDS'):
+            names = spec[spec.index('(') + 1:spec.rindex(')')].split()
+            return self.header_fields(names, exclude=upper.startswith('HEADER.FIELDS.NOT'))
+
+        path = []
+        for piece in spec.split('.'):
+            if not piece.isdigit():
+                raise BadCommand(f"unsupported section {spec}")
+            path.append(int(piece))
+        part = email.message_from_bytes(self.raw)
+        for number in path:
+            if part.is_multipart():
+                children = part.get_payload()
+                if number > len(children):
+                    return b''
+                part = children[number - 1]
+            elif number != 1:
+                return b''
+        if part.is_multipart():
+            text = part.as_bytes()
+            return text[text.find(b'\n\n') + 2:]
+        return _leaf_bytes(part)
+
+
+def _tokenize(line):
+    """Split a command line into atoms, quoted strings and nested lists"""
+    stack = [[]]
+    i, n = 0, len(line)
+    while i < n:
+        c = line[i]
+        if c == ' ':
+            i += 1
+        elif c == '(':
+            stack.append([])
+            i += 1
+        elif c == ')':
+            if len(stack) == 1:
+                raise BadCommand("unbalanced parentheses")
+            done = stack.pop()
+            stack[-1].append(done)
+            i += 1
+        elif c == '"':
+            i += 1
+            value = []
+            while i < n and line[i] != '"':
+                if line[i] == '\\':
+                    i += 1
+                value.append(line[i])
+                i += 1
+            stack[-1].append(''.join(value))
+            i += 1
+        else:
+            start = i
+            depth = 0
+            # Section specs such as BODY.PEEK[HEADER.FIELDS (FROM SUBJECT)] contain spaces and parentheses
+            while i < n and (depth or line[i] not in ' ()'):
+                if line[i] == '[':
+                    depth += 1
+                elif line[i] == ']':
+                    depth -= 1
+                i += 1
+            stack[-1].append(line[start:i])
+    if len(stack) != 1:
+        raise BadCommand("unbalanced parentheses")
+    return stack[0]
+
+
+def _in_set(spec, value, largest):
+    """Return True if value is in an IMAP sequence set such as '1:3,7,9:*'"""
+    for piece in spec.split(','):
+        low, _, high = piece.partition(':')
+        low = largest if low == '*' else int(low)
+        high = low if not high else largest if high == '*' else int(high)
+        if min(low, high) <= value <= max(low, high):
+            return True
+    return False
+
+
+def _is_set(token):
+    return isinstance(token, str) and bool(token) and all(c in '0123456789:,*' for c in token)
+
+
+class ImapStubServer:
+    """Threaded IMAP server holding one mailbox in memory"""
+
+    def __init__(self, host='127.0.0.1', port=0, user='user', password='password', mailbox='INBOX',
+                 uidvalidity=1, idle=True):
+        """Initialize with the credentials and name of the only mailbox; idle=False hides the IDLE capability"""
+        self.user = user
+        self.password = password
+        self.mailbox = mailbox
+        self.uidvalidity = uidvalidity
+        self.capabilities = CAPABILITIES if idle else CAPABILITIES.replace(' IDLE', '')
+        self.messages = []
+        self.commands = Counter()
+        self.bytes_sent = 0
+        self._next_uid = 1
+        self._lock = threading.Lock()
+        self._idlers = set()
+        self._server = socketserver.ThreadingTCPServer((host, port), self._handler_class(), bind_and_activate=False)
+        self._server.daemon_threads = True
+        self._server.allow_reuse_address = True
+        self._server.server_bind()
+        self._server.server_activate()
+        self._thread = None
+
+    @property
+    def address(self):
+        """(host, port) to pass as IMAP_HOST and IMAP_PORT"""
+        return self._server.server_address[:2]
+
+    def start(self):
+        """Serve connections on a background thread"""
+        self._thread = threading.Thread(target=self._server.serve_forever, name="imap-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Shut the server down"""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def append(self, raw, flags=()):
+        """Add a message and tell clients in IDLE about it; returns its UID"""
+        with self._lock:
+            message = StubMessage(self._next_uid, raw, flags)
+            self._next_uid += 1
+            self.messages.append(message)
+            count = len(self.messages)
+            idlers = list(self._idlers)
+        for session in idlers:
+            session.announce(count)
+        return message.uid
+
+    def load(self, messages, seen=()):
+        """Bulk-add raw messages without notifying anyone; seen holds indexes to flag \\Seen"""
+        seen = set(seen)
+        with self._lock:
+            for index, raw in enumerate(messages):
+                self.messages.append(StubMessage(self._next_uid, raw, ('\\Seen',) if index in seen else ()))
+                self._next_uid += 1
+
+    def _snapshot(self):
+        with self._lock:
+            return list(self.messages), self._next_uid
+
+    def _handler_class(self):
+        stub = self
+
+        class Session(socketserver.StreamRequestHandler):
+            """One client connection"""
+
+            # Responses are written in several pieces; don't let Nagle hold them back
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                self.write_lock = threading.Lock()
+                self.authenticated = False
+                self.selected = False
+                self.read_only = False
+                self.known_exists = 0
+
+            def write(self, data):
+                with self.write_lock:
+                    self.wfile.write(data)
+                with stub._lock:
+                    stub.bytes_sent += len(data)
+
+            def announce(self, count):
+                """Send an untagged EXISTS if the client has not seen count messages yet"""
+                with self.write_lock:
+                    if count <= self.known_exists:
+                        return
+                    self.known_exists = count
+                    self.wfile.write(f'* {count} EXISTS\r\n'.encode())
+
+            def read_command(self):
+                """Read one command line, collecting literals; returns None at EOF"""
+                line = self.rfile.readline()
+                if not line:
+                    return None
+                parts = []
+                while True:
+                    line = line.rstrip(b'\r\n')
+                    match = _LITERAL.search(line)
+                    if not match:
+                        parts.append(line.decode('utf-8', 'replace'))
+                        return ''.join(parts)
+                    if not line.endswith(b'+}'):
+                        self.write(b'+ Ready for literal data\r\n')
+                    literal = self.rfile.read(int(match.group(1)))
+                    parts.append(line[:match.start()].decode('utf-8', 'replace'))
+                    self.literals.append(literal)
+                    parts.append(f'\x00{len(self.literals) - 1}\x00')
+                    line = self.rfile.readline()
+
+            def handle(self):
+                self.write(b'* OK [CAPABILITY ' + stub.capabilities.encode() + b'] IMAP stub ready\r\n')
+                while True:
+                    self.literals = []
+                    line = self.read_command()
+                    if line is None:
+                        return
+                    tag, _, rest = line.partition(' ')
+                    name, _, args = rest.partition(' ')
+                    name = name.upper()
+                    with stub._lock:
+                        stub.commands[name] += 1
+                    try:
+                        if not self.dispatch(tag, name, args):
+                            return
+                    except BadCommand as e:
+                        self.write(f'{tag} BAD {e}\r\n'.encode())
+                    except (ValueError, IndexError) as e:
+                        self.write(f'{tag} BAD invalid arguments: {e}\r\n'.encode())
+
+            def dispatch(self, tag, name, args):
+                """Run one command; returns False when the connection should close"""
+                if name == 'CAPABILITY':
+                    self.write(f'* CAPABILITY {stub.capabilities}\r\n{tag} OK CAPABILITY completed\r\n'.encode())
+                elif name == 'NOOP':
+                    self.ok(tag, 'NOOP completed')
+                elif name == 'LOGOUT':
+                    self.write(f'* BYE IMAP stub logging out\r\n{tag} OK LOGOUT completed\r\n'.encode())
+                    return False
+                elif name == 'LOGIN':
+                    user, password = _tokenize(args)[:2]
+                    if user == stub.user and password == stub.password:
+                        self.authenticated = True
+                        self.ok(tag, 'LOGIN completed')
+                    else:
+                        self.write(f'{tag} NO [AUTHENTICATIONFAILED] Invalid credentials\r\n'.encode())
+                elif not self.authenticated:
+                    self.write(f'{tag} BAD not authenticated\r\n'.encode())
+                elif name in ('SELECT', 'EXAMINE'):
+                    self.select(tag, name, _tokenize(args)[0])
+                elif name == 'APPEND':
+                    self.append(tag, _tokenize(args))
+                elif not self.selected:
+                    self.write(f'{tag} BAD no mailbox selected\r\n'.encode())
+                elif name == 'CLOSE':
+                    self.selected = False
+                    self.ok(tag, 'CLOSE completed')
+                elif name == 'IDLE':
+                    self.idle(tag)
+                elif name == 'UID':
+                    sub, _, sub_args = args.partition(' ')
+                    self.run(tag, sub.upper(), sub_args, uid=True)
+                else:
+                    self.run(tag, name, args, uid=False)
+                return True
+
+            def ok(self, tag, text):
+                messages, _ = stub._snapshot()
+                self.announce(len(messages))
+                self.write(f'{tag} OK {text}\r\n'.encode())
+
+            def select(self, tag, name, mailbox):
+                if mailbox.upper() != stub.mailbox.upper():
+                    self.selected = False
+                    self.write(f'{tag} NO [NONEXISTENT] Unknown mailbox\r\n'.encode())
+                    return
+                messages, next_uid = stub._snapshot()
+                unseen = next((i for i, m in enumerate(messages, 1) if '\\Seen' not in m.flags), None)
+                self.selected = True
+                self.read_only = name == 'EXAMINE'
+                with self.write_lock:
+                    self.known_exists = len(messages)
+                lines = [
+                    f'* FLAGS ({" ".join(SYSTEM_FLAGS)})',
+                    f'* OK [PERMANENTFLAGS ({" ".join(SYSTEM_FLAGS)})] Flags permitted',
+                    f'* {len(messages)} EXISTS',
+                    '* 0 RECENT',
+                    f'* OK [UIDVALIDITY {stub.uidvalidity}] UIDs valid',
+                    f'* OK [UIDNEXT {next_uid}] Predicted next UID',
+                ]
+                if unseen:
+                    lines.append(f'* OK [UNSEEN {unseen}] First unseen')
+                access = 'READ-ONLY' if self.read_only else 'READ-WRITE'
+                lines.append(f'{tag} OK [{access}] {name} completed')
+                self.write(('\r\n'.join(lines) + '\r\n').encode())
+
+            def append(self, tag, tokens):
+                literal = next((t for t in tokens if isinstance(t, str) and t.startswith('\x00')), None)
+                if literal is None or tokens[0].upper() != stub.mailbox.upper():
+                    raise BadCommand("APPEND needs the selected mailbox and a literal message")
+                flags = next((t for t in tokens[1:] if isinstance(t, list)), [])
+                uid = stub.append(self.literals[int(literal.strip('\x00'))], flags)
+                self.ok(tag, f'[APPENDUID {stub.uidvalidity} {uid}] APPEND completed')
+
+            def idle(self, tag):
+                if 'IDLE' not in stub.capabilities:
+                    raise BadCommand("IDLE is not supported")
+                self.write(b'+ idling\r\n')
+                with stub._lock:
+                    stub._idlers.add(self)
+                    count = len(stub.messages)
+                try:
+                    self.announce(count)
+                    line = self.rfile.readline()
+                finally:
+                    with stub._lock:
+                        stub._idlers.discard(self)
+                if not line:
+                    return
+                if line.strip().upper() != b'DONE':
+                    self.write(f'{tag} BAD expected DONE\r\n'.encode())
+                    return
+                self.ok(tag, 'IDLE terminated')
+
+            def run(self, tag, name, args, uid):
+                messages, _ = stub._snapshot()
+                if name == 'SEARCH':
+                    tokens = _tokenize(args)
+                    if tokens and isinstance(tokens[0], str) and tokens[0].upper() == 'CHARSET':
+                        tokens = tokens[2:]
+                    found = self.search(messages, tokens, uid)
+                    self.write(f'* SEARCH {" ".join(map(str, found))}\r\n'.encode() if found else b'* SEARCH\r\n')
+                elif name == 'FETCH':
+                    sequence, _, items = args.partition(' ')
+                    items = _tokenize(items)
+                    items = items[0] if items and isinstance(items[0], list) else items
+                    self.fetch(messages, sequence, items, uid)
+                elif name == 'STORE':
+                    sequence, mode, flags = _tokenize(args)[:3]
+                    self.store(messages, sequence, mode.upper(), flags if isinstance(flags, list) else [flags], uid)
+                else:
+                    raise BadCommand(f"unsupported command {'UID ' if uid else ''}{name}")
+                self.ok(tag, f"{'UID ' if uid else ''}{name} completed")
+
+            def select_set(self, messages, sequence, uid):
+                """Return (sequence number, message) pairs addressed by a sequence set"""
+                if not messages:
+                    return []
+                largest = messages[-1].uid if uid else len(messages)
+                return [(seq, m) for seq, m in enumerate(messages, 1)
+                        if _in_set(sequence, m.uid if uid else seq, largest)]
+
+            def search(self, messages, tokens, uid):
+                largest_uid = messages[-1].uid if messages else 0
+                keys = []
+                pos = 0
+                while pos < len(tokens):
+                    key, pos = self.search_key(tokens, pos, largest_uid, len(messages))
+                    keys.append(key)
+                return [m.uid if uid else seq for seq, m in enumerate(messages, 1)
+                        if all(key(seq, m) for key in keys)]
+
+            def search_key(self, tokens, pos, largest_uid, count):
+                """Parse one search key at tokens[pos]; returns (predicate, next position)"""
+                token = tokens[pos]
+                if isinstance(token, list):
+                    keys = []
+                    inner = 0
+                    while inner < len(token):
+                        key, inner = self.search_key(token, inner, largest_uid, count)
+                        keys.append(key)
+                    return (lambda seq, m: all(k(seq, m) for k in keys)), pos + 1
+                if _is_set(token):
+                    return (lambda seq, m: _in_set(token, seq, count)), pos + 1
+                key = token.upper()
+                flag_keys = {'SEEN': '\\Seen', 'ANSWERED': '\\Answered', 'FLAGGED': '\\Flagged',
+                             'DELETED': '\\Deleted', 'DRAFT': '\\Draft'}
+                if key == 'ALL':
+                    return (lambda seq, m: True), pos + 1
+                if key in flag_keys:
+                    return (lambda seq, m: flag_keys[key] in m.flags), pos + 1
+                if key.startswith('UN') and key[2:] in flag_keys:
+                    return (lambda seq, m: flag_keys[key[2:]] not in m.flags), pos + 1
+                if key in ('NEW', 'RECENT'):
+                    return (lambda seq, m: False), pos + 1
+                if key == 'OLD':
+                    return (lambda seq, m: True), pos + 1
+                if key == 'NOT':
+                    inner, pos = self.search_key(tokens, pos + 1, largest_uid, count)
+                    return (lambda seq, m: not inner(seq, m)), pos
+                if key == 'OR':
+                    left, pos = self.search_key(tokens, pos + 1, largest_uid, count)
+                    right, pos = self.search_key(tokens, pos, largest_uid, count)
+                    return (lambda seq, m: left(seq, m) or right(seq, m)), pos
+                if key == 'UID':
+                    spec = tokens[pos + 1]
+                    return (lambda seq, m: _in_set(spec, m.uid, largest_uid)), pos + 2
+                if key == 'FROM':
+                    value = tokens[pos + 1].lower()
+                    return (lambda seq, m: value in m.from_), pos + 2
+                if key in ('TO', 'CC', 'SUBJECT'):
+                    value = tokens[pos + 1].lower()
+                    return (lambda seq, m: value in m.header_value(key.title()).lower()), pos + 2
+                if key == 'HEADER':
+                    field, value = tokens[pos + 1], tokens[pos + 2].lower()
+                    return (lambda seq, m: value in m.header_value(field).lower()), pos + 3
+                if key in ('BODY', 'TEXT'):
+                    value = tokens[pos + 1].lower().encode('utf-8')
+                    skip_header = key == 'BODY'
+                    return (lambda seq, m: value in m.raw[m.header_end if skip_header else 0:].lower()), pos + 2
+                if key in ('LARGER', 'SMALLER'):
+                    size = int(tokens[pos + 1])
+                    if key == 'LARGER':
+                        return (lambda seq, m: len(m.raw) > size), pos + 2
+                    return (lambda seq, m: len(m.raw) < size), pos + 2
+                if key in ('SINCE', 'BEFORE', 'ON', 'SENTSINCE', 'SENTBEFORE', 'SENTON'):
+                    day = time.strptime(tokens[pos + 1], '%d-%b-%Y')[:3]
+                    compare = {'SINCE': lambda d: d >= day, 'BEFORE': lambda d: d < day, 'ON': lambda d: d == day}
+                    test = compare[key.replace('SENT', '')]
+                    return (lambda seq, m: test(_message_day(m))), pos + 2
+                raise BadCommand(f"unsupported search key {token}")
+
+            def fetch(self, messages, sequence, items, uid):
+                items = [item.upper() if '[' not in item else item for item in items]
+                if 'FAST' in items or 'ALL' in items or 'FULL' in items:
+                    items = ['FLAGS', 'INTERNALDATE', 'RFC822.SIZE']
+                if uid and 'UID' not in items:
+                    items = ['UID'] + items
+                for seq, message in self.select_set(messages, sequence, uid):
+                    out = []
+                    marks_seen = False
+                    for item in items:
+                        key = item.upper()
+                        if key == 'UID':
+                            out.append(f'UID {message.uid}'.encode())
+                        elif key == 'FLAGS':
+                            out.append(f'FLAGS ({" ".join(sorted(message.flags))})'.encode())
+                        elif key == 'RFC822.SIZE':
+                            out.append(f'RFC822.SIZE {len(message.raw)}'.encode())
+                        elif key == 'INTERNALDATE':
+                            stamp = time.strftime('%d-%b-%Y %H:%M:%S +0000', time.gmtime(message.internal_time))
+                            out.append(f'INTERNALDATE "{stamp}"'.encode())
+                        elif key in ('BODYSTRUCTURE', 'BODY'):
+                            out.append(f'{key} {message.structure()}'.encode())
+                        elif key in ('RFC822', 'RFC822.HEADER', 'RFC822.TEXT'):
+                            section = {'RFC822': '', 'RFC822.HEADER': 'HEADER', 'RFC822.TEXT': 'TEXT'}[key]
+                            marks_seen = marks_seen or key != 'RFC822.HEADER'
+                            out.append(_literal(key, message.section(section)))
+                        else:
+                            match = _FETCH_ITEM.match(item)
+                            if not match:
+                                raise BadCommand(f"unsupported fetch item {item}")
+                            command, spec, origin, length = match.groups()
+                            data = message.section(spec)
+                            name = f'BODY[{spec}]'
+                            if origin is not None:
+                                start = int(origin)
+                                data = data[start:start + int(length)] if length else data[start:]
+                                name += f'<{start}>'
+                            marks_seen = marks_seen or command.upper() == 'BODY'
+                            out.append(_literal(name, data))
+                    if marks_seen and not self.read_only and '\\Seen' not in message.flags:
+                        message.flags.add('\\Seen')
+                        out.append(b'FLAGS (\\Seen)')
+                    self.write(f'* {seq} FETCH ('.encode() + b' '.join(out) + b')\r\n')
+
+            def store(self, messages, sequence, mode, flags, uid):
+                for seq, message in self.select_set(messages, sequence, uid):
+                    if mode.startswith('+FLAGS'):
+                        message.flags.update(flags)
+                    elif mode.startswith('-FLAGS'):
+                        message.flags.difference_update(flags)
+                    elif mode.startswith('FLAGS'):
+                        message.flags = set(flags)
+                    else:
+                        raise BadCommand(f"unsupported STORE mode {mode}")
+                    if not mode.endswith('.SILENT'):
+                        uid_item = f'UID {message.uid} ' if uid else ''
+                        self.write(f'* {seq} FETCH ({uid_item}FLAGS ({" ".join(sorted(message.flags))}))\r\n'.encode())
+
+        return Session
+
+
+def _literal(name, data):
+    return f'{name} {{{len(data)}}}\r\n'.encode() + data
+
+
+def _message_day(message):
+    try:
+        return parsedate_to_datetime(message.header_value('Date')).timetuple()[:3]
+    except (TypeError, ValueError):
+        return time.gmtime(message.internal_time)[:3]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a synthetic mailbox over IMAP for benchmarks and manual testing")
+    parser.add_argument('--port', type=int, default=1143)
+    parser.add_argument('--messages', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--attachment-kb', type=int, default=128, help="typical attachment size")
+    parser.add_argument('--seen-ratio', type=float, default=0.0, help="share of messages flagged \\Seen")
+    parser.add_argument('--no-idle', action='store_true', help="do not advertise IDLE")
+    args = parser.parse_args()
+
+    server = ImapStubServer(port=args.port, idle=not args.no_idle)
+    kinds = Counter()
+    raws = []
+    for kind, raw in generate_mailbox(args.messages, seed=args.seed, attachment_kb=args.attachment_kb):
+        kinds[kind] += 1
+        raws.append(raw)
+    server.load(raws, seen=range(int(len(raws) * args.seen_ratio)))
+    server.start()
+    host, port = server.address
+    # One JSON line tells scripts that the server is ready and what the mailbox holds
+    print(json.dumps({"host": host, "port": port, "messages": len(raws),
+                      "bytes": sum(len(raw) for raw in raws), "kinds": dict(kinds)}), flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
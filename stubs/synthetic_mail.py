@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Synthetic mailbox of bank alerts mixed with ordinary mail.
+
+Generates raw RFC 822 messages for benchmarks and the local IMAP stand-in
+(`stubs/imap_server.py`): HDFC UPI credit and credit card alerts that the
+bundled rule pack turns into payment alerts (plain text, multipart and
+HTML-only, in 7bit, quoted-printable and base64), other mail from the bank
+that must not alert (debits, statements with PDF attachments), and noise from
+other senders (newsletters, long reply threads, large attachments, and bodies
+and subjects in odd charsets).
+
+Messages are built from templates rather than the email package, so 10k of
+them are generated in a few seconds. The output is deterministic for a given seed.
+"""
+
+import base64
+import quopri
+import random
+from datetime import datetime, timedelta, timezone
+from email.header import Header
+from email.utils import format_datetime
+
+# Relative share of each kind of message in a generated mailbox
+DEFAULT_MIX = {
+    'upi_credit': 4,
+    'card_alert': 1,
+    'html_alert': 1,
+    'bank_debit': 5,
+    'bank_statement': 0.5,
+    'newsletter': 45,
+    'thread': 20,
+    'charset': 10,
+    'attachment': 1,
+}
+
+# Kinds the bundled rule pack reports as payments
+PAYMENT_KINDS = frozenset(('upi_credit', 'card_alert', 'html_alert'))
+
+BANK_SENDER = 'HDFC Bank InstaAlerts <alerts@hdfcbank.net>'
+RECIPIENT = 'me@example.com'
+WORDS = (
+    "update account newsletter offer meeting invoice shipping order delivery weekly summary team "
+    "project schedule review report security login device welcome release notes pricing community "
+    "webinar roadmap feedback support renewal discount event launch survey quarterly"
+).split()
+FOOTER = (
+    "This is a system generated alert. Please do not reply to this email. For any queries, "
+    "reach out to us via PhoneBanking or visit the nearest branch. Never share your OTP, PIN, "
+    "card details or passwords with anyone, including bank staff."
+)
+ODD_CHARSETS = (
+    ('iso-8859-1', 'quoted-printable', "Résumé de votre commande", "Votre commande a été expédiée. Merci d'avoir choisi notre boutique, à bientôt !"),
+    ('windows-1252', '8bit', "“Weekly” digest – issue", "Here’s what you missed this week… “Top stories” – curated for you."),
+    ('koi8-r', 'base64', "Ваш заказ отправлен", "Здравствуйте! Ваш заказ передан в службу доставки. Спасибо за покупку."),
+    ('shift_jis', 'base64', "ご注文ありがとうございます", "この度はご注文いただき、誠にありがとうございます。発送まで今しばらくお待ちください。"),
+    ('iso-2022-jp', '7bit', "会議のお知らせ", "来週の定例会議は水曜日の午後三時からです。よろしくお願いいたします。"),
+)
+IST = timezone(timedelta(hours=5, minutes=30))
+BASE_TIME = datetime(2024, 5, 1, 8, 0, tzinfo=IST)
+
+# Pseudo-random bytes tiled into attachments, so large mailboxes are cheap to build
+_BLOCK = random.Random(0).getrandbits(8 * 49152).to_bytes(49152, 'little')
+
+
+def _b64(data):
+    return base64.encodebytes(data).replace(b'\n', b'\r\n')
+
+
+def _crlf(text):
+    return text.replace('\r\n', '\n').replace('\n', '\r\n')
+
+
+def _encode(text, charset, encoding):
+    """Return the body bytes of a text part in the given charset and transfer encoding"""
+    data = _crlf(text).encode(charset)
+    if encoding == 'base64':
+        return _b64(data)
+    if encoding == 'quoted-printable':
+        return quopri.encodestring(data).replace(b'\r\n', b'\n').replace(b'\n', b'\r\n')
+    return data
+
+
+def _text_part(text, subtype='plain', charset='utf-8', encoding='7bit'):
+    headers = (
+        f'Content-Type: text/{subtype}; charset="{charset}"\r\n'
+        f'Content-Transfer-Encoding: {encoding}\r\n\r\n'
+    ).encode('ascii')
+    return headers + _encode(text, charset, encoding)
+
+
+def _attachment_part(rng, filename, content_type, size):
+    offset = rng.randrange(len(_BLOCK))
+    data = (_BLOCK[offset:] + _BLOCK * (size // len(_BLOCK) + 1))[:size]
+    headers = (
+        f'Content-Type: {content_type}; name="{filename}"\r\n'
+        f'Content-Disposition: attachment; filename="{filename}"\r\n'
+        'Content-Transfer-Encoding: base64\r\n\r\n'
+    ).encode('ascii')
+    return headers + _b64(data)
+
+
+def _multipart(subtype, parts, boundary):
+    body = b''.join(b'--' + boundary.encode() + b'\r\n' + part + b'\r\n' for part in parts)
+    headers = f'Content-Type: multipart/{subtype}; boundary="{boundary}"\r\n\r\n'.encode('ascii')
+    return headers + b'This is a multi-part message in MIME format.\r\n' + body + b'--' + boundary.encode() + b'--\r\n'
+
+
+def _message(index, from_, subject, content, extra_headers=()):
+    """Prepend the top-level headers to a part (its own headers become the message's MIME headers)"""
+    if any(ord(c) > 127 for c in subject):
+        subject = Header(subject, 'utf-8').encode()
+    date = BASE_TIME + timedelta(minutes=7 * index)
+    headers = [
+        f'Return-Path: <{from_.split("<")[-1].rstrip(">")}>',
+        f'Message-ID: <{index}.{date.strftime("%Y%m%d%H%M%S")}@synthetic.example>',
+        f'Date: {format_datetime(date)}',
+        f'From: {from_}',
+        f'To: {RECIPIENT}',
+        f'Subject: {subject}',
+        'MIME-Version: 1.0',
+    ]
+    headers.extend(extra_headers)
+    return ('\r\n'.join(headers) + '\r\n').encode('ascii') + content
+
+
+def _amount(rng):
+    return f"{rng.randint(1, 99999):,}.{rng.randint(0, 99):02d}"
+
+
+def _words(rng, count):
+    return ' '.join(rng.choices(WORDS, k=count))
+
+
+def _paragraphs(rng, lines):
+    return '\n'.join(_words(rng, 14) for _ in range(lines))
+
+
+def _html(text):
+    paragraphs = ''.join(f'<p style="font-family:Arial;font-size:14px">{line}</p>' for line in text.split('\n') if line)
+    return f'<html><head><meta charset="utf-8"></head><body><table width="600"><tr><td>{paragraphs}</td></tr></table></body></html>'
+
+
+def upi_credit(rng, index, attachment_kb):
+    text = (
+        f"Dear Customer,\n\nRs.{_amount(rng)} has been credited to account **{rng.randint(1000, 9999)} by VPA "
+        f"{rng.choice(WORDS)}{rng.randint(1, 999)}@ok{rng.choice(('axis', 'hdfcbank', 'icici', 'sbi'))} on "
+        f"{(BASE_TIME + timedelta(minutes=7 * index)).strftime('%d-%m-%y')}.\n\n"
+        f"Your UPI transaction reference number is {rng.randint(10 ** 11, 10 ** 12 - 1)}.\n\n"
+        f"Thank you for banking with us.\n\nWarm Regards,\nHDFC Bank\n\n{FOOTER}\n"
+    )
+    encoding = rng.choice(('7bit', 'quoted-printable', 'base64'))
+    if rng.random() < 0.5:
+        content = _text_part(text, encoding=encoding)
+    else:
+        content = _multipart('alternative', [
+            _text_part(text, encoding=encoding),
+            _text_part(_html(text), 'html', encoding='quoted-printable'),
+        ], f'alt-{index}')
+    return _message(index, BANK_SENDER, "❗ You have received a UPI payment", content)
+
+
+def card_alert(rng, index, attachment_kb):
+    when = BASE_TIME + timedelta(minutes=7 * index)
+    text = (
+        f"Dear Card Member,\n\nThank you for using your HDFC Bank Credit Card ending {rng.randint(1000, 9999)} "
+        f"for Rs {_amount(rng)} at {rng.choice(WORDS).upper()} {rng.choice(('STORES', 'MART', 'FOODS'))} "
+        f"on {when.strftime('%Y-%m-%d:%H:%M:%S')}. Authorization code:- {rng.randint(100000, 999999)}\n\n{FOOTER}\n"
+    )
+    return _message(index, BANK_SENDER, "Transaction alert for your HDFC Bank Credit Card",
+                    _text_part(text, encoding=rng.choice(('7bit', 'quoted-printable'))))
+
+
+def html_alert(rng, index, attachment_kb):
+    """UPI credit alert sent as HTML only; the alerter has to fall back to the raw message"""
+    text = (
+        f"Dear Customer,\nRs.{_amount(rng)} has been credited to account **{rng.randint(1000, 9999)} by VPA "
+        f"{rng.choice(WORDS)}{rng.randint(1, 999)}@okaxis on "
+        f"{(BASE_TIME + timedelta(minutes=7 * index)).strftime('%d-%m-%y')}.\n"
+        f"Your UPI transaction reference number is {rng.randint(10 ** 11, 10 ** 12 - 1)}.\n{FOOTER}"
+    )
+    return _message(index, BANK_SENDER, "You have received a UPI payment",
+                    _text_part(_html(text), 'html', encoding='quoted-printable'))
+
+
+def bank_debit(rng, index, attachment_kb):
+    text = (
+        f"Dear Customer,\n\nRs.{_amount(rng)} has been debited from account **{rng.randint(1000, 9999)} to VPA "
+        f"{rng.choice(WORDS)}@ybl on {(BASE_TIME + timedelta(minutes=7 * index)).strftime('%d-%m-%y')}.\n\n"
+        f"If you did not authorize this transaction, please report it immediately.\n\n{FOOTER}\n"
+    )
+    return _message(index, BANK_SENDER, "❗ You have done a UPI txn. Check details!",
+                    _text_part(text, encoding='quoted-printable'))
+
+
+def bank_statement(rng, index, attachment_kb):
+    size = int(attachment_kb * 1024 * rng.uniform(0.5, 1.5))
+    month = (BASE_TIME + timedelta(minutes=7 * index)).strftime('%B %Y')
+    content = _multipart('mixed', [
+        _text_part(f"Dear Customer,\n\nYour account statement for {month} is attached. "
+                   f"The password is your customer ID.\n\n{FOOTER}\n"),
+        _attachment_part(rng, f"statement_{index}.pdf", 'application/pdf', size),
+    ], f'mixed-{index}')
+    return _message(index, BANK_SENDER, f"Your HDFC Bank account statement for {month}", content)
+
+
+def newsletter(rng, index, attachment_kb):
+    text = _paragraphs(rng, rng.randint(10, 60))
+    sender = rng.choice(WORDS)
+    content = _multipart('alternative', [
+        _text_part(text, encoding='quoted-printable'),
+        _text_part(_html(text), 'html', encoding='quoted-printable'),
+    ], f'news-{index}')
+    return _message(index, f'{sender.title()} Weekly <news@{sender}.example>', _words(rng, 6).capitalize(), content,
+                    (f'List-Unsubscribe: <mailto:unsubscribe@{sender}.example>', 'Precedence: bulk'))
+
+
+def thread(rng, index, attachment_kb):
+    lines = []
+    for depth in range(rng.randint(1, 6)):
+        lines.append(f"On {format_datetime(BASE_TIME - timedelta(days=depth))}, colleague{depth} wrote:")
+        prefix = '>' * (depth + 1) + ' '
+        lines.extend(prefix + _words(rng, 12) for _ in range(rng.randint(5, 40)))
+    text = _paragraphs(rng, rng.randint(2, 8)) + '\n\n' + '\n'.join(lines)
+    return _message(index, f'Colleague <colleague{rng.randint(1, 50)}@work.example>', 'Re: ' + _words(rng, 4),
+                    _text_part(text))
+
+
+def charset(rng, index, attachment_kb):
+    name, encoding, subject, sentence = rng.choice(ODD_CHARSETS)
+    text = '\n'.join(sentence for _ in range(rng.randint(3, 30)))
+    message = _message(index, f'Shop <orders@{rng.choice(WORDS)}.example>', 'x', _text_part(text, charset=name, encoding=encoding))
+    # Encoded-word subject in the message's own charset
+    return message.replace(b'Subject: x\r\n', b'Subject: ' + Header(subject, name).encode().encode('ascii') + b'\r\n', 1)
+
+
+def attachment(rng, index, attachment_kb):
+    size = int(attachment_kb * 1024 * rng.uniform(0.5, 2.0))
+    filename, content_type = rng.choice((('invoice.pdf', 'application/pdf'), ('photos.zip', 'application/zip'),
+                                         ('scan.jpg', 'image/jpeg')))
+    content = _multipart('mixed', [
+        _text_part(_paragraphs(rng, 3)),
+        _attachment_part(rng, filename, content_type, size),
+    ], f'att-{index}')
+    return _message(index, f'Billing <billing@{rng.choice(WORDS)}.example>', _words(rng, 3).capitalize(), content)
+
+
+BUILDERS = {
+    'upi_credit': upi_credit,
+    'card_alert': card_alert,
+    'html_alert': html_alert,
+    'bank_debit': bank_debit,
+    'bank_statement': bank_statement,
+    'newsletter': newsletter,
+    'thread': thread,
+    'charset': charset,
+    'attachment': attachment,
+}
+
+
+def generate_mailbox(count, seed=1, mix=None, attachment_kb=128, start=0):
+    """
+    Yield (kind, raw message bytes) for count messages.
+    mix maps kinds to relative weights (default DEFAULT_MIX); start offsets the
+    message index, so later batches get later dates and distinct Message-IDs.
+    """
+    mix = mix or DEFAULT_MIX
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+    rng = random.Random(f"{seed}:{start}")
+    for index in range(start, start + count):
+        kind = rng.choices(kinds, weights)[0]
+        yield kind, BUILDERS[kind](rng, index, attachment_kb)
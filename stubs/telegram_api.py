@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Telegram Bot API.
+
+Implements enough of `sendMessage`, `getUpdates`, `setWebhook` and `deleteWebhook` (plus `getMe`)
+for benchmarks and tests to run the real `TelegramBot` against it. Like Telegram, it answers with a 429 and a
+`retry_after` value when a chat or the bot as a whole sends too fast, and refuses `getUpdates` while a
+webhook is set.
+
+For load and fault testing, every call can be delayed by a latency distribution, and `sendMessage` can fail
+with an injected 429, a 5xx error or a connection reset, either scripted (`fail_next`) or at random
+(`fault_rates`). A `lost_response` reset records the message before dropping the connection, like a
+response lost on the way back. Every accepted message is kept in `deliveries`, so tests can check that each
+alert arrived exactly once.
+
+Point the bot at it with:
+    TELEGRAM_API_BASE_URL=http://127.0.0.1:<port>/bot
+"""
+
+import argparse
+import json
+import logging
+import math
+import random
+import socket
+import struct
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger("GitHubSponsorsBot.TelegramStub")
+
+# Faults that can be injected into sendMessage
+FLOOD = 'flood'                    # 429 with retry_after; the message is not delivered
+SERVER_ERROR = 'server_error'      # 5xx; the message is not delivered
+RESET = 'reset'                    # connection reset before the message is delivered
+LOST_RESPONSE = 'lost_response'    # message delivered, then the connection is reset instead of answering
+FAULTS = (FLOOD, SERVER_ERROR, RESET, LOST_RESPONSE)
+
+# Longest a getUpdates call waits for new updates, whatever timeout the client asks for
+MAX_LONG_POLL = 1.0
+
+
+def fixed_latency(seconds):
+    """Latency distribution that always answers after the given time"""
+    return lambda rng: seconds
+
+
+def uniform_latency(low, high):
+    """Latency distribution uniform between low and high seconds"""
+    return lambda rng: rng.uniform(low, high)
+
+
+def lognormal_latency(median, sigma=0.5):
+    """Long-tailed latency distribution around a median in seconds, like real network round trips"""
+    return lambda rng: rng.lognormvariate(math.log(median), sigma)
+
+
+class _Window:
+    """Counts requests in a sliding window of one second"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.times = []
+
+    def full(self, now):
+        self.times = [t for t in self.times if now - t < 1.0]
+        return len(self.times) >= self.limit
+
+    def retry_after(self, now):
+        return max(1, math.ceil(1.0 - (now - self.times[0])))
+
+
+def _flood_response(retry_after):
+    return 429, {
+        "ok": False,
+        "error_code": 429,
+        "description": f"Too Many Requests: retry after {retry_after}",
+        "parameters": {"retry_after": retry_after},
+    }
+
+
+class TelegramStubServer:
+    """Threaded HTTP server emulating the Telegram Bot API, its flood limits and injected faults"""
+
+    def __init__(self, host='127.0.0.1', port=0, chat_limit=1, global_limit=30, latency=None, seed=None):
+        """
+        Initialize with per-chat and global messages-per-second limits.
+        latency is a distribution such as lognormal_latency(0.05) applied to every call; seed makes the
+        latency and random faults reproducible.
+        """
+        self.chat_limit = chat_limit
+        self.global_limit = global_limit
+        self.latency = latency
+        # Probability of each fault per sendMessage call, e.g. {SERVER_ERROR: 0.05, RESET: 0.01}
+        self.fault_rates = {}
+        # retry_after and status used by random faults
+        self.retry_after = 1
+        self.error_status = 500
+        self.deliveries = []
+        self.rejections = 0
+        self.injected = Counter()
+        self.calls = Counter()
+        # Parameters of the last setWebhook call, or None
+        self.webhook = None
+        self._updates = []
+        self._update_id = 0
+        self._scripted = deque()
+        self._rng = random.Random(seed)
+        self._global = _Window(global_limit)
+        self._chats = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._stopping = False
+        self._message_id = 0
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        """Value for TELEGRAM_API_BASE_URL"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/bot"
+
+    def start(self):
+        """Serve requests on a background thread"""
+        self._thread = threading.Thread(target=self._server.serve_forever, name="telegram-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Shut the server down, releasing getUpdates calls that are still waiting"""
+        with self._changed:
+            self._stopping = True
+            self._changed.notify_all()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def fail_next(self, fault, count=1, retry_after=1, status=500):
+        """Make the next count sendMessage calls fail with the given fault"""
+        if fault not in FAULTS:
+            raise ValueError(f"Unknown fault {fault!r}, expected one of {FAULTS}")
+        with self._lock:
+            self._scripted.extend([(fault, retry_after, status)] * count)
+
+    def add_message(self, text, chat_id=42, user_id=42):
+        """Queue an incoming message for getUpdates; commands get a bot_command entity"""
+        with self._changed:
+            self._update_id += 1
+            self._message_id += 1
+            message = {
+                "message_id": self._message_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": {"id": user_id, "is_bot": False, "first_name": "Stub"},
+                "text": text,
+            }
+            if text.startswith('/'):
+                message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+            update = {"update_id": self._update_id, "message": message}
+            self._updates.append(update)
+            self._changed.notify_all()
+        return update
+
+    def wait_for_deliveries(self, count, timeout=5.0):
+        """Wait until at least count messages were delivered; returns whether they were"""
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while len(self.deliveries) < count:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._changed.wait(remaining)
+        return True
+
+    def deliveries_to(self, chat_id):
+        """Messages delivered to one chat, oldest first"""
+        with self._lock:
+            return [delivery for delivery in self.deliveries if delivery["chat_id"] == str(chat_id)]
+
+    def delivery_counts(self):
+        """How often each message text was delivered"""
+        with self._lock:
+            return Counter(delivery["text"] for delivery in self.deliveries)
+
+    def duplicates(self):
+        """Message texts that were delivered more than once, with their counts"""
+        return {text: count for text, count in self.delivery_counts().items() if count > 1}
+
+    def _pick_fault(self):
+        """Return the (fault, retry_after, status) for this sendMessage call, or None; called with the lock held"""
+        if self._scripted:
+            return self._scripted.popleft()
+        for fault, rate in self.fault_rates.items():
+            if rate and self._rng.random() < rate:
+                return fault, self.retry_after, self.error_status
+        return None
+
+    def _send_message(self, params):
+        """Accept, rate-limit or fail a sendMessage call; returns (status, body), or (None, None) to reset"""
+        chat_id = str(params.get('chat_id'))
+        now = time.monotonic()
+        with self._changed:
+            fault = self._pick_fault()
+            if fault:
+                kind, retry_after, status = fault
+                self.injected[kind] += 1
+                if kind == FLOOD:
+                    return _flood_response(retry_after)
+                if kind == SERVER_ERROR:
+                    return status, {"ok": False, "error_code": status, "description": "Internal Server Error"}
+                if kind == RESET:
+                    return None, None
+            chat = self._chats.setdefault(chat_id, _Window(self.chat_limit))
+            if not fault:
+                for window in (chat, self._global):
+                    if window.full(now):
+                        self.rejections += 1
+                        return _flood_response(window.retry_after(now))
+            chat.times.append(now)
+            self._global.times.append(now)
+            self._message_id += 1
+            message = {
+                "message_id": self._message_id,
+                "date": int(time.time()),
+                "chat": {"id": int(chat_id) if chat_id.lstrip('-').isdigit() else 0, "type": "private"},
+                "text": params.get('text', ''),
+            }
+            self.deliveries.append({"chat_id": chat_id, "text": message["text"], "time": time.time()})
+            self._changed.notify_all()
+        if fault:
+            # LOST_RESPONSE: delivered, but the client never hears about it
+            return None, None
+        return 200, {"ok": True, "result": message}
+
+    def _get_updates(self, params):
+        """Return updates from offset on, waiting up to timeout seconds for new ones"""
+        if self.webhook:
+            return 409, {
+                "ok": False,
+                "error_code": 409,
+                "description": "Conflict: can't use getUpdates method while webhook is active",
+            }
+        offset = int(params.get('offset') or 0)
+        limit = int(params.get('limit') or 100)
+        deadline = time.monotonic() + min(float(params.get('timeout') or 0), MAX_LONG_POLL)
+        with self._changed:
+            # Like Telegram, asking for an offset confirms every update before it
+            self._updates = [update for update in self._updates if update["update_id"] >= offset]
+            while not self._updates and not self._stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._changed.wait(remaining)
+            result = self._updates[:limit]
+        return 200, {"ok": True, "result": result}
+
+    def _route(self, method, params):
+        """Answer one Bot API call; returns (status, body), or (None, None) to reset the connection"""
+        if method == 'sendMessage':
+            return self._send_message(params)
+        if method == 'getUpdates':
+            return self._get_updates(params)
+        if method == 'getMe':
+            return 200, {"ok": True, "result": {
+                "id": 123456, "is_bot": True, "first_name": "Stub", "username": "stub_bot"
+            }}
+        if method == 'setWebhook':
+            self.webhook = params
+            return 200, {"ok": True, "result": True, "description": "Webhook was set"}
+        if method == 'deleteWebhook':
+            self.webhook = None
+            return 200, {"ok": True, "result": True, "description": "Webhook was deleted"}
+        return 404, {"ok": False, "error_code": 404, "description": "Not Found"}
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                raw = self.rfile.read(length) if length else b''
+                try:
+                    params = json.loads(raw or b'{}')
+                except ValueError:
+                    params = {}
+                method = self.path.rsplit('/', 1)[-1]
+                with stub._lock:
+                    stub.calls[method] += 1
+                    delay = stub.latency(stub._rng) if stub.latency else 0
+                if delay > 0:
+                    time.sleep(delay)
+                status, body = stub._route(method, params)
+                if status is None:
+                    self.reset()
+                    return
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def reset(self):
+                """Drop the connection with a TCP reset instead of answering"""
+                self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+                self.close_connection = True
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Telegram Bot API stub for manual load and fault testing")
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency-ms', type=float, default=0, help="median latency of every call")
+    parser.add_argument('--chat-limit', type=int, default=1, help="messages per second per chat")
+    parser.add_argument('--global-limit', type=int, default=30, help="messages per second in total")
+    for fault in FAULTS:
+        parser.add_argument(f"--{fault.replace('_', '-')}-rate", type=float, default=0.0,
+                            help=f"probability of a {fault} fault per sendMessage")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server = TelegramStubServer(
+        port=args.port,
+        chat_limit=args.chat_limit,
+        global_limit=args.global_limit,
+        latency=lognormal_latency(args.latency_ms / 1000) if args.latency_ms else None
+    )
+    server.fault_rates = {fault: getattr(args, f"{fault}_rate") for fault in FAULTS}
+    server.start()
+    print(f"Telegram stub listening, use TELEGRAM_API_BASE_URL={server.base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print(f"{len(server.deliveries)} delivered, {len(server.duplicates())} duplicated, "
+              f"{server.rejections} rate limited, injected {dict(server.injected)}")
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,7 @@
 Test script to simulate GitHub webhook events.
 This script sends a simulated GitHub Sponsors webhook payload to your webhook server
 to test the integration without needing to set up a real GitHub webhook.
+The payload builder is also used by benchmarks/bench_webhook_load.py.
 """
 
 import os
@@ -22,15 +23,68 @@ logging.basicConfig(
 )
 logger = logging.getLogger("WebhookTest")
 
+# Actions GitHub sends with the sponsorship event
+SPONSORSHIP_ACTIONS = (
+    'created', 'cancelled', 'edited', 'tier_changed', 'pending_cancellation', 'pending_tier_change'
+)
+
 def generate_signature(payload, secret):
     """Generate a GitHub webhook signature for the payload"""
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
     mac = hmac.new(
         secret.encode('utf-8'),
-        msg=payload.encode('utf-8'),
+        msg=payload,
         digestmod=hashlib.sha256
     )
     return f"sha256={mac.hexdigest()}"
 
+def build_sponsorship_payload(action='created', login='test-user', name='Test User', amount=10,
+                              one_time=False, description='', created_at=None):
+    """
+    Build a sponsorship event payload shaped like the ones GitHub sends.
+    description is the tier description, which makes up most of the size of real payloads.
+    """
+    created_at = created_at or datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ")
+    user_id = int(hashlib.md5(login.encode('utf-8')).hexdigest()[:7], 16)
+    user = {
+        "login": login,
+        "id": user_id,
+        "node_id": f"MDQ6VXNlcj{user_id}",
+        "avatar_url": f"https://avatars.githubusercontent.com/u/{user_id}?v=4",
+        "html_url": f"https://github.com/{login}",
+        "type": "User",
+        "site_admin": False,
+    }
+    tier = {
+        "node_id": f"MDEyOlNwb25zb3JzVGllcj{amount}",
+        "created_at": "2019-12-20T19:17:05Z",
+        "description": description,
+        "monthly_price_in_cents": amount * 100,
+        "monthly_price_in_dollars": amount,
+        "name": f"${amount} a month" if not one_time else f"${amount} one time",
+        "is_one_time": one_time,
+        "is_custom_amount": False,
+    }
+    payload = {
+        "action": action,
+        "sponsorship": {
+            "node_id": f"MDExOlNwb25zb3JzaGlw{user_id}{created_at[:10].replace('-', '')}",
+            "created_at": created_at,
+            "sponsorable": dict(user, login="maintainer", html_url="https://github.com/maintainer"),
+            "sponsor": dict(user, name=name),
+            "privacy_level": "public",
+            "tier": tier,
+            "is_one_time_payment": one_time,
+        },
+        "sender": user,
+    }
+    if action in ('edited', 'tier_changed'):
+        payload["changes"] = {"tier": {"from": dict(tier, monthly_price_in_dollars=max(1, amount // 2))}}
+    if action in ('pending_cancellation', 'pending_tier_change'):
+        payload["effective_date"] = created_at
+    return payload
+
 def test_webhook():
     """Test the webhook server by sending a simulated GitHub Sponsors event"""
     # Load environment variables
@@ -52,21 +106,7 @@ def test_webhook():
     # Create a sample sponsorship event payload
     current_time = datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ")
     
-    payload = {
-        "action": "created",
-        "sponsorship": {
-            "sponsor": {
-                "login": "test-user",
-                "name": "Test User"
-            },
-            "tier": {
-                "name": "Test Tier",
-                "monthly_price_in_dollars": 10
-            },
-            "created_at": current_time,
-            "is_one_time_payment": False
-        }
-    }
+    payload = build_sponsorship_payload(created_at=current_time)
     
     # Convert payload to JSON
     payload_json = json.dumps(payload)
@@ -86,8 +126,8 @@ def test_webhook():
         logger.info(f"Sending test webhook to {webhook_url}")
         response = requests.post(webhook_url, data=payload_json, headers=headers)
         
-        # Check response
-        if response.status_code == 200:
+        # Check response (new sponsorships are answered with 202 once queued)
+        if response.status_code in (200, 202):
             logger.info("Webhook test successful!")
             print(f"\n✅ Success! Webhook server responded with status code {response.status_code}")
             print(f"Response: {response.text}")
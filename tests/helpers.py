@@ -0,0 +1,41 @@
+"""
+Shared test doubles for the payment sources.
+"""
+
+import threading
+
+
+class NullNotifier:
+    """Accepts every alert and discards it"""
+
+    def send_message(self, message, **kwargs):
+        return True
+
+
+class RecordingNotifier:
+    """Collects the routing fields of each alert instead of queueing it; set accept to False to reject alerts"""
+
+    def __init__(self):
+        self.sent = []
+        self.accept = True
+        self.received = threading.Condition()
+
+    def send_message(self, message, **kwargs):
+        if not self.accept:
+            return False
+        with self.received:
+            self.sent.append(kwargs)
+            self.received.notify_all()
+        return True
+
+    def values(self, *fields):
+        """Return the given fields of every alert, as tuples when more than one field is asked for"""
+        with self.received:
+            if len(fields) == 1:
+                return [alert.get(fields[0]) for alert in self.sent]
+            return [tuple(alert.get(field) for field in fields) for alert in self.sent]
+
+    def wait_for(self, count, timeout=5.0):
+        """Wait until at least count alerts were recorded; return False on timeout"""
+        with self.received:
+            return self.received.wait_for(lambda: len(self.sent) >= count, timeout)
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Tests for the asyncio runtime against the local Telegram stub.
+"""
+
+import asyncio
+import os
+import threading
+import time
+import unittest
+
+import aiohttp
+
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from notifications.rate_limit import TelegramRateLimiter
+from payment_sources.scheduler import PollJob
+from runtime.asyncio_runtime import AsyncPollScheduler, AsyncRuntime, AsyncTelegramSender
+from stubs.telegram_api import TelegramStubServer
+
+
+class TestAsyncRuntime(unittest.TestCase):
+    """Test the aiohttp webhook server, Telegram sender and scheduler on one loop."""
+
+    def setUp(self):
+        """Start the Telegram stub and the runtime on a background thread."""
+        self.telegram = TelegramStubServer(chat_limit=1).start()
+        self.handled = []
+        self.scheduler = AsyncPollScheduler(workers=1)
+        sender = AsyncTelegramSender("123:abc", "42", base_url=self.telegram.base_url,
+                                     rate_limiter=TelegramRateLimiter(global_rate=100, chat_rate=100, chat_burst=5))
+        self.runtime = AsyncRuntime('127.0.0.1', 0, self.webhook, lambda: {"status": "healthy"}, self.scheduler, sender)
+
+    def tearDown(self):
+        """Stop the runtime and the stub."""
+        self.runtime.stop()
+        if getattr(self, 'thread', None) is not None:
+            self.thread.join(5)
+        self.telegram.stop()
+
+    def webhook(self, body, headers):
+        self.handled.append(headers.get('X-GitHub-Delivery'))
+        return {"status": "accepted"}, 202
+
+    def start(self):
+        self.thread = threading.Thread(target=lambda: asyncio.run(self.runtime.serve()), daemon=True)
+        self.thread.start()
+        self.assertTrue(self.runtime.ready.wait(5))
+
+    def test_concurrent_webhooks_use_a_bounded_pool(self):
+        """Test that hundreds of concurrent deliveries only use the loop's default executor threads."""
+        self.start()
+        threads_before = threading.active_count()
+        url = f"http://127.0.0.1:{self.runtime.port}/webhook/github"
+
+        async def deliver(session, i):
+            async with session.post(url, data=b'{}', headers={'X-GitHub-Delivery': str(i)}) as response:
+                return response.status
+
+        async def burst():
+            async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0)) as session:
+                return await asyncio.gather(*(deliver(session, i) for i in range(300)))
+
+        statuses = asyncio.run(burst())
+        self.assertEqual(statuses, [202] * 300)
+        self.assertEqual(len(self.handled), 300)
+        # The default executor has at most min(32, CPUs + 4) threads
+        self.assertLessEqual(threading.active_count(), threads_before + min(32, (os.cpu_count() or 1) + 4) + 1)
+
+    def test_blocking_webhook_does_not_stall_the_loop(self):
+        """Test that /health and Telegram sends proceed while a webhook handler blocks."""
+        release = threading.Event()
+        self.webhook = lambda body, headers: (release.wait(5), ({"status": "accepted"}, 202))[1]
+        self.runtime.webhook_handler = self.webhook
+        self.start()
+        base = f"http://127.0.0.1:{self.runtime.port}"
+
+        async def scenario():
+            async with aiohttp.ClientSession() as session:
+                webhook = asyncio.ensure_future(session.post(f"{base}/webhook/github", data=b'{}'))
+                await asyncio.sleep(0.1)
+                started = time.monotonic()
+                async with session.get(f"{base}/health") as response:
+                    health = response.status
+                elapsed = time.monotonic() - started
+                release.set()
+                async with await webhook as response:
+                    return health, elapsed, response.status
+
+        health, elapsed, status = asyncio.run(scenario())
+        self.assertEqual((health, status), (200, 202))
+        self.assertLess(elapsed, 1)
+        self.assertTrue(self.runtime.send_message("while blocked"))
+
+    def test_send_waits_out_flood_control(self):
+        """Test that a 429 from Telegram is retried after retry_after."""
+        self.start()
+        results = []
+        senders = [threading.Thread(target=lambda i=i: results.append(self.runtime.send_message(f"alert {i}")))
+                   for i in range(2)]
+        for t in senders:
+            t.start()
+        for t in senders:
+            t.join(10)
+
+        self.assertEqual(results, [True, True])
+        self.assertEqual(sorted(d["text"] for d in self.telegram.deliveries), ["alert 0", "alert 1"])
+        self.assertGreaterEqual(self.telegram.rejections, 1)
+
+    def test_scheduler_runs_blocking_and_async_sources(self):
+        """Test that both kinds of job functions run and can be triggered from another thread."""
+        runs = {"sync": 0, "async": 0}
+
+        def blocking_check():
+            runs["sync"] += 1
+            return 0
+
+        async def async_check():
+            runs["async"] += 1
+            return 0
+
+        self.scheduler.add(PollJob("sync", blocking_check, interval=3600))
+        self.start()
+        self.scheduler.add(PollJob("async", async_check, interval=3600))
+        deadline = time.monotonic() + 2
+        while (runs["sync"] < 1 or runs["async"] < 1) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(runs, {"sync": 1, "async": 1})
+
+        self.assertEqual(self.scheduler.trigger("async"), ["async"])
+        deadline = time.monotonic() + 2
+        while runs["async"] < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(runs["async"], 2)
+        self.assertEqual(self.scheduler.stats()["sync"]["runs"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Tests for incremental Binance polling against the local Binance stub.
+"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from payment_sources import binance_alerts
+from payment_sources.binance_alerts import BinanceAlerts
+from storage.seen_ids import SeenIdStore
+from storage.state import StateStore
+from stubs.binance_api import C2C_PATH, DEPOSIT_PATH, BinanceStubServer
+from tests.helpers import RecordingNotifier
+
+MINUTE_MS = 60 * 1000
+
+
+class TestBinancePolling(unittest.TestCase):
+    """Test cursor-based polling of deposits and P2P orders."""
+
+    def setUp(self):
+        """Start the stub and point the Binance client at it."""
+        self.server = BinanceStubServer().start()
+        self.tmpdir = tempfile.mkdtemp()
+        self.state = StateStore(os.path.join(self.tmpdir, 'state.db'))
+        self.patches = [
+            patch.object(binance_alerts, 'BINANCE_API_KEY', 'key'),
+            patch.object(binance_alerts, 'BINANCE_API_SECRET', 'secret'),
+            patch.object(binance_alerts, 'BINANCE_API_URL', self.server.base_url),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        """Stop the stub and remove the temporary directory."""
+        for p in self.patches:
+            p.stop()
+        self.server.stop()
+        self.state.close()
+        shutil.rmtree(self.tmpdir)
+
+    def alerter(self):
+        self.notifier = RecordingNotifier()
+        return BinanceAlerts(self.notifier, state=self.state)
+
+    def test_first_poll_reads_only_initial_lookback(self):
+        """Test that the first poll alerts recent payments and ignores old history."""
+        now = int(time.time() * 1000)
+        self.server.add_deposit("old", "1", insert_time=now - 3 * 24 * 60 * MINUTE_MS)
+        self.server.add_deposit("recent", "25.5", insert_time=now - 5 * MINUTE_MS)
+        self.server.add_c2c_order("sell-1", trade_type='SELL', total_price='5000', create_time=now - MINUTE_MS)
+        self.server.add_c2c_order("buy-cancelled", trade_type='BUY', status='CANCELLED', create_time=now - MINUTE_MS)
+
+        alerter = self.alerter()
+        self.assertEqual(alerter.check_for_new_payments(), 2)
+        self.assertEqual(self.notifier.values("source", "amount", "currency"), [("binance", "25.5", "USDT"), ("binance", "5000", "INR")])
+        self.assertEqual(len(self.server.requests_to(DEPOSIT_PATH)), 1)
+        self.assertEqual(len(self.server.requests_to(C2C_PATH)), 2)
+
+    def test_next_poll_starts_at_cursor_minus_overlap(self):
+        """Test that a restarted poller resumes from the persisted cursor with the overlap."""
+        self.alerter().check_for_new_payments()
+        cursor = self.alerter().get_cursor('deposits')
+        self.server.requests = []
+
+        self.alerter().check_for_new_payments()
+        params = self.server.requests_to(DEPOSIT_PATH)[0]
+        self.assertEqual(int(params['startTime']), cursor - binance_alerts.BINANCE_POLL_OVERLAP * 1000)
+
+    def test_large_window_is_paged(self):
+        """Test offset paging when a window holds more deposits than one page."""
+        now = int(time.time() * 1000)
+        for i in range(1500):
+            self.server.add_deposit(f"tx{i}", "1", insert_time=now - 30 * MINUTE_MS + i)
+
+        self.assertEqual(self.alerter().check_for_new_payments(), 1500)
+        offsets = [int(p['offset']) for p in self.server.requests_to(DEPOSIT_PATH)]
+        self.assertEqual(offsets, [0, 1000])
+
+    def test_pending_deposit_is_rechecked(self):
+        """Test that an unconfirmed deposit lets the cursor advance and is alerted once it is credited."""
+        now = int(time.time() * 1000)
+        deposit = self.server.add_deposit("slow", "3", status=0, insert_time=now - 20 * MINUTE_MS)
+
+        alerter = self.alerter()
+        self.assertEqual(alerter.check_for_new_payments(), 0)
+        self.assertGreater(alerter.get_cursor('deposits'), deposit['insertTime'])
+        self.assertEqual(alerter.get_pending('deposits'), {"deposit:slow": deposit['insertTime']})
+
+        deposit['status'] = 1
+        self.server.requests = []
+        self.assertEqual(self.alerter().check_for_new_payments(), 1)
+        recheck = self.server.requests_to(DEPOSIT_PATH)[-1]
+        self.assertEqual((int(recheck['startTime']), int(recheck['endTime'])), (deposit['insertTime'],) * 2)
+        self.assertEqual(self.alerter().get_pending('deposits'), {})
+
+    def test_open_order_does_not_widen_the_window(self):
+        """Test that an order left in appeal does not pull later polls back to its createTime."""
+        now = int(time.time() * 1000)
+        order = self.server.add_c2c_order("appeal-1", status='IN_APPEAL', create_time=now - 20 * MINUTE_MS)
+        self.alerter().check_for_new_payments()
+
+        for _ in range(2):
+            self.server.requests = []
+            self.assertEqual(self.alerter().check_for_new_payments(), 0)
+            starts = [int(p['startTimestamp']) for p in self.server.requests_to(C2C_PATH) if p['tradeType'] == 'SELL']
+            self.assertEqual(len(starts), 2)
+            self.assertGreater(starts[0], order['createTime'])
+            self.assertEqual(starts[1], order['createTime'])
+
+        order['orderStatus'] = 'COMPLETED'
+        self.assertEqual(self.alerter().check_for_new_payments(), 1)
+        self.assertEqual(self.alerter().get_pending('p2p_sell'), {})
+
+    def test_rejected_alert_is_retried(self):
+        """Test that a deposit whose alert could not be queued holds the cursor and is alerted next time."""
+        now = int(time.time() * 1000)
+        deposit = self.server.add_deposit("tx-1", "10", insert_time=now - 20 * MINUTE_MS)
+        self.server.add_deposit("tx-2", "20", insert_time=now - 10 * MINUTE_MS)
+
+        alerter = self.alerter()
+        self.notifier.accept = False
+        alerter.check_for_new_payments()
+        self.assertEqual(alerter.get_cursor('deposits'), deposit['insertTime'])
+
+        self.notifier.accept = True
+        self.assertEqual(alerter.check_for_new_payments(), 2)
+        self.assertEqual(self.notifier.values("amount"), ["10", "20"])
+
+    def test_overlap_does_not_repeat_alerts(self):
+        """Test that records read again through the overlap are alerted once, across restarts."""
+        now = int(time.time() * 1000)
+        self.server.add_deposit("tx-1", "10", insert_time=now - MINUTE_MS)
+        self.server.add_c2c_order("order-1", create_time=now - MINUTE_MS)
+        seen = SeenIdStore(os.path.join(self.tmpdir, 'state.db'))
+
+        self.assertEqual(BinanceAlerts(RecordingNotifier(), state=self.state, seen=seen).check_for_new_payments(), 2)
+        self.assertEqual(BinanceAlerts(RecordingNotifier(), state=self.state, seen=seen).check_for_new_payments(), 0)
+        seen.close()
+
+        restarted = SeenIdStore(os.path.join(self.tmpdir, 'state.db'))
+        self.assertEqual(BinanceAlerts(RecordingNotifier(), state=self.state, seen=restarted).check_for_new_payments(), 0)
+        self.assertEqual(len(self.server.requests_to(DEPOSIT_PATH)), 3)
+        restarted.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Tests for the Binance user data stream against the local REST and WebSocket stubs.
+"""
+
+import os
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from payment_sources import binance_alerts
+from payment_sources.binance_alerts import BinanceAlerts
+from payment_sources.binance_stream import BinanceUserStream
+from stubs.binance_api import DEPOSIT_PATH, LISTEN_KEY_PATH, BinanceStreamStub, BinanceStubServer
+from tests.helpers import RecordingNotifier
+
+
+class TestBinanceUserStream(unittest.TestCase):
+    """Test push alerts, keepalives and reconciliation after disconnects."""
+
+    def setUp(self):
+        """Start both stubs and a stream thread pointed at them."""
+        self.server = BinanceStubServer().start()
+        self.ws = BinanceStreamStub().start()
+        self.patches = [
+            patch.object(binance_alerts, 'BINANCE_API_KEY', 'key'),
+            patch.object(binance_alerts, 'BINANCE_API_SECRET', 'secret'),
+            patch.object(binance_alerts, 'BINANCE_API_URL', self.server.base_url),
+        ]
+        for p in self.patches:
+            p.start()
+        self.notifier = RecordingNotifier()
+        self.stream = BinanceUserStream(BinanceAlerts(self.notifier), ws_url=self.ws.url, keepalive_interval=0.5,
+                                        reconcile_interval=3600, recheck_delay=3600, max_backoff=0.1)
+        self.result = []
+        self.thread = None
+
+    def tearDown(self):
+        """Stop the stream thread and both stubs."""
+        self.stream.stop()
+        if self.thread is not None:
+            self.thread.join(5)
+        for p in self.patches:
+            p.stop()
+        self.ws.stop()
+        self.server.stop()
+
+    def start_stream(self):
+        self.thread = threading.Thread(target=lambda: self.result.append(self.stream.run()), daemon=True)
+        self.thread.start()
+        self.assertTrue(self.ws.wait_for_connections(1))
+
+    def deposit_event(self, tx_id, amount):
+        self.server.add_deposit(tx_id, amount)
+        self.ws.emit({"e": "balanceUpdate", "E": int(time.time() * 1000), "a": "USDT", "d": amount})
+
+    def test_balance_update_triggers_alert(self):
+        """Test that a balance event alerts the deposit without waiting for a poll."""
+        self.start_stream()
+        self.assertEqual(self.ws.paths, ["/ws/stub-listen-key-1"])
+        self.deposit_event("tx-1", "42")
+
+        self.assertTrue(self.notifier.wait_for(1))
+        self.assertEqual(self.notifier.values("summary"), ["Deposit 42 USDT"])
+
+    def test_reconnect_reconciles_missed_payments(self):
+        """Test that a deposit made while disconnected is alerted after reconnecting."""
+        self.start_stream()
+        self.ws.drop()
+        self.server.add_deposit("missed", "7")
+
+        self.assertTrue(self.ws.wait_for_connections(2))
+        self.assertTrue(self.notifier.wait_for(1))
+        self.deposit_event("tx-2", "8")
+        self.assertTrue(self.notifier.wait_for(2))
+        self.assertEqual(self.notifier.values("summary"), ["Deposit 7 USDT", "Deposit 8 USDT"])
+        self.assertGreaterEqual(self.stream.reconnects, 1)
+
+    def test_keepalive_and_expired_listen_key(self):
+        """Test that the listenKey is kept alive and replaced when it expires."""
+        self.start_stream()
+        time.sleep(1.5)
+        keepalives = [p for p in self.server.requests_to(LISTEN_KEY_PATH) if p.get('listenKey')]
+        self.assertGreaterEqual(len(keepalives), 1)
+
+        self.ws.emit({"e": "listenKeyExpired", "E": int(time.time() * 1000)})
+        self.assertTrue(self.ws.wait_for_connections(2))
+        self.assertEqual(self.ws.paths[-1], "/ws/stub-listen-key-2")
+
+    def test_refused_listen_key_falls_back(self):
+        """Test that run() returns False when the API key may not open a stream."""
+        self.server.user_stream_allowed = False
+        self.assertFalse(self.stream.run())
+        self.assertEqual(self.server.requests_to(DEPOSIT_PATH), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Tests for the Binance request-weight budget against the local Binance stub.
+"""
+
+import os
+import time
+import unittest
+from unittest.mock import patch
+
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from payment_sources import binance_alerts
+from payment_sources.binance_alerts import BinanceAlerts
+from payment_sources.binance_weight import LOW_PRIORITY, WeightBudget, WeightBudgetExceeded
+from stubs.binance_api import C2C_PATH, DEPOSIT_PATH, BinanceStubServer
+from tests.helpers import NullNotifier
+
+
+class TestWeightBudget(unittest.TestCase):
+    """Test that Binance calls stay within the reported request weight."""
+
+    def setUp(self):
+        """Start the stub and point the Binance client at it."""
+        self.server = BinanceStubServer().start()
+        self.patches = [
+            patch.object(binance_alerts, 'BINANCE_API_KEY', 'key'),
+            patch.object(binance_alerts, 'BINANCE_API_SECRET', 'secret'),
+            patch.object(binance_alerts, 'BINANCE_API_URL', self.server.base_url),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        """Stop the stub."""
+        for p in self.patches:
+            p.stop()
+        self.server.stop()
+
+    def alerter(self, **limits):
+        budget = WeightBudget(**dict({'max_wait': 0}, **limits))
+        return BinanceAlerts(NullNotifier(), weights=budget)
+
+    def test_headers_update_used_weight(self):
+        """Test that the weight reported by Binance is recorded for every response."""
+        alerter = self.alerter()
+        alerter.check_for_new_payments()
+
+        metrics = alerter.weights.metrics()
+        self.assertEqual(metrics["requests"], 3)
+        self.assertEqual(metrics["sapi_used_weight"], 3)
+        self.assertEqual(metrics["rate_limited"], 0)
+
+    def test_low_priority_calls_yield_when_budget_is_low(self):
+        """Test that P2P history is skipped while deposits still use the reserve."""
+        alerter = self.alerter(sapi_limit=100, reserve=0.2)
+        self.server.used_weight['sapi'] = 85
+
+        alerter.check_for_new_payments()
+        self.assertEqual(len(self.server.requests_to(DEPOSIT_PATH)), 1)
+        self.assertEqual(self.server.requests_to(C2C_PATH), [])
+        self.assertGreater(alerter.weights.delay('sapi', LOW_PRIORITY), 0)
+
+    def test_rate_limit_pauses_all_calls(self):
+        """Test that a 429 stops further requests until Retry-After has passed."""
+        self.server.weight_limits['sapi'] = 1
+        self.server.used_weight['sapi'] = 1
+        alerter = self.alerter()
+
+        alerter.check_for_new_payments()
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(alerter.weights.metrics()["rate_limited"], 1)
+        with self.assertRaises(WeightBudgetExceeded):
+            alerter.weights.acquire('sapi')
+        alerter.check_for_new_payments()
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_short_delays_wait_instead_of_skipping(self):
+        """Test that a call waits when the pause is within max_wait."""
+        budget = WeightBudget(max_wait=5)
+        budget.blocked_until = time.time() + 0.2
+        start = time.monotonic()
+        budget.acquire('sapi')
+        self.assertGreaterEqual(time.monotonic() - start, 0.15)
+        self.assertEqual(budget.metrics()["delays"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
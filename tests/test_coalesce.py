@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Unit tests for burst coalescing of notifications.
+"""
+
+import time
+import unittest
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from notifications.coalesce import Coalescer, format_digest
+from notifications.dispatch import NotificationDispatcher
+from notifications.notification import Notification
+
+
+class TestCoalescer(unittest.TestCase):
+    """Test folding bursts of notifications into digests."""
+
+    def setUp(self):
+        """Collect whatever the coalescer sends."""
+        self.sent = []
+        self.coalescer = Coalescer(lambda n: self.sent.append(n) or True, window=0.2, max_batch=3)
+
+    def test_single_event_is_sent_immediately(self):
+        """Test that the first event after a quiet period is not delayed."""
+        self.coalescer.submit(Notification("only one"))
+
+        self.assertEqual([n.message for n in self.sent], ["only one"])
+
+    def test_burst_is_folded_into_digest(self):
+        """Test that events arriving inside the window become one digest."""
+        self.coalescer.submit(Notification("first"))
+        self.coalescer.submit(Notification("second", source="email", amount="1,000.50", currency="INR"))
+        self.coalescer.submit(Notification("third", source="email", amount="99.50", currency="INR"))
+        time.sleep(0.4)
+
+        self.assertEqual(len(self.sent), 2)
+        digest = self.sent[1]
+        self.assertEqual(len(digest.parts), 2)
+        self.assertIn("2 New Payment Alerts", digest.message)
+        self.assertIn("1,100.00 INR", digest.message)
+
+    def test_max_batch_flushes_early(self):
+        """Test that a full batch is sent without waiting for the window."""
+        self.coalescer.submit(Notification("first"))
+        for i in range(3):
+            self.coalescer.submit(Notification(f"held {i}"))
+
+        self.assertEqual(len(self.sent), 2)
+        self.assertEqual(len(self.sent[1].parts), 3)
+        self.assertEqual(self.coalescer.pending(), 0)
+
+
+class TestDigestFormatting(unittest.TestCase):
+    """Test digest message rendering."""
+
+    def test_per_source_totals_and_items(self):
+        """Test that totals are grouped by source and currency."""
+        message = format_digest([
+            Notification("x", source="github_sponsors", amount=10, currency="USD", summary="Alice (@alice)"),
+            Notification("y", source="github_sponsors", amount=5, currency="USD", summary="Bob (@bob)"),
+            Notification("*New UPI Alert*\nmore", source="email", amount="250", currency="INR"),
+        ])
+
+        self.assertIn("GitHub Sponsors: 2 (15 USD)", message)
+        self.assertIn("Email: 1 (250 INR)", message)
+        self.assertIn("1. Alice (@alice)", message)
+        self.assertIn("3. New UPI Alert", message)
+
+
+class TestDispatcherCoalescing(unittest.TestCase):
+    """Test the dispatcher with coalescing enabled."""
+
+    def test_digest_counts_every_folded_alert(self):
+        """Test that delivered counts include alerts folded into digests."""
+        sent = []
+        dispatcher = NotificationDispatcher(
+            lambda message: sent.append(message) or True,
+            workers=1,
+            coalesce_window=5,
+            coalesce_max_batch=50
+        )
+        dispatcher.start()
+        for i in range(10):
+            dispatcher.send_message(f"alert {i}", source="email")
+        dispatcher.join()
+        dispatcher.stop()
+
+        self.assertEqual(len(sent), 2)
+        self.assertEqual(dispatcher.stats()['delivered'], 10)
+        self.assertEqual(dispatcher.stats()['digests'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the webhook delivery dedupe index.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from storage.dedupe import DeliveryDedupe
+
+
+class TestDeliveryDedupe(unittest.TestCase):
+    """Test recognising redelivered webhook events."""
+
+    def test_duplicate_is_detected(self):
+        """Test that the second copy of a delivery is a hit."""
+        dedupe = DeliveryDedupe()
+
+        self.assertFalse(dedupe.check_and_record("abc"))
+        self.assertTrue(dedupe.check_and_record("abc"))
+        self.assertEqual(dedupe.stats()['hits'], 1)
+        self.assertEqual(dedupe.stats()['misses'], 1)
+
+    def test_memory_is_bounded(self):
+        """Test that the least recently used ids are evicted beyond the limit."""
+        dedupe = DeliveryDedupe(max_entries=100)
+        for i in range(1000):
+            dedupe.check_and_record(f"delivery-{i}")
+
+        self.assertEqual(dedupe.stats()['entries'], 100)
+        self.assertEqual(dedupe.stats()['evictions'], 900)
+        self.assertFalse(dedupe.check_and_record("delivery-0"))
+        self.assertTrue(dedupe.check_and_record("delivery-999"))
+
+    def test_entries_expire(self):
+        """Test that ids older than the TTL are treated as new."""
+        dedupe = DeliveryDedupe(ttl=60)
+        with patch('storage.dedupe.time.time', return_value=1000.0):
+            dedupe.check_and_record("abc")
+        with patch('storage.dedupe.time.time', return_value=1061.0):
+            self.assertFalse(dedupe.check_and_record("abc"))
+
+    def test_forget_allows_reprocessing(self):
+        """Test that a forgotten id is processed again."""
+        dedupe = DeliveryDedupe()
+        dedupe.check_and_record("abc")
+        dedupe.forget("abc")
+
+        self.assertFalse(dedupe.check_and_record("abc"))
+
+    def test_persistent_ids_survive_restart(self):
+        """Test that ids stored in the database are recognised by a new index."""
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'state.db')
+            first = DeliveryDedupe(path=path)
+            first.check_and_record("abc")
+            first.close()
+
+            second = DeliveryDedupe(path=path)
+            self.assertTrue(second.check_and_record("abc"))
+            second.close()
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_only_one_connection_claims_a_delivery(self):
+        """Test that two indexes sharing a database cannot both treat a delivery as new."""
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'state.db')
+            first = DeliveryDedupe(path=path, ttl=60)
+            second = DeliveryDedupe(path=path, ttl=60)
+            with patch('storage.dedupe.time.time', return_value=1000.0):
+                results = [first.check_and_record("abc"), second.check_and_record("abc")]
+            self.assertEqual(results, [False, True])
+
+            with patch('storage.dedupe.time.time', return_value=1061.0):
+                self.assertFalse(second.check_and_record("abc"))
+                self.assertTrue(first.check_and_record("abc"))
+            first.close()
+            second.close()
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the notification dispatch queue.
+"""
+
+import threading
+import time
+import unittest
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from notifications.dispatch import NotificationDispatcher
+
+
+class TestNotificationDispatcher(unittest.TestCase):
+    """Test queueing and delivery of notifications."""
+
+    def test_messages_are_delivered_by_workers(self):
+        """Test that queued messages reach the send function."""
+        sent = []
+        dispatcher = NotificationDispatcher(lambda message: sent.append(message) or True, workers=2)
+        dispatcher.start()
+        try:
+            for i in range(20):
+                self.assertTrue(dispatcher.send_message(f"message {i}"))
+            dispatcher.join()
+        finally:
+            dispatcher.stop()
+
+        self.assertEqual(sorted(sent), sorted(f"message {i}" for i in range(20)))
+        stats = dispatcher.stats()
+        self.assertEqual(stats['delivered'], 20)
+        self.assertEqual(stats['depth'], 0)
+
+    def test_enqueue_does_not_wait_for_slow_sender(self):
+        """Test that producers are not blocked by a stuck send function."""
+        release = threading.Event()
+        dispatcher = NotificationDispatcher(lambda message: release.wait(), maxsize=10, workers=1)
+        dispatcher.start()
+        try:
+            start = time.monotonic()
+            for i in range(5):
+                dispatcher.send_message(f"message {i}")
+            self.assertLess(time.monotonic() - start, 0.1)
+        finally:
+            release.set()
+            dispatcher.stop()
+
+    def test_full_queue_rejects_messages(self):
+        """Test that a full queue rejects new messages instead of blocking."""
+        dispatcher = NotificationDispatcher(lambda message: True, maxsize=2)
+
+        self.assertTrue(dispatcher.send_message("one"))
+        self.assertTrue(dispatcher.send_message("two"))
+        self.assertFalse(dispatcher.send_message("three"))
+        self.assertEqual(dispatcher.stats()['rejected'], 1)
+        self.assertEqual(dispatcher.stats()['depth'], 2)
+
+    def test_failed_sends_are_counted(self):
+        """Test that send failures are recorded in the stats."""
+        dispatcher = NotificationDispatcher(lambda message: False, workers=1)
+        dispatcher.start()
+        try:
+            dispatcher.send_message("lost")
+            dispatcher.join()
+        finally:
+            dispatcher.stop()
+
+        self.assertEqual(dispatcher.stats()['failed'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the bank email rule engine.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+from decimal import Decimal
+from unittest.mock import patch
+
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from payment_sources.email_rules import RuleSet
+
+HDFC_UPI_BODY = (
+    "Dear Customer,\n\nRs.1,250.00 has been credited to account **4321 by VPA asha.k@okaxis "
+    "ASHA KUMAR on 12-05-24. Your UPI transaction reference number is 412345678901.\n\n"
+    "Warm Regards,\nHDFC Bank"
+)
+
+CARD_BODY = (
+    "Dear Card Member,\n\nThank you for using your HDFC Bank Credit Card ending 1234 for Rs 2,499.00 "
+    "at AMAZON PAY on 2024-05-12:10:11:12. Authorization code:- 0A1B2C\n"
+)
+
+
+class TestEmailRules(unittest.TestCase):
+    """Test loading rule packs and extracting payment records."""
+
+    def setUp(self):
+        """Load the bundled rule pack."""
+        self.rules = RuleSet.load()
+
+    def test_hdfc_upi_credit_is_extracted(self):
+        """Test extracting all fields of an HDFC UPI credit alert."""
+        record = self.rules.parse("You have received a UPI payment", "HDFC Bank <alerts@hdfcbank.net>", HDFC_UPI_BODY)
+
+        self.assertEqual(record.rule, "hdfc_upi_credit")
+        self.assertEqual(record.amount, Decimal("1250.00"))
+        self.assertEqual(record.currency, "INR")
+        self.assertEqual(record.counterparty, "asha.k@okaxis")
+        self.assertEqual(record.reference, "412345678901")
+        self.assertEqual(record.timestamp, datetime(2024, 5, 12))
+        self.assertEqual(record.to_dict()["description"], "Payment from asha.k@okaxis")
+
+    def test_credit_card_rule_uses_subject(self):
+        """Test that the card rule requires its subject and extracts the merchant."""
+        record = self.rules.parse("Transaction alert for your HDFC Bank Credit Card",
+                                  "alerts@hdfcbank.net", CARD_BODY)
+        self.assertEqual((record.rule, record.amount, record.counterparty, record.reference),
+                         ("hdfc_credit_card", Decimal("2499.00"), "AMAZON PAY", "0A1B2C"))
+
+    def test_non_payment_and_unknown_senders_are_rejected(self):
+        """Test rejection by keyword prefilter and by sender."""
+        self.assertIsNone(self.rules.parse("Your weekly digest", "alerts@hdfcbank.net", "Nothing to see here."))
+        self.assertIsNone(self.rules.parse("Payment", "phisher@example.com", HDFC_UPI_BODY))
+
+    def test_sender_env_activates_rule(self):
+        """Test that a rule tied to a sender variable is off until it is set."""
+        body = "You received INR 500.00 from Ravi Shah via UPI. UPI Ref No 998877665544."
+        self.assertIsNone(self.rules.parse("Payment received", "upi@mybank.example", body))
+
+        with patch.dict(os.environ, {'UPI_EMAIL_SENDER_FILTER': 'upi@mybank.example'}):
+            record = RuleSet.load().parse("Payment received", "upi@mybank.example", body)
+        self.assertEqual((record.amount, record.counterparty, record.reference),
+                         (Decimal("500.00"), "Ravi Shah", "998877665544"))
+
+    def test_new_bank_needs_only_a_rule_pack(self):
+        """Test that a custom YAML rule pack is used without code changes."""
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'rules.yaml')
+            with open(path, 'w') as f:
+                f.write(
+                    "rules:\n"
+                    "  - name: examplebank\n"
+                    "    type: Example Bank\n"
+                    "    currency: EUR\n"
+                    "    senders: [noreply@examplebank.eu]\n"
+                    "    keywords: [gutschrift]\n"
+                    "    fields:\n"
+                    "      amount: 'Gutschrift von EUR ([\\d.]+)'\n"
+                )
+            rules = RuleSet.load(path)
+        finally:
+            shutil.rmtree(tmpdir)
+
+        record = rules.parse("Konto", "noreply@examplebank.eu", "Gutschrift von EUR 42.50 erhalten")
+        self.assertEqual((record.type, record.amount, record.currency), ("Example Bank", Decimal("42.50"), "EUR"))
+        self.assertEqual(rules.senders(), ["noreply@examplebank.eu"])
+
+
+if __name__ == '__main__':
+    unittest.main()
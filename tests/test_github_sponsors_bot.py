@@ -17,6 +17,7 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import github_sponsors_bot
+from stubs.telegram_api import TelegramStubServer
 
 
 class TestWebhookVerification(unittest.TestCase):
@@ -129,11 +130,11 @@ class TestWebhookEndpoint(unittest.TestCase):
         }
 
     @patch('github_sponsors_bot.verify_github_signature')
-    @patch('github_sponsors_bot.telegram_bot')
-    def test_valid_webhook_request(self, mock_telegram_bot, mock_verify):
+    @patch('github_sponsors_bot.dispatcher')
+    def test_valid_webhook_request(self, mock_dispatcher, mock_verify):
         """Test handling of a valid webhook request."""
         mock_verify.return_value = True
-        mock_telegram_bot.send_message = MagicMock(return_value=True)
+        mock_dispatcher.send_message = MagicMock(return_value=True)
 
         with patch.object(github_sponsors_bot, 'GITHUB_WEBHOOK_SECRET', self.secret):
             response = self.app.post(
@@ -143,16 +144,68 @@ class TestWebhookEndpoint(unittest.TestCase):
             )
             
             # Check response
-            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.status_code, 202)
             data = json.loads(response.data)
-            self.assertEqual(data['status'], 'success')
+            self.assertEqual(data['status'], 'accepted')
             
-            # Check that the message was sent
-            mock_telegram_bot.send_message.assert_called_once()
+            # Check that the message was queued for delivery
+            mock_dispatcher.send_message.assert_called_once()
 
     @patch('github_sponsors_bot.verify_github_signature')
-    @patch('github_sponsors_bot.telegram_bot')
-    def test_invalid_signature(self, mock_telegram_bot, mock_verify):
+    @patch('github_sponsors_bot.dispatcher')
+    def test_queue_full(self, mock_dispatcher, mock_verify):
+        """Test that a full notification queue is reported to GitHub."""
+        mock_verify.return_value = True
+        mock_dispatcher.send_message = MagicMock(return_value=False)
+
+        response = self.app.post(
+            '/webhook/github',
+            data=self.payload_json,
+            headers=self.headers
+        )
+
+        self.assertEqual(response.status_code, 503)
+        data = json.loads(response.data)
+        self.assertEqual(data['status'], 'error')
+
+    @patch('github_sponsors_bot.verify_github_signature')
+    @patch('github_sponsors_bot.dispatcher')
+    def test_duplicate_delivery_is_not_notified_again(self, mock_dispatcher, mock_verify):
+        """Test that a redelivered event is acknowledged without a second notification."""
+        mock_verify.return_value = True
+        mock_dispatcher.send_message = MagicMock(return_value=True)
+        headers = dict(self.headers, **{'X-GitHub-Delivery': '72d3162e-cc78-11e3-81ab-4c9367dc0958'})
+
+        with patch.object(github_sponsors_bot, 'delivery_dedupe', github_sponsors_bot.DeliveryDedupe()):
+            first = self.app.post('/webhook/github', data=self.payload_json, headers=headers)
+            second = self.app.post('/webhook/github', data=self.payload_json, headers=headers)
+
+        self.assertEqual(first.status_code, 202)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(json.loads(second.data)['status'], 'duplicate')
+        mock_dispatcher.send_message.assert_called_once()
+
+    @patch('github_sponsors_bot.verify_github_signature')
+    @patch('github_sponsors_bot.dispatcher')
+    def test_failed_delivery_is_processed_when_redelivered(self, mock_dispatcher, mock_verify):
+        """Test that a delivery whose handling raised or was rejected is not treated as a duplicate."""
+        mock_verify.return_value = True
+        mock_dispatcher.send_message = MagicMock(side_effect=[RuntimeError("disk full"), True])
+        headers = dict(self.headers, **{'X-GitHub-Delivery': 'b0c4a2f6-cc78-11e3-81ab-4c9367dc0958'})
+
+        with patch.object(github_sponsors_bot, 'delivery_dedupe', github_sponsors_bot.DeliveryDedupe()):
+            with self.assertRaises(RuntimeError):
+                github_sponsors_bot.process_github_webhook(self.payload_json.encode('utf-8'), headers)
+            invalid = self.app.post('/webhook/github', data='{not json', headers=headers)
+            redelivered = self.app.post('/webhook/github', data=self.payload_json, headers=headers)
+
+        self.assertEqual(invalid.status_code, 400)
+        self.assertEqual(redelivered.status_code, 202)
+        self.assertEqual(mock_dispatcher.send_message.call_count, 2)
+
+    @patch('github_sponsors_bot.verify_github_signature')
+    @patch('github_sponsors_bot.dispatcher')
+    def test_invalid_signature(self, mock_dispatcher, mock_verify):
         """Test handling of a request with invalid signature."""
         mock_verify.return_value = False
         
@@ -168,8 +221,61 @@ class TestWebhookEndpoint(unittest.TestCase):
         self.assertEqual(data['status'], 'error')
         self.assertEqual(data['message'], 'Invalid signature')
         
-        # Check that no message was sent
-        mock_telegram_bot.send_message.assert_not_called()
+        # Check that no message was queued
+        mock_dispatcher.send_message.assert_not_called()
+
+
+
+class TestTelegramWebhook(unittest.TestCase):
+    """Test bot commands received on /webhook/telegram."""
+
+    def setUp(self):
+        """Point a fresh bot at the local Telegram stub."""
+        self.app = github_sponsors_bot.app.test_client()
+        self.stub = TelegramStubServer().start()
+        self.bot = github_sponsors_bot.TelegramBot("123:abc", "42", base_url=self.stub.base_url)
+        self.update = {
+            "update_id": 1,
+            "message": {
+                "message_id": 1,
+                "date": 1735732800,
+                "chat": {"id": 42, "type": "private"},
+                "from": {"id": 42, "is_bot": False, "first_name": "Test"},
+                "text": "/help",
+                "entities": [{"type": "bot_command", "offset": 0, "length": 5}]
+            }
+        }
+
+    def tearDown(self):
+        """Stop the stub."""
+        self.stub.stop()
+
+    def post(self, token):
+        with patch.object(github_sponsors_bot, 'telegram_bot', self.bot), \
+                patch.object(github_sponsors_bot, 'TELEGRAM_WEBHOOK_SECRET', 'telegram-secret'):
+            return self.app.post(
+                '/webhook/telegram',
+                data=json.dumps(self.update),
+                headers={'X-Telegram-Bot-Api-Secret-Token': token, 'Content-Type': 'application/json'}
+            )
+
+    def test_command_is_answered(self):
+        """Test that a verified update runs the command handler."""
+        self.assertTrue(self.bot.set_webhook("https://bot.example.com/webhook/telegram", "telegram-secret"))
+        self.assertEqual(self.stub.webhook["secret_token"], "telegram-secret")
+
+        response = self.post('telegram-secret')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.stub.deliveries), 1)
+        self.assertIn("Available commands", self.stub.deliveries[0]["text"])
+
+    def test_wrong_secret_token_is_rejected(self):
+        """Test that updates without the secret token are not processed."""
+        response = self.post('wrong-secret')
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.stub.deliveries, [])
 
 
 if __name__ == '__main__':
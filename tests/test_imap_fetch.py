@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Unit tests for IMAP FETCH response parsing.
+"""
+
+import os
+import unittest
+
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from payment_sources.imap_fetch import decode_part, find_text_part, parse_fetch_response, sender_criteria
+
+MIXED = (
+    b'1 (UID 5 BODYSTRUCTURE (("text" "plain" ("charset" "iso-8859-1") NIL NIL "quoted-printable" 120 4 '
+    b'NIL NIL NIL)("application" "pdf" ("name" "s.pdf") NIL NIL "base64" 2000000 NIL ("attachment" '
+    b'("filename" "s.pdf")) NIL) "mixed" ("boundary" "x") NIL NIL) BODY[HEADER.FIELDS (FROM SUBJECT DATE)] {15}'
+)
+
+
+class TestImapFetch(unittest.TestCase):
+    """Test parsing of FETCH responses and body structures."""
+
+    def test_parse_literals_and_trailing_items(self):
+        """Test that items before and after a literal are both parsed."""
+        data = [
+            (MIXED, b'Subject: hi\r\n\r\n'), b')',
+            (b'2 (UID 9 BODY[1] {4}', b'body'), b' FLAGS (\\Seen))',
+        ]
+        first, second = parse_fetch_response(data)
+
+        self.assertEqual(first['UID'], '5')
+        self.assertEqual(first['BODY[HEADER.FIELDS (FROM SUBJECT DATE)]'], b'Subject: hi\r\n\r\n')
+        self.assertEqual(second['BODY[1]'], b'body')
+        self.assertEqual(second['FLAGS'], ['\\Seen'])
+
+    def test_find_text_part_skips_attachments(self):
+        """Test locating the inline text/plain part of a multipart message."""
+        structure = parse_fetch_response([(MIXED, b'')])[0]['BODYSTRUCTURE']
+        self.assertEqual(find_text_part(structure), ('1', 'quoted-printable', 'iso-8859-1'))
+
+        attached = ['text', 'plain', None, None, None, 'base64', '10', '1', None, ['attachment', None]]
+        self.assertIsNone(find_text_part(attached))
+        self.assertEqual(decode_part(b'caf=E9', 'quoted-printable', 'iso-8859-1'), 'caf\xe9')
+
+    def test_sender_criteria(self):
+        """Test that several senders are combined with OR."""
+        self.assertEqual(sender_criteria([None]), [])
+        self.assertEqual(
+            sender_criteria(['upi@bank.example', 'alerts@hdfcbank.net']),
+            ['OR', 'FROM', '"upi@bank.example"', 'FROM', '"alerts@hdfcbank.net"']
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the IMAP IDLE watcher.
+"""
+
+import imaplib
+import socket
+import threading
+import unittest
+from unittest.mock import patch
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from payment_sources.imap_idle import ImapIdleWatcher, supports_idle
+
+
+class FakeMail:
+    """Client side of a socket pair exposing the imaplib calls the watcher uses"""
+
+    error = imaplib.IMAP4.error
+
+    def __init__(self, sock, capabilities=('IMAP4REV1', 'IDLE')):
+        self.sock = sock
+        self.file = sock.makefile('rb')
+        self.capabilities = capabilities
+        self.sent = []
+
+    def _new_tag(self):
+        return b'A001'
+
+    def send(self, data):
+        self.sent.append(data)
+        self.sock.sendall(data)
+
+    def readline(self):
+        return self.file.readline()
+
+
+class TestImapIdle(unittest.TestCase):
+    """Test the IDLE command exchange."""
+
+    def setUp(self):
+        """Create a connected socket pair standing in for the server."""
+        client, self.server = socket.socketpair()
+        self.mail = FakeMail(client)
+        self.server_file = self.server.makefile('rb')
+
+    def tearDown(self):
+        """Close both ends."""
+        self.mail.file.close()
+        self.mail.sock.close()
+        self.server_file.close()
+        self.server.close()
+
+    def serve(self, *untagged):
+        """Answer one IDLE command, sending untagged responses before the client says DONE"""
+        def run():
+            self.server_file.readline()
+            self.server.sendall(b'+ idling\r\n')
+            for line in untagged:
+                self.server.sendall(line)
+            self.server_file.readline()
+            self.server.sendall(b'A001 OK IDLE terminated\r\n')
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def test_exists_response_reports_new_mail(self):
+        """Test that an EXISTS response ends IDLE and reports new mail."""
+        thread = self.serve(b'* 4 EXISTS\r\n')
+        watcher = ImapIdleWatcher(alerter=None, idle_timeout=5)
+
+        self.assertTrue(watcher.idle(self.mail))
+        thread.join(5)
+        self.assertEqual(self.mail.sent, [b'A001 IDLE\r\n', b'DONE\r\n'])
+
+    def test_idle_is_reissued_after_timeout(self):
+        """Test that IDLE is ended after the timeout when nothing arrives."""
+        thread = self.serve()
+        watcher = ImapIdleWatcher(alerter=None, idle_timeout=0.2)
+
+        self.assertFalse(watcher.idle(self.mail))
+        thread.join(5)
+
+    def test_flag_updates_do_not_count_as_new_mail(self):
+        """Test that unrelated untagged responses keep waiting."""
+        thread = self.serve(b'* 3 FETCH (FLAGS (\\Seen))\r\n', b'* 2 EXPUNGE\r\n')
+        watcher = ImapIdleWatcher(alerter=None, idle_timeout=0.5)
+
+        self.assertFalse(watcher.idle(self.mail))
+        thread.join(5)
+
+    def test_polling_fallback_without_idle_capability(self):
+        """Test that run() gives up immediately when the server lacks IDLE."""
+        mail = FakeMail(self.mail.sock, capabilities=('IMAP4REV1',))
+        mail.logout = lambda: None
+
+        class Alerter:
+            def _connect(self):
+                return mail
+
+        self.assertFalse(supports_idle(mail))
+        self.assertFalse(ImapIdleWatcher(Alerter()).run())
+
+    def test_backoff_grows_while_connections_break_before_idle(self):
+        """Test that a connection which fails right after login does not reset the backoff."""
+        mail = FakeMail(self.mail.sock)
+        mail.logout = lambda: None
+        attempts = []
+        watcher = None
+
+        class Alerter:
+            alerts_sent = 0
+
+            def _connect(self):
+                return mail
+
+            def process_mailbox(self, mail):
+                raise ConnectionError("connection reset")
+
+        def delay(attempt, base, cap):
+            attempts.append(attempt)
+            if len(attempts) == 4:
+                watcher.stop()
+            return 0
+
+        watcher = ImapIdleWatcher(Alerter())
+        with patch('payment_sources.imap_idle.backoff_delay', side_effect=delay):
+            self.assertTrue(watcher.run())
+        self.assertEqual(attempts, [1, 2, 3, 4])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Tests for ImapAlerts against the local IMAP server and a synthetic mailbox.
+"""
+
+import os
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import payment_sources.imap_alerts as imap_alerts
+from payment_sources.imap_alerts import ImapAlerts
+from payment_sources.imap_idle import ImapIdleWatcher
+from stubs.imap_server import ImapStubServer
+from stubs.synthetic_mail import PAYMENT_KINDS, generate_mailbox
+from tests.helpers import RecordingNotifier
+
+
+class TestImapStub(unittest.TestCase):
+    """Test syncing a generated mailbox over IMAP."""
+
+    def setUp(self):
+        """Serve 300 generated messages and point ImapAlerts at the server."""
+        self.server = ImapStubServer().start()
+        self.mailbox = list(generate_mailbox(300, seed=3, attachment_kb=64))
+        self.server.load([raw for _, raw in self.mailbox])
+        host, port = self.server.address
+        self.config = patch.multiple(imap_alerts, IMAP_HOST=host, IMAP_PORT=port,
+                                     IMAP_USER='user', IMAP_PASSWORD='password')
+        self.config.start()
+        self.notifier = RecordingNotifier()
+        self.alerts = ImapAlerts(self.notifier)
+
+    def tearDown(self):
+        """Stop the server."""
+        self.config.stop()
+        self.server.stop()
+
+    def test_catch_up_alerts_payments_without_downloading_attachments(self):
+        """Test that a full sync finds every payment alert and fetches a small share of the mailbox."""
+        expected = sum(kind in PAYMENT_KINDS for kind, _ in self.mailbox)
+
+        self.assertEqual(self.alerts.check_for_new_emails(), expected)
+        self.assertGreater(expected, 0)
+        self.assertLess(self.alerts.bytes_fetched, sum(len(raw) for _, raw in self.mailbox) / 20)
+
+    def test_poll_only_processes_new_messages(self):
+        """Test that the next poll only handles messages appended after the first sync."""
+        self.alerts.check_for_new_emails()
+        new = list(generate_mailbox(50, seed=3, start=300))
+        for _, raw in new:
+            self.server.append(raw)
+
+        self.assertEqual(self.alerts.check_for_new_emails(), sum(kind in PAYMENT_KINDS for kind, _ in new))
+        self.assertEqual(self.alerts.check_for_new_emails(), 0)
+
+    def test_idle_watcher_sees_appended_alert(self):
+        """Test that a client in IDLE is told about a new message straight away."""
+        watcher = ImapIdleWatcher(self.alerts, idle_timeout=5)
+        thread = threading.Thread(target=watcher.run)
+        thread.start()
+        try:
+            deadline = time.monotonic() + 5
+            while self.alerts._cursor is None and time.monotonic() < deadline:
+                time.sleep(0.05)
+            sent_before = len(self.notifier.sent)
+            payment = next(raw for kind, raw in generate_mailbox(100, seed=4, start=1000) if kind in PAYMENT_KINDS)
+            self.server.append(payment)
+
+            deadline = time.monotonic() + 5
+            while len(self.notifier.sent) == sent_before and time.monotonic() < deadline:
+                time.sleep(0.05)
+        finally:
+            watcher.stop()
+            thread.join(5)
+
+        self.assertEqual(len(self.notifier.sent), sent_before + 1)
+        self.assertEqual(self.notifier.sent[-1]["source"], "email")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Unit tests for UID-based incremental IMAP sync and header-first fetching.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from payment_sources import imap_alerts
+from payment_sources.imap_alerts import ImapAlerts
+from payment_sources.imap_fetch import uid_set
+from storage.state import StateStore
+
+
+class FakeMailbox:
+    """Answers the UID SEARCH and UID FETCH commands issued by process_mailbox"""
+
+    def __init__(self, count, unseen=(), attachment_size=0):
+        self.messages = {}
+        self.attachment_size = attachment_size
+        for uid in range(1, count + 1):
+            self.add(uid)
+        self.unseen = set(unseen)
+        self.commands = []
+
+    def add(self, uid, subject=None):
+        self.messages[uid] = (subject or f"message {uid}", f"body of message {uid}".encode())
+
+    def _structure(self, body):
+        text = f'("text" "plain" ("charset" "utf-8") NIL NIL "7bit" {len(body)} 1 NIL NIL NIL)'
+        if not self.attachment_size:
+            return text
+        return f'({text}("application" "pdf" ("name" "s.pdf") NIL NIL "base64" {self.attachment_size} NIL ' \
+               f'("attachment" ("filename" "s.pdf")) NIL) "mixed" ("boundary" "b") NIL NIL)'
+
+    def uid(self, command, *args):
+        self.commands.append((command,) + args)
+        if command == 'SEARCH':
+            criteria = args[1:]
+            if 'FROM' in criteria:
+                # Sender filtering is the server's job; the fake mailbox ignores it
+                criteria = criteria[:criteria.index('OR' if 'OR' in criteria else 'FROM')]
+            if criteria == ('UNSEEN',):
+                found = sorted(self.unseen)
+            elif criteria == ('UID', '*'):
+                found = [max(self.messages)] if self.messages else []
+            else:
+                low = int(criteria[1].split(':')[0])
+                found = [uid for uid in sorted(self.messages) if uid >= low] or [max(self.messages)]
+            return 'OK', [' '.join(map(str, found)).encode()]
+
+        uids = []
+        for part in args[0].split(','):
+            low, _, high = part.partition(':')
+            uids.extend(range(int(low), int(high or low) + 1))
+        data = []
+        for uid in uids:
+            subject, body = self.messages[uid]
+            if 'BODYSTRUCTURE' in args[1]:
+                headers = f"From: alerts@bank.example\r\nSubject: {subject}\r\n\r\n".encode()
+                prefix = f"{uid} (UID {uid} BODYSTRUCTURE {self._structure(body)} " \
+                         f"BODY[HEADER.FIELDS (FROM SUBJECT DATE)] {{{len(headers)}}}"
+                data.append((prefix.encode(), headers))
+            else:
+                data.append((f"{uid} (UID {uid} BODY[1] {{{len(body)}}}".encode(), body))
+            data.append(b')')
+        return 'OK', data
+
+
+class RecordingAlerts(ImapAlerts):
+    """ImapAlerts that treats every email as a candidate and records handled subjects"""
+
+    def __init__(self, state):
+        super().__init__(notifier=None, state=state)
+        self.uidvalidity = 1
+        self.handled = []
+        self.failing = set()
+
+    def matches_headers(self, subject, from_address):
+        return "payment" in subject or subject.startswith("message")
+
+    def handle_email(self, subject, from_, body):
+        if subject in self.failing:
+            raise RuntimeError("alert could not be queued")
+        self.handled.append(subject)
+
+
+class TestImapSync(unittest.TestCase):
+    """Test the persisted UID high-water mark."""
+
+    def setUp(self):
+        """Create a state store in a temporary directory."""
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'state.db')
+        self.state = StateStore(self.path)
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        self.state.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_first_run_processes_unseen_and_sets_high_water_mark(self):
+        """Test that the first sync only handles unseen mail and remembers the newest UID."""
+        mailbox = FakeMailbox(10, unseen=[9, 10])
+        alerts = RecordingAlerts(self.state)
+        alerts.process_mailbox(mailbox)
+
+        self.assertEqual(alerts.handled, ["message 9", "message 10"])
+        self.assertEqual(self.state.get(alerts._state_key()), {"uidvalidity": 1, "last_uid": 10})
+
+    def test_restart_resumes_above_high_water_mark(self):
+        """Test that a new instance only fetches messages above the stored UID."""
+        mailbox = FakeMailbox(3)
+        RecordingAlerts(self.state).process_mailbox(mailbox)
+        mailbox.add(4)
+        mailbox.add(5)
+
+        alerts = RecordingAlerts(StateStore(self.path))
+        alerts.process_mailbox(mailbox)
+        self.assertEqual(alerts.handled, ["message 4", "message 5"])
+
+        alerts.handled = []
+        alerts.process_mailbox(mailbox)
+        self.assertEqual(alerts.handled, [])
+
+    def test_failed_message_is_fetched_again(self):
+        """Test that only a message whose handler failed is fetched again, until it is given up on."""
+        mailbox = FakeMailbox(2)
+        alerts = RecordingAlerts(self.state)
+        alerts.process_mailbox(mailbox)
+        for uid in range(3, 6):
+            mailbox.add(uid)
+        alerts.failing = {"message 4"}
+
+        alerts.process_mailbox(mailbox)
+        self.assertEqual(alerts.handled, ["message 3", "message 5"])
+        self.assertEqual(self.state.get(alerts._state_key()), {"uidvalidity": 1, "last_uid": 5, "retry": {"4": 1}})
+
+        alerts = RecordingAlerts(StateStore(self.path))
+        alerts.process_mailbox(mailbox)
+        self.assertEqual(alerts.handled, ["message 4"])
+        self.assertEqual(self.state.get(alerts._state_key()), {"uidvalidity": 1, "last_uid": 5})
+
+        mailbox.add(6)
+        mailbox.add(7)
+        alerts.failing = {"message 6"}
+        for _ in range(imap_alerts.MAX_MESSAGE_ATTEMPTS + 1):
+            alerts.process_mailbox(mailbox)
+        self.assertEqual(alerts.handled, ["message 4", "message 7"])
+        self.assertEqual(self.state.get(alerts._state_key()), {"uidvalidity": 1, "last_uid": 7})
+
+    def test_backlog_is_fetched_in_batches(self):
+        """Test that a large backlog costs one FETCH per batch."""
+        mailbox = FakeMailbox(1)
+        alerts = RecordingAlerts(self.state)
+        alerts.process_mailbox(mailbox)
+        for uid in range(2, 5002):
+            mailbox.add(uid)
+        mailbox.commands = []
+
+        alerts.process_mailbox(mailbox)
+        fetches = [c for c in mailbox.commands if c[0] == 'FETCH' and 'BODYSTRUCTURE' in c[2]]
+        self.assertEqual(len(alerts.handled), 5000)
+        self.assertEqual(len(fetches), 25)
+        self.assertEqual(fetches[0][1], '2:201')
+
+    def test_uidvalidity_change_resynchronises(self):
+        """Test that a new UIDVALIDITY discards the old high-water mark."""
+        self.state.set(RecordingAlerts(self.state)._state_key(), {"uidvalidity": 99, "last_uid": 500})
+        mailbox = FakeMailbox(5, unseen=[5])
+        alerts = RecordingAlerts(self.state)
+        alerts.process_mailbox(mailbox)
+
+        self.assertEqual(alerts.handled, ["message 5"])
+        self.assertEqual(self.state.get(alerts._state_key()), {"uidvalidity": 1, "last_uid": 5})
+
+    def test_only_candidate_bodies_are_downloaded(self):
+        """Test that non-matching emails cost only their headers and attachments are skipped."""
+        mailbox = FakeMailbox(0, attachment_size=20 * 1024 * 1024)
+        mailbox.add(1, subject="newsletter")
+        alerts = RecordingAlerts(self.state)
+        alerts.process_mailbox(mailbox)
+        for uid in range(2, 102):
+            mailbox.add(uid, subject="payment received" if uid % 50 == 0 else "newsletter")
+        mailbox.commands = []
+
+        alerts.process_mailbox(mailbox)
+        body_fetches = [c for c in mailbox.commands if c[0] == 'FETCH' and 'BODYSTRUCTURE' not in c[2]]
+        self.assertEqual(alerts.handled, ["payment received", "payment received"])
+        self.assertEqual(body_fetches, [('FETCH', '50,100', '(UID BODY.PEEK[1]<0.262144>)')])
+        self.assertLess(alerts.bytes_fetched, 10000)
+
+    def test_uid_set_compresses_ranges(self):
+        """Test the sequence-set encoding of UID lists."""
+        self.assertEqual(uid_set([1, 2, 3, 7, 9, 10]), '1:3,7,9:10')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the queued logging pipeline.
+"""
+
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import tempfile
+import time
+import unittest
+
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from observability import log_pipeline
+from observability.log_pipeline import DroppingQueueHandler, JsonFormatter, RepeatFilter
+
+
+def make_record(message, level=logging.ERROR, name="GitHubSponsorsBot.Test", **extra):
+    record = logging.LogRecord(name, level, __file__, 1, message, None, None)
+    record.__dict__.update(extra)
+    return record
+
+
+class TestLogPipeline(unittest.TestCase):
+    """Test JSON records, repeat limiting and the background writer."""
+
+    def test_json_records_carry_extra_fields(self):
+        """Test that fields passed with extra= become keys of the JSON object."""
+        line = JsonFormatter().format(make_record("Queued", level=logging.INFO, delivery_id="abc", duration_ms=1.5))
+
+        entry = json.loads(line)
+        self.assertEqual(entry["message"], "Queued")
+        self.assertEqual(entry["level"], "INFO")
+        self.assertEqual(entry["delivery_id"], "abc")
+        self.assertEqual(entry["duration_ms"], 1.5)
+        self.assertNotIn("args", entry)
+
+    def test_repeated_errors_are_limited_per_window(self):
+        """Test that repeats beyond the limit are dropped and counted in the next window."""
+        repeat_filter = RepeatFilter(limit=2, window=0.2)
+        passed = [repeat_filter.filter(make_record("IMAP poll failed")) for _ in range(5)]
+        self.assertEqual(passed, [True, True, False, False, False])
+        self.assertTrue(repeat_filter.filter(make_record("Another error")))
+        self.assertTrue(repeat_filter.filter(make_record("IMAP poll failed", level=logging.INFO)))
+
+        time.sleep(0.25)
+        record = make_record("IMAP poll failed")
+        self.assertTrue(repeat_filter.filter(record))
+        self.assertEqual(record.getMessage(), "IMAP poll failed (3 similar messages suppressed)")
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        """Test that logging into a full queue neither blocks nor raises."""
+        records = queue.Queue(maxsize=1)
+        handler = DroppingQueueHandler(records)
+        handler.handle(make_record("first"))
+        handler.handle(make_record("second"))
+
+        self.assertEqual(records.qsize(), 1)
+        self.assertEqual(records.get().getMessage(), "first")
+
+    def test_records_are_written_to_the_rotating_file(self):
+        """Test that records reach the log file once the writer is stopped, and the file rotates by size."""
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'logs', 'bot.log')
+        try:
+            log_pipeline.configure(path=path, fmt='json', max_bytes=2000, backup_count=2)
+            logger = logging.getLogger("GitHubSponsorsBot.Test")
+            for number in range(50):
+                logger.info(f"message {number}", extra={"delivery_id": f"id-{number}"})
+            log_pipeline.stop()
+
+            self.assertTrue(os.path.exists(path + '.1'))
+            self.assertFalse(os.path.exists(path + '.3'))
+            with open(path) as f:
+                entries = [json.loads(line) for line in f]
+            self.assertEqual(entries[-1]["message"], "message 49")
+            self.assertEqual(entries[-1]["delivery_id"], "id-49")
+        finally:
+            log_pipeline.configure()
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def test_each_role_gets_its_own_file(self):
+        """Test that roles other than 'all' log to their own file and a shared file is not rotated in-process."""
+        self.assertEqual(log_pipeline.role_path('logs/bot.log', 'all'), 'logs/bot.log')
+        self.assertEqual(log_pipeline.role_path('logs/bot.log', 'notifier'), 'logs/bot.notifier.log')
+        self.assertEqual(log_pipeline.role_path('', 'ingest'), '')
+
+        directory = tempfile.mkdtemp()
+        try:
+            handler = log_pipeline.file_handler(os.path.join(directory, 'bot.ingest.log'), shared=True)
+            self.assertIsInstance(handler, logging.handlers.WatchedFileHandler)
+            handler.close()
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
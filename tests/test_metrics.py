@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the in-process metrics and the /metrics endpoint.
+"""
+
+import json
+import hmac
+import hashlib
+import unittest
+from unittest.mock import patch, MagicMock
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import github_sponsors_bot
+from observability.metrics import Registry
+
+
+class TestRegistry(unittest.TestCase):
+    """Test recording and rendering metrics."""
+
+    def test_counter_and_histogram_render_in_text_format(self):
+        """Test that labelled counters and cumulative histogram buckets are rendered."""
+        registry = Registry()
+        requests = registry.counter('test_requests_total', 'Requests', ('event', 'outcome'))
+        latency = registry.histogram('test_seconds', 'Latency', buckets=(0.01, 0.1))
+        requests.labels('sponsorship', 'accepted').inc()
+        requests.labels('sponsorship', 'accepted').inc(2)
+        for value in (0.005, 0.05, 0.5):
+            latency.observe(value)
+
+        text = registry.render()
+
+        self.assertIn('# TYPE test_requests_total counter', text)
+        self.assertIn('test_requests_total{event="sponsorship",outcome="accepted"} 3', text)
+        self.assertIn('test_seconds_bucket{le="0.01"} 1', text)
+        self.assertIn('test_seconds_bucket{le="0.1"} 2', text)
+        self.assertIn('test_seconds_bucket{le="+Inf"} 3', text)
+        self.assertIn('test_seconds_count 3', text)
+        self.assertIn('test_seconds_sum 0.555', text)
+
+    def test_same_name_returns_the_same_metric(self):
+        """Test that modules sharing a metric get one instance, and conflicting types are refused."""
+        registry = Registry()
+        first = registry.counter('shared_total', 'Shared', ('reason',))
+        self.assertIs(registry.counter('shared_total', 'Shared', ('reason',)), first)
+        with self.assertRaises(ValueError):
+            registry.histogram('shared_total', 'Shared')
+
+    def test_collectors_run_before_render(self):
+        """Test that gauges set by a collector reflect the state at scrape time."""
+        registry = Registry()
+        depth = registry.gauge('test_depth', 'Depth')
+        queue = [1, 2, 3]
+        registry.on_collect(lambda: depth.set(len(queue)))
+
+        self.assertIn('test_depth 3', registry.render())
+        queue.pop()
+        self.assertIn('test_depth 2', registry.render())
+
+
+class TestMetricsEndpoint(unittest.TestCase):
+    """Test that webhook handling is visible on /metrics."""
+
+    def setUp(self):
+        """Set up a signed sponsorship delivery."""
+        self.app = github_sponsors_bot.app.test_client()
+        self.secret = "test_webhook_secret"
+        self.payload = json.dumps({"action": "created", "sponsorship": {"sponsor": {"login": "test-user"}}})
+        signature = hmac.new(self.secret.encode('utf-8'), self.payload.encode('utf-8'), hashlib.sha256).hexdigest()
+        self.headers = {
+            'X-Hub-Signature-256': f"sha256={signature}",
+            'X-GitHub-Event': 'sponsorship',
+            'Content-Type': 'application/json'
+        }
+
+    def sample(self, text, name):
+        for line in text.splitlines():
+            if line.startswith(name + ' '):
+                return float(line.rsplit(' ', 1)[1])
+        return 0.0
+
+    @patch('github_sponsors_bot.dispatcher')
+    def test_webhook_outcomes_and_timings_are_counted(self, mock_dispatcher):
+        """Test that accepted and rejected deliveries are counted by outcome and timed."""
+        mock_dispatcher.send_message = MagicMock(return_value=True)
+        mock_dispatcher.stats = MagicMock(return_value={"depth": 4, "inflight": 1})
+        accepted = 'sponsors_bot_webhook_requests_total{event="sponsorship",outcome="accepted"}'
+        rejected = 'sponsors_bot_webhook_requests_total{event="unverified",outcome="invalid_signature"}'
+        before = self.app.get('/metrics').get_data(as_text=True)
+
+        with patch.object(github_sponsors_bot, 'GITHUB_WEBHOOK_SECRET', self.secret), \
+                patch.object(github_sponsors_bot, 'delivery_dedupe', github_sponsors_bot.DeliveryDedupe()):
+            self.app.post('/webhook/github', data=self.payload, headers=self.headers)
+            self.app.post('/webhook/github', data=self.payload,
+                          headers=dict(self.headers, **{'X-Hub-Signature-256': 'sha256=forged'}))
+        response = self.app.get('/metrics')
+        after = response.get_data(as_text=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        self.assertEqual(self.sample(after, accepted) - self.sample(before, accepted), 1)
+        self.assertEqual(self.sample(after, rejected) - self.sample(before, rejected), 1)
+        self.assertEqual(self.sample(after, 'sponsors_bot_webhook_signature_seconds_count')
+                         - self.sample(before, 'sponsors_bot_webhook_signature_seconds_count'), 2)
+        self.assertEqual(self.sample(after, 'sponsors_bot_webhook_parse_seconds_count')
+                         - self.sample(before, 'sponsors_bot_webhook_parse_seconds_count'), 1)
+        self.assertEqual(self.sample(after, 'sponsors_bot_dispatch_queue_depth'), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Unit tests for streaming MIME body extraction.
+"""
+
+import os
+import unittest
+from email.message import EmailMessage
+
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from payment_sources.mime_extract import extract_email, html_to_text
+
+
+def build_message(text=None, html=None, attachment_size=0, charset='utf-8', attachment_first=False):
+    """Build a raw email with optional plain, HTML and PDF parts"""
+    msg = EmailMessage()
+    msg['Subject'] = '=?utf-8?q?Payment_received_=E2=82=B9500?='
+    msg['From'] = 'alerts@hdfcbank.net'
+    if attachment_first and attachment_size:
+        msg.set_content('See attachment')
+        msg.clear_content()
+        msg.add_attachment(b'%PDF' + b'\0' * attachment_size, maintype='application', subtype='pdf',
+                           filename='statement.pdf')
+    if text is not None:
+        if msg.is_multipart():
+            msg.add_attachment(text, disposition='inline', charset=charset)
+        else:
+            msg.set_content(text, charset=charset)
+    if html is not None:
+        if text is None:
+            msg.set_content(html, subtype='html')
+        else:
+            msg.add_alternative(html, subtype='html')
+    if attachment_size and not attachment_first:
+        msg.add_attachment(b'%PDF' + b'\0' * attachment_size, maintype='application', subtype='pdf',
+                           filename='statement.pdf')
+    return msg.as_bytes()
+
+
+class TestMimeExtract(unittest.TestCase):
+    """Test extracting readable text from raw emails."""
+
+    def test_stops_before_large_attachment(self):
+        """Test that parsing ends once the plain-text part is complete."""
+        raw = build_message(text="Rs.500.00 has been credited", attachment_size=20 * 1024 * 1024)
+        extracted = extract_email(raw)
+
+        self.assertEqual(extracted.body.strip(), "Rs.500.00 has been credited")
+        self.assertEqual(extracted.subject, "Payment received ₹500")
+        self.assertEqual(extracted.content_type, 'text/plain')
+        self.assertLess(extracted.bytes_parsed, 64 * 1024)
+
+    def test_attachment_before_text_is_bounded(self):
+        """Test that a leading attachment is skipped and parsing stays within the byte limit."""
+        raw = build_message(text="credited", attachment_size=2 * 1024 * 1024, attachment_first=True)
+        extracted = extract_email(raw, max_bytes=128 * 1024)
+
+        self.assertLessEqual(extracted.bytes_parsed, 128 * 1024)
+        self.assertTrue(extracted.truncated)
+
+    def test_html_fallback_is_stripped(self):
+        """Test that HTML is converted to text when there is no plain part."""
+        raw = build_message(html="<html><style>p {}</style><p>Amount: <b>Rs&nbsp;250</b></p><p>Ref 123</p></html>")
+        extracted = extract_email(raw)
+
+        self.assertEqual(extracted.content_type, 'text/html')
+        self.assertEqual(extracted.body, "Amount: Rs 250\nRef 123")
+
+    def test_declared_charset_is_used(self):
+        """Test decoding a quoted-printable Latin-1 body."""
+        raw = build_message(text="Überweisung erhalten", charset='iso-8859-1')
+        self.assertEqual(extract_email(raw).body.strip(), "Überweisung erhalten")
+
+    def test_html_to_text_skips_scripts(self):
+        """Test that script content is not treated as text."""
+        self.assertEqual(html_to_text("<div>a<script>var x = 1;</script></div><br>b"), "a\nb")
+
+
+if __name__ == '__main__':
+    unittest.main()
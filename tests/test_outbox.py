@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the durable notification outbox.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from notifications.dispatch import NotificationDispatcher
+from notifications.handoff import OutboxHandoff
+from notifications.notification import Notification
+from storage.outbox import Outbox
+
+
+class TestOutbox(unittest.TestCase):
+    """Test storing and draining outbox rows."""
+
+    def setUp(self):
+        """Create an outbox in a temporary directory."""
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'state.db')
+        self.outbox = Outbox(self.path, max_attempts=2)
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        self.outbox.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_pending_rows_survive_reopen(self):
+        """Test that undelivered rows are returned after reopening the database."""
+        first = self.outbox.append(Notification("one", source="email", amount="10", currency="INR"))
+        second = self.outbox.append(Notification("two"))
+        self.outbox.mark_delivered([first])
+        self.outbox.close()
+
+        pending = Outbox(self.path).pending()
+        self.assertEqual([n.outbox_id for n in pending], [second])
+        self.assertEqual(pending[0].message, "two")
+
+    def test_rows_stop_being_retried_after_max_attempts(self):
+        """Test that repeatedly failing rows become dead letters."""
+        row_id = self.outbox.append(Notification("bad"))
+        self.outbox.mark_failed([row_id])
+        self.assertEqual(len(self.outbox.pending()), 1)
+        self.outbox.mark_failed([row_id])
+
+        self.assertEqual(self.outbox.pending(), [])
+        self.assertEqual(self.outbox.stats()['dead'], 1)
+
+    def test_failed_update_is_rolled_back(self):
+        """Test that an error while marking rows leaves no transaction open for the next write."""
+        first = self.outbox.append(Notification("one"))
+        second = self.outbox.append(Notification("two"))
+        with self.assertRaises(Exception):
+            self.outbox.mark_delivered([first, object()])
+        with self.assertRaises(Exception):
+            self.outbox.mark_failed([second, object()])
+
+        self.assertEqual([n.outbox_id for n in self.outbox.pending()], [first, second])
+        self.outbox.mark_delivered([first])
+        self.assertIsNotNone(self.outbox.append(Notification("three")))
+        self.assertEqual(self.outbox.stats()['pending'], 2)
+
+    def test_concurrent_appends_share_commits(self):
+        """Test that concurrent writers are grouped into fewer transactions."""
+        def writer():
+            for i in range(50):
+                self.outbox.append(Notification(f"message {i}"))
+
+        threads = [threading.Thread(target=writer) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.outbox.appended, 400)
+        self.assertEqual(self.outbox.stats()['pending'], 400)
+        self.assertLessEqual(self.outbox.commits, 400)
+
+
+class TestDispatcherWithOutbox(unittest.TestCase):
+    """Test at-least-once delivery through the dispatcher."""
+
+    def setUp(self):
+        """Create an outbox in a temporary directory."""
+        self.tmpdir = tempfile.mkdtemp()
+        self.outbox = Outbox(os.path.join(self.tmpdir, 'state.db'))
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        self.outbox.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_failed_alert_is_replayed_by_next_dispatcher(self):
+        """Test that an alert whose send failed is delivered after a restart."""
+        failing = NotificationDispatcher(lambda message: False, workers=1, outbox=self.outbox)
+        failing.start()
+        failing.send_message("important", source="email")
+        failing.join()
+        failing.stop()
+        self.assertEqual(self.outbox.stats()['pending'], 1)
+
+        sent = []
+        delivered = threading.Event()
+        restarted = NotificationDispatcher(
+            lambda message: sent.append(message) or delivered.set() or True,
+            workers=1,
+            outbox=self.outbox
+        )
+        restarted.replay_pending(min_age=0)
+        restarted.start()
+        delivered.wait(5)
+        restarted.join()
+        restarted.stop()
+
+        self.assertEqual(sent, ["important"])
+        self.assertEqual(self.outbox.stats()['pending'], 0)
+
+    def test_full_queue_defers_stored_alert(self):
+        """Test that a stored alert is accepted even when the queue is full."""
+        dispatcher = NotificationDispatcher(lambda message: True, maxsize=1, outbox=self.outbox)
+
+        self.assertTrue(dispatcher.send_message("first"))
+        self.assertTrue(dispatcher.send_message("second"))
+        self.assertEqual(self.outbox.stats()['pending'], 2)
+        self.assertEqual(dispatcher.stats()['depth'], 1)
+
+    def test_notifier_picks_up_alerts_from_ingest_workers(self):
+        """Test that alerts stored by another process are delivered once, next to local alerts."""
+        ingest_outbox = Outbox(self.outbox.path)
+        ingest = OutboxHandoff(ingest_outbox)
+        sent = []
+        lock = threading.Lock()
+
+        def send(message):
+            with lock:
+                sent.append(message)
+            return True
+
+        notifier = NotificationDispatcher(send, workers=2, outbox=self.outbox, pickup_interval=0.01)
+        notifier.start()
+        try:
+            local = threading.Thread(target=lambda: [notifier.send_message(f"local {i}") for i in range(20)])
+            local.start()
+            for i in range(20):
+                self.assertTrue(ingest.send_message(f"webhook {i}"))
+            local.join()
+            deadline = time.monotonic() + 5
+            while len(sent) < 40 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            time.sleep(0.1)
+        finally:
+            notifier.stop()
+            ingest_outbox.close()
+
+        self.assertEqual(sorted(sent), sorted([f"local {i}" for i in range(20)] + [f"webhook {i}" for i in range(20)]))
+        self.assertEqual(notifier.stats()['picked_up'], 20)
+        self.assertEqual(self.outbox.stats()['pending'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
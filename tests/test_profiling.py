@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the on-demand profiler and the /admin/profile endpoint.
+"""
+
+import json
+import os
+import pstats
+import shutil
+import tempfile
+import tracemalloc
+import unittest
+from unittest.mock import patch
+
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import github_sponsors_bot
+from observability import profiling
+from observability.profiling import Profiler
+
+
+def files(directory, extension):
+    return sorted(name for name in os.listdir(directory) if name.endswith(extension))
+
+
+class TestProfiler(unittest.TestCase):
+    """Test cProfile captures and memory snapshots."""
+
+    def setUp(self):
+        """Write profiles to a temporary directory."""
+        self.directory = tempfile.mkdtemp()
+        self.profiler = Profiler(self.directory)
+
+    def tearDown(self):
+        """Remove the profiles."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_disabled_profiling_leaves_functions_unchanged(self):
+        """Test that the decorator returns the function itself without PROFILE_DIR."""
+        def handler():
+            return 1
+
+        with patch.object(profiling, 'profiler', None):
+            self.assertIs(profiling.profiled('webhook')(handler), handler)
+
+    def test_only_the_armed_number_of_calls_is_profiled(self):
+        """Test that arming captures the next N calls as pstats and JSON files."""
+        handler = self.profiler.wrap('webhook', lambda value: sorted(range(value)))
+        handler(10)
+        self.assertEqual(os.listdir(self.directory), [])
+
+        self.profiler.arm(2)
+        for _ in range(3):
+            self.assertEqual(handler(10), list(range(10)))
+
+        self.assertEqual(len(files(self.directory, '.pstats')), 2)
+        self.assertEqual(self.profiler.armed(), {})
+        stats = pstats.Stats(os.path.join(self.directory, files(self.directory, '.pstats')[0]))
+        self.assertTrue(any(name == '<lambda>' for _, _, name in stats.stats))
+        with open(os.path.join(self.directory, files(self.directory, '.json')[0])) as f:
+            summary = json.load(f)
+        self.assertEqual(summary["target"], "webhook")
+        self.assertTrue(summary["functions"])
+
+    def test_nested_targets_are_part_of_the_outer_profile(self):
+        """Test that a profiled call inside another one does not start a second capture."""
+        send = self.profiler.wrap('send', lambda: True)
+        webhook = self.profiler.wrap('webhook', lambda: send())
+        self.profiler.arm(1)
+
+        webhook()
+
+        self.assertEqual(len(files(self.directory, '.pstats')), 1)
+        self.assertEqual(self.profiler.armed(), {'send': 1})
+
+    def test_always_profiled_targets_need_no_trigger(self):
+        """Test that poll targets are profiled on every cycle with PROFILE_POLLS."""
+        profiler = Profiler(self.directory, always=('imap',))
+        poll = profiler.wrap('imap', lambda: 0)
+        poll()
+        poll()
+
+        self.assertEqual(len(files(self.directory, '.pstats')), 2)
+
+    def test_memory_snapshots_report_growth(self):
+        """Test that the second snapshot lists allocations made since the first."""
+        self.assertIsNone(self.profiler.snapshot_memory())
+        tracemalloc.start()
+        try:
+            self.profiler.snapshot_memory()
+            retained = [bytearray(1000) for _ in range(100)]
+            path = self.profiler.snapshot_memory()
+        finally:
+            tracemalloc.stop()
+
+        with open(path) as f:
+            snapshot = json.load(f)
+        self.assertTrue(snapshot["top"])
+        self.assertGreater(snapshot["growth"][0]["size_diff_kb"], 90)
+        self.assertEqual(len(retained), 100)
+
+
+class TestProfileEndpoint(unittest.TestCase):
+    """Test the authenticated /admin/profile endpoint."""
+
+    def setUp(self):
+        """Enable profiling with a token."""
+        self.directory = tempfile.mkdtemp()
+        self.profiler = Profiler(self.directory)
+        self.profiler.wrap('webhook', lambda: None)
+        self.client = github_sponsors_bot.app.test_client()
+
+    def tearDown(self):
+        """Remove the profiles."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def post(self, token, body):
+        with patch.multiple(profiling, profiler=self.profiler, PROFILE_TOKEN='secret'):
+            return self.client.post('/admin/profile', data=json.dumps(body),
+                                    headers={'Authorization': f'Bearer {token}'})
+
+    def test_disabled_without_profile_dir(self):
+        """Test that the endpoint is not found while profiling is disabled."""
+        with patch.object(profiling, 'profiler', None):
+            response = self.client.post('/admin/profile')
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_invalid_token_is_rejected(self):
+        """Test that a wrong bearer token arms nothing."""
+        response = self.post('wrong', {"count": 5})
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.profiler.armed(), {})
+
+    def test_arms_the_requested_targets(self):
+        """Test that a valid request arms the targets and rejects unknown ones."""
+        response = self.post('secret', {"targets": ["webhook"], "count": 5})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data)["armed"], {"webhook": 5})
+
+        response = self.post('secret', {"targets": ["nope"]})
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
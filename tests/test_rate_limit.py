@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Unit tests for Telegram rate limiting and retry handling.
+"""
+
+import unittest
+from unittest.mock import patch, MagicMock
+
+from telegram.error import BadRequest, RetryAfter, TimedOut
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import github_sponsors_bot
+from notifications.rate_limit import TokenBucket, TelegramRateLimiter
+
+
+class TestTokenBucket(unittest.TestCase):
+    """Test token bucket pacing."""
+
+    def test_burst_then_paced(self):
+        """Test that tokens beyond the burst capacity have to wait."""
+        bucket = TokenBucket(rate=10, capacity=2)
+
+        self.assertEqual(bucket.reserve(), 0.0)
+        self.assertEqual(bucket.reserve(), 0.0)
+        self.assertAlmostEqual(bucket.reserve(), 0.1, places=2)
+        self.assertAlmostEqual(bucket.reserve(), 0.2, places=2)
+
+    def test_pause(self):
+        """Test that a paused bucket delays the next token."""
+        bucket = TokenBucket(rate=10, capacity=5)
+        bucket.pause(2)
+
+        self.assertGreater(bucket.reserve(), 1.9)
+
+
+class TestTelegramSendRetries(unittest.TestCase):
+    """Test how TelegramBot.send_message reacts to API errors."""
+
+    def setUp(self):
+        """Set up a bot whose API calls are mocked."""
+        self.bot = github_sponsors_bot.TelegramBot(
+            "123456:test-token",
+            "42",
+            rate_limiter=TelegramRateLimiter(global_rate=1000, chat_rate=1000, chat_burst=1000, global_burst=1000),
+            max_retries=2
+        )
+        self.bot.bot = MagicMock()
+
+    def test_retry_after_is_honoured(self):
+        """Test that flood control pauses the chat and the message is resent."""
+        self.bot.bot.send_message.side_effect = [RetryAfter(1), MagicMock()]
+
+        with patch.object(self.bot.rate_limiter, 'penalize') as mock_penalize:
+            self.assertTrue(self.bot.send_message("hello"))
+
+        mock_penalize.assert_called_once_with("42", 1.0)
+        self.assertEqual(self.bot.bot.send_message.call_count, 2)
+
+    @patch('github_sponsors_bot.time.sleep')
+    def test_network_errors_are_retried_then_given_up(self, mock_sleep):
+        """Test that network errors are retried with backoff up to the limit."""
+        self.bot.bot.send_message.side_effect = TimedOut()
+
+        self.assertFalse(self.bot.send_message("hello"))
+        self.assertEqual(self.bot.bot.send_message.call_count, 3)
+        self.assertEqual(mock_sleep.call_count, 2)
+
+    def test_bad_request_is_not_retried(self):
+        """Test that a rejected request fails immediately."""
+        self.bot.bot.send_message.side_effect = BadRequest("Can't parse entities")
+
+        self.assertFalse(self.bot.send_message("*broken"))
+        self.assertEqual(self.bot.bot.send_message.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
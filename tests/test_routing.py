@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Unit tests for notification routing, output formats and webhook destinations.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest.mock import patch
+
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from notifications import formats
+from notifications.dispatch import NotificationDispatcher
+from notifications.notification import Notification
+from notifications.routing import (
+    Destination, NotificationRouter, WebhookDestination, parse_destinations, parse_routes
+)
+from storage.outbox import Outbox
+
+
+class RecordingDestination(Destination):
+    """Records payloads; can be made to block or fail"""
+
+    def __init__(self, name, fmt="markdown", **kwargs):
+        super().__init__(name, **kwargs)
+        self.format = fmt
+        self.payloads = []
+        self.release = threading.Event()
+        self.release.set()
+        self.fail = False
+
+    def deliver(self, payload):
+        self.release.wait(5)
+        if self.fail:
+            return False
+        self.payloads.append(payload)
+        return True
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class TestFormats(unittest.TestCase):
+    """Test rendering Telegram Markdown for other destinations."""
+
+    def test_slack_discord_and_json_payloads(self):
+        """Test the markup conversion of each webhook format."""
+        notification = Notification("*New sponsor* <3 [profile](https://github.com/octocat)",
+                                    source="github_sponsors", amount=5, currency="USD")
+
+        slack = json.loads(formats.render(notification, "slack"))
+        discord = json.loads(formats.render(notification, "discord"))
+        generic = json.loads(formats.render(notification, "json"))
+
+        self.assertEqual(slack["text"], "*New sponsor* &lt;3 <https://github.com/octocat|profile>")
+        self.assertEqual(discord["content"], "**New sponsor** <3 [profile](https://github.com/octocat)")
+        self.assertEqual(generic["text"], "New sponsor <3 profile (https://github.com/octocat)")
+        self.assertEqual(generic["amount"], "5")
+        self.assertEqual(formats.render(notification, "markdown"), notification.message)
+
+
+class TestNotificationRouter(unittest.TestCase):
+    """Test fan-out of alerts to destinations."""
+
+    def setUp(self):
+        """Route sponsors to a channel, bank alerts to a private chat and everything to ops and Slack."""
+        self.public = RecordingDestination("public")
+        self.private = RecordingDestination("private")
+        self.ops = RecordingDestination("ops")
+        self.slack = RecordingDestination("slack", fmt="slack")
+        self.default = RecordingDestination("default")
+        self.router = NotificationRouter(
+            [self.default, self.public, self.private, self.ops, self.slack],
+            parse_routes("github_sponsors=public; email=private; binance=private; *=ops,slack")
+        )
+        self.done = []
+        self.router.start()
+
+    def tearDown(self):
+        """Stop the senders."""
+        self.router.stop(1)
+
+    def on_done(self, notification, ok):
+        self.done.append((notification.message, ok))
+
+    def test_sources_reach_their_destinations(self):
+        """Test that '*' routes are added to every source and unrouted sources use the default."""
+        self.router.route(Notification("sponsor", source="github_sponsors"), self.on_done)
+        self.router.route(Notification("credit", source="email"), self.on_done)
+        self.assertTrue(wait_for(lambda: len(self.done) == 2))
+
+        self.assertEqual(self.public.payloads, ["sponsor"])
+        self.assertEqual(self.private.payloads, ["credit"])
+        self.assertEqual(self.ops.payloads, ["sponsor", "credit"])
+        self.assertEqual(len(self.slack.payloads), 2)
+        self.assertEqual(self.default.payloads, [])
+
+        router = NotificationRouter([self.default], {})
+        self.assertEqual(router.destinations_for("startup"), [self.default])
+
+    def test_unrouted_source_uses_default_next_to_wildcard(self):
+        """Test that a '*' route does not take the default destination away from unrouted sources."""
+        self.assertEqual(self.router.destinations_for("paypal"), [self.default, self.ops, self.slack])
+        self.assertEqual(self.router.destinations_for("email"), [self.private, self.ops, self.slack])
+
+        self.router.route(Notification("credit", source="paypal"), self.on_done)
+        self.assertTrue(wait_for(lambda: len(self.done) == 1))
+        self.assertEqual(self.default.payloads, ["credit"])
+        self.assertEqual(self.ops.payloads, ["credit"])
+
+    def test_bot_messages_skip_wildcard_routes(self):
+        """Test that startup messages and command replies stay on the default chat."""
+        self.assertEqual(self.router.destinations_for("startup"), [self.default])
+        self.assertEqual(self.router.destinations_for("command"), [self.default])
+        router = NotificationRouter([self.default, self.ops], {"startup": ["ops"], "*": ["ops"]})
+        self.assertEqual(router.destinations_for("startup"), [self.ops])
+
+    def test_each_format_is_rendered_once(self):
+        """Test that destinations sharing a format share one rendering."""
+        second_slack = RecordingDestination("slack2", fmt="slack")
+        router = NotificationRouter([self.ops, self.slack, second_slack], {"*": ["ops", "slack", "slack2"]})
+        calls = []
+        renderers = dict(formats.RENDERERS, slack=lambda n: calls.append(n) or b'{}')
+        second_slack.start()
+        with patch.dict(formats.RENDERERS, renderers):
+            router.route(Notification("alert", source="email"), self.on_done)
+            self.assertTrue(wait_for(lambda: self.done))
+        second_slack.stop(1)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(second_slack.payloads, [b'{}'])
+
+    def test_slow_destination_does_not_stall_the_others(self):
+        """Test that a blocked destination only backs up its own queue."""
+        self.slack.release.clear()
+        for i in range(20):
+            self.router.route(Notification(f"credit {i}", source="email"), self.on_done)
+
+        self.assertTrue(wait_for(lambda: len(self.private.payloads) == 20 and len(self.ops.payloads) == 20))
+        self.assertEqual(self.done, [])
+        self.slack.release.set()
+        self.assertTrue(wait_for(lambda: len(self.done) == 20))
+        self.assertTrue(all(ok for _, ok in self.done))
+
+    def test_invalid_configuration_is_rejected(self):
+        """Test that unknown destinations and malformed entries raise ValueError."""
+        with self.assertRaises(ValueError):
+            NotificationRouter([self.ops], {"email": ["nope"]})
+        with self.assertRaises(ValueError):
+            parse_destinations("ops=pager:123", None)
+        with self.assertRaises(ValueError):
+            parse_routes("email")
+        destinations = parse_destinations("ops=telegram:-100123; hook=discord:https://example.com/x?a=b", None)
+        self.assertEqual([(d.name, d.format) for d in destinations], [("ops", "markdown"), ("hook", "discord")])
+
+
+class TestRoutedDispatcher(unittest.TestCase):
+    """Test outbox delivery through the router."""
+
+    def setUp(self):
+        """Create an outbox in a temporary directory."""
+        self.tmpdir = tempfile.mkdtemp()
+        self.outbox = Outbox(os.path.join(self.tmpdir, 'state.db'))
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        self.outbox.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_retry_only_goes_to_destinations_that_missed_the_alert(self):
+        """Test that a partly failed alert is marked failed and resent only where it failed."""
+        chat = RecordingDestination("default")
+        hook = RecordingDestination("hook", fmt="json")
+        hook.fail = True
+        router = NotificationRouter([chat, hook], {"*": ["default", "hook"]})
+        dispatcher = NotificationDispatcher(None, workers=1, outbox=self.outbox, router=router)
+        dispatcher.start()
+        try:
+            dispatcher.send_message("credit", source="email")
+            self.assertTrue(wait_for(lambda: dispatcher.stats()["failed"] == 1))
+            self.assertEqual(self.outbox.stats()["pending"], 1)
+
+            hook.fail = False
+            dispatcher.replay_pending(min_age=0)
+            self.assertTrue(wait_for(lambda: dispatcher.stats()["delivered"] == 1))
+        finally:
+            dispatcher.stop()
+
+        self.assertEqual(chat.payloads, ["credit"])
+        self.assertEqual(len(hook.payloads), 1)
+        self.assertEqual(self.outbox.stats()["pending"], 0)
+        self.assertEqual(dispatcher.stats()["destinations"]["hook"]["failed"], 1)
+
+    def test_full_destination_queue_defers_without_using_an_attempt(self):
+        """Test that a full queue defers the alert and the retry only goes to that destination."""
+        chat = RecordingDestination("default")
+        hook = RecordingDestination("hook", fmt="json", maxsize=1)
+        hook.release.clear()
+        router = NotificationRouter([chat, hook], {"*": ["default", "hook"]})
+        dispatcher = NotificationDispatcher(None, workers=1, outbox=self.outbox, router=router)
+        dispatcher.start()
+        try:
+            for i in range(3):
+                dispatcher.send_message(f"credit {i}", source="email")
+            self.assertTrue(wait_for(lambda: dispatcher.stats()["deferred"] >= 1 and len(chat.payloads) == 3))
+
+            hook.release.set()
+            # A deferred row stays in flight until _finish returns, so replay until it is picked up
+            self.assertTrue(wait_for(lambda: dispatcher.replay_pending(min_age=0) >= 0
+                                     and dispatcher.stats()["delivered"] == 3))
+        finally:
+            dispatcher.stop()
+
+        self.assertEqual(chat.payloads, ["credit 0", "credit 1", "credit 2"])
+        self.assertEqual(len(hook.payloads), 3)
+        self.assertEqual(dispatcher.stats()["failed"], 0)
+        self.assertEqual(self.outbox.stats()["pending"], 0)
+        self.assertEqual(self.outbox.stats()["dead"], 0)
+
+
+class FlakyWebhookHandler(BaseHTTPRequestHandler):
+    """Answers the first POST with 500 and records the bodies of the rest"""
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        server = self.server
+        server.requests += 1
+        if server.requests == 1:
+            self.send_response(500)
+        else:
+            server.bodies.append(json.loads(body))
+            self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestWebhookDestination(unittest.TestCase):
+    """Test posting alerts to an incoming webhook."""
+
+    def test_server_errors_are_retried(self):
+        """Test that a 5xx answer is retried and the Slack body arrives."""
+        server = HTTPServer(('127.0.0.1', 0), FlakyWebhookHandler)
+        server.requests = 0
+        server.bodies = []
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        destination = WebhookDestination("slack", f"http://127.0.0.1:{server.server_port}/hook", "slack")
+        try:
+            with patch('notifications.routing.backoff_delay', return_value=0):
+                ok = destination.deliver(formats.render(Notification("*Paid* 10 USD"), "slack"))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        self.assertTrue(ok)
+        self.assertEqual(server.requests, 2)
+        self.assertEqual(server.bodies, [{"text": "*Paid* 10 USD"}])
+
+
+if __name__ == '__main__':
+    unittest.main()
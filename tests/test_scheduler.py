@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the payment source poll scheduler.
+"""
+
+import os
+import threading
+import time
+import unittest
+
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from payment_sources import scheduler
+from payment_sources.scheduler import PollJob, PollScheduler
+
+
+class TestPollJob(unittest.TestCase):
+    """Test how a job plans its next run."""
+
+    def job(self, **kwargs):
+        options = dict(interval=60, jitter=0, retry_base=15, max_backoff=100, active_interval=10, active_period=300)
+        options.update(kwargs)
+        job = PollJob("test", lambda: 0, **options)
+        job.schedule(1000)
+        return job
+
+    def test_interval_does_not_drift(self):
+        """Test that the next run is anchored to the schedule, not to when the run ended."""
+        job = self.job()
+        job.record(1000, 1000, 1007, 0)
+        self.assertEqual(job.next_run, 1060)
+        job.record(1060, 1061, 1070, 0)
+        self.assertEqual(job.next_run, 1120)
+        self.assertEqual(job.stats()["max_lag"], 1)
+
+    def test_failures_back_off_exponentially(self):
+        """Test that failed runs are retried soon and then less and less often."""
+        job = self.job()
+        delays = []
+        finished = 1000
+        for _ in range(5):
+            job.record(finished, finished, finished, False)
+            delays.append(job.next_run - finished)
+            finished = job.next_run
+        self.assertEqual(delays, [15, 30, 60, 100, 100])
+
+        job.record(finished, finished, finished, 0)
+        self.assertEqual(job.failures, 0)
+        self.assertEqual(job.next_run - finished, 60)
+
+    def test_payments_tighten_the_interval(self):
+        """Test that a run with alerts switches to the active interval for a while."""
+        job = self.job()
+        job.record(1000, 1000, 1000, 2)
+        self.assertEqual(job.next_run, 1010)
+        job.record(1010, 1010, 1310, 0)
+        self.assertEqual(job.next_run, 1370)
+        self.assertEqual(job.alerts, 2)
+
+    def test_jitter_stays_within_bounds(self):
+        """Test that runs are shifted by at most the jitter fraction."""
+        job = self.job(jitter=0.1)
+        runs = []
+        for _ in range(50):
+            job.record(1000, 1000, 1000, 0)
+            runs.append(job.next_run - job._anchor)
+            job._anchor = 1000
+        self.assertTrue(all(-6 <= r <= 6 for r in runs))
+        self.assertGreater(len(set(runs)), 1)
+
+    def test_slow_run_is_not_followed_straight_away(self):
+        """Test that a run taking almost the whole interval still leaves a gap before the next one."""
+        job = self.job(jitter=0.5)
+        for _ in range(50):
+            job.record(1000, 1000, 1059.5, 0)
+            self.assertGreaterEqual(job.next_run - 1059.5, 60 * scheduler.MIN_GAP_FRACTION * 0.5)
+            job._anchor = 1000
+
+        job = self.job()
+        job.record(1000, 1000, 1059.5, 0)
+        self.assertEqual(job.next_run, 1120)
+
+
+class TestPollScheduler(unittest.TestCase):
+    """Test running and triggering jobs."""
+
+    def setUp(self):
+        self.scheduler = PollScheduler(workers=2)
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def test_trigger_runs_job_immediately(self):
+        """Test that a triggered job runs without waiting for its interval."""
+        runs = []
+        ran = threading.Event()
+
+        def check():
+            runs.append(time.monotonic())
+            ran.set()
+            return 0
+
+        self.scheduler.add(PollJob("binance", check, interval=3600, jitter=0))
+        self.scheduler.start()
+        self.assertTrue(ran.wait(2))
+        ran.clear()
+
+        self.assertEqual(self.scheduler.trigger("binance"), ["binance"])
+        self.assertTrue(ran.wait(2))
+        self.assertEqual(len(runs), 2)
+        self.assertEqual(self.scheduler.trigger("unknown"), [])
+
+    def test_exceptions_count_as_failures(self):
+        """Test that an exception is recorded and retried with backoff."""
+        calls = threading.Semaphore(0)
+
+        def check():
+            calls.release()
+            raise ConnectionError("IMAP down")
+
+        self.scheduler.add(PollJob("imap", check, interval=3600, jitter=0, retry_base=0.05))
+        self.scheduler.start()
+        for _ in range(3):
+            self.assertTrue(calls.acquire(timeout=2))
+        stats = self.scheduler.stats()["imap"]
+        self.assertGreaterEqual(stats["errors"], 2)
+        self.assertGreaterEqual(stats["consecutive_failures"], 2)
+
+    def test_trigger_during_run_reruns_afterwards(self):
+        """Test that a trigger while a job is running is not lost."""
+        started = threading.Event()
+        release = threading.Event()
+        runs = []
+
+        def check():
+            runs.append(1)
+            started.set()
+            release.wait(2)
+            return 0
+
+        self.scheduler.add(PollJob("binance", check, interval=3600, jitter=0))
+        self.scheduler.start()
+        self.assertTrue(started.wait(2))
+        self.scheduler.trigger()
+        release.set()
+        deadline = time.monotonic() + 2
+        while len(runs) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(runs), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the time-partitioned seen-id store.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from storage.seen_ids import BloomFilter, SeenIdStore
+
+
+class TestSeenIdStore(unittest.TestCase):
+    """Test membership, pruning and persistence of seen ids."""
+
+    def setUp(self):
+        """Create a temporary directory for the database."""
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'state.db')
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.tmpdir)
+
+    def test_prune_drops_whole_partitions(self):
+        """Test that only partitions ending before the cutoff are dropped."""
+        store = SeenIdStore(partition_seconds=100)
+        store.add("old", 150)
+        store.add("recent", 250)
+
+        self.assertEqual(store.prune(230), 1)
+        self.assertFalse(store.contains("old"))
+        self.assertTrue(store.contains("recent"))
+        self.assertEqual(store.stats()["partitions"], 1)
+
+    def test_restart_loads_retained_partitions(self):
+        """Test that ids survive a restart and pruned ids do not."""
+        store = SeenIdStore(self.path, partition_seconds=100)
+        store.add("old", 50)
+        store.add("kept", 350)
+        store.prune(300)
+        store.close()
+
+        reopened = SeenIdStore(self.path, partition_seconds=100)
+        self.assertTrue(reopened.contains("kept"))
+        self.assertFalse(reopened.contains("old"))
+        self.assertEqual(reopened.stats()["entries"], 1)
+        reopened.close()
+
+    def test_bloom_front_confirms_hits_in_database(self):
+        """Test that Bloom filter positives are checked against the table."""
+        store = SeenIdStore(self.path, partition_seconds=100, bloom_capacity=1000)
+        for i in range(1000):
+            store.add(f"tx{i}", 10)
+
+        self.assertTrue(store.contains("tx7"))
+        self.assertFalse(any(store.contains(f"other{i}") for i in range(2000)))
+        stats = store.stats()
+        self.assertEqual(stats["entries"], 0)
+        self.assertLess(stats["bloom_bytes"], 2048)
+        self.assertLess(stats["db_lookups"], 20)
+        store.close()
+
+    def test_readded_id_moves_to_its_newer_partition(self):
+        """Test that an id seen again in a later window survives pruning of its first partition."""
+        store = SeenIdStore(partition_seconds=100)
+        for partition in range(50):
+            store.add(f"tx{partition}", partition * 100)
+        store.add("tx0", 4950)
+
+        self.assertEqual(store.prune(4900), 49)
+        self.assertTrue(store.contains("tx0"))
+        self.assertFalse(store.contains("tx1"))
+        self.assertEqual(store.stats()["entries"], 2)
+
+    def test_bloom_front_is_rebuilt_after_pruning(self):
+        """Test that pruned ids leave the single Bloom filter and it grows past its capacity."""
+        store = SeenIdStore(self.path, partition_seconds=100, bloom_capacity=100)
+        for i in range(300):
+            store.add(f"tx{i}", 10 + (i // 100) * 100)
+
+        self.assertTrue(all(store.contains(f"tx{i}") for i in range(300)))
+        store.prune(200)
+        lookups = store.stats()["db_lookups"]
+        self.assertFalse(any(store.contains(f"tx{i}") for i in range(200)))
+        self.assertTrue(store.contains("tx250"))
+        self.assertLess(store.stats()["db_lookups"] - lookups, 5)
+        store.close()
+
+    def test_bloom_front_counts_readded_id_once(self):
+        """Test that adding an id already in the Bloom filter does not count it again."""
+        store = SeenIdStore(self.path, partition_seconds=100, bloom_capacity=10)
+        store.add("tx1", 10)
+        bloom = store._bloom
+        for _ in range(50):
+            store.add("tx1", 10)
+
+        self.assertEqual(store._bloom_count, 1)
+        self.assertEqual(store._partitions, {0: 1})
+        self.assertIs(store._bloom, bloom)
+        self.assertEqual(store.prune(200), 1)
+        self.assertFalse(store.contains("tx1"))
+        store.close()
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        """Test that every added item is reported as present."""
+        bloom = BloomFilter(500, 0.01)
+        for i in range(500):
+            bloom.add(str(i))
+        self.assertTrue(all(str(i) in bloom for i in range(500)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Tests for Telegram delivery against the local Bot API stub with injected faults.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import github_sponsors_bot
+from notifications.dispatch import NotificationDispatcher
+from notifications.rate_limit import TelegramRateLimiter
+from storage.outbox import Outbox
+from stubs.telegram_api import (FLOOD, LOST_RESPONSE, RESET, SERVER_ERROR, TelegramStubServer,
+                                uniform_latency)
+
+
+class TestTelegramFaults(unittest.TestCase):
+    """Test that faults are retried without delivering an alert twice."""
+
+    def setUp(self):
+        """Start the stub without flood limits and point a bot at it."""
+        self.stub = TelegramStubServer(chat_limit=1000, global_limit=1000, seed=7).start()
+        self.bot = github_sponsors_bot.TelegramBot(
+            "123:abc",
+            "42",
+            base_url=self.stub.base_url,
+            rate_limiter=TelegramRateLimiter(global_rate=1000, chat_rate=1000, chat_burst=1000, global_burst=1000),
+            max_retries=10
+        )
+        self.backoff = patch.object(github_sponsors_bot, 'backoff_delay', lambda attempt: 0.01)
+        self.backoff.start()
+
+    def tearDown(self):
+        """Stop the stub."""
+        self.backoff.stop()
+        self.stub.stop()
+
+    def test_scripted_faults_are_retried_once_each(self):
+        """Test that a 429, a 5xx and a reset before delivery still deliver the message once."""
+        self.stub.fail_next(FLOOD, retry_after=0)
+        self.stub.fail_next(SERVER_ERROR, status=502)
+        self.stub.fail_next(RESET)
+
+        with patch.object(self.bot.rate_limiter, 'penalize'):
+            self.assertTrue(self.bot.send_message("hello"))
+
+        self.assertEqual(self.stub.calls['sendMessage'], 4)
+        self.assertEqual(self.stub.delivery_counts(), {"hello": 1})
+
+    def test_lost_response_is_visible_as_duplicate(self):
+        """Test that a response lost after delivery makes the retry a duplicate."""
+        self.stub.fail_next(LOST_RESPONSE)
+
+        self.assertTrue(self.bot.send_message("hello"))
+
+        self.assertEqual(self.stub.duplicates(), {"hello": 2})
+
+    def test_outbox_delivers_every_alert_once_under_random_faults(self):
+        """Test that alerts sent through the dispatcher arrive exactly once despite errors and resets."""
+        tmpdir = tempfile.mkdtemp()
+        outbox = Outbox(os.path.join(tmpdir, 'state.db'))
+        self.stub.latency = uniform_latency(0, 0.005)
+        self.stub.fault_rates = {SERVER_ERROR: 0.2, RESET: 0.1}
+        dispatcher = NotificationDispatcher(self.bot.send_message, workers=4, outbox=outbox)
+        dispatcher.start()
+        try:
+            for i in range(40):
+                self.assertTrue(dispatcher.send_message(f"alert {i}"))
+            self.assertTrue(self.stub.wait_for_deliveries(40))
+        finally:
+            dispatcher.stop()
+            pending = outbox.pending()
+            outbox.close()
+            shutil.rmtree(tmpdir)
+
+        self.assertGreater(self.stub.injected[SERVER_ERROR] + self.stub.injected[RESET], 0)
+        self.assertEqual(len(self.stub.deliveries), 40)
+        self.assertEqual(self.stub.duplicates(), {})
+        self.assertEqual(pending, [])
+
+    def test_commands_are_answered_by_polling(self):
+        """Test that a command queued for getUpdates is answered."""
+        self.stub.add_message("/help")
+
+        self.assertTrue(self.bot.start_polling())
+        try:
+            self.assertTrue(self.stub.wait_for_deliveries(1))
+        finally:
+            self.bot.stop_polling()
+
+        self.assertIn("Available commands", self.stub.deliveries[0]["text"])
+
+
+if __name__ == '__main__':
+    unittest.main()
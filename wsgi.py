@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+WSGI entry point for webhook ingest workers.
+
+    gunicorn -w 4 -b 0.0.0.0:5000 wsgi:app
+
+Each worker verifies, dedupes and formats GitHub webhooks and stores the
+alerts in the outbox (BOT_ROLE=ingest); no worker starts Telegram polling or
+a payment source. Run exactly one notifier next to the workers, with the same
+STATE_DB_PATH, to deliver the stored alerts and own Telegram and the payment
+sources:
+
+    BOT_ROLE=notifier WEBHOOK_PORT=5001 python github_sponsors_bot.py
+
+With TELEGRAM_WEBHOOK_URL set, the workers also answer bot commands.
+"""
+
+import os
+
+# Set before the bot module reads its configuration
+os.environ.setdefault('BOT_ROLE', 'ingest')
+
+from github_sponsors_bot import (  # noqa: E402
+    BOT_ROLE, TELEGRAM_WEBHOOK_SECRET, app, ingest_config_errors, telegram_bot
+)
+
+if BOT_ROLE != 'ingest':
+    raise RuntimeError(f"wsgi.py serves webhook ingest workers only, but BOT_ROLE is {BOT_ROLE!r}")
+
+errors = ingest_config_errors()
+if errors:
+    raise RuntimeError("; ".join(errors))
+
+# With a Telegram webhook, bot commands are answered by the same workers
+if TELEGRAM_WEBHOOK_SECRET:
+    telegram_bot.initialize_bot()